@@ -35,6 +35,7 @@ class FileInfo:
     codec: Codec
     channels: int = dt.field(default=2)
     channels_layout: ChannelsLayout = dt.field(default=ChannelsLayout.stereo)
+    path: Path = dt.field(default=None)
 
     def as_dict(self) -> dict:
         return dt.asdict(self)
@@ -60,6 +61,8 @@ class Metadata:
     featured_artist: str = dt.field(default_factory=str)
     additional_contributors: list[str] = dt.field(default_factory=list)
     year_of_composition: datetime.date = dt.field(default=datetime.date(1999, 1, 1))
+    # Raw container tags
+    tags: dict = dt.field(default_factory=dict)
 
     def as_dict(self) -> dict:
         return dt.asdict(self)
@@ -68,7 +71,114 @@ class Metadata:
         return dt.astuple(self)
 
 
+class EditType:
+    # Remove the region
+    Cut = "cut"
+    # Fade the region in or out. The audio before a fade-in and after a fade-out is silent
+    FadeIn = "fadeIn"
+    FadeOut = "fadeOut"
+    # Change the level of the region
+    Gain = "gain"
+    # Change the channels of the whole file, see `ChannelOperation`
+    Channels = "channels"
+    # Insert a part of another file at the region start
+    Insert = "insert"
+
+
+class ChannelOperation:
+    # Swap the left and right channels
+    Swap = "swap"
+    # Downmix to mono, or take a single channel as mono
+    Mono = "mono"
+    Left = "left"
+    Right = "right"
+    # Duplicate a mono channel into stereo
+    Stereo = "stereo"
+    # Invert the polarity of all channels
+    Invert = "invert"
+
+
+def _get_values(constants: type) -> set:
+    return {value for key, value in vars(constants).items() if not key.startswith("_")}
+
+
+@dt.dataclass
+class Edit:
+    type: str
+    # Region in seconds of the source timeline. `None` end is the end of the file
+    start: float = dt.field(default=0.0)
+    end: Optional[float] = dt.field(default=None)
+    # Gain in dB of `EditType.Gain`
+    gain: float = dt.field(default=0.0)
+    # `ChannelOperation` of `EditType.Channels`
+    channels: Optional[str] = dt.field(default=None)
+    # Curve of the fades, one of the ffmpeg `afade` curves
+    curve: str = dt.field(default="tri")
+    # Inserted file of `EditType.Insert` and its region in seconds. `None` end is the end of the clip
+    clip_path: Optional[Path] = dt.field(default=None)
+    clip_start: float = dt.field(default=0.0)
+    clip_end: Optional[float] = dt.field(default=None)
+
+    def __post_init__(self) -> None:
+        if self.type not in _get_values(EditType):
+            raise ValueError(f"Unknown edit type \"{self.type}\"")
+        if self.start < 0 or (self.end is not None and self.end < self.start):
+            raise ValueError(f"Invalid edit region {self.start}-{self.end}")
+        if self.type == EditType.Channels and self.channels not in _get_values(ChannelOperation):
+            raise ValueError(f"Unknown channel operation \"{self.channels}\"")
+        if self.type == EditType.Insert:
+            if not self.clip_path:
+                raise ValueError("Inserted clip has no file")
+            if self.clip_start < 0 or (self.clip_end is not None and self.clip_end < self.clip_start):
+                raise ValueError(f"Invalid clip region {self.clip_start}-{self.clip_end}")
+
+    def as_dict(self) -> dict:
+        data = dt.asdict(self)
+        data["clip_path"] = str(self.clip_path) if self.clip_path else None
+        return data
+
+
 @dt.dataclass
 class MediaFile:
     info: FileInfo
     metadata: Metadata
+    # Analyzer results by analyzer name
+    analysis: dict = dt.field(default_factory=dict)
+    # Hash of the audio payload, see `get_audio_hash`
+    audio_hash: Optional[str] = dt.field(default=None)
+    # Edit decision list applied at the export. The source file is never changed
+    edits: list[Edit] = dt.field(default_factory=list)
+
+
+@dt.dataclass
+class Preset:
+    name: str
+    codec: str
+    extension: str
+    bit_rate: Optional[str] = None
+    sample_rate: Optional[int] = None
+    channels: Optional[int] = None
+    options: dict = dt.field(default_factory=dict)
+    # Target integrated loudness in LUFS. Files are measured and normalized with a linear gain
+    loudness: Optional[float] = None
+    # True-peak ceiling in dBTP of the normalized files
+    true_peak: Optional[float] = None
+    # Threshold in dBFS of the leading and trailing silence to trim
+    trim_silence: Optional[float] = None
+
+    def get_output_options(self) -> dict:
+        """
+        Get ffmpeg output options
+        """
+        options = {"acodec": self.codec}
+        if self.bit_rate:
+            options["audio_bitrate"] = self.bit_rate
+        if self.sample_rate:
+            options["ar"] = self.sample_rate
+        if self.channels:
+            options["ac"] = self.channels
+        options.update(self.options)
+        return options
+
+    def as_dict(self) -> dict:
+        return dt.asdict(self)
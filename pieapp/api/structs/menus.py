@@ -5,6 +5,10 @@ Built-in app menus
 
 class MainMenuItem:
     OpenFiles = "openFiles"
+    MirrorLibrary = "mirrorLibrary"
+    MeasureLoudness = "measureLoudness"
+    FindSimilar = "findSimilar"
+    FindLossySources = "findLossySources"
     Preferences = "preferences"
     Exit = "exit"
 
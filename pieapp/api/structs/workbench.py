@@ -7,6 +7,7 @@ class WorkbenchItem:
     OpenFiles = "openFiles"
     Clear = "clear"
     Convert = "convert"
+    RemoveDuplicates = "removeDuplicates"
     Preferences = "Preferences"
     Spacer = "spacer"
     Exit = "exit"
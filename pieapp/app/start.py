@@ -1,12 +1,15 @@
 from PySide6.QtCore import QSettings
+from PySide6.QtCore import QCoreApplication
 from __feature__ import snake_case
 
 import sys
+from pathlib import Path
 from confstar.types import *
 
 from pieapp.api.globals import Global
 from pieapp.api.plugins import Plugins
 from pieapp.wizard.wizard import StartupWizard
+from pieapp.helpers.logger import logger
 from pieapp.helpers.modules import is_debug
 from pieapp.helpers.qt import get_application, except_hook
 from pieapp.widgets.splashscreen import SplashScreen
@@ -108,3 +111,55 @@ def start_application(*args, **kwargs) -> None:
     main_window.show()
 
     sys.exit(app.exec())
+
+
+def start_mirror(
+    source_root: Path,
+    target_root: Path,
+    preset_name: str = None,
+    ffmpeg_cmd: Path = Path("ffmpeg"),
+    ffprobe_cmd: Path = Path("ffprobe"),
+    dry_run: bool = False,
+    verify: bool = False,
+    embed_cover: bool = False
+) -> int:
+    """
+    Headless entrypoint of the library mirror
+
+    Returns:
+        exit_code (int): 0 on success, 1 if some files have failed, 2 if the mirror has failed
+    """
+    Global.add_handlers(Lock, Max, Min)
+    Global.import_module("pieapp.app.globals")
+
+    # Converter plugin modules are imported the same way the plugin registry does
+    sys.path.insert(0, (Global.APP_ROOT / Global.PLUGINS_FOLDER).as_posix())
+    from converter.cache import TranscodeCache
+    from converter.covers import CoverPreparer
+    from converter.mirror import MirrorSession
+    from converter.presets import get_preset
+    from converter.scheduler import ConversionScheduler
+
+    app = QCoreApplication.instance() or QCoreApplication(sys.argv)
+    scheduler = ConversionScheduler(
+        ffmpeg_cmd,
+        cache=TranscodeCache(Global.USER_ROOT / Global.DEFAULT_TEMP_FOLDER_NAME / "transcode"),
+        verify=verify,
+        covers=CoverPreparer(Global.USER_ROOT / Global.DEFAULT_TEMP_FOLDER_NAME / "covers") if embed_cover else None,
+    )
+    scheduler.sig_job_completed.connect(lambda job: logger.info(f"Converted {job.source_path}"))
+    scheduler.sig_job_failed.connect(lambda job, message: logger.error(f"Failed to convert {job.source_path}: {message}"))
+    scheduler.sig_job_verified.connect(lambda job: job.verification.passed or logger.error(
+        f"Verification of {job.output_path} has failed: {job.verification.message}"
+    ))
+
+    session = MirrorSession(scheduler, ffprobe_cmd)
+    session.sig_mirror_planned.connect(lambda plan: logger.info(
+        f"{len(plan.convert)} to convert, {len(plan.move)} moved, "
+        f"{len(plan.remove)} removed, {plan.unchanged} unchanged"
+    ))
+    session.sig_mirror_completed.connect(lambda converted, failed: app.exit(1 if failed else 0))
+    session.sig_mirror_failed.connect(lambda message: (logger.critical(message), app.exit(2)))
+    session.start(source_root, target_root, get_preset(preset_name), dry_run=dry_run)
+
+    return app.exec()
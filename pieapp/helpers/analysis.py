@@ -0,0 +1,313 @@
+"""
+Audio analysis service. Each file is decoded once for all the requested analyzers,
+and the results are cached as JSON by the audio hash. Large results, e.g. waveforms,
+are stored by their analyzers
+"""
+from __feature__ import snake_case
+
+import os
+import json
+import multiprocessing
+from pathlib import Path
+from typing import Optional
+from concurrent.futures import Executor
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import ffmpeg
+
+from PySide6.QtCore import Slot
+from PySide6.QtCore import Signal
+from PySide6.QtCore import QObject
+from PySide6.QtCore import QRunnable
+from PySide6.QtCore import QThreadPool
+
+from pieapp.api.structs.media import MediaFile
+from pieapp.helpers.analyzers import Analyzer
+from pieapp.helpers.analyzers import analyze_file
+from pieapp.helpers.analyzers import get_default_analyzers
+from pieapp.helpers.analyzers import DEFAULT_ANALYSIS_SAMPLE_RATE
+from pieapp.helpers.files import read_json
+from pieapp.helpers.files import get_partial_path
+from pieapp.helpers.hashing import get_audio_hash
+from pieapp.helpers.logger import logger
+
+
+class AnalysisCache:
+    """
+    Results stored as `<audio hash>.json` with the analyzer versions
+    """
+
+    def __init__(self, folder: Path) -> None:
+        self._folder = Path(folder)
+
+    def get(self, audio_hash: str, analyzers: list[Analyzer]) -> dict[str, dict]:
+        """
+        Get the cached results of the analyzers. Results of other analyzer versions are skipped.
+        Analyzers that aren't `cached` load their results themselves
+        """
+        cached = read_json(self._folder / f"{audio_hash}.json", default={}, raise_exception=False)
+        results = {
+            analyzer.name: cached[analyzer.name]["result"] for analyzer in analyzers
+            if analyzer.cached and cached.get(analyzer.name, {}).get("version") == analyzer.version
+        }
+        for analyzer in analyzers:
+            if not analyzer.cached:
+                result = analyzer.load(audio_hash)
+                if result is not None:
+                    results[analyzer.name] = result
+
+        return results
+
+    def put(self, audio_hash: str, analyzers: list[Analyzer], results: dict[str, dict]) -> dict[str, dict]:
+        """
+        Store the results of the analyzers
+
+        Returns:
+            results (dict[str, dict]): results with the ones stored by the analyzers as they're loaded
+        """
+        results = dict(results)
+        for analyzer in analyzers:
+            if not analyzer.cached:
+                results[analyzer.name] = analyzer.store(audio_hash, results[analyzer.name])
+
+        analyzers = [analyzer for analyzer in analyzers if analyzer.cached]
+        if not analyzers:
+            return results
+
+        cache_path = self._folder / f"{audio_hash}.json"
+        cached = read_json(cache_path, default={}, raise_exception=False)
+        for analyzer in analyzers:
+            cached[analyzer.name] = {"version": analyzer.version, "result": results[analyzer.name]}
+
+        self._folder.mkdir(parents=True, exist_ok=True)
+        partial_path = get_partial_path(cache_path)
+        partial_path.write_text(json.dumps(cached), encoding="utf-8")
+        os.replace(partial_path, cache_path)
+        return results
+
+
+class AnalysisSignals(QObject):
+    ready = Signal(object, object)
+    failed = Signal(object, str)
+
+
+class AnalysisWorker(QRunnable):
+
+    def __init__(
+        self,
+        key: tuple,
+        ffmpeg_cmd: Path,
+        media_file: MediaFile,
+        analyzers: list[Analyzer],
+        cache: AnalysisCache,
+        executor: Optional[Executor]
+    ) -> None:
+        super().__init__()
+
+        self._signals = AnalysisSignals()
+        self._key = key
+        self._ffmpeg_cmd = ffmpeg_cmd
+        self._media_file = media_file
+        self._analyzers = analyzers
+        self._cache = cache
+        self._executor = executor
+
+    @property
+    def signals(self) -> AnalysisSignals:
+        return self._signals
+
+    @Slot()
+    def run(self) -> None:
+        file_path = self._media_file.info.path
+        try:
+            audio_hash = get_audio_hash(file_path)
+            results = self._cache.get(audio_hash, self._analyzers)
+            missing = [analyzer for analyzer in self._analyzers if analyzer.name not in results]
+            if missing:
+                results.update(self._analyze(file_path, missing))
+                results = self._cache.put(audio_hash, missing, results)
+        except (ffmpeg.Error, OSError) as e:
+            message = getattr(e, "stderr", None) or str(e)
+            message = message.decode(errors="replace") if isinstance(message, bytes) else message
+            logger.debug(f"Analysis of {file_path} failed: {message}")
+            self._signals.failed.emit(self._key, message)
+            return
+        except Exception as e:
+            logger.error(f"Analysis of {file_path} failed: {e!s}")
+            self._signals.failed.emit(self._key, str(e))
+            return
+
+        self._signals.ready.emit(self._key, results)
+
+    def _analyze(self, file_path: Path, analyzers: list[Analyzer]) -> dict[str, dict]:
+        info = self._media_file.info
+        options = {
+            "sample_rate": int(float(info.sample_rate or 0)) or DEFAULT_ANALYSIS_SAMPLE_RATE,
+            "channels": 1 if info.channels == 1 else 2,
+            "duration": info.duration,
+        }
+        try:
+            return analyze_file(self._ffmpeg_cmd, file_path, analyzers, executor=self._executor, **options)
+        except BrokenProcessPool:
+            logger.debug(f"Analysis process pool is broken, {file_path} is analyzed in the thread")
+            return analyze_file(self._ffmpeg_cmd, file_path, analyzers, **options)
+
+
+class AnalysisService(QObject):
+    """
+    Asynchronous analysis of media files. One decoding of a file feeds all the requested
+    analyzers, so a new analyzer doesn't add a pass over the files. Results are attached
+    to `MediaFile.analysis`. Must be used from the GUI thread
+    """
+    sig_file_analyzed = Signal(object)
+    sig_file_failed = Signal(object, str)
+
+    def __init__(self, ffmpeg_cmd: Path, folder: Path, max_workers: int = None, parent: QObject = None) -> None:
+        super().__init__(parent)
+
+        self._ffmpeg_cmd = ffmpeg_cmd
+        self._cache = AnalysisCache(folder)
+        self._max_workers = max_workers or max(1, (os.cpu_count() or 1) // 2)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._analyzers: dict[str, Analyzer] = {}
+        # Media file and callbacks by file path and analyzer names
+        self._pending: dict[tuple, tuple[MediaFile, list[tuple[callable, callable]]]] = {}
+        self._pool = QThreadPool(self)
+        self._pool.set_max_thread_count(self._max_workers)
+
+        for analyzer in get_default_analyzers():
+            self.register_analyzer(analyzer)
+
+    def set_ffmpeg_cmd(self, ffmpeg_cmd: Path) -> None:
+        self._ffmpeg_cmd = ffmpeg_cmd
+
+    def register_analyzer(self, analyzer: Analyzer) -> None:
+        """
+        Add the analyzer to the ones run by default. An analyzer with the same name is replaced
+        """
+        self._analyzers[analyzer.name] = analyzer
+
+    def unregister_analyzer(self, name: str) -> None:
+        self._analyzers.pop(name, None)
+
+    def get_analyzers(self) -> list[Analyzer]:
+        return list(self._analyzers.values())
+
+    def request(
+        self,
+        media_file: MediaFile,
+        callback: callable = None,
+        names: list[str] = None,
+        error_callback: callable = None
+    ) -> None:
+        """
+        Analyze the file in the background
+
+        Args:
+            media_file (MediaFile): media file to analyze
+            callback (callable|None): called with the `MediaFile` once the results are attached
+            names (list[str]|None): analyzer names, all the registered analyzers by default
+            error_callback (callable|None): called with the `MediaFile` and the error message
+        """
+        names = tuple(sorted(names or self._analyzers))
+        if all(name in media_file.analysis for name in names):
+            if callback:
+                callback(media_file)
+            return
+
+        # A pending analysis with all the requested analyzers is joined instead of decoding again
+        key = next((
+            (path, pending_names) for path, pending_names in self._pending
+            if path == str(media_file.info.path) and set(names) <= set(pending_names)
+        ), (str(media_file.info.path), names))
+        is_pending = key in self._pending
+        self._pending.setdefault(key, (media_file, []))[1].append((callback, error_callback))
+        if is_pending:
+            return
+
+        worker = AnalysisWorker(
+            key,
+            self._ffmpeg_cmd,
+            media_file,
+            [self._analyzers[name] for name in names],
+            self._cache,
+            self._get_executor()
+        )
+        worker.signals.ready.connect(self._analysis_ready)
+        worker.signals.failed.connect(self._analysis_failed)
+        self._pool.start(worker)
+
+    def analyze(self, media_files: list[MediaFile], callback: callable, names: list[str] = None) -> None:
+        """
+        Analyze the files and call back with the list of the analyzed ones once all are done
+        """
+        remaining = list(range(len(media_files)))
+        analyzed: dict[int, MediaFile] = {}
+        if not remaining:
+            callback([])
+            return
+
+        def file_done(index: int, media_file: MediaFile = None) -> None:
+            remaining.remove(index)
+            if media_file is not None:
+                analyzed[index] = media_file
+            if not remaining:
+                callback([analyzed[index] for index in sorted(analyzed)])
+
+        for index, media_file in enumerate(media_files):
+            self.request(
+                media_file,
+                lambda analyzed_file, i=index: file_done(i, analyzed_file),
+                names,
+                lambda failed_file, message, i=index: file_done(i)
+            )
+
+    def clear(self) -> None:
+        """
+        Drop the queued requests
+        """
+        self._pool.clear()
+        self._pending.clear()
+
+    def shutdown(self) -> None:
+        self.clear()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _get_executor(self) -> Optional[ProcessPoolExecutor]:
+        # A single worker gains nothing from the processes
+        if self._executor is None and self._max_workers > 1:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self._max_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+
+        return self._executor
+
+    def _analysis_ready(self, key: tuple, results: dict) -> None:
+        media_file, callbacks = self._pending.pop(key, (None, []))
+        if media_file is None:
+            return
+
+        media_file.analysis.update(results)
+        self.sig_file_analyzed.emit(media_file)
+        for callback, _ in callbacks:
+            if callback is None:
+                continue
+            try:
+                callback(media_file)
+            except RuntimeError:
+                # The widget was deleted while the file was analyzed
+                pass
+
+    def _analysis_failed(self, key: tuple, message: str) -> None:
+        media_file, callbacks = self._pending.pop(key, (None, []))
+        if media_file is None:
+            return
+
+        self.sig_file_failed.emit(media_file, message)
+        for _, error_callback in callbacks:
+            if error_callback is not None:
+                error_callback(media_file, message)
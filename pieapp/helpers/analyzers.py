@@ -0,0 +1,349 @@
+"""
+Vectorized analyzers. A decoded file is passed to the analyzers block by block,
+and the blocks can be processed in worker processes through shared memory.
+The module doesn't import Qt, so the worker processes import it quickly
+"""
+from multiprocessing import shared_memory
+from concurrent.futures import Executor
+from pathlib import Path
+from typing import Any, Optional
+
+import numpy as np
+
+from pieapp.helpers.pcm import PCMReader
+from pieapp.helpers.pcm import SampleFormat
+from pieapp.helpers.pcm import SAMPLE_FORMATS
+
+# Decoded samples per channel in a block
+ANALYSIS_FRAME_SIZE = 65536
+
+# Sample rate used when the source rate is unknown
+DEFAULT_ANALYSIS_SAMPLE_RATE = 48000
+
+# Niceness increment of the decoding ffmpeg process
+ANALYSIS_NICENESS = 10
+
+# Level reported for digital silence, in dBFS
+MIN_DB = -144.0
+
+# Absolute sample value that is considered clipped
+CLIP_LEVEL = 0.999
+
+# Oversampling of the true-peak meter (ITU-R BS.1770)
+TRUE_PEAK_OVERSAMPLING = 4
+TRUE_PEAK_TAPS = 48
+
+
+def to_db(value: float) -> float:
+    return float(20 * np.log10(value)) if value > 0 else MIN_DB
+
+
+class Analyzer:
+    """
+    Vectorized analysis of sample blocks. Analyzers keep no per-file state of their own:
+    it's returned by `start`, passed through `process` for every block and turned into
+    results by `finish`. Blocks of a file can then be processed in any worker process.
+    Analyzers and their state must be picklable, and the state must not keep views of a block
+    """
+    # Unique name, the results are stored under it
+    name: str = None
+    # Cached results of other versions are recomputed
+    version: int = 1
+    # Results are kept in the JSON cache. Other analyzers store them with `store`, e.g. large arrays
+    cached: bool = True
+
+    def start(self, sample_rate: int, channels: int) -> Any:
+        """
+        Get the initial state
+        """
+        raise NotImplementedError
+
+    def process(self, state: Any, block: np.ndarray) -> Any:
+        """
+        Args:
+            state (Any): state after the previous block
+            block (np.ndarray): (channels, samples) float32 array
+
+        Returns:
+            state (Any): updated state
+        """
+        raise NotImplementedError
+
+    def take_output(self, state: Any) -> tuple[Any, Any]:
+        """
+        Split the state after a block into the state for the next block and the block output.
+        Outputs are kept by the caller, so a growing output isn't passed to the worker processes
+
+        Returns:
+            state, output (tuple[Any, Any]): next state and the block output or `None`
+        """
+        return state, None
+
+    def join_outputs(self, state: Any, outputs: list[Any]) -> Any:
+        """
+        Get the final state with the block outputs in order
+        """
+        return state
+
+    def finish(self, state: Any) -> dict:
+        """
+        Get JSON serializable results. Results of the analyzers that aren't `cached` can be of any type
+        """
+        raise NotImplementedError
+
+    def load(self, audio_hash: str) -> Optional[Any]:
+        """
+        Get the results stored by `store`, or `None` to analyze the file again. Used when not `cached`
+        """
+        return None
+
+    def store(self, audio_hash: str, result: Any) -> Any:
+        """
+        Store the results of the file and get them back as `load` would. Used when not `cached`
+        """
+        return result
+
+
+class PeakAnalyzer(Analyzer):
+    name = "peak"
+
+    def start(self, sample_rate: int, channels: int) -> np.ndarray:
+        return np.zeros(channels, dtype=np.float32)
+
+    def process(self, state: np.ndarray, block: np.ndarray) -> np.ndarray:
+        return np.maximum(state, np.abs(block).max(axis=1))
+
+    def finish(self, state: np.ndarray) -> dict:
+        return {"peak": state.tolist(), "peak_db": to_db(state.max(initial=0))}
+
+
+class RMSAnalyzer(Analyzer):
+    name = "rms"
+
+    def start(self, sample_rate: int, channels: int) -> tuple[np.ndarray, int]:
+        return np.zeros(channels, dtype=np.float64), 0
+
+    def process(self, state: tuple[np.ndarray, int], block: np.ndarray) -> tuple[np.ndarray, int]:
+        squares, samples = state
+        return squares + np.einsum("ij,ij->i", block, block, dtype=np.float64), samples + block.shape[1]
+
+    def finish(self, state: tuple[np.ndarray, int]) -> dict:
+        squares, samples = state
+        rms = np.sqrt(squares / max(samples, 1))
+        return {"rms": rms.tolist(), "rms_db": to_db(float(np.sqrt(rms.dot(rms) / max(len(rms), 1))))}
+
+
+class ClippingAnalyzer(Analyzer):
+    name = "clipping"
+
+    def start(self, sample_rate: int, channels: int) -> tuple[np.ndarray, int]:
+        return np.zeros(channels, dtype=np.int64), 0
+
+    def process(self, state: tuple[np.ndarray, int], block: np.ndarray) -> tuple[np.ndarray, int]:
+        clipped, samples = state
+        return clipped + np.count_nonzero(np.abs(block) >= CLIP_LEVEL, axis=1), samples + block.shape[1]
+
+    def finish(self, state: tuple[np.ndarray, int]) -> dict:
+        clipped, samples = state
+        return {
+            "clipped_samples": clipped.tolist(),
+            "clipped_ratio": float(clipped.sum() / max(samples * len(clipped), 1)),
+        }
+
+
+class DCOffsetAnalyzer(Analyzer):
+    name = "dc_offset"
+
+    def start(self, sample_rate: int, channels: int) -> tuple[np.ndarray, int]:
+        return np.zeros(channels, dtype=np.float64), 0
+
+    def process(self, state: tuple[np.ndarray, int], block: np.ndarray) -> tuple[np.ndarray, int]:
+        sums, samples = state
+        return sums + block.sum(axis=1, dtype=np.float64), samples + block.shape[1]
+
+    def finish(self, state: tuple[np.ndarray, int]) -> dict:
+        sums, samples = state
+        return {"dc_offset": (sums / max(samples, 1)).tolist()}
+
+
+class TruePeakAnalyzer(Analyzer):
+    """
+    Inter-sample peaks of the 4x oversampled signal. The polyphase filter runs
+    over the block with the tail of the previous block prepended
+    """
+    name = "true_peak"
+
+    def __init__(self) -> None:
+        # Windowed sinc interpolation filter split into one phase per output sample
+        taps = np.arange(TRUE_PEAK_TAPS) - (TRUE_PEAK_TAPS - 1) / 2
+        kernel = np.sinc(taps / TRUE_PEAK_OVERSAMPLING) * np.kaiser(TRUE_PEAK_TAPS, 8.0)
+        self._phases = [
+            (kernel[phase::TRUE_PEAK_OVERSAMPLING] / kernel[phase::TRUE_PEAK_OVERSAMPLING].sum()).astype(np.float32)
+            for phase in range(TRUE_PEAK_OVERSAMPLING)
+        ]
+
+    def start(self, sample_rate: int, channels: int) -> tuple[np.ndarray, np.ndarray]:
+        history = np.zeros((channels, len(self._phases[0]) - 1), dtype=np.float32)
+        return np.zeros(channels, dtype=np.float32), history
+
+    def process(self, state: tuple[np.ndarray, np.ndarray], block: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        peaks, history = state
+        peaks = peaks.copy()
+        for channel, samples in enumerate(block):
+            signal = np.concatenate((history[channel], samples))
+            for phase in self._phases:
+                peaks[channel] = max(peaks[channel], np.abs(np.convolve(signal, phase, "valid")).max(initial=0))
+
+        tail = np.concatenate((history, block), axis=1)[:, -history.shape[1]:]
+        return peaks, tail.copy()
+
+    def finish(self, state: tuple[np.ndarray, np.ndarray]) -> dict:
+        peaks, _ = state
+        return {"true_peak": peaks.tolist(), "true_peak_db": to_db(peaks.max(initial=0))}
+
+
+def get_default_analyzers() -> list[Analyzer]:
+    return [PeakAnalyzer(), RMSAnalyzer(), ClippingAnalyzer(), DCOffsetAnalyzer(), TruePeakAnalyzer()]
+
+
+def _run_analyzers(analyzers: list[Analyzer], states: list[Any], block: np.ndarray) -> list[tuple[Any, Any]]:
+    return [analyzer.take_output(analyzer.process(state, block)) for analyzer, state in zip(analyzers, states)]
+
+
+def _process_block(
+    analyzers: list[Analyzer],
+    states: list[Any],
+    memory_name: str,
+    samples: int,
+    channels: int
+) -> list[tuple[Any, Any]]:
+    """
+    Run the analyzers over a block in shared memory. Called in a worker process
+
+    Returns:
+        results (list[tuple[Any, Any]]): next state and the block output of each analyzer
+    """
+    memory = shared_memory.SharedMemory(name=memory_name)
+    try:
+        # Samples are interleaved, as ffmpeg wrote them
+        block = np.ndarray((samples, channels), dtype=np.float32, buffer=memory.buf).T
+        results = _run_analyzers(analyzers, states, block)
+        del block
+        return results
+    finally:
+        memory.close()
+
+
+def _keep_outputs(results: list[tuple[Any, Any]], outputs: list[list]) -> list[Any]:
+    for analyzer_outputs, (_, output) in zip(outputs, results):
+        if output is not None:
+            analyzer_outputs.append(output)
+
+    return [state for state, _ in results]
+
+
+def analyze_file(
+    ffmpeg_cmd: Path,
+    file_path: Path,
+    analyzers: list[Analyzer],
+    sample_rate: int = DEFAULT_ANALYSIS_SAMPLE_RATE,
+    channels: int = 2,
+    executor: Executor = None,
+    duration: float = None
+) -> dict[str, dict]:
+    """
+    Decode the file once and run all the analyzers over each block. With an executor the
+    blocks are processed in the worker processes while the next block is decoded
+
+    Args:
+        ffmpeg_cmd (Path): ffmpeg binary path
+        file_path (Path): media file path
+        analyzers (list[Analyzer]): analyzers to run
+        sample_rate (int): decoding sample rate
+        channels (int): decoding channels
+        executor (Executor|None): process pool, or `None` to process the blocks in the calling thread
+        duration (float|None): file duration in seconds used to scale the decoding timeout
+
+    Returns:
+        results (dict[str, dict]): results by analyzer name
+
+    Raises:
+        ffmpeg.Error: the file can't be decoded
+    """
+    states = [analyzer.start(sample_rate, channels) for analyzer in analyzers]
+    outputs = [[] for _ in analyzers]
+    reader_options = {
+        "sample_rate": sample_rate,
+        "channels": channels,
+        "sample_format": SampleFormat.Float32,
+        "frame_size": ANALYSIS_FRAME_SIZE,
+        "niceness": ANALYSIS_NICENESS,
+        "media_duration": duration,
+    }
+    if executor is None:
+        with PCMReader(ffmpeg_cmd, file_path, **reader_options) as reader:
+            for block in reader:
+                states = _keep_outputs(_run_analyzers(analyzers, states, block), outputs)
+    else:
+        frame_bytes = ANALYSIS_FRAME_SIZE * channels * np.dtype(SAMPLE_FORMATS[SampleFormat.Float32][0]).itemsize
+        # One block is analyzed while the other one is decoded
+        memories = [shared_memory.SharedMemory(create=True, size=frame_bytes) for _ in range(2)]
+        try:
+            states = _analyze_shared(
+                ffmpeg_cmd,
+                file_path,
+                analyzers,
+                states,
+                outputs,
+                memories,
+                executor,
+                reader_options
+            )
+        finally:
+            for memory in memories:
+                try:
+                    memory.close()
+                except BufferError:
+                    # Views are still referenced by a propagating exception
+                    pass
+                memory.unlink()
+
+    return {
+        analyzer.name: analyzer.finish(analyzer.join_outputs(state, analyzer_outputs))
+        for analyzer, state, analyzer_outputs in zip(analyzers, states, outputs)
+    }
+
+
+def _analyze_shared(
+    ffmpeg_cmd: Path,
+    file_path: Path,
+    analyzers: list[Analyzer],
+    states: list[Any],
+    outputs: list[list],
+    memories: list[shared_memory.SharedMemory],
+    executor: Executor,
+    reader_options: dict
+) -> list[Any]:
+    future = None
+    with PCMReader(
+        ffmpeg_cmd,
+        file_path,
+        frame_buffers=[memory.buf for memory in memories],
+        **reader_options
+    ) as reader:
+        for block in reader:
+            if future is not None:
+                states = _keep_outputs(future.result(), outputs)
+            future = executor.submit(
+                _process_block,
+                analyzers,
+                states,
+                memories[reader.buffer_index].name,
+                block.shape[1],
+                block.shape[0]
+            )
+
+        if future is not None:
+            states = _keep_outputs(future.result(), outputs)
+
+    return states
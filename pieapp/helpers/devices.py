@@ -0,0 +1,106 @@
+"""
+Block devices and read-ahead helpers
+"""
+import os
+from pathlib import Path
+
+from pieapp.helpers.logger import logger
+
+
+NETWORK_FILESYSTEMS: tuple[str] = (
+    "nfs", "nfs4", "cifs", "smb3", "smbfs", "9p", "ceph",
+    "glusterfs", "fuse.sshfs", "fuse.rclone", "afs",
+)
+
+
+# Cached device types by device id
+_device_types: dict[int, str] = {}
+
+
+class DeviceType:
+    Rotational = "rotational"
+    NonRotational = "non-rotational"
+    Network = "network"
+    Unknown = "unknown"
+
+
+def get_device(path: Path) -> int:
+    """
+    Get device id (`st_dev`) of the file
+    """
+    try:
+        return os.stat(path).st_dev
+    except OSError:
+        return -1
+
+
+def get_filesystem_type(path: Path) -> str:
+    """
+    Get filesystem type of the path from `/proc/mounts`
+    """
+    try:
+        with open("/proc/mounts", encoding="utf-8") as mounts_file:
+            mounts = [line.split()[1:3] for line in mounts_file]
+    except OSError:
+        return ""
+
+    path = str(Path(path).resolve())
+    filesystem_type, mount_point_length = "", -1
+    for mount_point, mount_type in mounts:
+        mount_point = mount_point.replace("\\040", " ")
+        inside = path == mount_point or path.startswith(mount_point.rstrip("/") + "/")
+        if inside and len(mount_point) > mount_point_length:
+            filesystem_type, mount_point_length = mount_type, len(mount_point)
+
+    return filesystem_type
+
+
+def _get_block_device_type(device: int) -> str:
+    try:
+        sys_path = Path(f"/sys/dev/block/{os.major(device)}:{os.minor(device)}").resolve(strict=True)
+    except (OSError, AttributeError):
+        return DeviceType.Unknown
+
+    # Partitions have no `queue` folder, so we check the parent disk too
+    for block_path in (sys_path, sys_path.parent):
+        rotational_path = block_path / "queue" / "rotational"
+        if rotational_path.exists():
+            is_rotational = rotational_path.read_text().strip() == "1"
+            return DeviceType.Rotational if is_rotational else DeviceType.NonRotational
+
+    return DeviceType.Unknown
+
+
+def get_device_type(device: int, path: Path) -> str:
+    """
+    Get device type by device id. The path is used to detect network mounts
+
+    Args:
+        device (int): device id (`st_dev`)
+        path (Path): any path on the device
+    """
+    if device not in _device_types:
+        if get_filesystem_type(path) in NETWORK_FILESYSTEMS:
+            _device_types[device] = DeviceType.Network
+        else:
+            _device_types[device] = _get_block_device_type(device)
+
+    return _device_types[device]
+
+
+def advise_will_need(paths: list[Path]) -> None:
+    """
+    Ask the kernel to start reading files ahead with `posix_fadvise(WILLNEED)`
+    """
+    if not hasattr(os, "posix_fadvise"):
+        return
+
+    for path in paths:
+        try:
+            fd = os.open(path, os.O_RDONLY)
+            try:
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+            finally:
+                os.close(fd)
+        except OSError as e:
+            logger.debug(f"Read-ahead of {path} has failed: {e!s}")
@@ -1,4 +1,6 @@
 import os
+import json
+import functools
 import tarfile
 import zipfile
 import ffmpeg
@@ -8,20 +10,120 @@ from pathlib import Path
 from PySide6.QtCore import QObject, Signal
 
 from pieapp.api.globals import Global
+from pieapp.helpers.governor import CALIBRATION_PROFILES, calibrate
+from pieapp.helpers.logger import logger
+from pieapp.helpers.supervisor import Supervisor
+from pieapp.helpers.supervisor import STALL_TIMEOUT
+from pieapp.helpers.supervisor import get_timeout
+from pieapp.helpers.supervisor import get_cpu_limit
 
+# ffprobe timeout in seconds. File duration is unknown before probing
+PROBE_TIMEOUT = 30
 
-def get_cover_album(cmd: Path, filepath: Path, temp_folder: Path) -> Path:
+
+def probe(cmd: Path, filepath: Path, timeout: float = PROBE_TIMEOUT) -> dict:
+    """
+    Run supervised ffprobe and get file information
+    """
+    args = [cmd.as_posix(), "-show_format", "-show_streams", "-of", "json", filepath.as_posix()]
+    stdout, _ = Supervisor(args, timeout=timeout, cpu_limit=get_cpu_limit()).run()
+    return json.loads(stdout.decode("utf-8"))
+
+
+@functools.lru_cache(maxsize=None)
+def get_ffmpeg_version(cmd: Path) -> str:
+    """
+    Get ffmpeg version line (e.g. "ffmpeg version 6.0 Copyright ...")
+    """
+    stdout, _ = Supervisor([cmd.as_posix(), "-version"], timeout=PROBE_TIMEOUT, cpu_limit=get_cpu_limit()).run()
+    return stdout.decode("utf-8", errors="ignore").partition("\n")[0].strip()
+
+
+def get_cover_album(cmd: Path, filepath: Path, temp_folder: Path, duration: float = None) -> Path:
     cover_image_path = temp_folder / f"{filepath.stem!s}.jpg"
-    (
+    args = ffmpeg.compile(
         ffmpeg
         .input(filepath.as_posix())
-        .output(cover_image_path.as_posix(), acodec="copy")
-        .run_async(cmd=cmd.as_posix(), overwrite_output=True, pipe_stdin=True, pipe_stdout=True, pipe_stderr=True)
+        .output(cover_image_path.as_posix(), acodec="copy"),
+        cmd=cmd.as_posix(),
+        overwrite_output=True
     )
+    try:
+        Supervisor(args, timeout=get_timeout(duration), cpu_limit=get_cpu_limit(duration)).run()
+    except ffmpeg.Error as e:
+        # Most of the files have no cover at all
+        logger.debug(f"Cover of {filepath} wasn't extracted: {e.stderr!r}")
 
     return cover_image_path
 
 
+def run_with_progress(
+    stream,
+    cmd: Path,
+    progress_callback: callable = None,
+    duration: float = None,
+    niceness: int = 0,
+    started_callback: callable = None,
+    threads: int = 1
+) -> bytes:
+    """
+    Run supervised ffmpeg with `-progress` output and report the processed time
+
+    Args:
+        stream: ffmpeg-python output stream
+        cmd (Path): ffmpeg binary path
+        progress_callback (callable|None): called with processed time in seconds.
+            Called from the reader thread, so it must be cheap and thread-safe
+        duration (float|None): media file duration in seconds used to scale the timeout
+        niceness (int): niceness increment of the ffmpeg process
+        started_callback (callable|None): called with the `Supervisor` instance once ffmpeg is started
+        threads (int): encoder threads used to scale the CPU time limit
+
+    Returns:
+        stderr (bytes): ffmpeg errors output
+
+    Raises:
+        ProcessTimeoutError: ffmpeg has timed out or stalled
+        ffmpeg.Error: ffmpeg has exited with a non-zero code
+    """
+    args = ffmpeg.compile(
+        stream.global_args("-progress", "pipe:1", "-nostats", "-loglevel", "error"),
+        cmd=cmd.as_posix(),
+        overwrite_output=True
+    )
+    supervisor = Supervisor(
+        args,
+        timeout=get_timeout(duration),
+        stall_timeout=STALL_TIMEOUT,
+        cpu_limit=get_cpu_limit(duration, threads),
+        niceness=niceness,
+        progress_callback=progress_callback or (lambda _: None)
+    ).start()
+    if started_callback:
+        started_callback(supervisor)
+
+    _, stderr = supervisor.wait()
+    return stderr
+
+
+def decode_to_null(cmd: Path, filepath: Path, duration: float = None, niceness: int = 0) -> tuple[float, bytes]:
+    """
+    Decode the whole file without writing the output
+
+    Returns:
+        result (tuple[float, bytes]): decoded duration in seconds and decoding errors
+    """
+    decoded_duration = 0.0
+
+    def update_duration(processed: float) -> None:
+        nonlocal decoded_duration
+        decoded_duration = processed
+
+    stream = ffmpeg.input(filepath.as_posix()).output("-", f="null")
+    stderr = run_with_progress(stream, cmd, update_duration, duration=duration, niceness=niceness)
+    return decoded_duration, stderr
+
+
 ARCHIVE_URL_NAME: dict[str, str] = {
     "nt": "ffmpeg-master-latest-win64-gpl.zip",
     "linux": "ffmpeg-master-latest-linux64-lgpl.tar.xz"
@@ -98,3 +200,50 @@ class DownloadWorker(QObject):
             self._unpack_archive()
         except Exception as e:
             raise e
+
+
+class CalibrationWorker(QObject):
+    sig_calibration_message = Signal(str)
+    sig_calibration_done = Signal(dict)
+    sig_calibration_failed = Signal(str)
+
+    def __init__(
+        self,
+        ffmpeg_cmd: Path = None,
+        profiles: tuple[str] = None,
+        benchmarks: dict[str, callable] = None
+    ) -> None:
+        """
+        Args:
+            ffmpeg_cmd (Path|None): ffmpeg binary path
+            profiles (tuple[str]|None): calibration profiles, all by default
+            benchmarks (dict[str, callable]|None): benchmarks by name called with the ffmpeg binary path.
+                Their results are stored next to the profiles under their names
+        """
+        super(CalibrationWorker, self).__init__()
+        self._ffmpeg_cmd = ffmpeg_cmd
+        self._profiles = profiles or tuple(CALIBRATION_PROFILES.keys())
+        self._benchmarks = benchmarks or {}
+
+    def set_ffmpeg_cmd(self, ffmpeg_cmd: Path) -> None:
+        self._ffmpeg_cmd = ffmpeg_cmd
+
+    def start(self) -> None:
+        """
+        Run a short local encode per calibration profile
+        and emit the best workers/threads settings for each of them
+        """
+        results: dict[str, dict] = {}
+        try:
+            for profile in self._profiles:
+                self.sig_calibration_message.emit(f"Calibrating {profile}...")
+                results[profile] = calibrate(self._ffmpeg_cmd, profile)
+            for name, benchmark in self._benchmarks.items():
+                self.sig_calibration_message.emit(f"Benchmarking {name}...")
+                results[name] = benchmark(self._ffmpeg_cmd)
+        except (ffmpeg.Error, OSError, RuntimeError) as e:
+            self.sig_calibration_failed.emit(str(e))
+            return
+
+        self.sig_calibration_message.emit("Done!")
+        self.sig_calibration_done.emit(results)
@@ -1,6 +1,7 @@
 import os
 import json
 import uuid
+import shutil
 
 from pathlib import Path
 from typing import Union, Any
@@ -98,6 +99,56 @@ def create_temp_directory(prefix: str, temp_directory: str) -> Path:
     return directory_path
 
 
+def get_partial_path(file_path: Union[str, Path]) -> Path:
+    """
+    Get unique hidden temp path next to the file. The extension is kept,
+    so the partial file can be renamed atomically on the same volume
+    """
+    file_path = Path(file_path)
+    return file_path.with_name(f".{file_path.stem}.{uuid.uuid4().hex[:8]}.part{file_path.suffix}")
+
+
+def clone_file(source: Union[str, Path], target: Union[str, Path], hardlink: bool = False) -> str:
+    """
+    Clone file with a copy-on-write reflink (`FICLONE`) where the filesystem supports it.
+    Falls back to a hard link, if allowed, and to a regular copy.
+    The target must not exist
+
+    Args:
+        source (str|Path): source file path
+        target (str|Path): target file path
+        hardlink (bool): allow hard links. The target shares data with the source,
+            so it must not be modified in place
+
+    Returns:
+        method (str): "reflink", "hardlink" or "copy"
+    """
+    try:
+        import fcntl
+
+        # `fcntl.FICLONE` is available since Python 3.12
+        ficlone = getattr(fcntl, "FICLONE", 0x40049409)
+        with open(source, "rb") as source_file, open(target, "xb") as target_file:
+            try:
+                fcntl.ioctl(target_file.fileno(), ficlone, source_file.fileno())
+                return "reflink"
+            except OSError:
+                pass
+        os.unlink(target)
+    except ImportError:
+        pass
+
+    if hardlink:
+        try:
+            os.link(source, target)
+            return "hardlink"
+        except OSError:
+            pass
+
+    shutil.copyfile(source, target)
+    return "copy"
+
+
 readJson = read_json
 writeJson = write_json
 updateJson = update_json
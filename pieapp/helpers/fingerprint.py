@@ -0,0 +1,173 @@
+"""
+Content fingerprints. Audio payloads are hashed in the thread pool,
+so identical tracks are found whatever their tags and file names
+"""
+from __feature__ import snake_case
+
+import os
+from pathlib import Path
+from typing import Optional
+
+from PySide6.QtCore import Slot
+from PySide6.QtCore import Signal
+from PySide6.QtCore import QObject
+from PySide6.QtCore import QRunnable
+from PySide6.QtCore import QThreadPool
+
+from pieapp.api.structs.media import MediaFile
+from pieapp.helpers.hashing import HashCache
+from pieapp.helpers.hashing import get_hash_cache
+from pieapp.helpers.hashing import get_audio_hash
+from pieapp.helpers.logger import logger
+
+# Maximum number of files hashed at once. Hashing is mostly bound by the disk
+MAX_HASH_WORKERS = 4
+
+# Global hash service
+_hash_service: "HashService" = None
+
+
+class HashSignals(QObject):
+    ready = Signal(str, str)
+    failed = Signal(str)
+
+
+class HashWorker(QRunnable):
+
+    def __init__(self, file_path: str, cache: HashCache) -> None:
+        super().__init__()
+
+        self._signals = HashSignals()
+        self._file_path = file_path
+        self._cache = cache
+
+    @property
+    def signals(self) -> HashSignals:
+        return self._signals
+
+    @Slot()
+    def run(self) -> None:
+        try:
+            audio_hash = get_audio_hash(self._file_path, self._cache)
+        except (OSError, ValueError) as e:
+            logger.debug(f"Hash of {self._file_path} wasn't computed: {e!s}")
+            self._signals.failed.emit(self._file_path)
+            return
+        except Exception as e:
+            logger.error(f"Hash of {self._file_path} wasn't computed: {e!s}")
+            self._signals.failed.emit(self._file_path)
+            return
+
+        self._signals.ready.emit(self._file_path, audio_hash)
+
+
+class HashService(QObject):
+    """
+    Asynchronous audio hashes. The hashes are the same as `get_audio_hash` ones,
+    so other caches keyed by them are shared. Must be used from the GUI thread
+    """
+
+    def __init__(self, cache: HashCache, max_workers: int = None, parent: QObject = None) -> None:
+        super().__init__(parent)
+
+        self._cache = cache
+        # Callbacks and error callbacks waiting for the hash by file path
+        self._pending: dict[str, list[tuple[callable, callable]]] = {}
+        self._pool = QThreadPool(self)
+        self._pool.set_max_thread_count(max_workers or min(MAX_HASH_WORKERS, os.cpu_count() or 1))
+
+    def request(self, file_path: Path, callback: callable, error_callback: callable = None) -> None:
+        """
+        Call back with the audio hash of the file
+
+        Args:
+            file_path (Path): media file path
+            callback (callable): called with the hex digest on the GUI thread
+            error_callback (callable|None): called without arguments if the file can't be read
+        """
+        file_path = str(file_path)
+        is_pending = file_path in self._pending
+        self._pending.setdefault(file_path, []).append((callback, error_callback))
+        if is_pending:
+            return
+
+        worker = HashWorker(file_path, self._cache)
+        worker.signals.ready.connect(self._hash_ready)
+        worker.signals.failed.connect(self._hash_failed)
+        self._pool.start(worker)
+
+    def hash_files(self, media_files: list[MediaFile], callback: callable) -> None:
+        """
+        Set `MediaFile.audio_hash` of the files and call back with the list of the hashed ones once all are done
+        """
+        hashed_files = [media_file for media_file in media_files if media_file.info.path]
+        remaining = set(range(len(hashed_files)))
+        if not remaining:
+            callback([])
+            return
+
+        def file_hashed(index: int, audio_hash: Optional[str]) -> None:
+            hashed_files[index].audio_hash = audio_hash
+            remaining.discard(index)
+            if not remaining:
+                callback([media_file for media_file in hashed_files if media_file.audio_hash])
+
+        for index, media_file in enumerate(hashed_files):
+            self.request(
+                media_file.info.path,
+                lambda audio_hash, i=index: file_hashed(i, audio_hash),
+                lambda i=index: file_hashed(i, None)
+            )
+
+    def clear(self) -> None:
+        """
+        Drop the queued requests and save the computed hashes
+        """
+        self._pool.clear()
+        self._pending.clear()
+        self._cache.save()
+
+    def _hash_ready(self, file_path: str, audio_hash: str) -> None:
+        for callback, _ in self._pending.pop(file_path, []):
+            try:
+                callback(audio_hash)
+            except RuntimeError:
+                # The widget was deleted while the file was hashed
+                pass
+
+        if not self._pending:
+            self._cache.save()
+
+    def _hash_failed(self, file_path: str) -> None:
+        for _, error_callback in self._pending.pop(file_path, []):
+            if error_callback is not None:
+                error_callback()
+
+        if not self._pending:
+            self._cache.save()
+
+
+def group_duplicates(media_files: list[MediaFile]) -> list[list[MediaFile]]:
+    """
+    Group the files with the same audio hash. Files without a hash are skipped
+
+    Returns:
+        groups (list[list[MediaFile]]): groups of two and more files in the list order
+    """
+    groups: dict[str, list[MediaFile]] = {}
+    for media_file in media_files:
+        if media_file.audio_hash:
+            groups.setdefault(media_file.audio_hash, []).append(media_file)
+
+    return [group for group in groups.values() if len(group) > 1]
+
+
+def get_hash_service() -> HashService:
+    """
+    Get the shared hash service with the shared hash cache
+    """
+    global _hash_service
+    if _hash_service is None:
+        _hash_service = HashService(get_hash_cache())
+
+    return _hash_service
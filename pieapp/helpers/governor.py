@@ -0,0 +1,240 @@
+"""
+Adaptive concurrency governor for ffmpeg workers
+"""
+import os
+import time
+import dataclasses as dt
+from pathlib import Path
+from typing import Optional, Union
+
+import ffmpeg
+
+from pieapp.helpers.supervisor import Supervisor
+from pieapp.helpers.supervisor import get_timeout
+from pieapp.helpers.supervisor import get_cpu_limit
+
+
+# Calibration profiles: generated input and output arguments per profile.
+# Each profile describes a typical kind of job with a distinct CPU footprint
+CALIBRATION_PROFILES: dict[str, dict] = {
+    "flac": {
+        "sample_rate": 44100,
+        "output": {"acodec": "flac"},
+    },
+    "opus": {
+        "sample_rate": 48000,
+        "output": {"acodec": "libopus", "audio_bitrate": "128k"},
+    },
+    "resample": {
+        "sample_rate": 96000,
+        "output": {"acodec": "pcm_s16le", "ar": 44100},
+    },
+}
+
+# Default calibration profile for unknown codecs
+DEFAULT_PROFILE = "flac"
+
+# Thresholds used by `ConcurrencyGovernor.adjust`
+UTILIZATION_LOW = 0.75
+UTILIZATION_HIGH = 0.95
+IOWAIT_LOW = 0.10
+IOWAIT_HIGH = 0.25
+LOAD_HIGH = 1.5
+
+
+@dt.dataclass
+class LoadSample:
+    busy: int
+    idle: int
+    iowait: int
+    load_average: float
+
+
+def read_load_sample() -> Optional[LoadSample]:
+    """
+    Read cumulative CPU times and load average from `/proc`.
+    Returns `None` on systems without procfs
+    """
+    try:
+        with open("/proc/stat", encoding="utf-8") as stat_file:
+            fields = list(map(int, stat_file.readline().split()[1:9]))
+        with open("/proc/loadavg", encoding="utf-8") as loadavg_file:
+            load_average = float(loadavg_file.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+
+    idle = fields[3]
+    iowait = fields[4] if len(fields) > 4 else 0
+    return LoadSample(
+        busy=sum(fields) - idle - iowait,
+        idle=idle,
+        iowait=iowait,
+        load_average=load_average,
+    )
+
+
+def get_calibration_profile(codec: str = None, resample: bool = False) -> str:
+    """
+    Get calibration profile name by the output codec name
+    """
+    if resample:
+        return "resample"
+
+    codec = (codec or "").lower()
+    for profile in CALIBRATION_PROFILES:
+        if profile in codec:
+            return profile
+
+    return DEFAULT_PROFILE
+
+
+class ConcurrencyGovernor:
+    """
+    Coordinates the number of concurrent ffmpeg processes with the number of threads
+    each of them is allowed to use, so that `workers * threads` doesn't oversubscribe the CPU.
+    The worker count grows or shrinks during a batch by calling `adjust`
+    """
+
+    def __init__(
+        self,
+        workers: int = None,
+        threads: int = 1,
+        min_workers: int = 1,
+        cpu_count: int = None
+    ) -> None:
+        self._cpu_count: int = cpu_count or os.cpu_count() or 1
+        self._threads: int = max(1, min(int(threads), self._cpu_count))
+        self._max_workers: int = max(1, self._cpu_count // self._threads)
+        self._min_workers: int = max(1, min(min_workers, self._max_workers))
+        self._workers: int = self._clamp(workers or self._max_workers)
+        self._last_sample: Optional[LoadSample] = read_load_sample()
+
+    @classmethod
+    def from_calibration(cls, calibration: dict, profile: str = DEFAULT_PROFILE) -> "ConcurrencyGovernor":
+        """
+        Create governor from the calibration results stored in user configuration
+        """
+        settings = (calibration or {}).get(profile) or {}
+        return cls(workers=settings.get("workers"), threads=settings.get("threads", 1))
+
+    @property
+    def workers(self) -> int:
+        return self._workers
+
+    @property
+    def threads(self) -> int:
+        return self._threads
+
+    def _clamp(self, workers: int) -> int:
+        return max(self._min_workers, min(int(workers), self._max_workers))
+
+    def adjust(self) -> int:
+        """
+        Sample system load since the previous call and grow or shrink the number of active workers
+
+        Returns:
+            workers (int): new number of active workers
+        """
+        sample = read_load_sample()
+        last_sample, self._last_sample = self._last_sample, sample
+        if sample is None or last_sample is None:
+            return self._workers
+
+        busy = sample.busy - last_sample.busy
+        idle = sample.idle - last_sample.idle
+        iowait = sample.iowait - last_sample.iowait
+        total = busy + idle + iowait
+        if total <= 0:
+            return self._workers
+
+        utilization = busy / total
+        iowait_ratio = iowait / total
+        load = sample.load_average / self._cpu_count
+
+        if iowait_ratio > IOWAIT_HIGH or (utilization > UTILIZATION_HIGH and load > LOAD_HIGH):
+            self._workers = self._clamp(self._workers - 1)
+
+        elif utilization < UTILIZATION_LOW and iowait_ratio < IOWAIT_LOW and load < 1.0:
+            self._workers = self._clamp(self._workers + 1)
+
+        return self._workers
+
+
+def _run_calibration_pass(
+    ffmpeg_cmd: Union[str, Path],
+    profile: str,
+    workers: int,
+    threads: int,
+    duration: int
+) -> float:
+    """
+    Run `workers` concurrent encodes of a generated signal and measure throughput
+    in seconds of audio encoded per wall-clock second
+    """
+    settings = CALIBRATION_PROFILES[profile]
+    args = ffmpeg.compile(
+        ffmpeg
+        .input(f"sine=frequency=440:sample_rate={settings['sample_rate']}:duration={duration}", f="lavfi")
+        .output("-", f="null", ac=2, threads=threads, **settings["output"]),
+        cmd=str(ffmpeg_cmd),
+        overwrite_output=True
+    )
+
+    started = time.monotonic()
+    supervisors = [
+        Supervisor(args, timeout=get_timeout(duration), cpu_limit=get_cpu_limit(duration, threads)).start()
+        for _ in range(workers)
+    ]
+    try:
+        for supervisor in supervisors:
+            supervisor.wait()
+    except ffmpeg.Error as e:
+        for supervisor in supervisors:
+            supervisor.kill()
+        raise RuntimeError(f"Calibration encode for profile \"{profile}\" has failed: {e.stderr!r}")
+
+    elapsed = time.monotonic() - started
+
+    return workers * duration / max(elapsed, 1e-6)
+
+
+def calibrate(
+    ffmpeg_cmd: Union[str, Path],
+    profile: str,
+    duration: int = 10,
+    cpu_count: int = None
+) -> dict:
+    """
+    Find the best combination of workers and threads per process for the given profile.
+    Each thread count starts with as many workers as fit the CPUs, and the worker count is halved
+    while the throughput grows, e.g. when the encodes are bound by the memory bandwidth
+
+    Args:
+        ffmpeg_cmd (str|Path): ffmpeg binary path
+        profile (str): calibration profile name (see `CALIBRATION_PROFILES`)
+        duration (int): duration of the generated signal in seconds
+        cpu_count (int): number of logical CPUs
+
+    Returns:
+        settings (dict): `workers`, `threads` and measured `speed` (audio seconds per second)
+    """
+    cpu_count = cpu_count or os.cpu_count() or 1
+    best: dict = {}
+
+    for threads in (1, 2, 4):
+        if threads > cpu_count:
+            break
+
+        workers = max(1, cpu_count // threads)
+        last_speed = 0
+        while True:
+            speed = _run_calibration_pass(ffmpeg_cmd, profile, workers, threads, duration)
+            if speed > best.get("speed", 0):
+                best = {"workers": workers, "threads": threads, "speed": round(speed, 2)}
+            if workers == 1 or speed <= last_speed:
+                break
+
+            last_speed = speed
+            workers //= 2
+
+    return best
@@ -0,0 +1,261 @@
+"""
+Audio payload hashing. Tags and container metadata are skipped, so retagged and renamed
+copies of a track get the same hash. Hashes are cached by the file identity and modification time
+"""
+import os
+import mmap
+import json
+import struct
+import hashlib
+import threading
+from pathlib import Path
+from typing import Union
+from typing import Optional
+
+from pieapp.api.globals import Global
+from pieapp.helpers.files import read_json
+from pieapp.helpers.files import get_partial_path
+
+# Read chunk size in bytes
+CHUNK_SIZE = 1024 * 1024
+
+# ID3v1 tag size in bytes
+ID3V1_SIZE = 128
+
+# APEv2 tag header and footer size in bytes
+APE_FOOTER_SIZE = 32
+
+# APEv2 flag of the tag with a header
+APE_HAS_HEADER = 0x80000000
+
+# Version of the hashed ranges, hashes of other versions in the cache are ignored
+HASH_VERSION = 2
+
+# Limit of cached hashes, the oldest ones are dropped
+HASH_CACHE_LIMIT = 100_000
+
+# Global hash cache
+_hash_cache: "HashCache" = None
+
+
+def _get_id3v2_size(header: bytes) -> int:
+    """
+    Get full ID3v2 tag size (header, frames and optional footer) by its 10-byte header
+    """
+    if len(header) < 10 or header[:3] != b"ID3":
+        return 0
+
+    # Tag size is a 28-bit "synchsafe" integer
+    size = (header[6] << 21) | (header[7] << 14) | (header[8] << 7) | header[9]
+    has_footer = header[5] & 0x10
+    return 10 + size + (10 if has_footer else 0)
+
+
+def _get_ape_size(footer: bytes) -> int:
+    """
+    Get full APEv2 tag size (optional header, items and footer) by its 32-byte footer
+    """
+    if len(footer) < APE_FOOTER_SIZE or footer[:8] != b"APETAGEX":
+        return 0
+
+    size, _, flags = struct.unpack("<III", footer[12:24])
+    return size + (APE_FOOTER_SIZE if flags & APE_HAS_HEADER else 0)
+
+
+def _get_tags_end(data: Union[bytes, mmap.mmap], start: int, end: int) -> int:
+    """
+    Get the end of the payload before the trailing ID3v1 and APEv2 tags. Both may come in any order
+    """
+    while True:
+        if end - start >= ID3V1_SIZE and data[end - ID3V1_SIZE:end - ID3V1_SIZE + 3] == b"TAG":
+            end -= ID3V1_SIZE
+            continue
+
+        ape_size = _get_ape_size(data[end - APE_FOOTER_SIZE:end]) if end - start >= APE_FOOTER_SIZE else 0
+        if 0 < ape_size <= end - start:
+            end -= ape_size
+            continue
+
+        return end
+
+
+def _get_flac_frames_start(data: Union[bytes, mmap.mmap], start: int, end: int) -> int:
+    """
+    Get the offset of the first FLAC frame after the metadata blocks
+    """
+    position = start + 4
+    while position + 4 <= end:
+        header = data[position:position + 4]
+        position += 4 + int.from_bytes(header[1:4], "big")
+        # The high bit marks the last metadata block
+        if header[0] & 0x80:
+            break
+
+    return min(position, end)
+
+
+def _get_mp4_media_ranges(data: Union[bytes, mmap.mmap], start: int, end: int) -> list[tuple[int, int]]:
+    """
+    Get the payload ranges of the top-level `mdat` atoms. The `udta`/`ilst` tags are stored in `moov`
+    along with the sample tables, whose chunk offsets change when the tags grow, so `moov` is skipped whole
+    """
+    ranges = []
+    position = start
+    while position + 8 <= end:
+        size, kind = struct.unpack(">I4s", data[position:position + 8])
+        header_size = 8
+        if size == 1 and position + 16 <= end:
+            size = struct.unpack(">Q", data[position + 8:position + 16])[0]
+            header_size = 16
+        elif size == 0:
+            size = end - position
+        if size < header_size:
+            break
+
+        if kind == b"mdat":
+            ranges.append((position + header_size, min(position + size, end)))
+        position += size
+
+    return ranges
+
+
+def get_audio_ranges(data: Union[bytes, mmap.mmap]) -> list[tuple[int, int]]:
+    """
+    Get the byte ranges of the audio payload: leading ID3v2 and trailing ID3v1/APEv2 tags,
+    FLAC metadata blocks and MP4 metadata atoms are skipped
+
+    Args:
+        data (bytes|mmap): whole file content
+
+    Returns:
+        ranges (list[tuple[int, int]]): start and end offsets
+    """
+    end = len(data)
+    start = min(_get_id3v2_size(data[:10]), end)
+    end = max(_get_tags_end(data, start, end), start)
+
+    if data[start:start + 4] == b"fLaC":
+        return [(_get_flac_frames_start(data, start, end), end)]
+
+    if data[start + 4:start + 8] == b"ftyp":
+        ranges = _get_mp4_media_ranges(data, start, end)
+        if ranges:
+            return ranges
+
+    return [(start, end)]
+
+
+class HashCache:
+    """
+    Audio hashes by the device, inode, size and modification time of the file, so a file
+    is read again only after it changes. Thread safe, the cache file is written by `save`
+    """
+
+    def __init__(self, cache_path: Path = None) -> None:
+        self._cache_path = Path(cache_path) if cache_path else None
+        self._lock = threading.Lock()
+        self._hashes: Optional[dict[str, str]] = None
+        self._changed = False
+
+    @staticmethod
+    def _get_key(stat: os.stat_result) -> str:
+        return f"{stat.st_dev}:{stat.st_ino}:{stat.st_size}:{stat.st_mtime_ns}"
+
+    def _load(self) -> dict[str, str]:
+        if self._hashes is None:
+            cached = {}
+            if self._cache_path:
+                cached = read_json(self._cache_path, default={}, raise_exception=False)
+            self._hashes = cached.get("hashes", {}) if cached.get("version") == HASH_VERSION else {}
+
+        return self._hashes
+
+    def get(self, stat: os.stat_result) -> Optional[str]:
+        with self._lock:
+            return self._load().get(self._get_key(stat))
+
+    def put(self, stat: os.stat_result, audio_hash: str) -> None:
+        with self._lock:
+            self._load()[self._get_key(stat)] = audio_hash
+            self._changed = True
+
+    def save(self) -> None:
+        with self._lock:
+            if not self._changed or self._cache_path is None:
+                return
+
+            hashes = self._load()
+            for key in list(hashes)[:max(0, len(hashes) - HASH_CACHE_LIMIT)]:
+                del hashes[key]
+            content = json.dumps({"version": HASH_VERSION, "hashes": hashes})
+            self._changed = False
+
+        self._cache_path.parent.mkdir(parents=True, exist_ok=True)
+        partial_path = get_partial_path(self._cache_path)
+        partial_path.write_text(content, encoding="utf-8")
+        os.replace(partial_path, self._cache_path)
+
+
+def get_hash_cache() -> HashCache:
+    """
+    Get the shared hash cache stored in the user temp folder
+    """
+    global _hash_cache
+    if _hash_cache is None:
+        _hash_cache = HashCache(Global.USER_ROOT / Global.DEFAULT_TEMP_FOLDER_NAME / "hashes.json")
+
+    return _hash_cache
+
+
+def _hash_ranges(file_path: Union[str, Path], size: int) -> str:
+    digest = hashlib.blake2b(digest_size=20)
+    if not size:
+        return digest.hexdigest()
+
+    with open(file_path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        view = memoryview(data)
+        try:
+            for start, end in get_audio_ranges(data):
+                # Large updates release the GIL, so files are hashed in parallel threads
+                digest.update(view[start:end])
+        finally:
+            view.release()
+
+    return digest.hexdigest()
+
+
+def get_audio_hash(file_path: Union[str, Path], cache: HashCache = None) -> str:
+    """
+    Get hash of the file audio payload, see `get_audio_ranges`. Retagging or renaming the file
+    doesn't change its hash, so the hash is used as the cache key of the file content
+
+    Args:
+        file_path (str|Path): media file path
+        cache (HashCache|None): hash cache, the shared one by default
+
+    Returns:
+        hash (str): hex digest
+    """
+    cache = cache or get_hash_cache()
+    stat = os.stat(file_path)
+    audio_hash = cache.get(stat)
+    if audio_hash is None:
+        audio_hash = _hash_ranges(file_path, stat.st_size)
+        cache.put(stat, audio_hash)
+
+    return audio_hash
+
+
+def get_file_checksum(file_path: Union[str, Path]) -> str:
+    """
+    Get streaming checksum of the whole file
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    with open(file_path, "rb") as file:
+        while True:
+            chunk = file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+
+    return digest.hexdigest()
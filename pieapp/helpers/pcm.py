@@ -0,0 +1,229 @@
+"""
+Streaming PCM decoding. ffmpeg writes raw samples to stdout, and they're read
+into preallocated buffers exposed as NumPy views
+"""
+import threading
+from pathlib import Path
+from typing import Iterator, Optional
+
+import ffmpeg
+import numpy as np
+
+from pieapp.helpers.supervisor import Supervisor
+from pieapp.helpers.supervisor import STALL_TIMEOUT
+from pieapp.helpers.supervisor import get_timeout
+from pieapp.helpers.supervisor import get_cpu_limit
+
+
+# Samples per channel in a single frame
+DEFAULT_FRAME_SIZE = 65536
+
+# Number of frame buffers. A frame stays valid until the buffer is reused
+DEFAULT_BUFFERS = 2
+
+
+class SampleFormat:
+    Float32 = "f32le"
+    Int16 = "s16le"
+
+
+# NumPy types and ffmpeg codecs by sample format
+SAMPLE_FORMATS: dict[str, tuple[type, str]] = {
+    SampleFormat.Float32: (np.float32, "pcm_f32le"),
+    SampleFormat.Int16: (np.int16, "pcm_s16le"),
+}
+
+
+class PCMReader:
+    """
+    Decode audio with ffmpeg and iterate over fixed-size frames. Each frame is a
+    (channels, samples) view of a preallocated buffer, so memory use doesn't depend
+    on the file length. The last frame may be shorter. Frames are reused after
+    `buffers` iterations, so copy them to keep them longer
+
+    Example:
+        with PCMReader(ffmpeg_cmd, path, sample_rate=44100, channels=1) as reader:
+            for frame in reader:
+                peak = max(peak, np.abs(frame).max())
+    """
+
+    def __init__(
+        self,
+        ffmpeg_cmd: Path,
+        file_path: Path,
+        sample_rate: int = None,
+        channels: int = 2,
+        sample_format: str = SampleFormat.Float32,
+        frame_size: int = DEFAULT_FRAME_SIZE,
+        start: float = 0.0,
+        duration: float = None,
+        buffers: int = DEFAULT_BUFFERS,
+        niceness: int = 0,
+        frame_buffers: list = None,
+        media_duration: float = None
+    ) -> None:
+        """
+        Args:
+            ffmpeg_cmd (Path): ffmpeg binary path
+            file_path (Path): media file path
+            sample_rate (int|None): resample to the rate, or keep the source rate if `None`
+            channels (int): output channels. Sources with more channels are downmixed
+            sample_format (str): see `SampleFormat`
+            frame_size (int): samples per channel in a frame
+            start (float): start offset in seconds
+            duration (float|None): maximum decoded duration in seconds
+            buffers (int): number of frame buffers
+            niceness (int): niceness increment of the ffmpeg process
+            frame_buffers (list|None): writable buffers of at least a frame size to decode into,
+                e.g. shared memory. Replaces `buffers`
+            media_duration (float|None): source duration in seconds used to scale the timeout and the CPU limit.
+                Without it ffmpeg is only killed when its output stalls
+        """
+        self._ffmpeg_cmd = ffmpeg_cmd
+        self._file_path = file_path
+        self._sample_rate = sample_rate
+        self._channels = channels
+        self._sample_format = sample_format
+        self._frame_size = frame_size
+        self._start = start
+        self._duration = duration
+        self._niceness = niceness
+        self._media_duration = duration or media_duration
+
+        dtype = SAMPLE_FORMATS[sample_format][0]
+        self._frame_bytes = frame_size * channels * np.dtype(dtype).itemsize
+        if frame_buffers:
+            self._buffers = [memoryview(buffer)[:self._frame_bytes] for buffer in frame_buffers]
+        else:
+            self._buffers = [bytearray(self._frame_bytes) for _ in range(max(1, buffers))]
+        # Frame views are made once, the loop only slices the last frame
+        self._frames = [
+            np.frombuffer(buffer, dtype=dtype).reshape(frame_size, channels).T
+            for buffer in self._buffers
+        ]
+
+        self._supervisor: Optional[Supervisor] = None
+        self._cancelled = threading.Event()
+        self._samples_read = 0
+        self._buffer_index = 0
+
+    @property
+    def sample_rate(self) -> Optional[int]:
+        return self._sample_rate
+
+    @property
+    def channels(self) -> int:
+        return self._channels
+
+    @property
+    def samples_read(self) -> int:
+        """
+        Samples per channel read so far
+        """
+        return self._samples_read
+
+    @property
+    def buffer_index(self) -> int:
+        """
+        Index of the buffer that holds the last frame
+        """
+        return self._buffer_index
+
+    def is_cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def get_args(self) -> list[str]:
+        input_options = {"ss": self._start} if self._start else {}
+        output_options = {
+            "f": self._sample_format,
+            "acodec": SAMPLE_FORMATS[self._sample_format][1],
+            "ac": self._channels,
+            "map": "0:a:0",
+        }
+        if self._sample_rate:
+            output_options["ar"] = self._sample_rate
+        if self._duration:
+            output_options["t"] = self._duration
+
+        stream = ffmpeg.input(self._file_path.as_posix(), **input_options).output("-", **output_options)
+        return ffmpeg.compile(
+            stream.global_args("-nostdin", "-loglevel", "error"),
+            cmd=self._ffmpeg_cmd.as_posix()
+        )
+
+    def cancel(self) -> None:
+        """
+        Stop decoding. Safe to call from any thread, the iteration ends without an error
+        """
+        self._cancelled.set()
+        self._kill()
+
+    def close(self) -> None:
+        self._kill()
+
+    def __enter__(self) -> "PCMReader":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        """
+        Raises:
+            ProcessTimeoutError: ffmpeg has timed out or stalled
+            ffmpeg.Error: ffmpeg has exited with a non-zero code
+        """
+        known_duration = bool(self._media_duration)
+        self._supervisor = Supervisor(
+            self.get_args(),
+            timeout=get_timeout(self._media_duration) if known_duration else None,
+            stall_timeout=STALL_TIMEOUT,
+            cpu_limit=get_cpu_limit(self._media_duration) if known_duration else None,
+            niceness=self._niceness,
+            stream_stdout=True
+        ).start()
+        if self.is_cancelled():
+            self._kill()
+
+        try:
+            yield from self._read_frames()
+        except BaseException:
+            self._kill()
+            raise
+
+        try:
+            self._supervisor.wait()
+        except ffmpeg.Error:
+            if not self.is_cancelled():
+                raise
+
+    def _read_frames(self) -> Iterator[np.ndarray]:
+        supervisor = self._supervisor
+        stdout = supervisor.stdout
+        sample_bytes = self._frame_bytes // self._frame_size
+        views = [memoryview(buffer) for buffer in self._buffers]
+        index = 0
+        while not self.is_cancelled():
+            view = views[index]
+            filled = 0
+            while filled < self._frame_bytes:
+                size = stdout.readinto(view[filled:])
+                if not size:
+                    break
+                filled += size
+                supervisor.touch()
+
+            samples = filled // sample_bytes
+            if samples:
+                self._samples_read += samples
+                self._buffer_index = index
+                frame = self._frames[index]
+                yield frame if samples == self._frame_size else frame[:, :samples]
+
+            if filled < self._frame_bytes:
+                break
+            index = (index + 1) % len(views)
+
+    def _kill(self) -> None:
+        if self._supervisor is not None:
+            self._supervisor.kill()
@@ -0,0 +1,383 @@
+"""
+Spectrograms. Each file is decoded once into STFT level tiles that are cached
+as palette PNG images by the audio hash, the FFT size and the hop.
+The lowpass cutoff is estimated from the same pass
+"""
+from __feature__ import snake_case
+
+import os
+import json
+import shutil
+import dataclasses as dt
+from pathlib import Path
+from typing import Optional
+
+import ffmpeg
+import numpy as np
+
+from PySide6.QtCore import Slot
+from PySide6.QtCore import Signal
+from PySide6.QtCore import QObject
+from PySide6.QtCore import QRunnable
+from PySide6.QtCore import QThreadPool
+from PySide6.QtGui import QImage
+
+from pieapp.api.structs.media import MediaFile
+from pieapp.helpers.analyzers import ANALYSIS_NICENESS
+from pieapp.helpers.analyzers import DEFAULT_ANALYSIS_SAMPLE_RATE
+from pieapp.helpers.files import read_json
+from pieapp.helpers.files import get_partial_path
+from pieapp.helpers.hashing import get_audio_hash
+from pieapp.helpers.logger import logger
+from pieapp.helpers.pcm import PCMReader
+from pieapp.helpers.stft import to_levels
+from pieapp.helpers.stft import estimate_cutoff
+from pieapp.helpers.stft import get_power_spectra
+
+# FFT sizes offered by the viewer and the default one
+SPECTROGRAM_FFT_SIZES: tuple[int] = (1024, 2048, 4096, 8192)
+DEFAULT_FFT_SIZE = 4096
+
+# Frames of a file aimed at by the default hop. Longer files get a longer hop
+SPECTROGRAM_TARGET_FRAMES = 8192
+
+# Frames per tile, the image width
+SPECTROGRAM_TILE_FRAMES = 1024
+
+# Decoded samples per frame
+SPECTROGRAM_FRAME_SIZE = 65536
+
+# Level range of the tiles in dB below full scale
+SPECTROGRAM_RANGE_DB = 120.0
+
+# Palette anchors from the floor to full scale
+SPECTROGRAM_COLORS: tuple[tuple[int, int, int]] = (
+    (0, 0, 4), (40, 11, 84), (101, 21, 110), (159, 42, 99),
+    (212, 72, 66), (245, 125, 21), (250, 193, 39), (252, 255, 164),
+)
+
+# Metadata file of a complete spectrogram, written after all the tiles
+SPECTROGRAM_INFO_NAME = "spectrogram.json"
+
+
+def get_default_hop(media_file: MediaFile, fft_size: int) -> int:
+    """
+    Get a power of two hop that keeps the file within `SPECTROGRAM_TARGET_FRAMES`,
+    and no shorter than a quarter of the frame
+    """
+    sample_rate = int(float(media_file.info.sample_rate or 0)) or DEFAULT_ANALYSIS_SAMPLE_RATE
+    samples = float(media_file.info.duration or 0) * sample_rate
+    hop = fft_size // 4
+    while samples / hop > SPECTROGRAM_TARGET_FRAMES:
+        hop *= 2
+
+    return hop
+
+
+def get_color_table() -> list[int]:
+    """
+    Get the 256 ARGB colors of the tile levels
+    """
+    anchors = np.asarray(SPECTROGRAM_COLORS, dtype=np.float64)
+    positions = np.linspace(0, 255, len(anchors))
+    channels = [np.interp(np.arange(256), positions, anchors[:, index]).round().astype(np.uint32) for index in range(3)]
+    return (0xFF000000 | channels[0] << 16 | channels[1] << 8 | channels[2]).tolist()
+
+
+@dt.dataclass
+class Spectrogram:
+    sample_rate: int
+    fft_size: int
+    hop: int
+    # Number of STFT frames of the file
+    frames: int
+    # `estimate_cutoff` result of the mean spectrum
+    cutoff: dict = dt.field(default_factory=dict)
+    folder: Path = dt.field(default=None)
+
+    @property
+    def tile_count(self) -> int:
+        return -(-self.frames // SPECTROGRAM_TILE_FRAMES)
+
+    @property
+    def duration(self) -> float:
+        return (self.frames * self.hop) / self.sample_rate
+
+    def get_tile(self, index: int) -> QImage:
+        """
+        Get the tile image: frames from left to right, the highest frequency at the top.
+        Rows are the `fft_size // 2` bins without the Nyquist one
+        """
+        return QImage((self.folder / f"{index}.png").as_posix())
+
+    def as_dict(self) -> dict:
+        return {field.name: getattr(self, field.name) for field in dt.fields(self) if field.name != "folder"}
+
+
+def compute_spectrogram(
+    ffmpeg_cmd: Path,
+    file_path: Path,
+    sample_rate: int,
+    fft_size: int,
+    hop: int,
+    tile_callback: callable,
+    reader: PCMReader = None,
+    duration: float = None
+) -> Spectrogram:
+    """
+    Decode the file once and pass the tiles to the callback as they're filled
+
+    Args:
+        ffmpeg_cmd (Path): ffmpeg binary path
+        file_path (Path): media file path
+        sample_rate (int): decoding sample rate
+        fft_size (int): frame size
+        hop (int): samples between the frame starts
+        tile_callback (callable): called with the tile index and the (frames, bins) uint8 levels
+        reader (PCMReader|None): mono reader, made from the arguments by default
+        duration (float|None): file duration in seconds used to scale the decoding timeout
+
+    Returns:
+        spectrogram (Spectrogram): spectrogram without the tile folder
+
+    Raises:
+        ffmpeg.Error: the file can't be decoded
+    """
+    reader = reader or PCMReader(
+        ffmpeg_cmd,
+        file_path,
+        sample_rate=sample_rate,
+        channels=1,
+        frame_size=SPECTROGRAM_FRAME_SIZE,
+        niceness=ANALYSIS_NICENESS,
+        media_duration=duration
+    )
+    bins = fft_size // 2
+    tile = np.empty((SPECTROGRAM_TILE_FRAMES, bins), dtype=np.uint8)
+    filled, tiles, frames = 0, 0, 0
+    power = np.zeros(bins + 1, dtype=np.float64)
+    pending = np.zeros(0, dtype=np.float32)
+    with reader:
+        for block in reader:
+            samples = np.concatenate((pending, block[0]))
+            spectra, consumed = get_power_spectra(samples, fft_size, hop)
+            pending = samples[consumed:].copy()
+            power += spectra.sum(axis=0, dtype=np.float64)
+            frames += len(spectra)
+
+            levels = (to_levels(spectra[:, :bins]) + SPECTROGRAM_RANGE_DB) * (255 / SPECTROGRAM_RANGE_DB)
+            levels = np.clip(levels, 0, 255, out=levels).astype(np.uint8)
+            while len(levels):
+                size = min(len(levels), SPECTROGRAM_TILE_FRAMES - filled)
+                tile[filled:filled + size] = levels[:size]
+                levels = levels[size:]
+                filled += size
+                if filled == SPECTROGRAM_TILE_FRAMES:
+                    tile_callback(tiles, tile)
+                    filled, tiles = 0, tiles + 1
+
+    if filled:
+        tile_callback(tiles, tile[:filled])
+
+    return Spectrogram(
+        sample_rate=sample_rate,
+        fft_size=fft_size,
+        hop=hop,
+        frames=frames,
+        cutoff=estimate_cutoff(power / max(frames, 1), sample_rate)
+    )
+
+
+class SpectrogramCache:
+    """
+    Tiles stored as `<audio hash>/<FFT size>-<hop>/<index>.png`
+    """
+
+    def __init__(self, folder: Path) -> None:
+        self._folder = Path(folder)
+        self._color_table = get_color_table()
+
+    def get_folder(self, audio_hash: str, fft_size: int, hop: int) -> Path:
+        return self._folder / audio_hash / f"{fft_size}-{hop}"
+
+    def get(self, audio_hash: str, fft_size: int, hop: int) -> Optional[Spectrogram]:
+        folder = self.get_folder(audio_hash, fft_size, hop)
+        info = read_json(folder / SPECTROGRAM_INFO_NAME, default=None, raise_exception=False)
+        if not info:
+            return None
+
+        return Spectrogram(folder=folder, **info)
+
+    def put_tile(self, audio_hash: str, fft_size: int, hop: int, index: int, levels: np.ndarray) -> None:
+        """
+        Store the (frames, bins) levels as a palette image
+        """
+        folder = self.get_folder(audio_hash, fft_size, hop)
+        folder.mkdir(parents=True, exist_ok=True)
+        pixels = np.ascontiguousarray(levels[:, ::-1].T)
+        height, width = pixels.shape
+        image = QImage(pixels.data, width, height, width, QImage.Format.Format_Indexed8)
+        image.set_color_table(self._color_table)
+
+        tile_path = folder / f"{index}.png"
+        partial_path = get_partial_path(tile_path)
+        if not image.save(partial_path.as_posix(), "PNG"):
+            raise OSError(f"Can't write {tile_path}")
+        os.replace(partial_path, tile_path)
+
+    def put(self, audio_hash: str, spectrogram: Spectrogram) -> Spectrogram:
+        """
+        Mark the stored tiles complete and get the spectrogram with the tile folder
+        """
+        folder = self.get_folder(audio_hash, spectrogram.fft_size, spectrogram.hop)
+        folder.mkdir(parents=True, exist_ok=True)
+        info_path = folder / SPECTROGRAM_INFO_NAME
+        partial_path = get_partial_path(info_path)
+        partial_path.write_text(json.dumps(spectrogram.as_dict()), encoding="utf-8")
+        os.replace(partial_path, info_path)
+        return dt.replace(spectrogram, folder=folder)
+
+    def clear(self) -> None:
+        shutil.rmtree(self._folder, ignore_errors=True)
+
+
+class SpectrogramSignals(QObject):
+    ready = Signal(object, object)
+    failed = Signal(object, str)
+
+
+class SpectrogramWorker(QRunnable):
+
+    def __init__(
+        self,
+        key: tuple,
+        ffmpeg_cmd: Path,
+        media_file: MediaFile,
+        fft_size: int,
+        hop: int,
+        cache: SpectrogramCache
+    ) -> None:
+        super().__init__()
+
+        self._signals = SpectrogramSignals()
+        self._key = key
+        self._ffmpeg_cmd = ffmpeg_cmd
+        self._media_file = media_file
+        self._fft_size = fft_size
+        self._hop = hop
+        self._cache = cache
+
+    @property
+    def signals(self) -> SpectrogramSignals:
+        return self._signals
+
+    @Slot()
+    def run(self) -> None:
+        file_path = Path(self._media_file.info.path)
+        try:
+            audio_hash = get_audio_hash(file_path)
+            spectrogram = self._cache.get(audio_hash, self._fft_size, self._hop)
+            if spectrogram is None:
+                spectrogram = self._cache.put(audio_hash, compute_spectrogram(
+                    self._ffmpeg_cmd,
+                    file_path,
+                    int(float(self._media_file.info.sample_rate or 0)) or DEFAULT_ANALYSIS_SAMPLE_RATE,
+                    self._fft_size,
+                    self._hop,
+                    lambda index, levels: self._cache.put_tile(audio_hash, self._fft_size, self._hop, index, levels),
+                    duration=self._media_file.info.duration
+                ))
+        except (ffmpeg.Error, OSError) as e:
+            message = getattr(e, "stderr", None) or str(e)
+            message = message.decode(errors="replace") if isinstance(message, bytes) else message
+            logger.debug(f"Spectrogram of {file_path} wasn't computed: {message}")
+            self._signals.failed.emit(self._key, message)
+            return
+        except Exception as e:
+            logger.error(f"Spectrogram of {file_path} wasn't computed: {e!s}")
+            self._signals.failed.emit(self._key, str(e))
+            return
+
+        self._signals.ready.emit(self._key, spectrogram)
+
+
+class SpectrogramService(QObject):
+    """
+    Asynchronous spectrograms, computed on demand in the thread pool.
+    The FFT releases the GIL, so the files are transformed in parallel.
+    Must be used from the GUI thread
+    """
+
+    def __init__(self, ffmpeg_cmd: Path, folder: Path, max_workers: int = None, parent: QObject = None) -> None:
+        super().__init__(parent)
+
+        self._ffmpeg_cmd = ffmpeg_cmd
+        self._cache = SpectrogramCache(folder)
+        self._spectrograms: dict[tuple, Spectrogram] = {}
+        # Callbacks and error callbacks by file path, FFT size and hop
+        self._pending: dict[tuple, list[tuple[callable, callable]]] = {}
+        self._pool = QThreadPool(self)
+        self._pool.set_max_thread_count(max_workers or max(1, (os.cpu_count() or 1) // 2))
+
+    def set_ffmpeg_cmd(self, ffmpeg_cmd: Path) -> None:
+        self._ffmpeg_cmd = ffmpeg_cmd
+
+    def request(
+        self,
+        media_file: MediaFile,
+        callback: callable,
+        fft_size: int = DEFAULT_FFT_SIZE,
+        hop: int = None,
+        error_callback: callable = None
+    ) -> None:
+        """
+        Call back with `Spectrogram` on the GUI thread once it's ready
+
+        Args:
+            media_file (MediaFile): media file
+            callback (callable): called with `Spectrogram`
+            fft_size (int): frame size, one of `SPECTROGRAM_FFT_SIZES`
+            hop (int|None): samples between the frame starts, see `get_default_hop`
+            error_callback (callable|None): called with the error message
+        """
+        hop = hop or get_default_hop(media_file, fft_size)
+        key = (str(media_file.info.path), fft_size, hop)
+        if key in self._spectrograms:
+            callback(self._spectrograms[key])
+            return
+
+        is_pending = key in self._pending
+        self._pending.setdefault(key, []).append((callback, error_callback))
+        if is_pending:
+            return
+
+        worker = SpectrogramWorker(key, self._ffmpeg_cmd, media_file, fft_size, hop, self._cache)
+        worker.signals.ready.connect(self._spectrogram_ready)
+        worker.signals.failed.connect(self._spectrogram_failed)
+        self._pool.start(worker)
+
+    def clear(self) -> None:
+        """
+        Drop the loaded spectrograms and the queued requests
+        """
+        self._pool.clear()
+        self._pending.clear()
+        self._spectrograms.clear()
+
+    def _spectrogram_ready(self, key: tuple, spectrogram: Spectrogram) -> None:
+        self._spectrograms[key] = spectrogram
+        for callback, _ in self._pending.pop(key, []):
+            try:
+                callback(spectrogram)
+            except RuntimeError:
+                # The dialog was closed while the spectrogram was computed
+                pass
+
+    def _spectrogram_failed(self, key: tuple, message: str) -> None:
+        for _, error_callback in self._pending.pop(key, []):
+            if error_callback is None:
+                continue
+            try:
+                error_callback(message)
+            except RuntimeError:
+                pass
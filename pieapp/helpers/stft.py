@@ -0,0 +1,114 @@
+"""
+Short-time spectra. Power spectra of the overlapping frames are computed block by block,
+and the long-term spectrum gives the lowpass cutoff left by lossy encoders.
+The module doesn't import Qt, so the analysis worker processes import it quickly
+"""
+import functools
+
+import numpy as np
+
+from pieapp.helpers.analyzers import MIN_DB
+
+# Width of the moving average over the long-term spectrum levels in Hz
+CUTOFF_SMOOTHING = 200.0
+
+# Bins below this frequency in Hz aren't searched for the cutoff
+CUTOFF_SEARCH_START = 1000.0
+
+# Band in Hz on each side of the cutoff. Their level difference is the edge steepness
+CUTOFF_EDGE_WIDTH = 500.0
+
+# Level drop in dB across the edge of an encoder lowpass
+CUTOFF_EDGE_DB = 20.0
+
+
+@functools.lru_cache(maxsize=8)
+def _get_window(fft_size: int) -> np.ndarray:
+    # Periodic Hann window, the overlapping frames sum to a constant
+    return (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(fft_size) / fft_size)).astype(np.float32)
+
+
+def get_power_spectra(samples: np.ndarray, fft_size: int, hop: int) -> tuple[np.ndarray, int]:
+    """
+    Get the power spectra of the frames that fit in the mono samples. A full scale sine is 1
+
+    Args:
+        samples (np.ndarray): mono float32 samples, the rest of the previous block first
+        fft_size (int): frame size
+        hop (int): samples between the frame starts
+
+    Returns:
+        spectra, consumed (tuple[np.ndarray, int]): (frames, fft_size // 2 + 1) float32 array
+            and the number of samples to drop before the next block
+    """
+    count = (len(samples) - fft_size) // hop + 1 if len(samples) >= fft_size else 0
+    if not count:
+        return np.zeros((0, fft_size // 2 + 1), dtype=np.float32), 0
+
+    window = _get_window(fft_size)
+    frames = np.lib.stride_tricks.sliding_window_view(samples, fft_size)[::hop][:count]
+    spectra = np.fft.rfft(frames * window, axis=1)
+    power = np.square(spectra.real) + np.square(spectra.imag)
+    power *= np.float32(4 / float(window.sum()) ** 2)
+    return power, count * hop
+
+
+def to_levels(power: np.ndarray) -> np.ndarray:
+    """
+    Get the power in dB, digital silence is `MIN_DB`
+    """
+    return 10 * np.log10(np.maximum(power, 10 ** (MIN_DB / 10)))
+
+
+def estimate_cutoff(power: np.ndarray, sample_rate: int) -> dict:
+    """
+    Find the highest steep edge of the long-term spectrum. Lossy encoders cut the spectrum
+    with a brick-wall lowpass, while the natural roll-off of a recording is gradual
+
+    Args:
+        power (np.ndarray): mean power spectrum, `fft_size // 2 + 1` bins
+        sample_rate (int): sample rate of the spectrum
+
+    Returns:
+        result (dict): "cutoff" in Hz, the Nyquist frequency if there's no edge or `None` for silence,
+            "nyquist" in Hz, "edge_db" level drop across the cutoff and "floor_db" level above it
+    """
+    nyquist = sample_rate / 2
+    bin_width = nyquist / max(len(power) - 1, 1)
+    smoothing = max(1, round(CUTOFF_SMOOTHING / bin_width))
+    # Levels are averaged in dB, so the edge isn't moved toward the louder side.
+    # The moving average is normalized at the ends
+    kernel = np.ones(smoothing)
+    levels = np.convolve(to_levels(power), kernel, "same") / np.convolve(np.ones(len(power)), kernel, "same")
+
+    start = min(round(CUTOFF_SEARCH_START / bin_width), len(levels) - 1)
+    if levels[start:].max() <= MIN_DB + CUTOFF_EDGE_DB:
+        return {"cutoff": None, "nyquist": nyquist, "edge_db": 0.0, "floor_db": MIN_DB}
+
+    # Mean levels of the bands below and above every bin
+    edge = max(1, round(CUTOFF_EDGE_WIDTH / bin_width))
+    sums = np.concatenate(([0.0], np.cumsum(levels)))
+    bins = np.arange(max(start, edge), len(levels) - edge + 1)
+    below = (sums[bins] - sums[bins - edge]) / edge
+    above = (sums[bins + edge] - sums[bins]) / edge
+    drops = below - above
+    if not len(drops) or drops.max() < CUTOFF_EDGE_DB:
+        return {
+            "cutoff": nyquist,
+            "nyquist": nyquist,
+            "edge_db": float(drops.max(initial=0.0)),
+            "floor_db": float(levels[-edge:].mean()),
+        }
+
+    # The steepest point of the highest edge
+    edges = np.flatnonzero(drops >= CUTOFF_EDGE_DB)
+    first = edges[-1]
+    while first > 0 and drops[first - 1] >= CUTOFF_EDGE_DB:
+        first -= 1
+    index = first + int(np.argmax(drops[first:edges[-1] + 1]))
+    return {
+        "cutoff": float(bins[index] * bin_width),
+        "nyquist": nyquist,
+        "edge_db": float(drops[index]),
+        "floor_db": float(above[index]),
+    }
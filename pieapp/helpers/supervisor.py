@@ -0,0 +1,378 @@
+"""
+Supervisor for ffprobe/ffmpeg child processes and for the work done in a thread instead of them
+"""
+import os
+import math
+import time
+import signal
+import threading
+import subprocess
+from typing import Optional
+
+import ffmpeg
+
+
+# Wall-clock timeout is `TIMEOUT_BASE + duration * TIMEOUT_FACTOR` seconds
+TIMEOUT_BASE = 60
+TIMEOUT_FACTOR = 1.0
+
+# CPU time limit is `(CPU_LIMIT_BASE + duration * CPU_LIMIT_FACTOR) * threads` seconds.
+# Demuxing, decoding and filtering run next to the encoder threads, so the factor is above the wall-clock one
+CPU_LIMIT_BASE = 60
+CPU_LIMIT_FACTOR = 2.0
+
+# Seconds without `-progress` advancing before the process is considered stalled
+STALL_TIMEOUT = 60
+
+# Address space limit of the child process in bytes
+MEMORY_LIMIT = 4 * 1024 ** 3
+
+# Interval between supervisor checks in seconds
+POLL_INTERVAL = 0.5
+
+
+class ProcessTimeoutError(ffmpeg.Error):
+    """
+    Raised when the child process was killed by the supervisor
+    """
+
+
+def get_timeout(duration: float = None) -> float:
+    """
+    Get wall-clock timeout scaled to the media file duration
+    """
+    return TIMEOUT_BASE + float(duration or 0) * TIMEOUT_FACTOR
+
+
+def get_cpu_limit(duration: float = None, threads: int = 1) -> int:
+    """
+    Get `RLIMIT_CPU` in seconds scaled to the media file duration and the number of the encoder threads
+    """
+    return math.ceil((CPU_LIMIT_BASE + float(duration or 0) * CPU_LIMIT_FACTOR) * max(1, int(threads or 1)))
+
+
+def limit_resources(memory_limit: int = None, cpu_limit: int = None, niceness: int = 0) -> callable:
+    """
+    Get `preexec_fn` that moves the child into its own process group and applies resource limits
+    """
+    def preexec() -> None:
+        import resource
+
+        os.setsid()
+        if niceness:
+            os.nice(niceness)
+        if memory_limit:
+            resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+        if cpu_limit:
+            resource.setrlimit(resource.RLIMIT_CPU, (cpu_limit, cpu_limit + 5))
+
+    return preexec
+
+
+class Supervisor:
+    """
+    Runs a child process with a wall-clock timeout, stall detection and resource limits.
+    On timeout the whole process group is killed and the process is reaped.
+    With `stream_stdout` the caller reads `stdout` itself, and a watchdog thread applies the timeouts
+    """
+
+    def __init__(
+        self,
+        args: list[str],
+        timeout: float = None,
+        stall_timeout: float = None,
+        memory_limit: int = MEMORY_LIMIT,
+        cpu_limit: int = None,
+        niceness: int = 0,
+        progress_callback: callable = None,
+        stream_stdout: bool = False
+    ) -> None:
+        """
+        Args:
+            args (list[str]): command line arguments
+            timeout (float|None): wall-clock timeout in seconds
+            stall_timeout (float|None): seconds without `-progress` advancing. Requires `-progress pipe:1`
+            memory_limit (int|None): `RLIMIT_AS` in bytes
+            cpu_limit (int|None): `RLIMIT_CPU` in seconds
+            niceness (int): niceness increment of the child process
+            progress_callback (callable|None): called with processed time in seconds from the reader thread.
+                If set, stdout is parsed as `-progress` output
+            stream_stdout (bool): leave stdout to the caller. The stall timeout runs from the last `touch` call
+        """
+        self._args = args
+        self._timeout = timeout
+        self._stall_timeout = stall_timeout
+        self._memory_limit = memory_limit
+        self._cpu_limit = cpu_limit
+        self._niceness = niceness
+        self._progress_callback = progress_callback
+        self._stream_stdout = stream_stdout
+
+        self._process: Optional[subprocess.Popen] = None
+        self._readers: list[threading.Thread] = []
+        self._stdout: list[bytes] = []
+        self._stderr: list[bytes] = []
+        self._started_at: float = None
+        self._last_progress: float = None
+        self._last_out_time: int = -1
+        self._suspended_at: float = None
+        self._timeout_message: Optional[bytes] = None
+
+    @property
+    def pid(self) -> Optional[int]:
+        return self._process.pid if self._process else None
+
+    @property
+    def stdout(self):
+        """
+        Stdout pipe of the process started with `stream_stdout`
+        """
+        return self._process.stdout
+
+    def touch(self) -> None:
+        """
+        Mark the streamed output as advancing, see `stream_stdout`
+        """
+        self._last_progress = time.monotonic()
+
+    def start(self) -> "Supervisor":
+        kwargs = {}
+        if os.name == "posix":
+            kwargs["preexec_fn"] = limit_resources(self._memory_limit, self._cpu_limit, self._niceness)
+        elif os.name == "nt":
+            kwargs["creationflags"] = subprocess.CREATE_NEW_PROCESS_GROUP
+
+        self._process = subprocess.Popen(
+            self._args,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            **kwargs
+        )
+        self._started_at = self._last_progress = time.monotonic()
+        self._readers = [threading.Thread(target=self._read_stderr, daemon=True)]
+        if not self._stream_stdout:
+            self._readers.append(threading.Thread(target=self._read_stdout, daemon=True))
+        for reader in self._readers:
+            reader.start()
+
+        if self._stream_stdout:
+            threading.Thread(target=self._watch, daemon=True).start()
+
+        return self
+
+    def wait(self) -> tuple[bytes, bytes]:
+        """
+        Wait for the process to finish
+
+        Returns:
+            output (tuple[bytes, bytes]): stdout and stderr
+
+        Raises:
+            ProcessTimeoutError: the process has timed out or stalled
+            ffmpeg.Error: the process has exited with a non-zero code
+        """
+        while True:
+            try:
+                self._process.wait(timeout=POLL_INTERVAL)
+                break
+            except subprocess.TimeoutExpired:
+                self._check()
+
+        stdout, stderr = self._join()
+        if self._timeout_message:
+            raise ProcessTimeoutError(self._args[0], None, self._timeout_message)
+        if self._process.returncode:
+            raise ffmpeg.Error(self._args[0], stdout, stderr)
+
+        return stdout, stderr
+
+    def run(self) -> tuple[bytes, bytes]:
+        return self.start().wait()
+
+    def is_suspended(self) -> bool:
+        return self._suspended_at is not None
+
+    def suspend(self) -> bool:
+        """
+        Stop the process group with `SIGSTOP`. Timeouts don't run while the process is suspended
+
+        Returns:
+            suspended (bool): whether the process was suspended
+        """
+        if os.name != "posix" or self._suspended_at is not None or not self._signal(signal.SIGSTOP):
+            return False
+
+        self._suspended_at = time.monotonic()
+        return True
+
+    def resume(self) -> None:
+        """
+        Continue the suspended process group with `SIGCONT`
+        """
+        if self._suspended_at is None:
+            return
+
+        self._signal(signal.SIGCONT)
+        suspended_for = time.monotonic() - self._suspended_at
+        self._started_at += suspended_for
+        self._last_progress += suspended_for
+        self._suspended_at = None
+
+    def kill(self) -> None:
+        """
+        Kill the whole process group and reap the process
+        """
+        if self._process is None or self._process.poll() is not None:
+            return
+
+        if os.name == "posix":
+            self._signal(signal.SIGKILL)
+        else:
+            self._process.kill()
+
+        self._process.wait()
+        self._join()
+
+    def _check(self) -> None:
+        """
+        Kill the process that has timed out or stalled
+
+        Raises:
+            ProcessTimeoutError: the process was killed
+        """
+        if self._suspended_at is not None:
+            return
+
+        now = time.monotonic()
+        if self._timeout and now - self._started_at > self._timeout:
+            self._timeout_message = b"Process has timed out"
+        elif self._is_stalled(now):
+            self._timeout_message = b"Process has stalled"
+        else:
+            return
+
+        self.kill()
+        raise ProcessTimeoutError(self._args[0], None, self._timeout_message)
+
+    def _watch(self) -> None:
+        while self._process.poll() is None:
+            time.sleep(POLL_INTERVAL)
+            try:
+                self._check()
+            except ProcessTimeoutError:
+                return
+
+    def _signal(self, signum: int) -> bool:
+        if self._process is None or self._process.poll() is not None:
+            return False
+
+        try:
+            os.killpg(self._process.pid, signum)
+        except ProcessLookupError:
+            return False
+
+        return True
+
+    def _is_stalled(self, now: float) -> bool:
+        if not ((self._progress_callback or self._stream_stdout) and self._stall_timeout):
+            return False
+
+        return now - self._last_progress > self._stall_timeout
+
+    def _join(self) -> tuple[bytes, bytes]:
+        for reader in self._readers:
+            reader.join()
+
+        return b"".join(self._stdout), b"".join(self._stderr)
+
+    def _read_stdout(self) -> None:
+        if self._progress_callback is None:
+            self._stdout.append(self._process.stdout.read())
+            return
+
+        for line in self._process.stdout:
+            key, _, value = line.decode(errors="ignore").strip().partition("=")
+            if key == "out_time_us" and value.isdigit():
+                out_time = int(value)
+                if out_time > self._last_out_time:
+                    self._last_out_time = out_time
+                    self._last_progress = time.monotonic()
+                    self._progress_callback(out_time / 1_000_000)
+
+    def _read_stderr(self) -> None:
+        self._stderr.append(self._process.stderr.read())
+
+
+class TaskSupervisor:
+    """
+    Supervisor of the work that runs in the calling thread instead of a child process,
+    e.g. the native conversion. The work calls `check` between its steps: it waits there
+    while suspended and raises once the task has timed out or was killed. Has the `suspend`,
+    `resume` and `kill` methods of `Supervisor`, so the scheduler treats both the same.
+    CPU and memory limits aren't applied to a thread
+    """
+
+    def __init__(self, name: str, timeout: float = None) -> None:
+        """
+        Args:
+            name (str): task name reported in the errors
+            timeout (float|None): wall-clock timeout in seconds. Suspended time doesn't count
+        """
+        self._name = name
+        self._timeout = timeout
+        self._started_at = time.monotonic()
+        self._suspended_at: float = None
+        self._killed = False
+        self._lock = threading.Lock()
+        # Cleared while the task is suspended
+        self._running = threading.Event()
+        self._running.set()
+
+    def is_suspended(self) -> bool:
+        return self._suspended_at is not None
+
+    def suspend(self) -> bool:
+        """
+        Pause the task at its next check
+
+        Returns:
+            suspended (bool): whether the task was suspended
+        """
+        with self._lock:
+            if self._suspended_at is not None or self._killed:
+                return False
+
+            self._suspended_at = time.monotonic()
+            self._running.clear()
+            return True
+
+    def resume(self) -> None:
+        with self._lock:
+            if self._suspended_at is None:
+                return
+
+            self._started_at += time.monotonic() - self._suspended_at
+            self._suspended_at = None
+            self._running.set()
+
+    def kill(self) -> None:
+        """
+        Stop the task at its next check. Safe to call from any thread
+        """
+        with self._lock:
+            self._killed = True
+            self._running.set()
+
+    def check(self) -> None:
+        """
+        Called by the task between its steps
+
+        Raises:
+            ProcessTimeoutError: the task has timed out or was killed
+        """
+        self._running.wait()
+        if self._killed:
+            raise ProcessTimeoutError(self._name, None, b"Task was killed")
+        if self._timeout and time.monotonic() - self._started_at > self._timeout:
+            raise ProcessTimeoutError(self._name, None, b"Task has timed out")
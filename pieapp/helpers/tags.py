@@ -0,0 +1,515 @@
+"""
+Tag write engine. Tags are rewritten in place where the existing tag padding allows,
+otherwise the file is remuxed by ffmpeg without re-encoding the audio
+"""
+from __feature__ import snake_case
+
+import os
+import struct
+import dataclasses as dt
+from pathlib import Path
+from typing import Optional
+
+import ffmpeg
+
+from PySide6.QtCore import Slot
+from PySide6.QtCore import Signal
+from PySide6.QtCore import QObject
+from PySide6.QtCore import QRunnable
+from PySide6.QtCore import QThreadPool
+
+from pieapp.api.structs.media import Metadata
+from pieapp.helpers.files import get_partial_path
+from pieapp.helpers.logger import logger
+from pieapp.helpers.supervisor import Supervisor
+from pieapp.helpers.supervisor import get_timeout
+from pieapp.helpers.supervisor import get_cpu_limit
+
+
+# `Metadata` fields by the generic (ffmpeg) tag names
+METADATA_TAGS: dict[str, str] = {
+    "title": "title",
+    "genre": "genre",
+    "subgenre": "subgenre",
+    "track": "track_number",
+    "artist": "primary_artist",
+    "featured_artist": "featured_artist",
+    "publisher": "publisher",
+    "language": "release_language",
+    "lyrics_language": "lyrics_language",
+    "lyrics_publisher": "lyrics_publisher",
+    "copyright": "composition_owner",
+    "date": "year_of_composition",
+}
+
+# ID3v2 text frames by the generic tag names. Other tags are written as `TXXX` frames
+ID3_FRAMES: dict[str, str] = {
+    "title": "TIT2",
+    "artist": "TPE1",
+    "album": "TALB",
+    "album_artist": "TPE2",
+    "genre": "TCON",
+    "track": "TRCK",
+    "disc": "TPOS",
+    "composer": "TCOM",
+    "publisher": "TPUB",
+    "copyright": "TCOP",
+    "language": "TLAN",
+}
+
+# Vorbis comment fields by the generic tag names. Other tags are upper-cased
+VORBIS_FIELDS: dict[str, str] = {
+    "album_artist": "ALBUMARTIST",
+    "track": "TRACKNUMBER",
+    "disc": "DISCNUMBER",
+}
+
+# Generic tag of the embedded front cover. Its value is the image path, `None` removes the cover
+COVER_TAG = "cover"
+
+# Containers that can hold an attached picture
+COVER_EXTENSIONS: tuple[str] = (".mp3", ".flac", ".m4a")
+
+# Files written per worker
+TAG_WRITE_CHUNK_SIZE = 100
+
+# FLAC metadata block types
+FLAC_PADDING = 1
+FLAC_VORBIS_COMMENT = 4
+
+
+class TagWriteMethod:
+    # Tags were rewritten in the existing tag space
+    InPlace = "in-place"
+    # The file was remuxed by ffmpeg
+    Remux = "remux"
+
+
+def metadata_to_tags(metadata: Metadata) -> dict[str, Optional[str]]:
+    """
+    Convert `Metadata` into generic tags. Empty fields are mapped to `None`, so they're removed
+    """
+    tags = {}
+    for tag, field in METADATA_TAGS.items():
+        value = getattr(metadata, field)
+        tags[tag] = str(value) if value not in (None, "") else None
+
+    return tags
+
+
+def get_cover_output_options(extension: str) -> dict:
+    """
+    Get ffmpeg output options that embed the second mapped stream as the front cover without re-encoding
+    """
+    options = {
+        "c:v": "copy",
+        "disposition:v": "attached_pic",
+        "metadata:s:v": "title=Album cover",
+        "metadata:s:v:0": "comment=Cover (front)",
+    }
+    if extension == ".mp3":
+        options["id3v2_version"] = 3
+
+    return options
+
+
+# ID3v2
+
+def _read_synchsafe(data: bytes) -> int:
+    return (data[0] << 21) | (data[1] << 14) | (data[2] << 7) | data[3]
+
+
+def _write_synchsafe(value: int) -> bytes:
+    return bytes(((value >> 21) & 0x7F, (value >> 14) & 0x7F, (value >> 7) & 0x7F, value & 0x7F))
+
+
+def _decode_id3_description(body: bytes) -> str:
+    """
+    Get description of `TXXX` and `COMM` frames
+    """
+    encoding, body = body[0], body[1:]
+    if encoding in (1, 2):
+        index = 0
+        while index + 1 < len(body) and body[index:index + 2] != b"\x00\x00":
+            index += 2
+        return body[:index].decode("utf-16" if encoding == 1 else "utf-16-be", errors="ignore")
+
+    return body.split(b"\x00", 1)[0].decode("latin-1" if encoding == 0 else "utf-8", errors="ignore")
+
+
+def _get_id3_frame_key(frame_id: str, body: bytes, flags: int, version: int) -> str:
+    # Skip frames we can't decode: compressed, encrypted or with the data length indicator
+    opaque_flags = 0x00C0 if version == 3 else 0x000F
+    if frame_id == "TXXX" and body and not flags & opaque_flags:
+        return f"TXXX:{_decode_id3_description(body).lower()}"
+
+    if frame_id == "COMM" and len(body) > 4 and not flags & opaque_flags:
+        return f"COMM:{_decode_id3_description(body[:1] + body[4:]).lower()}"
+
+    return frame_id
+
+
+def _get_id3_frame_keys(tag: str, version: int) -> list[str]:
+    if tag == "date":
+        return ["TDRC", "TYER", "TDAT"] if version == 4 else ["TYER", "TDRC", "TDAT"]
+
+    if tag == "comment":
+        return ["COMM:"]
+
+    if tag in ID3_FRAMES:
+        return [ID3_FRAMES[tag]]
+
+    return [f"TXXX:{tag.lower()}"]
+
+
+def _encode_id3_text(text: str, version: int) -> tuple[bytes, bytes]:
+    """
+    Returns:
+        result (tuple[bytes, bytes]): encoding byte and encoded text.
+            ID3v2.3 has no UTF-8, so UTF-16 with BOM is used
+    """
+    if version == 4:
+        return b"\x03", text.encode("utf-8")
+
+    return b"\x01", text.encode("utf-16")
+
+
+def _build_id3_frame(tag: str, value: str, version: int) -> bytes:
+    frame_id = _get_id3_frame_keys(tag, version)[0]
+    if tag == "date" and version == 3:
+        value = value[:4]
+
+    encoding, text = _encode_id3_text(value, version)
+    terminator = b"\x00" if encoding == b"\x03" else b"\x00\x00"
+
+    if frame_id.startswith("TXXX:"):
+        description = _encode_id3_text(tag.upper(), version)[1]
+        frame_id, body = "TXXX", encoding + description + terminator + text
+    elif frame_id.startswith("COMM:"):
+        frame_id, body = "COMM", encoding + b"eng" + _encode_id3_text("", version)[1] + terminator + text
+    else:
+        body = encoding + text
+
+    size = _write_synchsafe(len(body)) if version == 4 else struct.pack(">I", len(body))
+    return frame_id.encode("ascii") + size + b"\x00\x00" + body
+
+
+def _write_id3_in_place(file_path: Path, tags: dict[str, Optional[str]]) -> bool:
+    with open(file_path, "rb") as file:
+        header = file.read(10)
+        if len(header) < 10 or header[:3] != b"ID3" or header[3] not in (3, 4):
+            return False
+
+        version, flags = header[3], header[5]
+        # Unsynchronisation, extended header and footer are rare. The remux handles them
+        if flags & 0xD0:
+            return False
+
+        tag_size = _read_synchsafe(header[6:10])
+        region = file.read(tag_size)
+        if len(region) < tag_size:
+            return False
+
+    replaced_keys = {k for tag in tags for k in _get_id3_frame_keys(tag, version)}
+    frames: list[bytes] = []
+    position = 0
+    while position + 10 <= len(region) and region[position] != 0:
+        frame_id = region[position:position + 4].decode("latin-1")
+        size_bytes = region[position + 4:position + 8]
+        frame_size = _read_synchsafe(size_bytes) if version == 4 else struct.unpack(">I", size_bytes)[0]
+        frame_flags = struct.unpack(">H", region[position + 8:position + 10])[0]
+        frame_end = position + 10 + frame_size
+        if frame_end > len(region):
+            return False
+
+        body = region[position + 10:frame_end]
+        if _get_id3_frame_key(frame_id, body, frame_flags, version) not in replaced_keys:
+            frames.append(region[position:frame_end])
+        position = frame_end
+
+    frames.extend(_build_id3_frame(tag, value, version) for tag, value in tags.items() if value is not None)
+    frames_data = b"".join(frames)
+    if len(frames_data) > tag_size:
+        return False
+
+    with open(file_path, "r+b") as file:
+        file.seek(10)
+        file.write(frames_data + b"\x00" * (tag_size - len(frames_data)))
+
+    return True
+
+
+# FLAC
+
+def _get_vorbis_field(tag: str) -> str:
+    return VORBIS_FIELDS.get(tag, tag.upper())
+
+
+def _build_vorbis_comment(comment: bytes, tags: dict[str, Optional[str]]) -> Optional[bytes]:
+    """
+    Replace fields of the vorbis comment block. Returns `None` if the block is malformed
+    """
+    try:
+        vendor_size = struct.unpack("<I", comment[:4])[0]
+        vendor = comment[4:4 + vendor_size]
+        position = 4 + vendor_size
+        count = struct.unpack("<I", comment[position:position + 4])[0]
+        position += 4
+
+        replaced_fields = {_get_vorbis_field(tag) for tag in tags}
+        fields: list[bytes] = []
+        for _ in range(count):
+            size = struct.unpack("<I", comment[position:position + 4])[0]
+            field = comment[position + 4:position + 4 + size]
+            position += 4 + size
+            name = field.split(b"=", 1)[0].decode("ascii", errors="ignore").upper()
+            if name not in replaced_fields:
+                fields.append(field)
+    except struct.error:
+        return None
+
+    for tag, value in tags.items():
+        if value is not None:
+            fields.append(f"{_get_vorbis_field(tag)}={value}".encode("utf-8"))
+
+    return b"".join((
+        struct.pack("<I", len(vendor)), vendor,
+        struct.pack("<I", len(fields)),
+        *(struct.pack("<I", len(f)) + f for f in fields),
+    ))
+
+
+def _write_flac_in_place(file_path: Path, tags: dict[str, Optional[str]]) -> bool:
+    # Block type, data and size. Padding data isn't read
+    blocks: list[tuple[int, bytes, int]] = []
+    with open(file_path, "rb") as file:
+        if file.read(4) != b"fLaC":
+            return False
+
+        is_last = False
+        while not is_last:
+            header = file.read(4)
+            if len(header) < 4:
+                return False
+
+            is_last = bool(header[0] & 0x80)
+            block_type = header[0] & 0x7F
+            block_size = int.from_bytes(header[1:4], "big")
+            if block_type == FLAC_PADDING:
+                file.seek(block_size, 1)
+                data = b""
+            else:
+                data = file.read(block_size)
+            blocks.append((block_type, data, block_size))
+
+    # Metadata region size without the "fLaC" marker
+    region_size = sum(4 + size for _, _, size in blocks)
+
+    comment = next((data for block_type, data, _ in blocks if block_type == FLAC_VORBIS_COMMENT), None)
+    # An empty vorbis comment: empty vendor string and no fields
+    comment = _build_vorbis_comment(comment if comment is not None else b"\x00" * 8, tags)
+    if comment is None:
+        return False
+
+    new_blocks = [(t, d) for t, d, _ in blocks if t not in (FLAC_PADDING, FLAC_VORBIS_COMMENT)]
+    new_blocks.insert(1, (FLAC_VORBIS_COMMENT, comment))
+    used_size = sum(4 + len(d) for _, d in new_blocks)
+
+    # The rest of the region is filled by a padding block, or the region must match exactly
+    if used_size != region_size:
+        if used_size + 4 > region_size:
+            return False
+        new_blocks.append((FLAC_PADDING, b"\x00" * (region_size - used_size - 4)))
+
+    region = b"".join(
+        bytes(((0x80 if i == len(new_blocks) - 1 else 0) | block_type,)) + len(data).to_bytes(3, "big") + data
+        for i, (block_type, data) in enumerate(new_blocks)
+    )
+    with open(file_path, "r+b") as file:
+        file.seek(4)
+        file.write(region)
+
+    return True
+
+
+# ffmpeg fallback
+
+def _write_with_remux(ffmpeg_cmd: Path, file_path: Path, tags: dict[str, Optional[str]]) -> None:
+    """
+    Remux the file with the new tags through a temp file and rename it atomically
+    """
+    tags = dict(tags)
+    replace_cover = COVER_TAG in tags
+    cover_path = tags.pop(COVER_TAG, None)
+
+    partial_path = get_partial_path(file_path)
+    args = [ffmpeg_cmd.as_posix(), "-y", "-loglevel", "error", "-i", file_path.as_posix()]
+    if cover_path:
+        args += ["-i", cover_path]
+
+    args += ["-map", "0"]
+    if replace_cover:
+        # The embedded cover is dropped, and the new one is mapped in its place
+        args += ["-map", "-0:v"]
+    if cover_path:
+        args += ["-map", "1:0"]
+
+    args += ["-c", "copy", "-map_metadata", "0"]
+    if cover_path:
+        for key, value in get_cover_output_options(file_path.suffix.lower()).items():
+            args += [f"-{key}", str(value)]
+
+    # Ogg containers keep the tags in the stream comment header
+    metadata_option = "-metadata:s:a:0" if file_path.suffix.lower() in (".ogg", ".opus", ".oga") else "-metadata"
+    for tag, value in tags.items():
+        args += [metadata_option, f"{tag}={value or ''}"]
+    args.append(partial_path.as_posix())
+
+    try:
+        Supervisor(args, timeout=get_timeout(), cpu_limit=get_cpu_limit()).run()
+        os.replace(partial_path, file_path)
+    finally:
+        if partial_path.exists():
+            partial_path.unlink()
+
+
+def write_tags(ffmpeg_cmd: Path, file_path: Path, tags: dict[str, Optional[str]]) -> str:
+    """
+    Write tags into the file without re-encoding the audio
+
+    Args:
+        ffmpeg_cmd (Path): ffmpeg binary path, used when the tags can't be written in place
+        file_path (Path): media file path
+        tags (dict[str, str|None]): generic tag names and values. `None` removes the tag.
+            `COVER_TAG` holds the path of the new cover image
+
+    Returns:
+        method (str): see `TagWriteMethod`
+
+    Raises:
+        ffmpeg.Error: the remux has failed
+        OSError: the file can't be read or written
+    """
+    suffix = file_path.suffix.lower()
+    if COVER_TAG in tags and suffix not in COVER_EXTENSIONS:
+        logger.warning(f"The cover can't be embedded into {file_path}")
+        tags = {tag: value for tag, value in tags.items() if tag != COVER_TAG}
+
+    if not tags:
+        return TagWriteMethod.InPlace
+
+    # Hard links share the data with the other files (e.g. the transcode cache),
+    # so they're always remuxed into a new file. The cover is always remuxed too
+    if COVER_TAG not in tags and os.stat(file_path).st_nlink == 1:
+        if suffix == ".mp3" and _write_id3_in_place(file_path, tags):
+            return TagWriteMethod.InPlace
+        if suffix == ".flac" and _write_flac_in_place(file_path, tags):
+            return TagWriteMethod.InPlace
+
+    _write_with_remux(ffmpeg_cmd, file_path, tags)
+    return TagWriteMethod.Remux
+
+
+class TagWriteSignals(QObject):
+    file_written = Signal(Path, str)
+    file_failed = Signal(Path, str)
+    completed = Signal()
+
+
+class TagWriteWorker(QRunnable):
+
+    def __init__(self, ffmpeg_cmd: Path, changes: list[tuple[Path, dict]]) -> None:
+        super().__init__()
+
+        self._signals = TagWriteSignals()
+        self._ffmpeg_cmd = ffmpeg_cmd
+        self._changes = changes
+
+    @property
+    def signals(self) -> TagWriteSignals:
+        return self._signals
+
+    @Slot()
+    def run(self) -> None:
+        for file_path, tags in self._changes:
+            try:
+                method = write_tags(self._ffmpeg_cmd, file_path, tags)
+            except (ffmpeg.Error, OSError) as e:
+                self._signals.file_failed.emit(file_path, str(getattr(e, "stderr", None) or e))
+                continue
+            except Exception as e:
+                logger.error(f"Tags of {file_path} weren't written: {e!r}")
+                self._signals.file_failed.emit(file_path, str(e))
+                continue
+
+            self._signals.file_written.emit(file_path, method)
+
+        self._signals.completed.emit()
+
+
+@dt.dataclass
+class TagWriteBatch:
+    workers: int
+    written: list[Path] = dt.field(default_factory=list)
+    failed: dict[Path, str] = dt.field(default_factory=dict)
+
+
+class TagWriter(QObject):
+    """
+    Writes tags of many files in chunks on the thread pool
+    """
+    sig_file_written = Signal(Path)
+    sig_file_failed = Signal(Path, str)
+    sig_batch_written = Signal(list, object)
+
+    def __init__(self, ffmpeg_cmd: Path, chunk_size: int = TAG_WRITE_CHUNK_SIZE, parent: QObject = None) -> None:
+        super().__init__(parent)
+
+        self._ffmpeg_cmd = ffmpeg_cmd
+        self._chunk_size = chunk_size
+        self._batches: list[TagWriteBatch] = []
+
+    def set_ffmpeg_cmd(self, ffmpeg_cmd: Path) -> None:
+        self._ffmpeg_cmd = ffmpeg_cmd
+
+    def is_running(self) -> bool:
+        return bool(self._batches)
+
+    def write(self, changes: dict[Path, dict[str, Optional[str]]]) -> None:
+        """
+        Write tags of the files. `sig_batch_written` is emitted with the written files
+        and the failed ones with their errors when the whole batch is done
+
+        Args:
+            changes (dict[Path, dict[str, str|None]]): tags by file path
+        """
+        items = [(path, tags) for path, tags in changes.items() if tags]
+        if not items:
+            self.sig_batch_written.emit([], {})
+            return
+
+        chunks = [items[i:i + self._chunk_size] for i in range(0, len(items), self._chunk_size)]
+        batch = TagWriteBatch(workers=len(chunks))
+        self._batches.append(batch)
+
+        pool = QThreadPool.global_instance()
+        for chunk in chunks:
+            worker = TagWriteWorker(self._ffmpeg_cmd, chunk)
+            worker.signals.file_written.connect(lambda path, _, b=batch: self._file_written(b, path))
+            worker.signals.file_failed.connect(lambda path, message, b=batch: self._file_failed(b, path, message))
+            worker.signals.completed.connect(lambda b=batch: self._worker_completed(b))
+            pool.start(worker)
+
+    def _file_written(self, batch: TagWriteBatch, file_path: Path) -> None:
+        batch.written.append(file_path)
+        self.sig_file_written.emit(file_path)
+
+    def _file_failed(self, batch: TagWriteBatch, file_path: Path, message: str) -> None:
+        batch.failed[file_path] = message
+        self.sig_file_failed.emit(file_path, message)
+
+    def _worker_completed(self, batch: TagWriteBatch) -> None:
+        batch.workers -= 1
+        if batch.workers == 0:
+            self._batches.remove(batch)
+            self.sig_batch_written.emit(batch.written, batch.failed)
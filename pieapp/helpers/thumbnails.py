@@ -0,0 +1,214 @@
+"""
+Cover thumbnails. Images are decoded at a reduced size in the thread pool,
+kept in `QPixmapCache` and cached on disk by the image content hash
+"""
+from __feature__ import snake_case
+
+import os
+import hashlib
+from pathlib import Path
+from typing import Optional
+
+from PySide6.QtCore import Qt
+from PySide6.QtCore import Slot
+from PySide6.QtCore import Signal
+from PySide6.QtCore import QBuffer
+from PySide6.QtCore import QObject
+from PySide6.QtCore import QRunnable
+from PySide6.QtCore import QByteArray
+from PySide6.QtCore import QThreadPool
+from PySide6.QtGui import QImage
+from PySide6.QtGui import QPixmap
+from PySide6.QtGui import QPixmapCache
+from PySide6.QtGui import QImageReader
+
+from pieapp.api.globals import Global
+from pieapp.helpers.files import get_partial_path
+from pieapp.helpers.logger import logger
+
+
+# Thumbnail sizes in pixels: list rows, previews and tooltips
+THUMBNAIL_SIZES: tuple[int] = (48, 128, 264)
+
+# In-memory pixmap cache limit in kilobytes
+PIXMAP_CACHE_LIMIT = 64 * 1024
+
+# Global thumbnail service
+_thumbnail_service: "ThumbnailService" = None
+
+
+def _get_disk_path(folder: Path, key: str, size: int) -> Path:
+    return folder / f"{key}-{size}.png"
+
+
+class ThumbnailSignals(QObject):
+    ready = Signal(str, object)
+    failed = Signal(str)
+
+
+class ThumbnailWorker(QRunnable):
+    """
+    Make thumbnails of all the sizes with one decoding of the image
+    """
+
+    def __init__(self, image_path: str, folder: Path) -> None:
+        super().__init__()
+
+        self._signals = ThumbnailSignals()
+        self._image_path = image_path
+        self._folder = folder
+
+    @property
+    def signals(self) -> ThumbnailSignals:
+        return self._signals
+
+    @Slot()
+    def run(self) -> None:
+        try:
+            images = self._make_thumbnails()
+        except OSError as e:
+            logger.debug(f"Thumbnail of {self._image_path} wasn't made: {e!s}")
+            images = None
+        except Exception as e:
+            # The service waits for a signal of every request
+            logger.error(f"Thumbnail of {self._image_path} wasn't made: {e!r}")
+            images = None
+
+        if images:
+            self._signals.ready.emit(self._image_path, images)
+        else:
+            self._signals.failed.emit(self._image_path)
+
+    def _make_thumbnails(self) -> dict[int, QImage]:
+        data = Path(self._image_path).read_bytes()
+        key = hashlib.blake2b(data, digest_size=16).hexdigest()
+
+        images: dict[int, QImage] = {}
+        for size in THUMBNAIL_SIZES:
+            disk_path = _get_disk_path(self._folder, key, size)
+            if disk_path.exists():
+                image = QImage(disk_path.as_posix())
+                if not image.is_null():
+                    images[size] = image
+
+        missing_sizes = [size for size in THUMBNAIL_SIZES if size not in images]
+        if not missing_sizes:
+            return images
+
+        buffer = QBuffer()
+        buffer.set_data(QByteArray(data))
+        reader = QImageReader(buffer)
+        source_size = reader.size()
+        largest_size = max(missing_sizes)
+        # Decode straight at the largest needed size. JPEG decoders skip most of the work
+        if source_size.is_valid() and max(source_size.width(), source_size.height()) > largest_size:
+            reader.set_scaled_size(source_size.scaled(largest_size, largest_size, Qt.AspectRatioMode.KeepAspectRatio))
+
+        image = reader.read()
+        if image.is_null():
+            raise OSError(reader.error_string())
+
+        self._folder.mkdir(parents=True, exist_ok=True)
+        for size in missing_sizes:
+            thumbnail = image
+            if max(image.width(), image.height()) > size:
+                thumbnail = image.scaled(
+                    size,
+                    size,
+                    Qt.AspectRatioMode.KeepAspectRatio,
+                    Qt.TransformationMode.SmoothTransformation
+                )
+            images[size] = thumbnail
+
+            disk_path = _get_disk_path(self._folder, key, size)
+            partial_path = get_partial_path(disk_path)
+            if thumbnail.save(partial_path.as_posix(), "PNG"):
+                os.replace(partial_path, disk_path)
+
+        return images
+
+
+class ThumbnailService(QObject):
+    """
+    Asynchronous thumbnails. Must be used from the GUI thread
+    """
+
+    def __init__(self, folder: Path, parent: QObject = None) -> None:
+        super().__init__(parent)
+
+        self._folder = Path(folder)
+        # Callbacks waiting for the thumbnails by image path
+        self._pending: dict[str, list[tuple[int, callable]]] = {}
+        QPixmapCache.set_cache_limit(max(QPixmapCache.cache_limit(), PIXMAP_CACHE_LIMIT))
+
+    def get(self, image_path: str, size: int) -> Optional[QPixmap]:
+        """
+        Get the thumbnail from the memory cache
+        """
+        pixmap = QPixmap()
+        if QPixmapCache.find(self._get_cache_key(image_path, size), pixmap):
+            return pixmap
+
+        return None
+
+    def request(self, image_path: str, size: int, callback: callable) -> None:
+        """
+        Call back with the thumbnail pixmap once it's ready. The callback is called immediately
+        if the thumbnail is in the memory cache, and it's not called if the image can't be read
+
+        Args:
+            image_path (str): image file path
+            size (int): one of `THUMBNAIL_SIZES`
+            callback (callable): called with `QPixmap` on the GUI thread
+        """
+        image_path = str(image_path)
+        pixmap = self.get(image_path, size)
+        if pixmap is not None:
+            callback(pixmap)
+            return
+
+        is_pending = image_path in self._pending
+        self._pending.setdefault(image_path, []).append((size, callback))
+        if is_pending:
+            return
+
+        worker = ThumbnailWorker(image_path, self._folder)
+        worker.signals.ready.connect(self._thumbnails_ready)
+        worker.signals.failed.connect(self._thumbnails_failed)
+        QThreadPool.global_instance().start(worker)
+
+    @staticmethod
+    def _get_cache_key(image_path: str, size: int) -> str:
+        try:
+            modified = os.stat(image_path).st_mtime_ns
+        except OSError:
+            modified = 0
+
+        return f"thumbnail:{image_path}:{modified}:{size}"
+
+    def _thumbnails_ready(self, image_path: str, images: dict) -> None:
+        pixmaps = {}
+        for size, image in images.items():
+            pixmaps[size] = QPixmap.from_image(image)
+            QPixmapCache.insert(self._get_cache_key(image_path, size), pixmaps[size])
+
+        for size, callback in self._pending.pop(image_path, []):
+            try:
+                callback(pixmaps[size])
+            except RuntimeError:
+                # The widget was deleted while the thumbnail was made
+                pass
+
+    def _thumbnails_failed(self, image_path: str) -> None:
+        self._pending.pop(image_path, None)
+
+
+def get_thumbnail_service() -> ThumbnailService:
+    """
+    Get the shared thumbnail service with the disk cache in the user temp folder
+    """
+    global _thumbnail_service
+    if _thumbnail_service is None:
+        _thumbnail_service = ThumbnailService(Global.USER_ROOT / Global.DEFAULT_TEMP_FOLDER_NAME / "thumbnails")
+
+    return _thumbnail_service
@@ -0,0 +1,197 @@
+"""
+Waveform peaks. A min/max/RMS pyramid is built by `WaveformAnalyzer` in the analysis pass,
+cached as `.npy` files by the audio hash and memory-mapped on load.
+The module doesn't import Qt, so the analysis worker processes import it quickly
+"""
+import os
+import shutil
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from pieapp.helpers.analyzers import Analyzer
+from pieapp.helpers.files import get_partial_path
+
+# Samples per bin of the pyramid levels, from the finest to the coarsest.
+# Every level is a multiple of the previous one
+WAVEFORM_LEVELS: tuple[int] = (256, 1024, 4096, 16384, 65536)
+
+# Cached pyramids of other versions are recomputed
+WAVEFORM_VERSION = 2
+
+# Columns of the level arrays
+MIN, MAX, RMS = 0, 1, 2
+
+
+class Waveform:
+    """
+    Min/max/RMS pyramid. Cached levels are loaded on first use: the coarsest one
+    is read into memory, and the finer ones are memory-mapped
+    """
+
+    def __init__(self, levels: dict[int, np.ndarray] = None, folder: Path = None) -> None:
+        self._levels = dict(levels or {})
+        self._folder = folder
+
+    def get_level(self, samples_per_bin: int) -> np.ndarray:
+        """
+        Get (bins, 3) array of min, max and RMS of the finest level that is not finer than requested
+        """
+        fitting = [level for level in WAVEFORM_LEVELS if level <= samples_per_bin]
+        return self._load(max(fitting) if fitting else min(WAVEFORM_LEVELS))
+
+    def get_coarsest(self) -> np.ndarray:
+        return self._load(max(WAVEFORM_LEVELS))
+
+    def render(self, bins: int, start: float = 0.0, end: float = 1.0) -> np.ndarray:
+        """
+        Get peaks of a part of the waveform reduced to the number of bins (e.g. pixels)
+
+        Args:
+            bins (int): number of output bins
+            start (float): part start, from 0 to 1
+            end (float): part end, from 0 to 1
+
+        Returns:
+            peaks (np.ndarray): (bins, 3) array of min, max and RMS. Can be shorter if the part is too short
+        """
+        total_samples = len(self.get_coarsest()) * max(WAVEFORM_LEVELS)
+        samples_per_bin = max(1, int(total_samples * (end - start) / max(bins, 1)))
+        level = self.get_level(samples_per_bin)
+
+        first, last = int(len(level) * start), int(np.ceil(len(level) * end))
+        return reduce_peaks(np.asarray(level[first:last]), bins)
+
+    def _load(self, level: int) -> np.ndarray:
+        if level not in self._levels:
+            mmap_mode = None if level == max(WAVEFORM_LEVELS) else "r"
+            self._levels[level] = np.load(self._folder / f"{level}.npy", mmap_mode=mmap_mode)
+
+        return self._levels[level]
+
+
+def compute_peaks(samples: np.ndarray, samples_per_bin: int) -> np.ndarray:
+    """
+    Get min, max and RMS per bin of (channels, samples) or mono samples. The channels are merged:
+    min and max are taken over all of them, so a clipped channel isn't averaged away. The last bin can be partial
+    """
+    samples = np.atleast_2d(samples)
+    channels, length = samples.shape
+    full = length // samples_per_bin * samples_per_bin
+    blocks = samples[:, :full].reshape(channels, -1, samples_per_bin)
+    bins = blocks.shape[1]
+    peaks = np.empty((bins + (full < length), 3), dtype=np.float32)
+    peaks[:bins, MIN] = blocks.min(axis=(0, 2), initial=np.inf)
+    peaks[:bins, MAX] = blocks.max(axis=(0, 2), initial=-np.inf)
+    peaks[:bins, RMS] = np.sqrt(np.einsum("cij,cij->i", blocks, blocks) / (samples_per_bin * channels))
+    if full < length:
+        rest = samples[:, full:]
+        peaks[-1] = rest.min(), rest.max(), np.sqrt(np.einsum("ij,ij->", rest, rest) / rest.size)
+
+    return peaks
+
+
+def reduce_peaks(peaks: np.ndarray, bins: int) -> np.ndarray:
+    """
+    Merge adjacent bins of peaks into the number of bins
+    """
+    if len(peaks) <= bins:
+        return peaks
+
+    return _reduce_at(peaks, np.linspace(0, len(peaks), bins, endpoint=False).astype(np.intp))
+
+
+def _reduce_at(peaks: np.ndarray, indices: np.ndarray) -> np.ndarray:
+    counts = np.diff(np.append(indices, len(peaks)))
+    reduced = np.empty((len(indices), 3), dtype=np.float32)
+    reduced[:, MIN] = np.minimum.reduceat(peaks[:, MIN], indices)
+    reduced[:, MAX] = np.maximum.reduceat(peaks[:, MAX], indices)
+    reduced[:, RMS] = np.sqrt(np.add.reduceat(np.square(peaks[:, RMS], dtype=np.float64), indices) / counts)
+    return reduced
+
+
+def build_waveform(frames: list[np.ndarray]) -> Waveform:
+    """
+    Build all the pyramid levels from the finest level peaks of consecutive frames
+    """
+    finest = min(WAVEFORM_LEVELS)
+    peaks = np.concatenate(frames) if frames else np.zeros((0, 3), dtype=np.float32)
+    levels = {finest: peaks}
+    for level in WAVEFORM_LEVELS[1:]:
+        levels[level] = _reduce_at(peaks, np.arange(0, len(peaks), level // finest)) if len(peaks) else peaks
+
+    return Waveform(levels=levels)
+
+
+class WaveformCache:
+    """
+    Pyramids stored as `<version>/<audio hash>/<samples per bin>.npy`
+    """
+
+    def __init__(self, folder: Path) -> None:
+        self._root = Path(folder)
+        self._folder = self._root / str(WAVEFORM_VERSION)
+
+    def get(self, audio_hash: str) -> Optional[Waveform]:
+        folder = self._folder / audio_hash
+        if not all((folder / f"{level}.npy").exists() for level in WAVEFORM_LEVELS):
+            return None
+
+        return Waveform(folder=folder)
+
+    def put(self, audio_hash: str, waveform: Waveform) -> Waveform:
+        """
+        Store the pyramid and get it back memory-mapped
+        """
+        folder = self._folder / audio_hash
+        folder.mkdir(parents=True, exist_ok=True)
+        for level in WAVEFORM_LEVELS:
+            peaks = waveform.get_level(level)
+            level_path = folder / f"{level}.npy"
+            partial_path = get_partial_path(level_path)
+            np.save(partial_path, np.ascontiguousarray(peaks, dtype=np.float32))
+            os.replace(partial_path, level_path)
+
+        return self.get(audio_hash) or waveform
+
+    def clear(self) -> None:
+        shutil.rmtree(self._root, ignore_errors=True)
+
+
+class WaveformAnalyzer(Analyzer):
+    """
+    Waveform pyramid built in the analysis pass, so listing a file doesn't decode it twice.
+    Blocks are reduced to the finest level in the worker processes, and the levels
+    are stored in `WaveformCache` instead of the JSON cache. Analysis blocks are made
+    of whole bins, so only the last block has a partial bin
+    """
+    name = "waveform"
+    cached = False
+
+    def __init__(self, folder: Path) -> None:
+        self._cache = WaveformCache(folder)
+
+    def start(self, sample_rate: int, channels: int) -> Optional[np.ndarray]:
+        return None
+
+    def process(self, state: Optional[np.ndarray], block: np.ndarray) -> np.ndarray:
+        return compute_peaks(block, min(WAVEFORM_LEVELS))
+
+    def take_output(self, state: np.ndarray) -> tuple[None, np.ndarray]:
+        return None, state
+
+    def join_outputs(self, state: None, outputs: list[np.ndarray]) -> list[np.ndarray]:
+        return outputs
+
+    def finish(self, state: list[np.ndarray]) -> Waveform:
+        return build_waveform(state)
+
+    def load(self, audio_hash: str) -> Optional[Waveform]:
+        return self._cache.get(audio_hash)
+
+    def store(self, audio_hash: str, result: Waveform) -> Waveform:
+        return self._cache.put(audio_hash, result)
+
+    def clear(self) -> None:
+        self._cache.clear()
@@ -1,12 +1,45 @@
+from pathlib import Path
+
+import click
+
+from pieapp.app.start import start_mirror
 from pieapp.app.start import start_application
 
 
-def launch():
+@click.group(invoke_without_command=True)
+@click.pass_context
+def launch(context: click.Context) -> None:
+    """
+    Start pie-audio. Without a command the application window is opened
+    """
+    if context.invoked_subcommand is None:
+        start_application()
+
+
+@launch.command()
+@click.argument("source", type=click.Path(exists=True, file_okay=False, path_type=Path))
+@click.argument("target", type=click.Path(file_okay=False, path_type=Path))
+@click.option("--preset", "preset_name", default=None, help="Conversion preset name")
+@click.option("--ffmpeg", "ffmpeg_cmd", default="ffmpeg", type=click.Path(path_type=Path), help="ffmpeg binary")
+@click.option("--ffprobe", "ffprobe_cmd", default="ffprobe", type=click.Path(path_type=Path), help="ffprobe binary")
+@click.option("--dry-run", is_flag=True, help="Only print the planned changes")
+@click.option("--verify", is_flag=True, help="Decode converted files and record their checksums")
+@click.option("--embed-cover", is_flag=True, help="Embed album covers into converted files")
+def mirror(
+    source: Path,
+    target: Path,
+    preset_name: str,
+    ffmpeg_cmd: Path,
+    ffprobe_cmd: Path,
+    dry_run: bool,
+    verify: bool,
+    embed_cover: bool
+) -> None:
     """
-    TODO: Add cli support
+    Keep a transcoded copy of the SOURCE library in TARGET. Only new and changed files are converted
     """
-    start_application()
+    raise SystemExit(start_mirror(source, target, preset_name, ffmpeg_cmd, ffprobe_cmd, dry_run, verify, embed_cover))
 
 
 if __name__ == '__main__':
-    launch()
\ No newline at end of file
+    launch()
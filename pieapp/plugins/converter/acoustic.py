@@ -0,0 +1,313 @@
+"""
+Acoustic fingerprints. Copies of a recording in other codecs and bit rates are found
+by the band energies of the downsampled mono signal, which lossy encoding keeps.
+The module doesn't import Qt, so the analysis worker processes import it quickly
+"""
+import base64
+import functools
+from typing import Hashable
+from typing import Optional
+
+import numpy as np
+
+from pieapp.api.structs.media import MediaFile
+from pieapp.helpers.analyzers import Analyzer
+
+# Lowest sample rate of the downsampled signal in Hz
+FINGERPRINT_SAMPLE_RATE = 11025
+
+# Frame and hop of the spectra in seconds
+FINGERPRINT_FRAME = 0.37
+FINGERPRINT_HOP = 0.0464
+
+# Logarithmic bands in Hz. Adjacent band differences give 32-bit words
+FINGERPRINT_BANDS = 33
+FINGERPRINT_BAND_RANGE = (300.0, 2000.0)
+
+# Track profile of the signature: segments of the active part of the track
+SIGNATURE_SEGMENTS = 16
+
+# Signature bits and their split into the index keys
+SIGNATURE_BITS = 128
+SIGNATURE_KEY_BITS = 16
+
+# Seed of the signature hyperplanes, changing it invalidates the cached signatures
+SIGNATURE_SEED = 1770
+
+# Frames quieter than the loudest one by this factor are outside the active part
+ACTIVE_LEVEL = 1e-6
+
+# Candidates farther than this number of signature bits aren't compared
+MAX_SIGNATURE_DISTANCE = 40
+
+# Bit error rate of the words below which two files are the same recording.
+# Unrelated audio is close to 0.5
+MAX_BIT_ERROR_RATE = 0.3
+
+# Time shift in seconds between the copies, e.g. encoder delay and padding
+MAX_TIME_OFFSET = 2.0
+
+# Index keys shared by more files carry no information and are skipped
+MAX_BUCKET_SIZE = 256
+
+# Codecs that keep the source samples
+LOSSLESS_CODECS: tuple[str] = ("flac", "alac", "wavpack", "ape", "tta", "mlp", "truehd", "shorten")
+
+
+@functools.lru_cache(maxsize=1)
+def _get_hyperplanes() -> np.ndarray:
+    rng = np.random.default_rng(SIGNATURE_SEED)
+    return rng.standard_normal((SIGNATURE_BITS, SIGNATURE_SEGMENTS * FINGERPRINT_BANDS))
+
+
+@functools.lru_cache(maxsize=8)
+def _get_band_starts(sample_rate: int, frame: int) -> np.ndarray:
+    low, high = FINGERPRINT_BAND_RANGE
+    edges = np.geomspace(low, high, FINGERPRINT_BANDS + 1)
+    starts = np.round(edges * frame / sample_rate).astype(np.intp)
+    # Each band gets at least one bin
+    steps = np.arange(len(starts))
+    return np.maximum.accumulate(starts - steps) + steps
+
+
+class FingerprintAnalyzer(Analyzer):
+    """
+    Band energies of the overlapping frames. The frame energies of each block are
+    taken out of the state, the words and the signature are computed once at the end
+    """
+    name = "fingerprint"
+
+    def start(self, sample_rate: int, channels: int) -> dict:
+        factor = max(1, sample_rate // FINGERPRINT_SAMPLE_RATE)
+        rate = sample_rate / factor
+        return {
+            "factor": factor,
+            "rate": rate,
+            "frame": round(rate * FINGERPRINT_FRAME),
+            "hop": round(rate * FINGERPRINT_HOP),
+            # Mono samples before downsampling and downsampled ones after the last frame
+            "pending": np.zeros(0, dtype=np.float32),
+            "samples": np.zeros(0, dtype=np.float32),
+            "energies": None,
+        }
+
+    def process(self, state: dict, block: np.ndarray) -> dict:
+        state = dict(state)
+        factor, frame, hop = state["factor"], state["frame"], state["hop"]
+
+        mono = np.concatenate((state["pending"], block.mean(axis=0)))
+        full = len(mono) // factor * factor
+        state["pending"] = mono[full:].copy()
+        # Averaging is a weak lowpass, the bands are far below the new Nyquist frequency
+        samples = np.concatenate((state["samples"], mono[:full].reshape(-1, factor).mean(axis=1)))
+
+        count = (len(samples) - frame) // hop + 1 if len(samples) >= frame else 0
+        state["samples"] = samples[count * hop:].copy()
+        if not count:
+            state["energies"] = np.zeros((0, FINGERPRINT_BANDS), dtype=np.float32)
+            return state
+
+        frames = np.lib.stride_tricks.sliding_window_view(samples, frame)[::hop][:count]
+        power = np.abs(np.fft.rfft(frames * np.hanning(frame), axis=1)) ** 2
+        starts = _get_band_starts(round(state["rate"]), frame)
+        state["energies"] = np.add.reduceat(power[:, starts[0]:starts[-1]], starts[:-1] - starts[0], axis=1)
+        state["energies"] = state["energies"].astype(np.float32)
+        return state
+
+    def take_output(self, state: dict) -> tuple[dict, Optional[np.ndarray]]:
+        state = dict(state)
+        return state, state.pop("energies")
+
+    def join_outputs(self, state: dict, outputs: list[np.ndarray]) -> dict:
+        state = dict(state)
+        state["energies"] = np.concatenate(outputs) if outputs else np.zeros((0, FINGERPRINT_BANDS), dtype=np.float32)
+        return state
+
+    def finish(self, state: dict) -> dict:
+        energies = state["energies"].astype(np.float64)
+        return {
+            "hop": state["hop"] / state["rate"],
+            "words": base64.b64encode(_get_words(energies).tobytes()).decode("ascii"),
+            "signature": _get_signature(energies),
+        }
+
+
+def _get_words(energies: np.ndarray) -> np.ndarray:
+    """
+    Get a 32-bit word per frame: signs of the band energy differences between the frames
+    """
+    if len(energies) < 2:
+        return np.zeros(0, dtype=np.uint32)
+
+    differences = energies[:, :-1] - energies[:, 1:]
+    bits = (differences[1:] - differences[:-1]) > 0
+    return (bits.astype(np.uint64) << np.arange(FINGERPRINT_BANDS - 1, dtype=np.uint64)).sum(axis=1).astype(np.uint32)
+
+
+def _get_signature(energies: np.ndarray) -> Optional[str]:
+    """
+    Get the random hyperplane hash of the band levels over the segments of the active part.
+    Band means are removed, so the signature follows the changes in time and not the tone
+    """
+    levels = energies.sum(axis=1)
+    active = np.flatnonzero(levels > levels.max(initial=0) * ACTIVE_LEVEL)
+    if len(active) < SIGNATURE_SEGMENTS:
+        return None
+
+    log_energies = np.log10(energies[active[0]:active[-1] + 1] + 1e-12)
+    profile = np.stack([segment.mean(axis=0) for segment in np.array_split(log_energies, SIGNATURE_SEGMENTS)])
+    profile -= profile.mean(axis=0)
+    bits = _get_hyperplanes() @ profile.ravel() > 0
+    return np.packbits(bits).tobytes().hex()
+
+
+def _decode_words(result: dict) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(result["words"]), dtype=np.uint32)
+
+
+def get_bit_error_rate(words: np.ndarray, other_words: np.ndarray, max_offset: int) -> float:
+    """
+    Get the lowest share of different bits of the words over the time shifts
+
+    Args:
+        words (np.ndarray): words of a file
+        other_words (np.ndarray): words of another file
+        max_offset (int): maximum shift in words
+
+    Returns:
+        rate (float): 0 for the same audio, about 0.5 for unrelated audio
+    """
+    min_overlap = max(1, min(len(words), len(other_words)) // 2)
+    best = 1.0
+    for offset in range(-max_offset, max_offset + 1):
+        first = words[max(0, offset):]
+        second = other_words[max(0, -offset):]
+        size = min(len(first), len(second))
+        if size < min_overlap:
+            continue
+
+        different = np.unpackbits(np.bitwise_xor(first[:size], second[:size]).view(np.uint8)).sum()
+        best = min(best, different / (size * 32))
+
+    return best
+
+
+class FingerprintIndex:
+    """
+    Locality-sensitive index of the signatures. Files are compared only with the files
+    that share a part of the signature, so clustering a library isn't quadratic
+    """
+
+    def __init__(self) -> None:
+        self._fingerprints: dict[Hashable, tuple[int, dict]] = {}
+        self._buckets: dict[tuple[int, int], list[Hashable]] = {}
+
+    def __len__(self) -> int:
+        return len(self._fingerprints)
+
+    def add(self, key: Hashable, result: dict) -> None:
+        """
+        Add the `FingerprintAnalyzer` result. Results without a signature, e.g. silent files, are skipped
+        """
+        if not result.get("signature") or key in self._fingerprints:
+            return
+
+        signature = int(result["signature"], 16)
+        self._fingerprints[key] = (signature, result)
+        for part, value in self._get_parts(signature):
+            self._buckets.setdefault((part, value), []).append(key)
+
+    def get_candidates(self, key: Hashable) -> set[Hashable]:
+        """
+        Get the files with a close signature
+        """
+        signature, _ = self._fingerprints[key]
+        candidates = set()
+        for part in self._get_parts(signature):
+            bucket = self._buckets.get(part, [])
+            if len(bucket) <= MAX_BUCKET_SIZE:
+                candidates.update(bucket)
+
+        candidates.discard(key)
+        return {
+            candidate for candidate in candidates
+            if bin(signature ^ self._fingerprints[candidate][0]).count("1") <= MAX_SIGNATURE_DISTANCE
+        }
+
+    def get_clusters(self) -> list[list[Hashable]]:
+        """
+        Get the groups of two and more files of the same recording, in the order they were added
+        """
+        parents = {key: key for key in self._fingerprints}
+        words: dict[Hashable, np.ndarray] = {}
+
+        def find(key: Hashable) -> Hashable:
+            while parents[key] != key:
+                parents[key] = parents[parents[key]]
+                key = parents[key]
+            return key
+
+        order = {key: index for index, key in enumerate(self._fingerprints)}
+        for key in self._fingerprints:
+            for candidate in self.get_candidates(key):
+                if order[candidate] < order[key] or find(candidate) == find(key):
+                    continue
+
+                result, other_result = self._fingerprints[key][1], self._fingerprints[candidate][1]
+                for k, r in ((key, result), (candidate, other_result)):
+                    if k not in words:
+                        words[k] = _decode_words(r)
+                max_offset = round(MAX_TIME_OFFSET / result["hop"])
+                if get_bit_error_rate(words[key], words[candidate], max_offset) <= MAX_BIT_ERROR_RATE:
+                    parents[find(candidate)] = find(key)
+
+        clusters: dict[Hashable, list[Hashable]] = {}
+        for key in self._fingerprints:
+            clusters.setdefault(find(key), []).append(key)
+
+        return [cluster for cluster in clusters.values() if len(cluster) > 1]
+
+    @staticmethod
+    def _get_parts(signature: int) -> list[tuple[int, int]]:
+        mask = (1 << SIGNATURE_KEY_BITS) - 1
+        return [
+            (part, (signature >> (part * SIGNATURE_KEY_BITS)) & mask)
+            for part in range(SIGNATURE_BITS // SIGNATURE_KEY_BITS)
+        ]
+
+
+def is_lossless(media_file: MediaFile) -> bool:
+    codec = (media_file.info.codec.name if media_file.info.codec else "").lower()
+    return codec in LOSSLESS_CODECS or codec.startswith("pcm_")
+
+
+def get_quality_key(media_file: MediaFile) -> tuple:
+    """
+    Get the sort key of the source quality: lossless files first, then the higher
+    bit depth or bit rate, then the higher sample rate
+    """
+    info = media_file.info
+    sample_rate = int(float(info.sample_rate or 0))
+    if is_lossless(media_file):
+        return 1, int(info.bit_depth or 0), sample_rate
+
+    return 0, int(float(info.bit_rate or 0)), sample_rate
+
+
+def get_recording_groups(media_files: list[MediaFile]) -> list[list[MediaFile]]:
+    """
+    Group the files of the same recording by their `FingerprintAnalyzer` results
+
+    Returns:
+        groups (list[list[MediaFile]]): groups of two and more files, the best source first
+    """
+    index = FingerprintIndex()
+    for position, media_file in enumerate(media_files):
+        result = media_file.analysis.get(FingerprintAnalyzer.name)
+        if result:
+            index.add(position, result)
+
+    return [
+        sorted((media_files[position] for position in cluster), key=get_quality_key, reverse=True)
+        for cluster in index.get_clusters()
+    ]
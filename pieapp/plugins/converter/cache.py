@@ -0,0 +1,168 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from pathlib import Path
+from typing import Optional
+
+from pieapp.api.structs.media import Preset
+from pieapp.helpers.files import read_json
+from pieapp.helpers.files import write_json
+from pieapp.helpers.files import clone_file
+from pieapp.helpers.files import get_partial_path
+from pieapp.helpers.logger import logger
+
+from converter.costs import parse_bit_rate
+
+
+# Default size limit of the transcode cache in bytes
+DEFAULT_CACHE_SIZE = 2 * 1024 ** 3
+
+# Cache index file name
+INDEX_FILE_NAME = "index.json"
+
+
+def normalize_preset(preset: Preset) -> dict:
+    """
+    Get preset options that affect the encoded audio.
+    The preset name and equivalent spellings of the same options don't change the key
+    """
+    normalized = {
+        "codec": preset.codec.lower(),
+        "extension": preset.extension.lower(),
+        "bit_rate": parse_bit_rate(preset.bit_rate) or None,
+        "sample_rate": int(preset.sample_rate) if preset.sample_rate else None,
+        "channels": int(preset.channels) if preset.channels else None,
+        "options": {k: str(v) for k, v in sorted(preset.options.items())},
+    }
+    # Added only when set, so the keys of the other presets stay the same
+    if preset.loudness is not None:
+        normalized["loudness"] = float(preset.loudness)
+        normalized["true_peak"] = float(preset.true_peak) if preset.true_peak is not None else None
+    if preset.trim_silence is not None:
+        normalized["trim_silence"] = float(preset.trim_silence)
+
+    return normalized
+
+
+class TranscodeCache:
+    """
+    Content-addressed store of encoded outputs with LRU eviction.
+    Entries are tagless: tags are applied when the entry is materialized.
+    Safe to use from the worker threads
+    """
+
+    def __init__(self, root: Path, max_size: int = DEFAULT_CACHE_SIZE) -> None:
+        self._root = Path(root)
+        self._root.mkdir(parents=True, exist_ok=True)
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        self._index_path = self._root / INDEX_FILE_NAME
+        self._index: dict[str, dict] = read_json(self._index_path, default={}, raise_exception=False) or {}
+
+    @property
+    def size(self) -> int:
+        with self._lock:
+            return sum(e["size"] for e in self._index.values())
+
+    @staticmethod
+    def get_key(audio_hash: str, preset: Preset, ffmpeg_version: str, edits_hash: str = None) -> str:
+        """
+        Get cache key of the source audio payload encoded by the preset with the given ffmpeg build.
+        Edited outputs are keyed by the edits hash too, see `get_edits_hash`
+        """
+        parts = [audio_hash, normalize_preset(preset), ffmpeg_version]
+        if edits_hash:
+            parts.append(edits_hash)
+        payload = json.dumps(parts, sort_keys=True)
+        return hashlib.blake2b(payload.encode("utf-8"), digest_size=20).hexdigest()
+
+    def get(self, key: str) -> Optional[Path]:
+        """
+        Get cached file path by key and mark it as recently used
+        """
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None:
+                return None
+
+            file_path = self._root / entry["path"]
+            if not file_path.exists():
+                self._index.pop(key)
+                self._save()
+                return None
+
+            entry["last_used"] = time.time()
+            self._save()
+
+        return file_path
+
+    def put(self, key: str, file_path: Path) -> Path:
+        """
+        Store file in the cache and evict the least recently used entries over the size limit
+
+        Returns:
+            path (Path): cached file path
+        """
+        relative_path = Path(key[:2]) / f"{key}{file_path.suffix}"
+        cached_path = self._root / relative_path
+        cached_path.parent.mkdir(exist_ok=True)
+
+        partial_path = get_partial_path(cached_path)
+        clone_file(file_path, partial_path, hardlink=True)
+        os.replace(partial_path, cached_path)
+
+        with self._lock:
+            self._index[key] = {
+                "path": relative_path.as_posix(),
+                "size": cached_path.stat().st_size,
+                "last_used": time.time(),
+            }
+            self._evict()
+            self._save()
+
+        return cached_path
+
+    def materialize(self, key: str, target_path: Path) -> bool:
+        """
+        Materialize cached file into the target path with a reflink, hard link or copy
+
+        Returns:
+            hit (bool): whether the key was found
+        """
+        cached_path = self.get(key)
+        if cached_path is None:
+            return False
+
+        method = clone_file(cached_path, target_path, hardlink=True)
+        logger.debug(f"Materialized {target_path} from the transcode cache ({method})")
+        return True
+
+    def clear(self) -> None:
+        with self._lock:
+            for key in list(self._index):
+                self._remove(key)
+            self._save()
+
+    def _evict(self) -> None:
+        total_size = sum(e["size"] for e in self._index.values())
+        for key in sorted(self._index, key=lambda k: self._index[k]["last_used"]):
+            if total_size <= self._max_size:
+                break
+
+            total_size -= self._index[key]["size"]
+            self._remove(key)
+
+    def _remove(self, key: str) -> None:
+        entry = self._index.pop(key)
+        try:
+            (self._root / entry["path"]).unlink()
+        except FileNotFoundError:
+            pass
+
+    def _save(self) -> None:
+        try:
+            write_json(self._index_path, self._index)
+        except OSError as e:
+            logger.error(f"Transcode cache index wasn't saved: {e!s}")
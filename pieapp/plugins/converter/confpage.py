@@ -5,10 +5,16 @@ from pathlib import Path
 from PySide6.QtGui import QIcon
 from PySide6.QtGui import QAction
 from PySide6.QtCore import QDir
+from PySide6.QtCore import Slot
+from PySide6.QtCore import QThread
 from PySide6.QtWidgets import QWidget
+from PySide6.QtWidgets import QCheckBox
+from PySide6.QtWidgets import QComboBox
+from PySide6.QtWidgets import QPushButton
 from PySide6.QtWidgets import QLineEdit
 from PySide6.QtWidgets import QFileDialog
 from PySide6.QtWidgets import QFormLayout
+from PySide6.QtWidgets import QDoubleSpinBox
 
 from pieapp.api.globals import Global
 from pieapp.api.managers.configs.mixins import ConfigAccessorMixin
@@ -17,6 +23,15 @@ from pieapp.api.managers.structs import Section
 from pieapp.api.managers.themes.mixins import ThemeAccessorMixin
 from pieapp.api.plugins.confpage import ConfigPage
 from pieapp.api.structs.plugins import Plugin
+from pieapp.helpers.ffmpeg import CalibrationWorker
+from pieapp.helpers.logger import logger
+
+from converter.native import NATIVE_BENCHMARK
+from converter.native import benchmark_native
+from converter.presets import DEFAULT_PRESETS
+from converter.presets import DEFAULT_PRESET_NAME
+from converter.silence import DEFAULT_SILENCE_DURATION
+from converter.silence import DEFAULT_SILENCE_THRESHOLD
 
 
 class ConverterConfigPage(
@@ -53,7 +68,69 @@ class ConverterConfigPage(
             QLineEdit.ActionPosition.TrailingPosition
         )
 
+        self._preset_combo_box = QComboBox()
+        self._preset_combo_box.add_items(list(DEFAULT_PRESETS.keys()))
+        self._preset_combo_box.set_current_text(self.get_config(
+            "ffmpeg.preset", default=DEFAULT_PRESET_NAME, scope=Section.Root, section=Section.User
+        ))
+        self._preset_combo_box.currentTextChanged.connect(self._preset_combo_box_connect)
+
+        # Run calibration on demand
+        self._calibration_thread = QThread()
+        # The native backend is compared with ffmpeg in the same run
+        self._calibration_worker = CalibrationWorker(benchmarks={NATIVE_BENCHMARK: benchmark_native})
+        self._calibration_worker.sig_calibration_done.connect(self._calibration_done)
+        self._calibration_worker.sig_calibration_failed.connect(self._calibration_failed)
+        self._calibration_worker.move_to_thread(self._calibration_thread)
+        self._calibration_thread.started.connect(self._calibration_worker.start)
+
+        self._calibrate_button = QPushButton(translate("Calibrate"))
+        self._calibrate_button.clicked.connect(self._calibrate_button_connect)
+
+        self._staging_check_box = QCheckBox()
+        self._staging_check_box.set_checked(self.get_config(
+            "ffmpeg.stage_network_sources", default=False, scope=Section.Root, section=Section.User
+        ))
+        self._staging_check_box.toggled.connect(self._staging_check_box_connect)
+
+        self._verify_check_box = QCheckBox()
+        self._verify_check_box.set_checked(self.get_config(
+            "ffmpeg.verify", default=False, scope=Section.Root, section=Section.User
+        ))
+        self._verify_check_box.toggled.connect(self._verify_check_box_connect)
+
+        self._cover_check_box = QCheckBox()
+        self._cover_check_box.set_checked(self.get_config(
+            "ffmpeg.embed_cover", default=False, scope=Section.Root, section=Section.User
+        ))
+        self._cover_check_box.toggled.connect(self._cover_check_box_connect)
+
+        self._silence_threshold_spin_box = QDoubleSpinBox()
+        self._silence_threshold_spin_box.set_range(-120.0, -20.0)
+        self._silence_threshold_spin_box.set_decimals(0)
+        self._silence_threshold_spin_box.set_suffix(" dBFS")
+        self._silence_threshold_spin_box.set_value(self.get_config(
+            "ffmpeg.silence_threshold", default=DEFAULT_SILENCE_THRESHOLD, scope=Section.Root, section=Section.User
+        ))
+        self._silence_threshold_spin_box.valueChanged.connect(self._silence_threshold_spin_box_connect)
+
+        self._silence_duration_spin_box = QDoubleSpinBox()
+        self._silence_duration_spin_box.set_range(0.1, 60.0)
+        self._silence_duration_spin_box.set_single_step(0.5)
+        self._silence_duration_spin_box.set_suffix(" s")
+        self._silence_duration_spin_box.set_value(self.get_config(
+            "ffmpeg.silence_duration", default=DEFAULT_SILENCE_DURATION, scope=Section.Root, section=Section.User
+        ))
+        self._silence_duration_spin_box.valueChanged.connect(self._silence_duration_spin_box_connect)
+
         main_form_layout.add_row(translate("Converter binaries path"), self._ffmpeg_line_edit)
+        main_form_layout.add_row(translate("Default preset"), self._preset_combo_box)
+        main_form_layout.add_row(translate("Workers calibration"), self._calibrate_button)
+        main_form_layout.add_row(translate("Copy network sources locally"), self._staging_check_box)
+        main_form_layout.add_row(translate("Verify converted files"), self._verify_check_box)
+        main_form_layout.add_row(translate("Embed album covers"), self._cover_check_box)
+        main_form_layout.add_row(translate("Silence threshold"), self._silence_threshold_spin_box)
+        main_form_layout.add_row(translate("Minimum silent gap"), self._silence_duration_spin_box)
         self._main_widget.set_layout(main_form_layout)
 
     def _ffmpeg_button_connect(self) -> None:
@@ -96,6 +173,88 @@ class ConverterConfigPage(
             self._ffmpeg_line_edit.set_text(directory_path)
             self.set_modified(True)
 
+    def _preset_combo_box_connect(self, preset_name: str) -> None:
+        self.set_config(
+            scope=Section.Root,
+            section=Section.User,
+            key="ffmpeg.preset",
+            data=preset_name,
+        )
+        self.set_modified(True)
+
+    def _staging_check_box_connect(self, checked: bool) -> None:
+        self.set_config(
+            scope=Section.Root,
+            section=Section.User,
+            key="ffmpeg.stage_network_sources",
+            data=checked,
+        )
+        self.set_modified(True)
+
+    def _verify_check_box_connect(self, checked: bool) -> None:
+        self.set_config(
+            scope=Section.Root,
+            section=Section.User,
+            key="ffmpeg.verify",
+            data=checked,
+        )
+        self.set_modified(True)
+
+    def _cover_check_box_connect(self, checked: bool) -> None:
+        self.set_config(
+            scope=Section.Root,
+            section=Section.User,
+            key="ffmpeg.embed_cover",
+            data=checked,
+        )
+        self.set_modified(True)
+
+    def _silence_threshold_spin_box_connect(self, value: float) -> None:
+        self.set_config(
+            scope=Section.Root,
+            section=Section.User,
+            key="ffmpeg.silence_threshold",
+            data=value,
+        )
+        self.set_modified(True)
+
+    def _silence_duration_spin_box_connect(self, value: float) -> None:
+        self.set_config(
+            scope=Section.Root,
+            section=Section.User,
+            key="ffmpeg.silence_duration",
+            data=value,
+        )
+        self.set_modified(True)
+
+    def _calibrate_button_connect(self) -> None:
+        if self._calibration_thread.is_running():
+            return
+
+        self._calibration_worker.set_ffmpeg_cmd(Path(self.get_config(
+            "ffmpeg.ffmpeg", default="ffmpeg", scope=Section.Root, section=Section.User
+        )))
+        self._calibrate_button.set_disabled(True)
+        self._calibration_thread.start()
+
+    @Slot(dict)
+    def _calibration_done(self, results: dict) -> None:
+        self.set_config(
+            scope=Section.Root,
+            section=Section.User,
+            key="ffmpeg.calibration",
+            data=results,
+        )
+        self.set_modified(True)
+        self._calibrate_button.set_disabled(False)
+        self._calibration_thread.quit()
+
+    @Slot(str)
+    def _calibration_failed(self, message: str) -> None:
+        logger.error(message)
+        self._calibrate_button.set_disabled(False)
+        self._calibration_thread.quit()
+
     def accept(self) -> None:
         self.save_config(scope=Section.Root, section=Section.User)
         self.set_modified(False)
@@ -0,0 +1,197 @@
+import re
+import shutil
+import dataclasses as dt
+from pathlib import Path
+
+from pieapp.api.structs.media import Preset
+from pieapp.helpers.devices import get_device
+from pieapp.helpers.governor import get_calibration_profile
+
+from converter.jobs import ConversionJob
+
+
+# Fallback speeds (audio seconds per wall-clock second per worker) for 44.1kHz stereo sources
+DEFAULT_SPEEDS: dict[str, float] = {
+    "flac": 150.0,
+    "opus": 60.0,
+    "resample": 100.0,
+}
+
+# Compressed size of lossless codecs relative to 16-bit PCM
+LOSSLESS_RATIOS: dict[str, float] = {
+    "flac": 0.6,
+    "alac": 0.6,
+    "wavpack": 0.6,
+}
+
+# Samples per second of the reference 44.1kHz stereo source
+REFERENCE_RATE = 44100 * 2
+
+# Weight of the latest measurement in the throughput history
+HISTORY_WEIGHT = 0.3
+
+# Free space to keep on the target volume in bytes
+FREE_SPACE_MARGIN = 64 * 1024 * 1024
+
+
+@dt.dataclass
+class JobEstimate:
+    # Predicted wall time in seconds
+    wall_time: float
+    # Predicted output size in bytes
+    output_size: int
+
+
+def parse_bit_rate(bit_rate: str) -> int:
+    """
+    Parse ffmpeg bit rate string (e.g. "320k", "1.5M" or "128000") into bits per second
+    """
+    match = re.match(r"^\s*([\d.]+)\s*([kKmM]?)", str(bit_rate or ""))
+    if not match:
+        return 0
+
+    value, suffix = float(match.group(1)), match.group(2).lower()
+    return int(value * {"": 1, "k": 1000, "m": 1000_000}[suffix])
+
+
+def get_pcm_sample_size(codec: str) -> int:
+    """
+    Get PCM sample size in bytes by codec name (e.g. `pcm_s24le`)
+    """
+    match = re.search(r"(\d+)", codec or "")
+    return int(match.group(1)) // 8 if match else 2
+
+
+class CostModel:
+    """
+    Predicts wall time and output size of conversion jobs from probe data
+    and the history of measured throughput per preset on this machine
+    """
+
+    def __init__(self, history: dict = None, calibration: dict = None) -> None:
+        self._history: dict[str, float] = dict(history or {})
+        self._calibration: dict = calibration or {}
+
+    @property
+    def history(self) -> dict[str, float]:
+        return self._history
+
+    def set_calibration(self, calibration: dict) -> None:
+        self._calibration = calibration or {}
+
+    def get_speed(self, preset: Preset) -> float:
+        """
+        Get speed of the single worker in audio seconds per wall-clock second
+        """
+        if self._history.get(preset.name):
+            return self._history[preset.name]
+
+        profile = get_calibration_profile(preset.codec, resample=bool(preset.sample_rate))
+        settings = self._calibration.get(profile) or {}
+        if settings.get("speed") and settings.get("workers"):
+            return settings["speed"] / settings["workers"]
+
+        return DEFAULT_SPEEDS[profile]
+
+    def estimate(self, job: ConversionJob) -> JobEstimate:
+        info = job.media_file.info
+        preset = job.preset
+        duration = float(info.duration or 0)
+        sample_rate = float(info.sample_rate or 44100)
+        channels = int(info.channels or 2)
+
+        # Decoding and filtering cost scales with the number of source samples
+        wall_time = duration / self.get_speed(preset) * (sample_rate * channels / REFERENCE_RATE)
+
+        output_rate = float(preset.sample_rate or sample_rate)
+        output_channels = int(preset.channels or channels)
+
+        if preset.bit_rate:
+            output_size = parse_bit_rate(preset.bit_rate) * duration / 8
+        elif preset.codec.startswith("pcm_"):
+            output_size = output_rate * output_channels * get_pcm_sample_size(preset.codec) * duration
+        elif preset.codec in LOSSLESS_RATIOS:
+            output_size = output_rate * output_channels * 2 * duration * LOSSLESS_RATIOS[preset.codec]
+        else:
+            output_size = parse_bit_rate(info.bit_rate) * duration / 8
+
+        return JobEstimate(wall_time=wall_time, output_size=int(output_size))
+
+    def record(self, job: ConversionJob, elapsed: float) -> None:
+        """
+        Record measured job throughput into the preset history
+        """
+        duration = float(job.media_file.info.duration or 0)
+        if duration <= 0 or elapsed <= 0:
+            return
+
+        sample_rate = float(job.media_file.info.sample_rate or 44100)
+        channels = int(job.media_file.info.channels or 2)
+        speed = duration / elapsed * (sample_rate * channels / REFERENCE_RATE)
+
+        previous = self._history.get(job.preset.name)
+        self._history[job.preset.name] = speed if not previous else (
+            previous * (1 - HISTORY_WEIGHT) + speed * HISTORY_WEIGHT
+        )
+
+    def sort(self, jobs: list[ConversionJob], longest_first: bool = True) -> list[ConversionJob]:
+        """
+        Sort jobs longest-first to minimize the batch makespan
+        or shortest-first for interactive batches
+        """
+        return sorted(jobs, key=lambda j: self.estimate(j).wall_time, reverse=longest_first)
+
+    def estimate_batch_time(self, jobs: list[ConversionJob], workers: int = 1) -> float:
+        """
+        Estimate batch makespan by simulating the longest-first assignment to workers
+        """
+        finish_times = [0.0] * max(1, workers)
+        for wall_time in sorted((self.estimate(j).wall_time for j in jobs), reverse=True):
+            index = finish_times.index(min(finish_times))
+            finish_times[index] += wall_time
+
+        return max(finish_times)
+
+    def estimate_batch_size(self, jobs: list[ConversionJob]) -> int:
+        return sum(self.estimate(j).output_size for j in jobs)
+
+    @staticmethod
+    def _get_existing(path: Path) -> Path:
+        # Output folders are created by the workers
+        while not path.exists() and path.parent != path:
+            path = path.parent
+
+        return path
+
+    @staticmethod
+    def get_free_space(path: Path) -> int:
+        return shutil.disk_usage(CostModel._get_existing(path)).free
+
+    @staticmethod
+    def get_volume(path: Path) -> int:
+        """
+        Get device id of the volume the output folder or file will be on
+        """
+        return get_device(CostModel._get_existing(path))
+
+    def fits(self, path: Path, size: int, reserved: int = 0) -> bool:
+        """
+        Check whether the output of the given size fits on the volume of the path,
+        keeping `FREE_SPACE_MARGIN` free. The batch check and the job admission use the same predicate
+
+        Args:
+            path (Path): output folder or file
+            size (int): predicted output size in bytes
+            reserved (int): bytes reserved by the running jobs on the same volume
+        """
+        return size <= self.get_free_space(path) - reserved - FREE_SPACE_MARGIN
+
+    def can_admit(self, job: ConversionJob, reserved: int = 0) -> bool:
+        """
+        Check whether the predicted job output fits on the target volume
+
+        Args:
+            job (ConversionJob): job to admit
+            reserved (int): bytes reserved by the running jobs on the same volume
+        """
+        return self.fits(job.output_path.parent, self.estimate(job).output_size, reserved)
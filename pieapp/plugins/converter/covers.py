@@ -0,0 +1,159 @@
+from __feature__ import snake_case
+
+import os
+import hashlib
+import threading
+import dataclasses as dt
+from pathlib import Path
+from typing import Optional
+from concurrent.futures import Future
+
+from PySide6.QtCore import Qt
+from PySide6.QtCore import QBuffer
+from PySide6.QtCore import QByteArray
+from PySide6.QtGui import QImage
+from PySide6.QtGui import QImageReader
+
+from pieapp.api.structs.media import MediaFile
+from pieapp.helpers.files import get_partial_path
+from pieapp.helpers.logger import logger
+
+
+# Cover images looked up next to the source when it has no embedded cover
+COVER_FILE_NAMES: tuple[str] = (
+    "cover.jpg", "cover.png", "folder.jpg", "folder.png", "front.jpg", "front.png",
+)
+
+# Image format names by `CoverSpec.format`
+COVER_FORMATS: dict[str, tuple[str, str]] = {
+    "jpeg": ("JPEG", ".jpg"),
+    "png": ("PNG", ".png"),
+}
+
+
+@dt.dataclass
+class CoverSpec:
+    # Maximum width and height in pixels
+    max_size: int = dt.field(default=600)
+    # Image format: "jpeg" or "png"
+    format: str = dt.field(default="jpeg")
+    # Compression quality from 0 to 100
+    quality: int = dt.field(default=90)
+
+    def __post_init__(self) -> None:
+        if self.format not in COVER_FORMATS:
+            raise ValueError(f"Unknown cover format \"{self.format}\", expected one of {', '.join(COVER_FORMATS)}")
+        if int(self.max_size) <= 0:
+            raise ValueError(f"Cover size must be positive, got {self.max_size}")
+        if not 0 <= int(self.quality) <= 100:
+            raise ValueError(f"Cover quality must be from 0 to 100, got {self.quality}")
+
+    @property
+    def extension(self) -> str:
+        return COVER_FORMATS[self.format][1]
+
+
+def find_cover(media_file: MediaFile) -> Optional[Path]:
+    """
+    Get the embedded cover extracted on probing or the cover image from the source folder
+    """
+    album_cover = media_file.metadata.album_cover if media_file.metadata else None
+    if album_cover and album_cover.image_path and album_cover.image_path.exists():
+        return album_cover.image_path
+
+    if media_file.info.path:
+        for file_name in COVER_FILE_NAMES:
+            cover_path = media_file.info.path.parent / file_name
+            if cover_path.exists():
+                return cover_path
+
+    return None
+
+
+class CoverPreparer:
+    """
+    Prepares every distinct cover once by its content hash. Tracks of the same album share
+    the prepared image, and the workers that need a cover being prepared wait for it.
+    Safe to use from the worker threads
+    """
+
+    def __init__(self, folder: Path, spec: CoverSpec = None) -> None:
+        self._folder = Path(folder)
+        self._folder.mkdir(parents=True, exist_ok=True)
+        self._spec = spec or CoverSpec()
+        self._lock = threading.Lock()
+        self._futures: dict[str, Future] = {}
+
+    @property
+    def spec(self) -> CoverSpec:
+        return self._spec
+
+    def prepare(self, image_path: Path) -> Optional[Path]:
+        """
+        Resize and recompress the image by the spec
+
+        Returns:
+            path (Path|None): prepared image path or `None` if the image can't be read
+
+        Raises:
+            Exception: the unexpected preparation error, raised in every thread waiting for the cover
+        """
+        data = image_path.read_bytes()
+        digest = hashlib.blake2b(data, digest_size=16)
+        digest.update(repr(self._spec).encode("utf-8"))
+        key = digest.hexdigest()
+
+        with self._lock:
+            future = self._futures.get(key)
+            is_owner = future is None
+            if is_owner:
+                future = self._futures[key] = Future()
+
+        if is_owner:
+            try:
+                future.set_result(self._prepare(data, key))
+            except OSError as e:
+                logger.error(f"Cover {image_path} wasn't prepared: {e!s}")
+                future.set_result(None)
+            except BaseException as e:
+                # The waiting workers must not block on the future forever
+                future.set_exception(e)
+
+        return future.result()
+
+    def _prepare(self, data: bytes, key: str) -> Optional[Path]:
+        cover_path = self._folder / f"{key}{self._spec.extension}"
+        if cover_path.exists():
+            return cover_path
+
+        buffer = QBuffer()
+        buffer.set_data(QByteArray(data))
+        reader = QImageReader(buffer)
+        size = reader.size()
+        image_format = bytes(reader.format()).decode().lower().replace("jpg", "jpeg")
+        partial_path = get_partial_path(cover_path)
+
+        if image_format == self._spec.format and max(size.width(), size.height()) <= self._spec.max_size:
+            # Keep the original bytes to avoid recompression losses
+            partial_path.write_bytes(data)
+        else:
+            if max(size.width(), size.height()) > self._spec.max_size:
+                reader.set_scaled_size(size.scaled(
+                    self._spec.max_size,
+                    self._spec.max_size,
+                    Qt.AspectRatioMode.KeepAspectRatio
+                ))
+
+            image = reader.read()
+            if image.is_null():
+                logger.debug(f"Cover image can't be read: {reader.error_string()}")
+                return None
+
+            if self._spec.format == "jpeg":
+                image = image.convert_to_format(QImage.Format.Format_RGB888)
+
+            if not image.save(partial_path.as_posix(), COVER_FORMATS[self._spec.format][0], self._spec.quality):
+                raise OSError(f"Can't write {partial_path}")
+
+        os.replace(partial_path, cover_path)
+        return cover_path
@@ -0,0 +1,87 @@
+"""
+Lowpass cutoff estimation. Lossy encoders drop the highest frequencies with a steep
+edge, so a lossless file cut at e.g. 16 kHz was likely transcoded from a lossy source.
+The module doesn't import Qt, so the analysis worker processes import it quickly
+"""
+from typing import Optional
+
+import numpy as np
+
+from pieapp.api.structs.media import MediaFile
+from pieapp.helpers.analyzers import Analyzer
+from pieapp.helpers.stft import estimate_cutoff
+from pieapp.helpers.stft import get_power_spectra
+
+from converter.acoustic import is_lossless
+
+# Frame size of the long-term spectrum. Frames don't overlap, the spectrum is averaged anyway
+CUTOFF_FFT_SIZE = 4096
+
+# Cutoffs in Hz expected of the lossless files and of the lossy files at the high bit rates.
+# Files with a lower steep cutoff are suspicious
+LOSSLESS_MIN_CUTOFF = 19000.0
+HIGH_BIT_RATE_MIN_CUTOFF = 17500.0
+
+# Lossy bit rate in b/s, as ffprobe reports it, from which the full band is expected
+HIGH_BIT_RATE = 256000
+
+# Share of the Nyquist frequency expected at the low sample rates
+NYQUIST_SHARE = 0.9
+
+
+class CutoffAnalyzer(Analyzer):
+    """
+    Mean power spectrum of the mono signal. Only the power sums
+    and the rest of the block are kept in the state
+    """
+    name = "cutoff"
+
+    def start(self, sample_rate: int, channels: int) -> dict:
+        return {
+            "sample_rate": sample_rate,
+            "pending": np.zeros(0, dtype=np.float32),
+            "power": np.zeros(CUTOFF_FFT_SIZE // 2 + 1, dtype=np.float64),
+            "frames": 0,
+        }
+
+    def process(self, state: dict, block: np.ndarray) -> dict:
+        state = dict(state)
+        samples = np.concatenate((state["pending"], block.mean(axis=0)))
+        spectra, consumed = get_power_spectra(samples, CUTOFF_FFT_SIZE, CUTOFF_FFT_SIZE)
+        state["pending"] = samples[consumed:].copy()
+        state["power"] = state["power"] + spectra.sum(axis=0, dtype=np.float64)
+        state["frames"] += len(spectra)
+        return state
+
+    def finish(self, state: dict) -> dict:
+        return estimate_cutoff(state["power"] / max(state["frames"], 1), state["sample_rate"])
+
+
+def get_expected_cutoff(media_file: MediaFile, nyquist: float) -> Optional[float]:
+    """
+    Get the lowest cutoff in Hz expected of the file, or `None` if a low cutoff is normal for it
+    """
+    if is_lossless(media_file):
+        expected = LOSSLESS_MIN_CUTOFF
+    elif int(float(media_file.info.bit_rate or 0)) >= HIGH_BIT_RATE:
+        expected = HIGH_BIT_RATE_MIN_CUTOFF
+    else:
+        return None
+
+    return min(expected, nyquist * NYQUIST_SHARE)
+
+
+def is_suspicious(media_file: MediaFile, result: dict) -> bool:
+    """
+    Check whether the file has a cutoff below the one expected of its codec and bit rate.
+    `estimate_cutoff` reports only the steep edges, a gradual roll-off is at the Nyquist frequency
+
+    Args:
+        media_file (MediaFile): analyzed file
+        result (dict): `CutoffAnalyzer` result, or the cutoff of a spectrogram
+    """
+    if not result or result.get("cutoff") is None:
+        return False
+
+    expected = get_expected_cutoff(media_file, result["nyquist"])
+    return expected is not None and result["cutoff"] < expected
@@ -0,0 +1,444 @@
+"""
+Non-destructive edits. The edit decision list of a file is stored by its audio hash,
+apart from the source, and compiled into a single `filter_complex` at the export,
+so any number of edits costs one encoding. Previews of short regions are cached by the list hash
+"""
+import os
+import json
+import math
+import hashlib
+import dataclasses as dt
+from pathlib import Path
+from typing import Optional
+
+import ffmpeg
+
+from pieapp.api.structs.media import Edit
+from pieapp.api.structs.media import EditType
+from pieapp.api.structs.media import MediaFile
+from pieapp.api.structs.media import ChannelOperation
+from pieapp.helpers.ffmpeg import run_with_progress
+from pieapp.helpers.files import read_json
+from pieapp.helpers.files import get_partial_path
+from pieapp.helpers.hashing import get_audio_hash
+from pieapp.helpers.logger import logger
+
+# Stored lists of other versions are ignored
+EDITS_VERSION = 1
+
+# Filters of the channel operations, the channels they output and the source channels they apply to,
+# 0 for any. Operations on other sources are skipped, e.g. a mono source isn't downmixed again
+CHANNEL_FILTERS: dict[str, tuple[str, int, int]] = {
+    ChannelOperation.Swap: ("pan=stereo|c0=c1|c1=c0", 2, 2),
+    ChannelOperation.Mono: ("pan=mono|c0=0.5*c0+0.5*c1", 1, 2),
+    ChannelOperation.Left: ("pan=mono|c0=c0", 1, 2),
+    ChannelOperation.Right: ("pan=mono|c0=c1", 1, 2),
+    ChannelOperation.Stereo: ("pan=stereo|c0=c0|c1=c0", 2, 1),
+    ChannelOperation.Invert: ("aeval=exprs=-val(ch):channel_layout=same", 0, 0),
+}
+
+# Channel layouts of the inserted clips by the number of channels
+CHANNEL_LAYOUTS: dict[int, str] = {1: "mono", 2: "stereo"}
+
+# Label of the edited audio in the compiled graph
+OUTPUT_LABEL = "out"
+
+# Preview codec and the number of the cached previews
+PREVIEW_CODEC = "pcm_s16le"
+PREVIEW_CACHE_FILES = 64
+
+
+class EditStore:
+    """
+    Edit decision lists stored as `<audio hash>.json`, so they follow the audio through renames and retagging
+    """
+
+    def __init__(self, folder: Path) -> None:
+        self._folder = Path(folder)
+
+    def get(self, audio_hash: str) -> list[Edit]:
+        stored = read_json(self._folder / f"{audio_hash}.json", default={}, raise_exception=False)
+        if stored.get("version") != EDITS_VERSION:
+            return []
+
+        try:
+            return [_edit_from_dict(data) for data in stored.get("edits", [])]
+        except (TypeError, ValueError) as e:
+            logger.error(f"Edits of {audio_hash} are invalid: {e!s}")
+            return []
+
+    def put(self, audio_hash: str, edits: list[Edit]) -> None:
+        """
+        Store the list. An empty list removes the stored one
+        """
+        edits_path = self._folder / f"{audio_hash}.json"
+        if not edits:
+            edits_path.unlink(missing_ok=True)
+            return
+
+        self._folder.mkdir(parents=True, exist_ok=True)
+        partial_path = get_partial_path(edits_path)
+        partial_path.write_text(
+            json.dumps({"version": EDITS_VERSION, "edits": [edit.as_dict() for edit in edits]}),
+            encoding="utf-8"
+        )
+        os.replace(partial_path, edits_path)
+
+
+def _edit_from_dict(data: dict) -> Edit:
+    edit = Edit(**data)
+    edit.clip_path = Path(edit.clip_path) if edit.clip_path else None
+    return edit
+
+
+def get_edits_hash(media_file: MediaFile) -> str:
+    """
+    Get the hash of the source audio with its edits. Inserted clips are identified by their size and modification time
+    """
+    edits = []
+    for edit in media_file.edits:
+        data = edit.as_dict()
+        if edit.clip_path:
+            stat = os.stat(edit.clip_path)
+            data["clip"] = [stat.st_size, stat.st_mtime_ns]
+        edits.append(data)
+
+    audio_hash = media_file.audio_hash or get_audio_hash(media_file.info.path)
+    payload = json.dumps([EDITS_VERSION, audio_hash, edits], sort_keys=True)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=20).hexdigest()
+
+
+def get_pieces(edits: list[Edit], duration: Optional[float]) -> list[tuple]:
+    """
+    Get the output as the kept regions of the source and the inserted clips in order.
+    Clips inserted into a cut region are placed at the cut
+
+    Args:
+        edits (list[Edit]): edit decision list
+        duration (float|None): source duration in seconds. Sources of unknown duration are open-ended
+
+    Returns:
+        pieces (list[tuple]): `("source", start, end)` with `None` end for the end of the file, or `("clip", edit)`
+    """
+    end_of_file = duration or math.inf
+    cuts = sorted(
+        (min(edit.start, end_of_file), end_of_file if edit.end is None else min(edit.end, end_of_file))
+        for edit in edits if edit.type == EditType.Cut
+    )
+    kept, position = [], 0.0
+    for start, end in cuts:
+        if start > position:
+            kept.append((position, start))
+        position = max(position, end)
+    if position < end_of_file:
+        kept.append((position, None))
+
+    inserts = sorted((edit for edit in edits if edit.type == EditType.Insert), key=lambda edit: edit.start)
+    pieces, index = [], 0
+    for start, end in kept:
+        while index < len(inserts) and inserts[index].start <= start:
+            pieces.append(("clip", inserts[index]))
+            index += 1
+
+        position = start
+        while index < len(inserts) and (end is None or inserts[index].start < end):
+            pieces.append(("source", position, inserts[index].start))
+            pieces.append(("clip", inserts[index]))
+            position = inserts[index].start
+            index += 1
+        pieces.append(("source", position, end))
+
+    pieces += [("clip", edit) for edit in inserts[index:]]
+    return pieces
+
+
+def get_region_pieces(pieces: list[tuple], duration: Optional[float], start: float, length: float) -> Optional[list[tuple]]:
+    """
+    Cut the pieces to a region of the edited output
+
+    Args:
+        pieces (list[tuple]): pieces of the output, see `get_pieces`
+        duration (float|None): source duration in seconds, `None` if unknown
+        start (float): region start in seconds of the edited output
+        length (float): region duration in seconds
+
+    Returns:
+        pieces (list[tuple]|None): pieces of the region, or `None` if a piece of unknown length
+            is followed by others before the region end
+    """
+    end = start + length
+    region, position = [], 0.0
+    for index, piece in enumerate(pieces):
+        if position >= end:
+            break
+
+        if piece[0] == "source":
+            piece_start, piece_end = piece[1], duration if piece[2] is None else piece[2]
+        else:
+            piece_start, piece_end = piece[1].clip_start, piece[1].clip_end
+        if piece_end is None and index < len(pieces) - 1:
+            return None
+
+        piece_length = math.inf if piece_end is None else piece_end - piece_start
+        first, last = max(start - position, 0.0), min(end - position, piece_length)
+        if last > first:
+            if piece[0] == "source":
+                region.append(("source", piece_start + first, piece_start + last))
+            else:
+                region.append(("clip", dt.replace(piece[1], clip_start=piece_start + first, clip_end=piece_start + last)))
+        position += piece_length
+
+    return region
+
+
+def get_seek(edits: list[Edit], pieces: list[tuple]) -> float:
+    """
+    Get the source time the input can be seeked to before the pieces: the first kept sample,
+    or the start of a fade that still changes the audio there
+    """
+    starts = [piece[1] for piece in pieces if piece[0] == "source"]
+    if not starts:
+        return 0.0
+
+    seek = min(starts)
+    fades = [edit for edit in edits if edit.type in (EditType.FadeIn, EditType.FadeOut)]
+    is_changed = True
+    while is_changed:
+        is_changed = False
+        for edit in fades:
+            # The audio after a fade-out stays silent, the audio after a fade-in isn't changed
+            if edit.start < seek and (edit.type == EditType.FadeOut or edit.end is None or edit.end > seek):
+                seek, is_changed = edit.start, True
+
+    return seek
+
+
+def get_edited_duration(media_file: MediaFile) -> Optional[float]:
+    """
+    Get the duration of the edited output, or `None` if the source duration is unknown
+    or an inserted clip has no end
+    """
+    duration = float(media_file.info.duration or 0) or None
+    total = 0.0
+    for piece in get_pieces(media_file.edits, duration):
+        if piece[0] == "source":
+            _, start, end = piece
+            if end is None and duration is None:
+                return None
+            total += (duration if end is None else end) - start
+        elif piece[1].clip_end is None:
+            return None
+        else:
+            total += piece[1].clip_end - piece[1].clip_start
+
+    return total
+
+
+def compile_edits(
+    media_file: MediaFile,
+    filters: list[str] = None,
+    pieces: list[tuple] = None,
+    offset: float = 0.0
+) -> str:
+    """
+    Compile the edits into a `filter_complex` graph of the first input. Channel operations,
+    gains and fades are applied on the source timeline, then the kept regions and the clips
+    are concatenated. The output is labeled `OUTPUT_LABEL`
+
+    Args:
+        media_file (MediaFile): file with the edits
+        filters (list[str]|None): filters applied to the edited audio, e.g. the preset ones
+        pieces (list[tuple]|None): pieces to compile, all the pieces of the edits by default (see `get_pieces`)
+        offset (float): source time the input is seeked to, see `get_seek`
+
+    Returns:
+        graph (str): filter graph
+
+    Raises:
+        ValueError: the edits cut the whole file, or a fade to the end of the file has no duration
+    """
+    edits = media_file.edits
+    duration = float(media_file.info.duration or 0) or None
+    channels = int(media_file.info.channels or 2)
+
+    chain = []
+    for edit in edits:
+        if edit.type == EditType.Channels:
+            channel_filter, output_channels, source_channels = CHANNEL_FILTERS[edit.channels]
+            if source_channels and source_channels != channels:
+                continue
+            chain.append(channel_filter)
+            channels = output_channels or channels
+    for edit in edits:
+        if edit.type == EditType.Gain:
+            enable = "" if edit.start <= offset and edit.end is None else f":enable='{_get_between(edit, offset)}'"
+            chain.append(f"volume=volume={edit.gain:.2f}dB{enable}")
+        elif edit.type in (EditType.FadeIn, EditType.FadeOut):
+            if edit.type == EditType.FadeIn and edit.end is not None and edit.end <= offset:
+                # The seeked input starts after the fade-in
+                continue
+
+            end = duration if edit.end is None else edit.end
+            if end is None:
+                raise ValueError("A fade to the end of the file needs the file duration")
+
+            fade = "in" if edit.type == EditType.FadeIn else "out"
+            chain.append(
+                f"afade=t={fade}:st={_format_time(edit.start - offset)}:d={_format_time(end - edit.start)}"
+                f":curve={edit.curve}"
+            )
+
+    pieces = [
+        piece for piece in (get_pieces(edits, duration) if pieces is None else pieces)
+        if piece[0] == "clip" or piece[2] is None or piece[2] > piece[1]
+    ]
+    regions = [piece for piece in pieces if piece[0] == "source"]
+    if not pieces:
+        raise ValueError("The edits cut the whole file")
+
+    tail = ",".join(filters or []) or None
+    if len(pieces) == 1 and regions:
+        if regions[0][1] > offset or regions[0][2] is not None:
+            chain.append(_get_trim(regions[0][1], regions[0][2], offset))
+        # Skipped channel operations can leave nothing to apply
+        return f"[0:a]{','.join(filter(None, chain + [tail])) or 'anull'}[{OUTPUT_LABEL}]"
+
+    graph = []
+    if regions:
+        split = f"asplit={len(regions)}" + "".join(f"[s{index}]" for index in range(len(regions)))
+        graph.append(f"[0:a]{','.join(chain + [split])}")
+
+    labels, region_index = [], 0
+    sample_rate = int(float(media_file.info.sample_rate or 0))
+    clip_format = ":".join(filter(None, (
+        f"sample_rates={sample_rate}" if sample_rate else None,
+        f"channel_layouts={CHANNEL_LAYOUTS[channels]}" if channels in CHANNEL_LAYOUTS else None,
+    )))
+    for index, piece in enumerate(pieces):
+        if piece[0] == "source":
+            graph.append(f"[s{region_index}]{_get_trim(piece[1], piece[2], offset)}[p{index}]")
+            region_index += 1
+        else:
+            clip = piece[1]
+            # Clips are loaded in the graph, so the output has a single input and no default maps
+            clip_chain = [
+                f"amovie=filename={_escape_value(Path(clip.clip_path).as_posix())}",
+                _get_trim(clip.clip_start, clip.clip_end),
+                f"aformat={clip_format}" if clip_format else None,
+            ]
+            graph.append(f"{','.join(filter(None, clip_chain))}[p{index}]")
+        labels.append(f"[p{index}]")
+
+    concat = f"concat=n={len(pieces)}:v=0:a=1"
+    graph.append(f"{''.join(labels)}{','.join(filter(None, [concat, tail]))}[{OUTPUT_LABEL}]")
+    return ";".join(graph)
+
+
+def _format_time(seconds: float) -> str:
+    return f"{seconds:.6f}".rstrip("0").rstrip(".")
+
+
+def _get_between(edit: Edit, offset: float = 0.0) -> str:
+    if edit.end is None:
+        return f"gte(t,{_format_time(edit.start - offset)})"
+
+    return f"between(t,{_format_time(edit.start - offset)},{_format_time(edit.end - offset)})"
+
+
+def _get_trim(start: float, end: Optional[float], offset: float = 0.0) -> str:
+    bounds = f"start={_format_time(start - offset)}" + (f":end={_format_time(end - offset)}" if end is not None else "")
+    return f"atrim={bounds},asetpts=PTS-STARTPTS"
+
+
+def _escape_value(value: str) -> str:
+    # Option value escaping, then the filter graph escaping
+    for special in ("\\':", "\\'[],;"):
+        for char in special:
+            value = value.replace(char, f"\\{char}")
+    return value
+
+
+def get_edited_stream(
+    source,
+    media_file: MediaFile,
+    output_path: Path,
+    filters: list[str] = None,
+    pieces: list[tuple] = None,
+    offset: float = 0.0,
+    **options
+):
+    """
+    Get the ffmpeg-python output stream of the edited first input
+
+    Args:
+        source: ffmpeg-python input of the source
+        media_file (MediaFile): file with the edits
+        output_path (Path): output file
+        filters (list[str]|None): filters applied to the edited audio. `-af` can't be used with the graph
+        pieces (list[tuple]|None): pieces to compile, see `compile_edits`
+        offset (float): source time the input is seeked to
+        options: output options
+    """
+    return source.output(
+        output_path.as_posix(),
+        filter_complex=compile_edits(media_file, filters, pieces, offset),
+        map=f"[{OUTPUT_LABEL}]",
+        **options
+    )
+
+
+def render_preview(ffmpeg_cmd: Path, media_file: MediaFile, start: float, duration: float, folder: Path) -> Path:
+    """
+    Render a region of the edited output into a WAV file. Only the region is compiled, and the source
+    is seeked to its first sample. Renders are cached by the edits hash and the region
+
+    Args:
+        ffmpeg_cmd (Path): ffmpeg binary path
+        media_file (MediaFile): file with the edits
+        start (float): region start in seconds of the edited output
+        duration (float): region duration in seconds
+        folder (Path): previews folder
+
+    Returns:
+        preview_path (Path): rendered WAV file
+
+    Raises:
+        ffmpeg.Error: the file can't be rendered
+        ValueError: the edits cut the whole region
+    """
+    folder = Path(folder)
+    preview_path = folder / f"{get_edits_hash(media_file)}-{_format_time(start)}-{_format_time(duration)}.wav"
+    if preview_path.exists():
+        os.utime(preview_path)
+        return preview_path
+
+    media_duration = float(media_file.info.duration or 0) or None
+    pieces = get_region_pieces(get_pieces(media_file.edits, media_duration), media_duration, start, duration)
+    if pieces is None:
+        # The position of the region is unknown before the length of a clip, the output is rendered from the start
+        source = ffmpeg.input(Path(media_file.info.path).as_posix())
+        options = {"filters": [_get_trim(start, start + duration)]}
+        decoded = start + duration
+    else:
+        seek = get_seek(media_file.edits, pieces)
+        source = ffmpeg.input(Path(media_file.info.path).as_posix(), **({"ss": _format_time(seek)} if seek else {}))
+        options = {"pieces": pieces, "offset": seek}
+        decoded = duration
+
+    folder.mkdir(parents=True, exist_ok=True)
+    partial_path = get_partial_path(preview_path)
+    stream = get_edited_stream(source, media_file, partial_path, acodec=PREVIEW_CODEC, f="wav", **options)
+    try:
+        run_with_progress(stream, ffmpeg_cmd, duration=decoded)
+        os.replace(partial_path, preview_path)
+    finally:
+        partial_path.unlink(missing_ok=True)
+
+    _prune_previews(folder)
+    return preview_path
+
+
+def _prune_previews(folder: Path) -> None:
+    previews = sorted(folder.glob("*.wav"), key=lambda path: path.stat().st_mtime, reverse=True)
+    for preview_path in previews[PREVIEW_CACHE_FILES:]:
+        preview_path.unlink(missing_ok=True)
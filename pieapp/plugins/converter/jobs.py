@@ -0,0 +1,50 @@
+import dataclasses as dt
+from pathlib import Path
+from typing import Union
+
+from pieapp.api.structs.media import Preset
+from pieapp.api.structs.media import MediaFile
+from pieapp.helpers.supervisor import Supervisor
+from pieapp.helpers.supervisor import TaskSupervisor
+
+
+class JobPriority:
+    # Quick jobs started by user that must not wait for the batch
+    Interactive = 0
+    # Batch jobs
+    Background = 1
+
+
+@dt.dataclass
+class VerificationResult:
+    passed: bool
+    # Decoded duration of the output in seconds
+    duration: float = dt.field(default=0.0)
+    checksum: str = dt.field(default=None)
+    message: str = dt.field(default=None)
+
+
+@dt.dataclass(eq=False)
+class ConversionJob:
+    media_file: MediaFile
+    preset: Preset
+    output_path: Path
+    threads: int = dt.field(default=1)
+    priority: int = dt.field(default=JobPriority.Background)
+    # Source device id (`st_dev`)
+    device: int = dt.field(default=-1)
+    # Local copy of the source from a slow volume
+    staging_path: Path = dt.field(default=None)
+    # Whether the job is converted without ffmpeg. Set by the scheduler when the native backend is preferred
+    # and cleared by the worker unless both ends are uncompressed
+    native: bool = dt.field(default=False)
+    # Whether the output was materialized from the transcode cache
+    cached: bool = dt.field(default=False)
+    # Audio payload hash of the source. Set by the worker when it's computed
+    audio_hash: str = dt.field(default=None)
+    verification: VerificationResult = dt.field(default=None)
+    supervisor: Union[Supervisor, TaskSupervisor] = dt.field(default=None, repr=False)
+
+    @property
+    def source_path(self) -> Path:
+        return self.media_file.info.path
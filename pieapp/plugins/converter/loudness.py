@@ -0,0 +1,299 @@
+"""
+EBU R128 loudness (ITU-R BS.1770-4). Gating blocks are kept as a histogram of energies,
+so the album loudness is computed from the track results without decoding again.
+The module doesn't import Qt, so the analysis worker processes import it quickly
+"""
+import functools
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from pieapp.api.structs.media import Preset
+from pieapp.api.structs.media import MediaFile
+from pieapp.helpers.analyzers import Analyzer
+from pieapp.helpers.analyzers import TruePeakAnalyzer
+from pieapp.helpers.analyzers import MIN_DB
+from pieapp.helpers.analyzers import to_db
+
+# Step of the gating blocks in seconds. Momentary blocks are 4 steps, short-term ones are 30
+GATE_STEP = 0.1
+MOMENTARY_STEPS = 4
+SHORT_TERM_STEPS = 30
+
+# Gates in LUFS and LU
+ABSOLUTE_GATE = -70.0
+RELATIVE_GATE = -10.0
+RANGE_RELATIVE_GATE = -20.0
+
+# Loudness range percentiles
+RANGE_PERCENTILES = (0.10, 0.95)
+
+# Histogram of the gating blocks: 0.1 LU bins from the absolute gate
+HISTOGRAM_STEP = 0.1
+HISTOGRAM_BINS = 800
+
+# Reference levels of the gain tags in LUFS
+REPLAYGAIN_REFERENCE = -18.0
+R128_REFERENCE = -23.0
+
+# Analyzers needed for the gain tags and the normalization
+LOUDNESS_ANALYZERS: tuple[str] = ("loudness", "true_peak")
+
+# Extensions that get `R128_*` gain tags (RFC 7845). Others get `REPLAYGAIN_*` ones
+R128_EXTENSIONS: tuple[str] = (".opus",)
+
+
+def _get_biquad_response(b: tuple, a: tuple, z: np.ndarray) -> np.ndarray:
+    return (b[0] + b[1] / z + b[2] / z ** 2) / (a[0] + a[1] / z + a[2] / z ** 2)
+
+
+def _get_k_weighting_taps(sample_rate: int) -> int:
+    # The high-pass response decays below 1e-7 of its peak within ~85 ms
+    return 1 << int(np.ceil(np.log2(sample_rate / 12)))
+
+
+@functools.lru_cache(maxsize=8)
+def _get_k_weighting(sample_rate: int, size: int) -> np.ndarray:
+    """
+    Get the spectrum of the K-weighting filter for the FFT size. The shelving and high-pass
+    stages are turned into a FIR filter that is long enough for their response to decay
+    """
+    taps = _get_k_weighting_taps(sample_rate)
+    z = np.exp(2j * np.pi * np.arange(taps // 2 + 1) / taps)
+
+    # High shelf
+    gain, q, frequency = 3.999843853973347, 0.7071752369554196, 1681.974450955533
+    k = np.tan(np.pi * frequency / sample_rate)
+    vh = 10 ** (gain / 20)
+    vb = vh ** 0.4996667741545416
+    a0 = 1 + k / q + k * k
+    shelf = _get_biquad_response(
+        ((vh + vb * k / q + k * k) / a0, 2 * (k * k - vh) / a0, (vh - vb * k / q + k * k) / a0),
+        (1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0),
+        z
+    )
+
+    # High-pass
+    q, frequency = 0.5003270373238773, 38.13547087602444
+    k = np.tan(np.pi * frequency / sample_rate)
+    a0 = 1 + k / q + k * k
+    high_pass = _get_biquad_response(
+        (1.0, -2.0, 1.0),
+        (1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0),
+        z
+    )
+
+    kernel = np.fft.irfft(shelf * high_pass, taps)
+    return np.fft.rfft(kernel, size)
+
+
+def _get_loudness(energy: np.ndarray) -> np.ndarray:
+    with np.errstate(divide="ignore"):
+        return -0.691 + 10 * np.log10(energy)
+
+
+class LoudnessAnalyzer(Analyzer):
+    """
+    Integrated loudness, loudness range and the gating histogram. The K-weighting
+    is applied as an FFT convolution, and the blocks are summed in 100 ms steps
+    """
+    name = "loudness"
+
+    def start(self, sample_rate: int, channels: int) -> dict:
+        return {
+            "sample_rate": sample_rate,
+            "tail": np.zeros((channels, _get_k_weighting_taps(sample_rate) - 1), dtype=np.float32),
+            # Power of the samples after the last full step
+            "pending": np.zeros(0, dtype=np.float64),
+            # Energy of the last steps that the next blocks overlap
+            "steps": np.zeros(0, dtype=np.float64),
+            "counts": np.zeros(HISTOGRAM_BINS, dtype=np.int64),
+            "energies": np.zeros(HISTOGRAM_BINS, dtype=np.float64),
+            "short_term_counts": np.zeros(HISTOGRAM_BINS, dtype=np.int64),
+            "short_term_energies": np.zeros(HISTOGRAM_BINS, dtype=np.float64),
+        }
+
+    def process(self, state: dict, block: np.ndarray) -> dict:
+        state = dict(state)
+        samples = block.shape[1]
+        tail = state["tail"]
+        size = 1 << int(np.ceil(np.log2(samples + tail.shape[1] + 1)))
+        spectrum = _get_k_weighting(state["sample_rate"], size)
+
+        # Overlap-add: the convolution tail carries over to the next block
+        filtered = np.fft.irfft(np.fft.rfft(block, size, axis=1) * spectrum, size, axis=1)
+        filtered = filtered[:, :samples + tail.shape[1]]
+        filtered[:, :tail.shape[1]] += tail
+        state["tail"] = filtered[:, samples:].astype(np.float32)
+
+        power = np.concatenate((state["pending"], np.einsum("ij,ij->j", filtered[:, :samples], filtered[:, :samples])))
+        step_size = max(1, round(state["sample_rate"] * GATE_STEP))
+        full = len(power) // step_size * step_size
+        state["pending"] = power[full:].copy()
+        if not full:
+            return state
+
+        history = state["steps"]
+        steps = np.concatenate((history, power[:full].reshape(-1, step_size).sum(axis=1)))
+        cumulative = np.concatenate(([0.0], np.cumsum(steps)))
+        for window, prefix in ((MOMENTARY_STEPS, ""), (SHORT_TERM_STEPS, "short_term_")):
+            ends = np.arange(max(len(history), window - 1), len(steps)) + 1
+            energies = (cumulative[ends] - cumulative[ends - window]) / (window * step_size)
+            self._add_blocks(state, prefix, energies)
+
+        state["steps"] = steps[-(SHORT_TERM_STEPS - 1):].copy()
+        return state
+
+    def finish(self, state: dict) -> dict:
+        counts, energies = state["counts"], state["energies"]
+        integrated, threshold = get_gated_loudness(counts, energies)
+        bins = np.flatnonzero(counts)
+        return {
+            "integrated": integrated,
+            "range": get_loudness_range(state["short_term_counts"], state["short_term_energies"]),
+            "threshold": threshold,
+            # Sparse gating histogram for the album loudness
+            "histogram": {
+                "bins": bins.tolist(),
+                "counts": counts[bins].tolist(),
+                "energies": energies[bins].tolist(),
+            },
+        }
+
+    @staticmethod
+    def _add_blocks(state: dict, prefix: str, energies: np.ndarray) -> None:
+        loudness = _get_loudness(energies)
+        gated = loudness >= ABSOLUTE_GATE
+        bins = np.minimum(((loudness[gated] - ABSOLUTE_GATE) / HISTOGRAM_STEP).astype(np.intp), HISTOGRAM_BINS - 1)
+        state[f"{prefix}counts"] = state[f"{prefix}counts"] + np.bincount(bins, minlength=HISTOGRAM_BINS)
+        state[f"{prefix}energies"] = state[f"{prefix}energies"] + np.bincount(
+            bins, weights=energies[gated], minlength=HISTOGRAM_BINS
+        )
+
+
+def _get_bin_loudness() -> np.ndarray:
+    return ABSOLUTE_GATE + (np.arange(HISTOGRAM_BINS) + 0.5) * HISTOGRAM_STEP
+
+
+def get_gated_loudness(counts: np.ndarray, energies: np.ndarray) -> tuple[float, float]:
+    """
+    Get the integrated loudness of the gating histogram
+
+    Returns:
+        loudness, threshold (tuple[float, float]): integrated loudness and the relative gate in LUFS
+    """
+    if not counts.sum():
+        return MIN_DB, MIN_DB
+
+    threshold = float(_get_loudness(energies.sum() / counts.sum())) + RELATIVE_GATE
+    gated = _get_bin_loudness() >= threshold
+    if not counts[gated].sum():
+        return MIN_DB, threshold
+
+    return float(_get_loudness(energies[gated].sum() / counts[gated].sum())), threshold
+
+
+def get_loudness_range(counts: np.ndarray, energies: np.ndarray) -> float:
+    """
+    Get the loudness range of the short-term blocks histogram in LU
+    """
+    if not counts.sum():
+        return 0.0
+
+    threshold = float(_get_loudness(energies.sum() / counts.sum())) + RANGE_RELATIVE_GATE
+    counts = np.where(_get_bin_loudness() >= threshold, counts, 0)
+    total = counts.sum()
+    if not total:
+        return 0.0
+
+    cumulative = np.cumsum(counts)
+    low, high = (int(np.searchsorted(cumulative, total * p)) for p in RANGE_PERCENTILES)
+    return float(_get_bin_loudness()[high] - _get_bin_loudness()[low])
+
+
+def get_album_loudness(results: list[dict]) -> float:
+    """
+    Get the integrated loudness of the tracks together from their gating histograms
+    """
+    counts = np.zeros(HISTOGRAM_BINS, dtype=np.int64)
+    energies = np.zeros(HISTOGRAM_BINS, dtype=np.float64)
+    for result in results:
+        histogram = result["histogram"]
+        np.add.at(counts, histogram["bins"], histogram["counts"])
+        np.add.at(energies, histogram["bins"], histogram["energies"])
+
+    return get_gated_loudness(counts, energies)[0]
+
+
+def _get_true_peak(media_file: MediaFile) -> float:
+    return max(media_file.analysis.get("true_peak", {}).get("true_peak") or [0.0])
+
+
+def _get_album_key(media_file: MediaFile) -> str:
+    tags = {key.lower(): value for key, value in (media_file.metadata.tags or {}).items()}
+    album = str(tags.get("album") or "").strip().lower()
+    return f"album:{album}" if album else f"folder:{Path(media_file.info.path).parent}"
+
+
+def get_gain_tags(media_files: list[MediaFile]) -> dict[Path, dict[str, str]]:
+    """
+    Get ReplayGain 2.0 tags, or R128 tags for Opus, of the measured files. Files are grouped
+    into albums by the album tag, or by the folder if the tag is missing
+
+    Returns:
+        tags (dict[Path, dict[str, str]]): gain tags by file path
+    """
+    measured = [media_file for media_file in media_files if all(n in media_file.analysis for n in LOUDNESS_ANALYZERS)]
+    albums: dict[str, list[MediaFile]] = {}
+    for media_file in measured:
+        albums.setdefault(_get_album_key(media_file), []).append(media_file)
+
+    tags = {}
+    for album_files in albums.values():
+        album_loudness = get_album_loudness([media_file.analysis["loudness"] for media_file in album_files])
+        album_peak = max(_get_true_peak(media_file) for media_file in album_files)
+        for media_file in album_files:
+            track_loudness = media_file.analysis["loudness"]["integrated"]
+            if Path(media_file.info.path).suffix.lower() in R128_EXTENSIONS:
+                tags[media_file.info.path] = {
+                    "r128_track_gain": str(_to_q78(R128_REFERENCE - track_loudness)),
+                    "r128_album_gain": str(_to_q78(R128_REFERENCE - album_loudness)),
+                }
+            else:
+                tags[media_file.info.path] = {
+                    "replaygain_track_gain": f"{REPLAYGAIN_REFERENCE - track_loudness:.2f} dB",
+                    "replaygain_track_peak": f"{_get_true_peak(media_file):.6f}",
+                    "replaygain_album_gain": f"{REPLAYGAIN_REFERENCE - album_loudness:.2f} dB",
+                    "replaygain_album_peak": f"{album_peak:.6f}",
+                }
+
+    return tags
+
+
+def _to_q78(gain: float) -> int:
+    # Q7.8 fixed point in the int16 range
+    return int(np.clip(round(gain * 256), -32768, 32767))
+
+
+def get_normalization_gain(media_file: MediaFile, preset: Preset) -> Optional[float]:
+    """
+    Get the gain in dB that brings the file to the preset loudness without exceeding
+    its true-peak ceiling, or `None` if the preset doesn't normalize or the file isn't measured
+    """
+    if preset.loudness is None or not all(name in media_file.analysis for name in LOUDNESS_ANALYZERS):
+        return None
+
+    loudness = media_file.analysis["loudness"]["integrated"]
+    if loudness <= MIN_DB:
+        return None
+
+    gain = preset.loudness - loudness
+    if preset.true_peak is not None:
+        gain = min(gain, preset.true_peak - to_db(_get_true_peak(media_file)))
+
+    return gain
+
+
+def get_loudness_analyzers() -> list[Analyzer]:
+    return [LoudnessAnalyzer(), TruePeakAnalyzer()]
@@ -0,0 +1,429 @@
+from __feature__ import snake_case
+
+import os
+import json
+import hashlib
+import dataclasses as dt
+from pathlib import Path
+from pathlib import PurePosixPath
+from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+
+import ffmpeg
+
+from PySide6.QtCore import Slot
+from PySide6.QtCore import Signal
+from PySide6.QtCore import QObject
+from PySide6.QtCore import QRunnable
+from PySide6.QtCore import QThreadPool
+
+from pieapp.api.structs.media import Preset
+from pieapp.api.structs.media import MediaFile
+from pieapp.helpers.files import read_json
+from pieapp.helpers.files import write_json
+from pieapp.helpers.files import get_partial_path
+from pieapp.helpers.hashing import get_audio_hash
+from pieapp.helpers.logger import logger
+
+from converter.cache import normalize_preset
+from converter.jobs import ConversionJob
+from converter.scheduler import ConversionScheduler
+from converter.workers import probe_media_file
+
+
+# Manifest file name in the target root
+MANIFEST_FILE_NAME = ".pie-mirror.json"
+MANIFEST_VERSION = 1
+
+# Save the manifest after every N converted files
+MANIFEST_SAVE_INTERVAL = 100
+
+# Source file extensions to mirror
+AUDIO_EXTENSIONS: tuple[str] = (
+    ".flac", ".wav", ".aif", ".aiff", ".wv", ".ape",
+    ".mp3", ".m4a", ".ogg", ".opus", ".wma",
+)
+
+
+@dt.dataclass
+class MirrorItem:
+    # Source path relative to the source root in posix form
+    relative_path: str
+    source_path: Path
+    output_path: Path
+    size: int
+    mtime_ns: int
+    media_file: MediaFile = dt.field(default=None, repr=False)
+
+
+@dt.dataclass
+class MirrorPlan:
+    source_root: Path
+    target_root: Path
+    preset: Preset
+    # Sources to transcode
+    convert: list[MirrorItem] = dt.field(default_factory=list)
+    # Outputs of renamed sources: (old output, new output)
+    move: list[tuple[Path, Path]] = dt.field(default_factory=list)
+    # Outputs of deleted or changed sources
+    remove: list[Path] = dt.field(default_factory=list)
+    # Number of sources that are up to date
+    unchanged: int = dt.field(default=0)
+    # Manifest entries of the unchanged and moved sources
+    files: dict[str, dict] = dt.field(default_factory=dict)
+
+
+def get_preset_key(preset: Preset) -> str:
+    payload = json.dumps(normalize_preset(preset), sort_keys=True)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=10).hexdigest()
+
+
+def get_output_path(relative_path: str, extension: str) -> str:
+    return PurePosixPath(relative_path).with_suffix(extension).as_posix()
+
+
+def scan_sources(source_root: Path, exclude: Path = None) -> dict[str, os.stat_result]:
+    """
+    Recursively collect audio files of the source tree
+
+    Args:
+        source_root (Path): source tree root
+        exclude (Path|None): folder to skip, e.g. the target root inside the source tree
+
+    Returns:
+        files (dict[str, os.stat_result]): stat results by the relative posix path
+    """
+    exclude = os.path.normcase(os.path.abspath(exclude)) if exclude else None
+    root = os.path.abspath(source_root)
+    files: dict[str, os.stat_result] = {}
+    folders = [root]
+
+    while folders:
+        folder = folders.pop()
+        try:
+            entries = list(os.scandir(folder))
+        except OSError as e:
+            logger.warning(f"Folder {folder} wasn't scanned: {e!s}")
+            continue
+
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if os.path.normcase(entry.path) != exclude:
+                    folders.append(entry.path)
+
+            elif os.path.splitext(entry.name)[1].lower() in AUDIO_EXTENSIONS:
+                relative_path = os.path.relpath(entry.path, root).replace(os.sep, "/")
+                files[relative_path] = entry.stat()
+
+    return files
+
+
+def read_manifest(target_root: Path) -> dict:
+    manifest = read_json(target_root / MANIFEST_FILE_NAME, default={}, raise_exception=False) or {}
+    if manifest.get("version") != MANIFEST_VERSION:
+        return {}
+
+    return manifest
+
+
+def write_manifest(target_root: Path, preset: Preset, files: dict[str, dict]) -> None:
+    """
+    Write the manifest atomically, so an interrupted mirror never leaves a broken one
+    """
+    manifest_path = target_root / MANIFEST_FILE_NAME
+    partial_path = get_partial_path(manifest_path)
+    write_json(partial_path, {
+        "version": MANIFEST_VERSION,
+        "preset": get_preset_key(preset),
+        "files": files,
+    })
+    os.replace(partial_path, manifest_path)
+
+
+def plan_mirror(source_root: Path, target_root: Path, preset: Preset) -> MirrorPlan:
+    """
+    Compare the source tree with the manifest in the target root.
+    Unchanged sources are detected by size and mtime only, so a no-change pass doesn't read the files.
+    A new source with the size and mtime of a deleted one is a renamed file: its output is moved
+    instead of transcoded once the audio hash matches. Without the stored hash the source is converted,
+    since distinct files may share the size and mtime
+    """
+    plan = MirrorPlan(source_root=source_root, target_root=target_root, preset=preset)
+    manifest = read_manifest(target_root)
+    same_preset = manifest.get("preset") == get_preset_key(preset)
+    entries: dict[str, dict] = manifest.get("files", {})
+    sources = scan_sources(source_root, exclude=target_root)
+
+    deleted = {k: v for k, v in entries.items() if k not in sources}
+    deleted_by_stat = {(v["size"], v["mtime_ns"]): k for k, v in deleted.items()}
+
+    for relative_path, stat in sources.items():
+        output_path = get_output_path(relative_path, preset.extension)
+        entry = entries.get(relative_path)
+
+        if (
+            entry
+            and same_preset
+            and entry["size"] == stat.st_size
+            and entry["mtime_ns"] == stat.st_mtime_ns
+            and (target_root / entry["output"]).exists()
+        ):
+            plan.files[relative_path] = entry
+            plan.unchanged += 1
+            continue
+
+        if entry is None and same_preset:
+            old_path = deleted_by_stat.pop((stat.st_size, stat.st_mtime_ns), None)
+            old_entry = deleted.get(old_path)
+            if old_entry and old_entry.get("hash") and (target_root / old_entry["output"]).exists():
+                if old_entry["hash"] == _get_audio_hash(source_root / relative_path):
+                    deleted.pop(old_path)
+                    plan.move.append((target_root / old_entry["output"], target_root / output_path))
+                    plan.files[relative_path] = {**old_entry, "output": output_path}
+                    continue
+
+        if entry and entry["output"] != output_path:
+            plan.remove.append(target_root / entry["output"])
+
+        plan.convert.append(MirrorItem(
+            relative_path=relative_path,
+            source_path=source_root / relative_path,
+            output_path=target_root / output_path,
+            size=stat.st_size,
+            mtime_ns=stat.st_mtime_ns,
+        ))
+
+    plan.remove.extend(target_root / e["output"] for e in deleted.values())
+    return plan
+
+
+def _get_audio_hash(file_path: Path) -> Optional[str]:
+    try:
+        return get_audio_hash(file_path)
+    except (OSError, ValueError):
+        return None
+
+
+def _remove_empty_folders(folder: Path, target_root: Path) -> None:
+    while folder != target_root and target_root in folder.parents:
+        try:
+            folder.rmdir()
+        except OSError:
+            return
+        folder = folder.parent
+
+
+def apply_plan(plan: MirrorPlan) -> None:
+    """
+    Move the outputs of renamed sources, remove the stale outputs
+    and create the output folders of the sources to transcode
+    """
+    for old_path, new_path in plan.move:
+        new_path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(old_path, new_path)
+        _remove_empty_folders(old_path.parent, plan.target_root)
+
+    for output_path in plan.remove:
+        try:
+            output_path.unlink()
+        except FileNotFoundError:
+            pass
+        _remove_empty_folders(output_path.parent, plan.target_root)
+
+    for item in plan.convert:
+        item.output_path.parent.mkdir(parents=True, exist_ok=True)
+
+
+class MirrorSignals(QObject):
+    planned = Signal(MirrorPlan)
+    failed = Signal(str)
+
+
+class MirrorWorker(QRunnable):
+    """
+    Scan the source tree, apply moves and removals and probe the sources to transcode
+    """
+
+    def __init__(
+        self,
+        source_root: Path,
+        target_root: Path,
+        preset: Preset,
+        ffprobe_cmd: Path,
+        dry_run: bool = False
+    ) -> None:
+        super().__init__()
+
+        self._signals = MirrorSignals()
+        self._source_root = source_root
+        self._target_root = target_root
+        self._preset = preset
+        self._ffprobe_cmd = ffprobe_cmd
+        self._dry_run = dry_run
+
+    @property
+    def signals(self) -> MirrorSignals:
+        return self._signals
+
+    @Slot()
+    def run(self) -> None:
+        try:
+            self._target_root.mkdir(parents=True, exist_ok=True)
+            plan = plan_mirror(self._source_root, self._target_root, self._preset)
+            if not self._dry_run:
+                apply_plan(plan)
+                with ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as executor:
+                    for item, media_file in zip(plan.convert, executor.map(self._probe, plan.convert)):
+                        item.media_file = media_file
+        except OSError as e:
+            logger.critical(f"Mirror of {self._source_root} has failed: {e!s}")
+            self._signals.failed.emit(str(e))
+            return
+
+        self._signals.planned.emit(plan)
+
+    def _probe(self, item: MirrorItem) -> Optional[MediaFile]:
+        try:
+            return probe_media_file(self._ffprobe_cmd, item.source_path)
+        except (ffmpeg.Error, OSError, ValueError) as e:
+            logger.error(f"{item.source_path}: {getattr(e, 'stderr', e)!r}")
+            return None
+
+
+class MirrorSession(QObject):
+    """
+    Keeps a transcoded copy of the source tree in sync.
+    Transcoded files are recorded in the manifest as soon as they are done,
+    so an interrupted mirror resumes where it has stopped
+    """
+    sig_mirror_planned = Signal(MirrorPlan)
+    sig_mirror_completed = Signal(int, int)
+    sig_mirror_failed = Signal(str)
+
+    def __init__(self, scheduler: ConversionScheduler, ffprobe_cmd: Path, parent: QObject = None) -> None:
+        super().__init__(parent)
+
+        self._scheduler = scheduler
+        self._ffprobe_cmd = ffprobe_cmd
+        self._plan: MirrorPlan = None
+        self._items: dict[ConversionJob, MirrorItem] = {}
+        self._completed: dict[ConversionJob, str] = {}
+        self._converted: int = 0
+        self._failed: int = 0
+        self._dry_run: bool = False
+
+        self._scheduler.sig_job_completed.connect(self._job_completed)
+        self._scheduler.sig_job_failed.connect(self._job_failed)
+        self._scheduler.sig_job_verified.connect(self._job_verified)
+        self._scheduler.sig_batch_completed.connect(self._batch_completed)
+
+    def is_running(self) -> bool:
+        return self._plan is not None
+
+    def start(self, source_root: Path, target_root: Path, preset: Preset, dry_run: bool = False) -> None:
+        """
+        Start mirroring the source tree into the target root
+
+        Args:
+            source_root (Path): source tree root
+            target_root (Path): mirror root. The manifest is stored here
+            preset (Preset): conversion preset
+            dry_run (bool): only plan the changes
+        """
+        if self.is_running():
+            return
+
+        self._plan = MirrorPlan(source_root=source_root, target_root=target_root, preset=preset)
+        self._items.clear()
+        self._completed.clear()
+        self._converted = self._failed = 0
+        self._dry_run = dry_run
+
+        worker = MirrorWorker(source_root, target_root, preset, self._ffprobe_cmd, dry_run)
+        worker.signals.planned.connect(self._mirror_planned)
+        worker.signals.failed.connect(self._mirror_failed)
+        QThreadPool.global_instance().start(worker)
+
+    @Slot(MirrorPlan)
+    def _mirror_planned(self, plan: MirrorPlan) -> None:
+        self._plan = plan
+        self.sig_mirror_planned.emit(plan)
+        if self._dry_run:
+            self._finish()
+            return
+
+        for item in plan.convert:
+            if item.media_file is None:
+                self._failed += 1
+                continue
+
+            job = ConversionJob(media_file=item.media_file, preset=plan.preset, output_path=item.output_path)
+            self._items[job] = item
+
+        self._save_manifest()
+        if not self._items:
+            self._finish()
+            return
+
+        self._scheduler.submit(list(self._items.keys()))
+
+    @Slot(str)
+    def _mirror_failed(self, message: str) -> None:
+        self._plan = None
+        self.sig_mirror_failed.emit(message)
+
+    @Slot(ConversionJob)
+    def _job_completed(self, job: ConversionJob) -> None:
+        item = self._items.pop(job, None)
+        if item is None:
+            return
+
+        self._plan.files[item.relative_path] = {
+            "output": get_output_path(item.relative_path, self._plan.preset.extension),
+            "size": item.size,
+            "mtime_ns": item.mtime_ns,
+            "hash": job.audio_hash,
+        }
+        self._completed[job] = item.relative_path
+        self._converted += 1
+        if self._converted % MANIFEST_SAVE_INTERVAL == 0:
+            self._save_manifest()
+
+    @Slot(ConversionJob, str)
+    def _job_failed(self, job: ConversionJob, _: str) -> None:
+        if self._items.pop(job, None) is not None:
+            self._failed += 1
+
+    @Slot(ConversionJob)
+    def _job_verified(self, job: ConversionJob) -> None:
+        """
+        Record the output checksum. Outputs that failed verification are dropped
+        from the manifest, so the next pass converts them again
+        """
+        relative_path = self._completed.pop(job, None)
+        if relative_path is None or relative_path not in self._plan.files:
+            return
+
+        if job.verification.passed:
+            self._plan.files[relative_path]["checksum"] = job.verification.checksum
+        else:
+            self._plan.files.pop(relative_path)
+            self._converted -= 1
+            self._failed += 1
+
+    @Slot()
+    def _batch_completed(self) -> None:
+        if self._plan is not None and not self._items:
+            self._save_manifest()
+            self._finish()
+
+    def _save_manifest(self) -> None:
+        try:
+            write_manifest(self._plan.target_root, self._plan.preset, self._plan.files)
+        except OSError as e:
+            logger.error(f"Mirror manifest wasn't saved: {e!s}")
+
+    def _finish(self) -> None:
+        self._plan = None
+        self._completed.clear()
+        self.sig_mirror_completed.emit(self._converted, self._failed)
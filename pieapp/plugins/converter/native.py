@@ -0,0 +1,650 @@
+"""
+NumPy conversion backend of uncompressed audio. WAV, RF64 and AIFF sources are memory-mapped
+and converted without starting ffmpeg: sample formats and channels are converted with vectorized
+NumPy, sample rates with a polyphase filter, and the output is written into a preallocated file.
+The module doesn't import Qt
+"""
+import os
+import math
+import mmap
+import time
+import struct
+import tempfile
+import functools
+import dataclasses as dt
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Union
+from typing import Optional
+
+import ffmpeg
+import numpy as np
+
+from pieapp.api.structs.media import Preset
+from pieapp.helpers.supervisor import Supervisor
+from pieapp.helpers.supervisor import TaskSupervisor
+from pieapp.helpers.supervisor import get_timeout
+from pieapp.helpers.supervisor import get_cpu_limit
+
+# Frames converted at once
+NATIVE_CHUNK_FRAMES = 65536
+
+# Calibration key of the `benchmark_native` results
+NATIVE_BENCHMARK = "native"
+
+# Resampling filter: Kaiser window beta and the stopband attenuation it gives in dB,
+# and the transition band width relative to the lower Nyquist frequency.
+# The stopband starts at the lower Nyquist frequency, so nothing above it is aliased
+RESAMPLER_BETA = 8.6
+RESAMPLER_ATTENUATION = 86.0
+RESAMPLER_TRANSITION = 0.1
+
+# WAV format tags
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# Speaker masks of the extensible format: mono is the front center
+WAVE_CHANNEL_MASKS: dict[int, int] = {1: 0x4, 2: 0x3}
+
+# Chunk sizes above this limit are stored in the RF64 `ds64` chunk
+RIFF_SIZE_LIMIT = 0xFFFFFFFF
+
+# Sample type, bit depth and byte order of the output codecs
+NATIVE_CODECS: dict[str, tuple[str, int, str]] = {
+    "pcm_u8": ("u", 8, "<"),
+    "pcm_s16le": ("i", 16, "<"),
+    "pcm_s24le": ("i", 24, "<"),
+    "pcm_s32le": ("i", 32, "<"),
+    "pcm_f32le": ("f", 32, "<"),
+    "pcm_s16be": ("i", 16, ">"),
+    "pcm_s24be": ("i", 24, ">"),
+    "pcm_s32be": ("i", 32, ">"),
+}
+
+# Output containers by extension
+NATIVE_EXTENSIONS: dict[str, str] = {".wav": "wav", ".aif": "aiff", ".aiff": "aiff"}
+
+# Tag chunks copied to an output of the same container
+TAG_CHUNKS: dict[str, tuple[bytes]] = {
+    "wav": (b"LIST", b"id3 ", b"ID3 "),
+    "aiff": (b"NAME", b"AUTH", b"ANNO", b"(c) ", b"ID3 "),
+}
+
+# AIFF-C compression types of uncompressed samples: sample type and byte order
+AIFC_TYPES: dict[bytes, tuple[str, str]] = {
+    b"NONE": ("i", ">"),
+    b"twos": ("i", ">"),
+    b"sowt": ("i", "<"),
+    b"fl32": ("f", ">"),
+    b"FL32": ("f", ">"),
+}
+
+
+@dt.dataclass
+class PCMFormat:
+    # "wav" or "aiff"
+    container: str
+    # "i" for signed, "u" for unsigned integers and "f" for floats
+    sample_type: str
+    bit_depth: int
+    # "<" or ">"
+    byte_order: str
+    sample_rate: int
+    channels: int
+    frames: int = dt.field(default=0)
+    # Offset of the first sample in the file
+    data_offset: int = dt.field(default=0)
+    # Tag chunks: id, payload offset and payload size
+    tags: list[tuple[bytes, int, int]] = dt.field(default_factory=list)
+
+    @property
+    def block_align(self) -> int:
+        return self.channels * self.bit_depth // 8
+
+
+def _read_extended(data: bytes) -> float:
+    """
+    Read an 80-bit IEEE 754 extended float of the AIFF sample rate
+    """
+    exponent, mantissa = struct.unpack(">HQ", data)
+    if not mantissa:
+        return 0.0
+    return math.ldexp(mantissa, (exponent & 0x7FFF) - 16383 - 63)
+
+
+def _write_extended(value: int) -> bytes:
+    exponent = max(0, int(value).bit_length() - 1)
+    return struct.pack(">HQ", exponent + 16383, int(value) << (63 - exponent))
+
+
+def _read_chunks(file, start: int, end: int, byte_order: str) -> list[tuple[bytes, int, int]]:
+    """
+    Get the id, payload offset and payload size of the chunks. Payloads are padded to even sizes
+    """
+    chunks = []
+    position = start
+    while position + 8 <= end:
+        file.seek(position)
+        header = file.read(8)
+        if len(header) < 8:
+            break
+
+        chunk_id, size = struct.unpack(f"{byte_order}4sI", header)
+        chunks.append((chunk_id, position + 8, size))
+        position += 8 + size + (size & 1)
+
+    return chunks
+
+
+def _read_wav_format(file, file_size: int, is_rf64: bool) -> Optional[PCMFormat]:
+    chunks = _read_chunks(file, 12, file_size, "<")
+    fmt = None
+    data_sizes = {}
+    for chunk_id, offset, size in chunks:
+        if chunk_id == b"ds64":
+            file.seek(offset)
+            _, data_size, _ = struct.unpack("<QQQ", file.read(24))
+            data_sizes["ds64"] = data_size
+        elif chunk_id == b"fmt ":
+            file.seek(offset)
+            payload = file.read(size)
+            tag, channels, sample_rate, _, _, bit_depth = struct.unpack("<HHIIHH", payload[:16])
+            if tag == WAVE_FORMAT_EXTENSIBLE and len(payload) >= 26:
+                tag = struct.unpack("<H", payload[24:26])[0]
+            if tag == WAVE_FORMAT_PCM and bit_depth in (8, 16, 24, 32):
+                fmt = PCMFormat("wav", "u" if bit_depth == 8 else "i", bit_depth, "<", sample_rate, channels)
+            elif tag == WAVE_FORMAT_IEEE_FLOAT and bit_depth == 32:
+                fmt = PCMFormat("wav", "f", bit_depth, "<", sample_rate, channels)
+            else:
+                return None
+
+    data = next(((offset, size) for chunk_id, offset, size in chunks if chunk_id == b"data"), None)
+    if fmt is None or data is None or not fmt.channels:
+        return None
+
+    offset, size = data
+    if is_rf64 and size == RIFF_SIZE_LIMIT:
+        size = data_sizes.get("ds64", file_size - offset)
+    elif size in (0, RIFF_SIZE_LIMIT):
+        # Streamed files have no data size
+        size = file_size - offset
+    fmt.data_offset = offset
+    fmt.frames = min(size, file_size - offset) // fmt.block_align
+    fmt.tags = [chunk for chunk in chunks if chunk[0] in TAG_CHUNKS["wav"]]
+    return fmt
+
+
+def _read_aiff_format(file, file_size: int, is_aifc: bool) -> Optional[PCMFormat]:
+    chunks = _read_chunks(file, 12, file_size, ">")
+    fmt = None
+    for chunk_id, offset, size in chunks:
+        if chunk_id == b"COMM":
+            file.seek(offset)
+            payload = file.read(size)
+            channels, _, bit_depth = struct.unpack(">HIH", payload[:8])
+            sample_rate = round(_read_extended(payload[8:18]))
+            sample_type, byte_order = "i", ">"
+            if is_aifc:
+                if payload[18:22] not in AIFC_TYPES:
+                    return None
+                sample_type, byte_order = AIFC_TYPES[payload[18:22]]
+            if bit_depth not in (8, 16, 24, 32) or (sample_type == "f" and bit_depth != 32):
+                return None
+            fmt = PCMFormat("aiff", sample_type, bit_depth, byte_order, sample_rate, channels)
+
+    data = next(((offset, size) for chunk_id, offset, size in chunks if chunk_id == b"SSND"), None)
+    if fmt is None or data is None or not fmt.channels:
+        return None
+
+    offset, size = data
+    file.seek(offset)
+    data_offset = struct.unpack(">I", file.read(4))[0]
+    fmt.data_offset = offset + 8 + data_offset
+    fmt.frames = max(0, min(size - 8 - data_offset, file_size - fmt.data_offset)) // fmt.block_align
+    fmt.tags = [chunk for chunk in chunks if chunk[0] in TAG_CHUNKS["aiff"]]
+    return fmt
+
+
+def read_pcm_format(file_path: Union[str, Path]) -> Optional[PCMFormat]:
+    """
+    Read the sample format of a WAV, RF64 or AIFF file
+
+    Returns:
+        format (PCMFormat|None): `None` if the file isn't uncompressed audio of a supported format
+    """
+    with open(file_path, "rb") as file:
+        file_size = os.fstat(file.fileno()).st_size
+        header = file.read(12)
+        if len(header) < 12:
+            return None
+
+        if header[:4] in (b"RIFF", b"RF64") and header[8:12] == b"WAVE":
+            return _read_wav_format(file, file_size, header[:4] == b"RF64")
+        if header[:4] == b"FORM" and header[8:12] in (b"AIFF", b"AIFC"):
+            return _read_aiff_format(file, file_size, header[8:12] == b"AIFC")
+
+    return None
+
+
+def get_target_format(source: PCMFormat, preset: Preset, extension: str) -> Optional[PCMFormat]:
+    """
+    Get the output format of the preset, or `None` if the native backend can't produce it
+    """
+    container = NATIVE_EXTENSIONS.get(extension.lower())
+    if container is None or preset.codec not in NATIVE_CODECS:
+        return None
+
+    sample_type, bit_depth, byte_order = NATIVE_CODECS[preset.codec]
+    if container == "wav" and byte_order != "<":
+        return None
+    if container == "aiff" and (byte_order != ">" or sample_type != "i"):
+        return None
+
+    channels = preset.channels or source.channels
+    if channels != source.channels and 1 not in (channels, source.channels):
+        # Layouts other than mono have their own downmix matrices
+        return None
+
+    return PCMFormat(container, sample_type, bit_depth, byte_order, preset.sample_rate or source.sample_rate, channels)
+
+
+def can_convert_natively(file_path: Union[str, Path], preset: Preset) -> bool:
+    """
+    Check whether both the source and the preset output are uncompressed audio the native backend converts.
+    Presets with custom ffmpeg options are left to ffmpeg
+    """
+    if preset.options or preset.codec not in NATIVE_CODECS:
+        return False
+
+    try:
+        source = read_pcm_format(file_path)
+    except (OSError, struct.error):
+        return False
+
+    return source is not None and get_target_format(source, preset, preset.extension) is not None
+
+
+def is_native_faster(results: Optional[dict]) -> bool:
+    """
+    Check whether `benchmark_native` found the native backend faster than ffmpeg on this machine.
+    Until the benchmark is run the native backend is used
+    """
+    if not results:
+        return True
+
+    return sum(case["native"] for case in results.values()) <= sum(case["ffmpeg"] for case in results.values())
+
+
+@functools.lru_cache(maxsize=8)
+def _get_filter_bank(up: int, down: int) -> np.ndarray:
+    """
+    Get the polyphase bank of the Kaiser-windowed sinc lowpass: a row of taps per output phase
+    """
+    # Frequencies are in cycles per input sample
+    nyquist = 0.5 * min(1.0, up / down)
+    transition = nyquist * RESAMPLER_TRANSITION
+    # The windowed sinc is down by 6 dB at the cutoff, in the middle of the transition band
+    cutoff = nyquist - transition / 2
+    # Kaiser's estimate of the window length for the attenuation over the transition band
+    taps = 2 * math.ceil((RESAMPLER_ATTENUATION - 7.95) / (14.36 * transition) / 2)
+    delay = taps // 2
+    # Time of each tap from the output sample in input samples
+    times = np.arange(taps)[None, :] - delay + np.arange(up)[:, None] / up
+    window = np.i0(RESAMPLER_BETA * np.sqrt(np.clip(1 - (times / (delay + 1)) ** 2, 0, 1))) / np.i0(RESAMPLER_BETA)
+    bank = 2 * cutoff * np.sinc(2 * cutoff * times) * window
+    # Unity gain at DC for every phase, taps are reversed for the windows of the oldest sample first
+    return (bank / bank.sum(axis=1, keepdims=True))[:, ::-1].copy()
+
+
+class PolyphaseResampler:
+    """
+    Streaming rational resampler. Output sample `k` is at input time `k * down / up`,
+    so the output is aligned with the input and has `ceil(frames * up / down)` samples
+    """
+
+    def __init__(self, source_rate: int, target_rate: int, channels: int, dtype: np.dtype = np.float32) -> None:
+        divisor = math.gcd(source_rate, target_rate)
+        self._up = target_rate // divisor
+        self._down = source_rate // divisor
+        self._bank = _get_filter_bank(self._up, self._down).astype(dtype)
+        self._taps = self._bank.shape[1]
+        self._delay = self._taps // 2
+        # Buffered input from the absolute input index `_start`, the first taps are the silence before the input
+        self._buffer = np.zeros((self._taps, channels), dtype=dtype)
+        self._start = -self._taps
+        self._frames = 0
+        self._next = 0
+
+    def get_output_frames(self, frames: int) -> int:
+        return -(-frames * self._up // self._down)
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        """
+        Resample the next (frames, channels) block
+        """
+        self._frames += len(block)
+        return self._resample(block, self._start + len(self._buffer) + len(block) - 1 - self._delay)
+
+    def flush(self) -> np.ndarray:
+        """
+        Get the samples delayed by the filter
+        """
+        padding = np.zeros((self._taps, self._buffer.shape[1]), dtype=self._buffer.dtype)
+        return self._resample(padding, self._frames - 1)
+
+    def _resample(self, block: np.ndarray, last_input: int) -> np.ndarray:
+        up, down = self._up, self._down
+        buffer = np.concatenate((self._buffer, block))
+        first = self._next
+        last = min(((last_input + 1) * up - 1) // down, self.get_output_frames(self._frames) - 1)
+        output = np.empty((max(0, last - first + 1), buffer.shape[1]), dtype=buffer.dtype)
+
+        if len(output):
+            windows = np.lib.stride_tricks.sliding_window_view(buffer, self._taps, axis=0)
+            for residue in range(min(up, len(output))):
+                # Outputs of the same phase read the input with the stride `down`
+                index = first + residue
+                phase = index * down % up
+                start = index * down // up + self._delay - self._taps + 1 - self._start
+                count = (last - index) // up + 1
+                output[residue::up] = windows[start:start + (count - 1) * down + 1:down] @ self._bank[phase]
+
+        self._next = last + 1
+        keep = self._next * down // up + self._delay - self._taps + 1 - self._start
+        self._buffer = buffer[min(keep, len(buffer)):].copy()
+        self._start += min(keep, len(buffer))
+        return output
+
+
+def _get_dtype(fmt: PCMFormat) -> np.dtype:
+    return np.dtype(f"{fmt.byte_order}{fmt.sample_type}{fmt.bit_depth // 8}")
+
+
+def _read_frames(data: mmap.mmap, fmt: PCMFormat, start: int, count: int, dtype: np.dtype) -> np.ndarray:
+    """
+    Get (count, channels) samples from the mapped file scaled to [-1, 1)
+    """
+    offset = fmt.data_offset + start * fmt.block_align
+    if fmt.bit_depth == 24:
+        raw = np.frombuffer(data, np.uint8, count * fmt.block_align, offset).reshape(-1, 3)
+        padded = np.zeros((len(raw), 4), dtype=np.uint8)
+        if fmt.byte_order == "<":
+            padded[:, 1:] = raw
+        else:
+            padded[:, :3] = raw
+        samples = padded.view(f"{fmt.byte_order}i4").reshape(count, fmt.channels)
+        return samples.astype(dtype) / dtype.type(2 ** 31)
+
+    samples = np.frombuffer(data, _get_dtype(fmt), count * fmt.channels, offset).reshape(count, fmt.channels)
+    if fmt.sample_type == "f":
+        return samples.astype(dtype)
+    if fmt.sample_type == "u":
+        return (samples.astype(dtype) - 128) / dtype.type(128)
+    return samples.astype(dtype) / dtype.type(2 ** (fmt.bit_depth - 1))
+
+
+def _write_frames(
+    output: np.ndarray,
+    fmt: PCMFormat,
+    samples: np.ndarray,
+    rng: Optional[np.random.Generator]
+) -> None:
+    """
+    Quantize the samples into the output bytes. The TPDF dither of `rng` spans two LSBs
+    """
+    if fmt.sample_type == "f":
+        output[:] = samples.astype(_get_dtype(fmt)).view(np.uint8).ravel()
+        return
+
+    scale = 2 ** (fmt.bit_depth - 1)
+    scaled = samples * scale
+    if rng is not None:
+        scaled += rng.random(scaled.shape, dtype=scaled.dtype) - rng.random(scaled.shape, dtype=scaled.dtype)
+    quantized = np.clip(np.rint(scaled), -scale, scale - 1)
+
+    if fmt.sample_type == "u":
+        output[:] = (quantized + 128).astype(np.uint8).ravel()
+    elif fmt.bit_depth == 24:
+        packed = quantized.astype(f"{fmt.byte_order}i4").view(np.uint8).reshape(-1, 4)
+        output.reshape(-1, 3)[:] = packed[:, :3] if fmt.byte_order == "<" else packed[:, 1:]
+    else:
+        output[:] = quantized.astype(_get_dtype(fmt)).view(np.uint8).ravel()
+
+
+def _get_wav_header(fmt: PCMFormat, data_size: int, tags: bytes) -> bytes:
+    format_tag = WAVE_FORMAT_IEEE_FLOAT if fmt.sample_type == "f" else WAVE_FORMAT_PCM
+    fmt_payload = struct.pack(
+        "<HHIIHH",
+        format_tag,
+        fmt.channels,
+        fmt.sample_rate,
+        fmt.sample_rate * fmt.block_align,
+        fmt.block_align,
+        fmt.bit_depth
+    )
+    if fmt.channels > 2 or fmt.bit_depth > 16:
+        # The extensible format carries the valid bits and the channel mask
+        sub_format = struct.pack("<H", format_tag) + b"\x00\x00\x00\x00\x10\x00\x80\x00\x00\xaa\x00\x38\x9b\x71"
+        channel_mask = WAVE_CHANNEL_MASKS.get(fmt.channels, (1 << fmt.channels) - 1 if fmt.channels <= 18 else 0)
+        fmt_payload = (
+            struct.pack("<HHIIHH", WAVE_FORMAT_EXTENSIBLE, *struct.unpack("<HIIHH", fmt_payload[2:]))
+            + struct.pack("<HHI", 22, fmt.bit_depth, channel_mask)
+            + sub_format
+        )
+
+    chunks = b"fmt " + struct.pack("<I", len(fmt_payload)) + fmt_payload + tags
+    riff_size = 4 + len(chunks) + 8 + data_size + (data_size & 1)
+    if riff_size <= RIFF_SIZE_LIMIT:
+        return b"RIFF" + struct.pack("<I", riff_size) + b"WAVE" + chunks + b"data" + struct.pack("<I", data_size)
+
+    ds64_payload = struct.pack("<QQQI", riff_size + 36, data_size, data_size // fmt.block_align, 0)
+    ds64 = b"ds64" + struct.pack("<I", len(ds64_payload)) + ds64_payload
+    return (
+        b"RF64" + struct.pack("<I", RIFF_SIZE_LIMIT) + b"WAVE" + ds64 + chunks
+        + b"data" + struct.pack("<I", RIFF_SIZE_LIMIT)
+    )
+
+
+def _get_aiff_header(fmt: PCMFormat, frames: int, data_size: int, tags: bytes) -> bytes:
+    comm = struct.pack(">HIH", fmt.channels, frames, fmt.bit_depth) + _write_extended(fmt.sample_rate)
+    chunks = b"COMM" + struct.pack(">I", len(comm)) + comm + tags
+    ssnd = b"SSND" + struct.pack(">III", 8 + data_size, 0, 0)
+    form_size = 4 + len(chunks) + len(ssnd) + data_size + (data_size & 1)
+    return b"FORM" + struct.pack(">I", form_size) + b"AIFF" + chunks + ssnd
+
+
+def _get_tag_chunks(file_path: Path, source: PCMFormat, target: PCMFormat) -> bytes:
+    if source.container != target.container:
+        return b""
+
+    byte_order = "<" if target.container == "wav" else ">"
+    chunks = b""
+    with open(file_path, "rb") as file:
+        for chunk_id, offset, size in source.tags:
+            file.seek(offset)
+            chunks += chunk_id + struct.pack(f"{byte_order}I", size) + file.read(size) + b"\x00" * (size & 1)
+
+    return chunks
+
+
+def convert_pcm(
+    source_path: Union[str, Path],
+    output_path: Union[str, Path],
+    preset: Preset,
+    gain: float = None,
+    trim: tuple[float, float] = None,
+    copy_tags: bool = True,
+    progress_callback: callable = None,
+    supervisor: TaskSupervisor = None
+) -> None:
+    """
+    Convert uncompressed audio by the preset without ffmpeg
+
+    Args:
+        source_path (str|Path): WAV, RF64 or AIFF file
+        output_path (str|Path): output file, RF64 is written for WAV data over 4 GiB
+        preset (Preset): preset with a codec of `NATIVE_CODECS`
+        gain (float|None): gain in dB
+        trim (tuple[float, float]|None): start and end of the kept audio in seconds
+        copy_tags (bool): copy the tag chunks when the containers are the same
+        progress_callback (callable|None): called with the converted source duration in seconds
+        supervisor (TaskSupervisor|None): checked between the chunks, so the conversion
+            can be suspended, killed or timed out like an ffmpeg one
+
+    Raises:
+        OSError: if the file can't be read or written or isn't supported
+        ProcessTimeoutError: the conversion has timed out or was killed
+    """
+    source_path, output_path = Path(source_path), Path(output_path)
+    try:
+        source = read_pcm_format(source_path)
+    except struct.error as e:
+        raise OSError(f"Malformed header of {source_path}: {e!s}")
+    target = get_target_format(source, preset, output_path.suffix) if source else None
+    if target is None:
+        raise OSError(f"{source_path} can't be converted to {preset.codec} without ffmpeg")
+
+    start, end = 0, source.frames
+    if trim is not None:
+        start = min(max(0, round(trim[0] * source.sample_rate)), source.frames)
+        end = min(max(start, round(trim[1] * source.sample_rate)), source.frames)
+
+    # Single precision keeps 24 bits, wider samples are converted in double precision
+    dtype = np.dtype(np.float64 if max(source.bit_depth, target.bit_depth) > 24 or source.sample_type == "f" else np.float32)
+    resampler = None
+    frames = end - start
+    if target.sample_rate != source.sample_rate:
+        resampler = PolyphaseResampler(source.sample_rate, target.sample_rate, target.channels, dtype)
+        frames = resampler.get_output_frames(frames)
+
+    # Samples between the target steps are reduced with the dither, copies of the same depth stay bit exact
+    is_processed = resampler is not None or gain is not None or target.channels < source.channels
+    source_precision = 24 if source.sample_type == "f" else source.bit_depth
+    needs_dither = target.sample_type != "f" and (target.bit_depth < source_precision or is_processed)
+    rng = np.random.default_rng() if needs_dither else None
+    factor = dtype.type(10 ** (gain / 20)) if gain is not None else None
+
+    data_size = frames * target.block_align
+    tags = _get_tag_chunks(source_path, source, target) if copy_tags else b""
+    if target.container == "wav":
+        header = _get_wav_header(target, data_size, tags)
+    else:
+        header = _get_aiff_header(target, frames, data_size, tags)
+
+    with ExitStack() as stack:
+        source_file = stack.enter_context(open(source_path, "rb"))
+        data = mmap.mmap(source_file.fileno(), 0, access=mmap.ACCESS_READ)
+        stack.callback(_close_map, data)
+        output_file = stack.enter_context(open(output_path, "wb+"))
+        output_file.write(header)
+        output_file.truncate(len(header) + data_size + (data_size & 1))
+        if not data_size:
+            return
+
+        output_data = mmap.mmap(output_file.fileno(), 0)
+        stack.callback(_close_map, output_data)
+        output = np.frombuffer(output_data, np.uint8, data_size, len(header))
+        position = 0
+
+        def write(samples: np.ndarray) -> None:
+            nonlocal position
+            size = min(len(samples), frames - position // target.block_align) * target.block_align
+            _write_frames(output[position:position + size], target, samples[:size // target.block_align], rng)
+            position += size
+
+        for chunk_start in range(start, end, NATIVE_CHUNK_FRAMES):
+            if supervisor is not None:
+                supervisor.check()
+            count = min(NATIVE_CHUNK_FRAMES, end - chunk_start)
+            samples = _read_frames(data, source, chunk_start, count, dtype)
+            if target.channels < source.channels:
+                samples = samples.mean(axis=1, keepdims=True, dtype=dtype)
+            elif target.channels > source.channels:
+                samples = np.repeat(samples, target.channels, axis=1)
+            if factor is not None:
+                samples *= factor
+            if resampler is not None:
+                samples = resampler.process(samples)
+
+            write(samples)
+            if progress_callback:
+                progress_callback((chunk_start + count - start) / source.sample_rate)
+
+        if resampler is not None:
+            write(resampler.flush())
+
+        del output
+        output_data.flush()
+
+
+def _close_map(data: mmap.mmap) -> None:
+    try:
+        data.close()
+    except BufferError:
+        # Views are still referenced by a propagating exception, the map is closed once they're freed
+        pass
+
+
+def benchmark_native(ffmpeg_cmd: Union[str, Path], duration: int = 60, folder: Path = None) -> dict[str, dict]:
+    """
+    Compare the native backend with ffmpeg on generated files of the typical PCM jobs
+
+    Args:
+        ffmpeg_cmd (str|Path): ffmpeg binary path
+        duration (int): duration of the generated files in seconds
+        folder (Path|None): folder of the generated files, a temp folder by default
+
+    Returns:
+        results (dict[str, dict]): seconds of `native` and `ffmpeg` conversions per job kind
+    """
+    cases: dict[str, tuple[dict, Preset, str]] = {
+        "96k/24 to 48k/16": (
+            {"sample_rate": 96000, "codec": "pcm_s24le", "extension": ".wav", "channels": 2},
+            Preset(name="benchmark", codec="pcm_s16le", extension=".wav", sample_rate=48000),
+            ".wav"
+        ),
+        "stereo to mono": (
+            {"sample_rate": 44100, "codec": "pcm_s16le", "extension": ".wav", "channels": 2},
+            Preset(name="benchmark", codec="pcm_s16le", extension=".wav", channels=1),
+            ".wav"
+        ),
+        "aiff to wav": (
+            {"sample_rate": 44100, "codec": "pcm_s16be", "extension": ".aiff", "channels": 2},
+            Preset(name="benchmark", codec="pcm_s16le", extension=".wav"),
+            ".wav"
+        ),
+        "44.1k to 48k": (
+            {"sample_rate": 44100, "codec": "pcm_s16le", "extension": ".wav", "channels": 2},
+            Preset(name="benchmark", codec="pcm_s16le", extension=".wav", sample_rate=48000),
+            ".wav"
+        ),
+    }
+
+    results: dict[str, dict] = {}
+    with tempfile.TemporaryDirectory(dir=folder) as temp_folder:
+        temp_folder = Path(temp_folder)
+        for name, (source, preset, extension) in cases.items():
+            source_path = temp_folder / f"source{source['extension']}"
+            output_path = temp_folder / f"output{extension}"
+            Supervisor(ffmpeg.compile(
+                ffmpeg
+                .input(f"sine=frequency=997:sample_rate={source['sample_rate']}:duration={duration}", f="lavfi")
+                .output(source_path.as_posix(), acodec=source["codec"], ac=source["channels"]),
+                cmd=str(ffmpeg_cmd),
+                overwrite_output=True
+            ), timeout=get_timeout(duration), cpu_limit=get_cpu_limit(duration)).run()
+
+            started = time.perf_counter()
+            convert_pcm(source_path, output_path, preset)
+            native = time.perf_counter() - started
+
+            started = time.perf_counter()
+            Supervisor(ffmpeg.compile(
+                ffmpeg.input(source_path.as_posix()).output(output_path.as_posix(), **preset.get_output_options()),
+                cmd=str(ffmpeg_cmd),
+                overwrite_output=True
+            ), timeout=get_timeout(duration), cpu_limit=get_cpu_limit(duration)).run()
+            results[name] = {"native": round(native, 3), "ffmpeg": round(time.perf_counter() - started, 3)}
+
+    return results
@@ -1,4 +1,5 @@
 from pathlib import Path
+from typing import Optional
 
 from __feature__ import snake_case
 
@@ -18,6 +19,7 @@ from pieapp.api.plugins import PiePlugin
 from pieapp.api.plugins.decorators import on_plugin_event
 from pieapp.api.plugins.helpers import get_plugin
 from pieapp.api.plugins.mixins import CoreAccessorsMixin, LayoutAccessorsMixins
+from pieapp.api.structs.media import Edit
 from pieapp.api.structs.media import MediaFile
 from pieapp.api.structs.plugins import Plugin
 from pieapp.api.structs.layouts import Layout
@@ -27,16 +29,54 @@ from pieapp.api.globals import Global
 from pieapp.api.structs.statusbar import StatusBarIndex
 from pieapp.api.structs.workbench import WorkbenchItem
 from pieapp.widgets.menus import INDEX_START
+from pieapp.helpers.analysis import AnalysisService
 from pieapp.helpers.files import create_temp_directory
-
+from pieapp.helpers.fingerprint import get_hash_service
+from pieapp.helpers.fingerprint import group_duplicates
+from pieapp.helpers.spectrogram import SpectrogramService
+from pieapp.helpers.tags import TagWriter
+from pieapp.helpers.waveform import WaveformAnalyzer
+
+from converter.acoustic import FingerprintAnalyzer
+from converter.acoustic import get_recording_groups
+from converter.cache import TranscodeCache
+from converter.cache import DEFAULT_CACHE_SIZE
+from converter.costs import CostModel
+from converter.covers import CoverSpec
+from converter.covers import CoverPreparer
+from converter.cutoff import CutoffAnalyzer
+from converter.cutoff import is_suspicious
+from converter.edits import EditStore
+from converter.jobs import JobPriority
+from converter.jobs import ConversionJob
+from converter.loudness import LOUDNESS_ANALYZERS
+from converter.loudness import LoudnessAnalyzer
+from converter.loudness import get_gain_tags
+from converter.mirror import MirrorPlan
+from converter.mirror import MirrorSession
+from converter.presets import get_preset
+from converter.presets import get_preset_analyzers
+from converter.progress import ProgressSnapshot
+from converter.scheduler import ConversionScheduler
+from converter.silence import SilenceAnalyzer
+from converter.silence import detect_silence
+from converter.silence import DEFAULT_SILENCE_DURATION
+from converter.silence import DEFAULT_SILENCE_THRESHOLD
+from converter.workers import PreviewWorker
 from converter.workers import ConverterWorker
 from converter.confpage import ConverterConfigPage
 from converter.widgets.item import ConverterItem
 from converter.widgets.search import ConverterSearch
 from converter.widgets.list import ConverterListWidget
+from converter.widgets.spectrogram import SpectrogramDialog
+from converter.widgets.progress import ConverterProgress
 from pieapp.widgets.waitingspinner import create_wait_spinner
 
 
+# Analyzers run for every listed file, their results are shown in the rows.
+# The other analyzers run when their action is invoked
+ROW_ANALYZERS: tuple[str] = (WaveformAnalyzer.name, SilenceAnalyzer.name)
+
 class Converter(PiePlugin, CoreAccessorsMixin, LayoutAccessorsMixins):
     name = Plugin.Converter
     requires = [Plugin.MainToolBar, Plugin.Preferences, Plugin.Layout, Plugin.Shortcut, Plugin.StatusBar]
@@ -54,6 +94,11 @@ class Converter(PiePlugin, CoreAccessorsMixin, LayoutAccessorsMixins):
         self._temp_folder: Path = None
         self._current_files: list[Path] = []
         self._converter_item_widgets: list[ConverterItem] = []
+        self._job_item_widgets: dict[ConversionJob, ConverterItem] = {}
+        self._verification_failures: int = 0
+        self._cover_preparer: CoverPreparer = None
+        # Copies of the same recording found by `find_similar`, the best source first
+        self._recording_groups: list[list[MediaFile]] = []
 
         self._chunk_size = self.get_config(
             key="ffmpeg.chunk_size",
@@ -78,6 +123,66 @@ class Converter(PiePlugin, CoreAccessorsMixin, LayoutAccessorsMixins):
             )
         )
 
+        # Setup conversion scheduler
+        self._scheduler = ConversionScheduler(
+            self._ffmpeg_command,
+            cost_model=CostModel(history=self.get_config(
+                key="ffmpeg.throughput",
+                default={},
+                scope=Section.Root,
+                section=Section.User
+            )),
+            reader_limits=self.get_config(
+                key="ffmpeg.readers",
+                default={},
+                scope=Section.Root,
+                section=Section.User
+            ),
+            cache=self._get_transcode_cache(),
+            parent=self
+        )
+        self._scheduler.sig_admission_paused.connect(self._conversion_admission_paused)
+        self._scheduler.sig_job_failed.connect(self._conversion_job_failed)
+        self._scheduler.sig_job_verified.connect(self._conversion_job_verified)
+        self._scheduler.sig_batch_completed.connect(self._conversion_batch_completed)
+        self._scheduler.progress.sig_progress_updated.connect(self._conversion_progress_updated)
+        self._progress_widget = ConverterProgress()
+
+        # Setup library mirror
+        self._mirror_session = MirrorSession(self._scheduler, self._ffprobe_command, parent=self)
+        self._mirror_session.sig_mirror_planned.connect(self._mirror_planned)
+        self._mirror_session.sig_mirror_completed.connect(self._mirror_completed)
+        self._mirror_session.sig_mirror_failed.connect(self._mirror_failed)
+
+        # Setup tag writer shared by the plugins that edit metadata
+        self._tag_writer = TagWriter(self._ffmpeg_command, parent=self)
+
+        # Setup analysis shared by the plugins that measure the files
+        self._analysis_service = AnalysisService(
+            self._ffmpeg_command,
+            Global.USER_ROOT / Global.DEFAULT_TEMP_FOLDER_NAME / "analysis",
+            parent=self
+        )
+        self._analysis_service.register_analyzer(LoudnessAnalyzer())
+        self._analysis_service.register_analyzer(SilenceAnalyzer())
+        self._analysis_service.register_analyzer(FingerprintAnalyzer())
+        self._analysis_service.register_analyzer(CutoffAnalyzer())
+        # Waveforms of the listed files are built in the same decoding
+        self._analysis_service.register_analyzer(WaveformAnalyzer(
+            Global.USER_ROOT / Global.DEFAULT_TEMP_FOLDER_NAME / "waveforms"
+        ))
+
+        # Setup spectrograms computed on demand
+        self._spectrogram_service = SpectrogramService(
+            self._ffmpeg_command,
+            Global.USER_ROOT / Global.DEFAULT_TEMP_FOLDER_NAME / "spectrograms",
+            parent=self
+        )
+
+        # Setup edit decision lists stored apart from the sources and their previews
+        self._edit_store = EditStore(Global.USER_ROOT / "edits")
+        self._previews_folder = Global.USER_ROOT / Global.DEFAULT_TEMP_FOLDER_NAME / "previews"
+
         # Setup grid layouts
         self._list_grid_layout = QGridLayout()
 
@@ -113,6 +218,8 @@ class Converter(PiePlugin, CoreAccessorsMixin, LayoutAccessorsMixins):
         self._set_placeholder()
 
     def on_system_shutdown(self) -> None:
+        self._analysis_service.shutdown()
+        get_hash_service().clear()
         if self._temp_folder:
             if not self._temp_folder.exists():
                 return
@@ -130,6 +237,69 @@ class Converter(PiePlugin, CoreAccessorsMixin, LayoutAccessorsMixins):
 
     # Public proxy methods
 
+    def get_selected_files(self) -> list[MediaFile]:
+        """
+        Get selected media files in the list order
+        """
+        rows = sorted(index.row() for index in self._content_list.selected_indexes())
+        return [self._converter_item_widgets[row].media_file for row in rows]
+
+    def get_analysis_service(self) -> AnalysisService:
+        """
+        Get the analysis service. Plugins register their analyzers in it,
+        and a file is decoded once for all the analyzers
+        """
+        return self._analysis_service
+
+    def get_spectrogram_service(self) -> SpectrogramService:
+        """
+        Get the spectrogram service. Tiles are cached by the audio hash, the FFT size and the hop
+        """
+        return self._spectrogram_service
+
+    def get_edits(self, media_file: MediaFile) -> list[Edit]:
+        """
+        Get the edit decision list of the file, applied at the export
+        """
+        return list(media_file.edits)
+
+    def set_edits(self, media_file: MediaFile, edits: list[Edit]) -> None:
+        """
+        Set and store the edit decision list of the file. The source file isn't changed,
+        all the edits are compiled into a single ffmpeg pass at the export
+        """
+        media_file.edits = list(edits)
+        if media_file.audio_hash:
+            self._edit_store.put(media_file.audio_hash, media_file.edits)
+
+        for item in self._converter_item_widgets:
+            if item.media_file is media_file:
+                item.set_edits(len(media_file.edits))
+
+    def preview_edits(
+        self,
+        media_file: MediaFile,
+        start: float,
+        duration: float,
+        callback: callable,
+        error_callback: callable = None
+    ) -> None:
+        """
+        Render a region of the edited file into a WAV file on the thread pool.
+        Renders are cached by the edits, so replaying a region doesn't encode it again
+        """
+        worker = PreviewWorker(media_file, start, duration, self._ffmpeg_command, self._previews_folder)
+        worker.signals.completed.connect(callback)
+        if error_callback:
+            worker.signals.failed.connect(error_callback)
+        QThreadPool.global_instance().start(worker)
+
+    def get_tag_writer(self) -> TagWriter:
+        """
+        Get the batched tag writer. Tags are written on the thread pool
+        """
+        return self._tag_writer
+
     def add_quick_action(
         self,
         name: str,
@@ -145,6 +315,74 @@ class Converter(PiePlugin, CoreAccessorsMixin, LayoutAccessorsMixins):
         for item in self._converter_item_widgets:
             item.add_quick_action(name, text, icon, callback, before, after)
 
+    def _update_scheduler_settings(self) -> None:
+        """
+        Apply settings that can be changed in the preferences while the plugin is running
+        """
+        self._scheduler.set_calibration(self.get_config(
+            key="ffmpeg.calibration",
+            default={},
+            scope=Section.Root,
+            section=Section.User
+        ))
+        self._scheduler.set_verification(self.get_config(
+            key="ffmpeg.verify",
+            default=False,
+            scope=Section.Root,
+            section=Section.User
+        ))
+        self._scheduler.set_covers(self._get_cover_preparer())
+
+    def _get_cover_preparer(self) -> Optional[CoverPreparer]:
+        embed_cover = self.get_config(
+            key="ffmpeg.embed_cover",
+            default=False,
+            scope=Section.Root,
+            section=Section.User
+        )
+        if not embed_cover:
+            return None
+
+        try:
+            cover_spec = CoverSpec(**self.get_config(
+                key="ffmpeg.cover",
+                default={},
+                scope=Section.Root,
+                section=Section.User
+            ))
+        except (TypeError, ValueError) as e:
+            self._logger.error(f"Covers aren't embedded, the cover settings are invalid: {e!s}")
+            return None
+        if self._cover_preparer is None or self._cover_preparer.spec != cover_spec:
+            self._cover_preparer = CoverPreparer(
+                Global.USER_ROOT / Global.DEFAULT_TEMP_FOLDER_NAME / "covers",
+                cover_spec
+            )
+
+        return self._cover_preparer
+
+    def _get_transcode_cache(self) -> Optional[TranscodeCache]:
+        cache_size = self.get_config(
+            key="ffmpeg.cache_size",
+            default=DEFAULT_CACHE_SIZE,
+            scope=Section.Root,
+            section=Section.User
+        )
+        if not cache_size:
+            return None
+
+        cache_folder = self.get_config(
+            key="ffmpeg.cache_folder",
+            default=Global.USER_ROOT / Global.DEFAULT_TEMP_FOLDER_NAME / "transcode",
+            scope=Section.Root,
+            section=Section.User
+        )
+        try:
+            return TranscodeCache(Path(cache_folder), cache_size)
+        except OSError as e:
+            self._logger.error(f"Transcode cache is disabled: {e!s}")
+            return None
+
     # Public API methods
 
     def open_files(self) -> None:
@@ -157,6 +395,13 @@ class Converter(PiePlugin, CoreAccessorsMixin, LayoutAccessorsMixins):
                 section=Section.User
             )
         )
+        stage_network_sources = self.get_config(
+            key="ffmpeg.stage_network_sources",
+            default=False,
+            scope=Section.Root,
+            section=Section.User
+        )
+        self._scheduler.set_staging_folder(self._temp_folder if stage_network_sources else None)
 
         selected_files = QFileDialog.get_open_file_names(caption=translate("Open files"))[0]
         selected_files = list(map(Path, selected_files))
@@ -181,8 +426,238 @@ class Converter(PiePlugin, CoreAccessorsMixin, LayoutAccessorsMixins):
         worker.signals.started.connect(self._worker_started)
         worker.signals.completed.connect(self._worker_finished)
         worker.signals.failed.connect(self._worker_failed)
+        worker.signals.file_failed.connect(self._worker_file_failed)
         pool.start(worker)
 
+    def convert_files(self) -> None:
+        """
+        Convert all files in the content list by the selected preset
+        """
+        if not self._converter_item_widgets or self._scheduler.is_running():
+            return
+
+        output_folder = QFileDialog.get_existing_directory(caption=translate("Select output folder"))
+        if not output_folder:
+            return
+
+        preset = get_preset(self.get_config(
+            key="ffmpeg.preset",
+            scope=Section.Root,
+            section=Section.User
+        ))
+        job_item_widgets = {
+            ConversionJob(
+                media_file=item.media_file,
+                preset=preset,
+                output_path=Path(output_folder) / f"{Path(item.media_file.info.filename).stem}{preset.extension}",
+            ): item
+            for item in self._converter_item_widgets
+        }
+        jobs = list(job_item_widgets.keys())
+
+        # Refuse the batch if its predicted output doesn't fit on the target volume
+        cost_model = self._scheduler.cost_model
+        if not cost_model.fits(Path(output_folder), cost_model.estimate_batch_size(jobs)):
+            status_bar = get_plugin(Plugin.StatusBar)
+            if status_bar:
+                status_bar.show_message(translate("Not enough free space in the output folder"))
+            return
+
+        self.get_tool_button(self.name, WorkbenchItem.Convert).set_disabled(True)
+        analyzer_names = get_preset_analyzers(preset)
+        if not analyzer_names:
+            self._submit_conversion(job_item_widgets)
+            return
+
+        # Normalizing and trimming presets need the analysis of all the files before the encoding
+        status_bar = get_plugin(Plugin.StatusBar)
+        if status_bar:
+            status_bar.show_message(translate("Analyzing %d files") % len(jobs))
+        self._analysis_service.analyze(
+            [job.media_file for job in jobs],
+            lambda media_files: self._submit_conversion(job_item_widgets),
+            names=list(analyzer_names)
+        )
+
+    def remove_duplicates(self) -> None:
+        """
+        Remove the files with the same audio as an earlier file in the list
+        and the lower quality copies of the recordings found by `find_similar`
+        """
+        duplicates = {id(media_file) for group in self._get_duplicate_groups() for media_file in group[1:]}
+        if not duplicates:
+            return
+
+        for row in reversed(range(len(self._converter_item_widgets))):
+            if id(self._converter_item_widgets[row].media_file) in duplicates:
+                self._remove_item(row)
+
+        status_bar = get_plugin(Plugin.StatusBar)
+        if status_bar:
+            status_bar.show_message(translate("Removed %d duplicate files") % len(duplicates))
+        self._show_duplicates()
+        self._content_list_item_removed()
+
+    def find_similar(self) -> None:
+        """
+        Find the copies of the same recording in other formats and bit rates, and suggest the best source to keep
+        """
+        media_files = [item.media_file for item in self._converter_item_widgets]
+        if not media_files:
+            return
+
+        status_bar = get_plugin(Plugin.StatusBar)
+        if status_bar:
+            status_bar.show_message(translate("Looking for similar recordings in %d files") % len(media_files))
+        self._analysis_service.analyze(media_files, self._similar_found, names=[FingerprintAnalyzer.name])
+
+    def measure_loudness(self) -> None:
+        """
+        Measure the loudness of the selected files, or all files if none is selected,
+        and write the ReplayGain/R128 track and album gain tags
+        """
+        media_files = self.get_selected_files() or [item.media_file for item in self._converter_item_widgets]
+        if not media_files:
+            return
+
+        status_bar = get_plugin(Plugin.StatusBar)
+        if status_bar:
+            status_bar.show_message(translate("Measuring loudness of %d files") % len(media_files))
+        self._analysis_service.analyze(media_files, self._loudness_measured, names=list(LOUDNESS_ANALYZERS))
+
+    def find_lossy_sources(self) -> None:
+        """
+        Estimate the lowpass cutoff of all files and mark the ones that look transcoded from a lossy source
+        """
+        media_files = [item.media_file for item in self._converter_item_widgets if item.media_file.info.path]
+        if not media_files:
+            return
+
+        status_bar = get_plugin(Plugin.StatusBar)
+        if status_bar:
+            status_bar.show_message(translate("Estimating cutoffs of %d files") % len(media_files))
+        self._analysis_service.analyze(media_files, self._cutoffs_estimated, names=[CutoffAnalyzer.name])
+
+    def mirror_library(self) -> None:
+        """
+        Keep a transcoded copy of the source library in sync. Only new and changed files are converted
+        """
+        if self._mirror_session.is_running():
+            return
+
+        source_root = QFileDialog.get_existing_directory(caption=translate("Select library folder"))
+        if not source_root:
+            return
+
+        target_root = QFileDialog.get_existing_directory(caption=translate("Select mirror folder"))
+        if not target_root:
+            return
+
+        preset = get_preset(self.get_config(
+            key="ffmpeg.preset",
+            scope=Section.Root,
+            section=Section.User
+        ))
+        self._update_scheduler_settings()
+        self._mirror_session.start(Path(source_root), Path(target_root), preset)
+
+    def _submit_conversion(self, job_item_widgets: dict[ConversionJob, ConverterItem]) -> None:
+        self._update_scheduler_settings()
+        self._job_item_widgets.update(job_item_widgets)
+        self._scheduler.submit(list(job_item_widgets.keys()), longest_first=self.get_config(
+            key="ffmpeg.longest_first",
+            default=True,
+            scope=Section.Root,
+            section=Section.User
+        ))
+
+    def _loudness_measured(self, media_files: list[MediaFile]) -> None:
+        changes = get_gain_tags(media_files)
+        for media_file in media_files:
+            media_file.metadata.tags.update(changes.get(media_file.info.path, {}))
+        self._tag_writer.write(changes)
+
+        status_bar = get_plugin(Plugin.StatusBar)
+        if status_bar:
+            status_bar.show_message(translate("Loudness of %d files is measured") % len(changes))
+
+    def _similar_found(self, media_files: list[MediaFile]) -> None:
+        self._recording_groups = get_recording_groups(media_files)
+        self._show_duplicates()
+
+        status_bar = get_plugin(Plugin.StatusBar)
+        if status_bar:
+            status_bar.show_message(
+                translate("Found %d copies of the same recordings")
+                % sum(len(group) - 1 for group in self._recording_groups)
+            )
+
+    @Slot(MirrorPlan)
+    def _mirror_planned(self, plan: MirrorPlan) -> None:
+        status_bar = get_plugin(Plugin.StatusBar)
+        if status_bar:
+            status_bar.show_message(translate("Mirror: %d to convert, %d moved, %d removed, %d unchanged") % (
+                len(plan.convert), len(plan.move), len(plan.remove), plan.unchanged
+            ))
+
+    @Slot(int, int)
+    def _mirror_completed(self, converted: int, failed: int) -> None:
+        status_bar = get_plugin(Plugin.StatusBar)
+        if status_bar:
+            status_bar.show_message(translate("Mirror is done: %d converted, %d failed") % (converted, failed))
+
+    @Slot(str)
+    def _mirror_failed(self, message: str) -> None:
+        status_bar = get_plugin(Plugin.StatusBar)
+        if status_bar:
+            status_bar.show_message(translate("Mirror has failed: %s") % message)
+
+    @Slot(ConversionJob)
+    def _conversion_admission_paused(self, job: ConversionJob) -> None:
+        status_bar = get_plugin(Plugin.StatusBar)
+        if status_bar:
+            status_bar.show_message(translate("Conversion is paused: not enough free space in the output folder"))
+
+    @Slot(ConversionJob, str)
+    def _conversion_job_failed(self, job: ConversionJob, message: str) -> None:
+        self._logger.error(f"Failed to convert {job.source_path}: {message}")
+
+    @Slot(ConversionJob)
+    def _conversion_job_verified(self, job: ConversionJob) -> None:
+        if not job.verification.passed:
+            self._verification_failures += 1
+            self._logger.error(f"Verification of {job.output_path} has failed: {job.verification.message}")
+
+    @Slot(ProgressSnapshot)
+    def _conversion_progress_updated(self, snapshot: ProgressSnapshot) -> None:
+        for job, progress in snapshot.rows.items():
+            item = self._job_item_widgets.get(job)
+            if item:
+                item.set_progress(progress)
+
+        self._progress_widget.update_snapshot(snapshot)
+
+    @Slot()
+    def _conversion_batch_completed(self) -> None:
+        self._job_item_widgets = {}
+        self._progress_widget.reset()
+
+        # Keep measured throughput for the next batches
+        self.set_config(
+            key="ffmpeg.throughput",
+            data=self._scheduler.cost_model.history,
+            scope=Section.Root,
+            section=Section.User
+        )
+        self.save_config(scope=Section.Root, section=Section.User)
+        self.get_tool_button(self.name, WorkbenchItem.Convert).set_disabled(not self._converter_item_widgets)
+        status_bar = get_plugin(Plugin.StatusBar)
+        if status_bar and self._verification_failures:
+            status_bar.show_message(translate("Done: %d files failed verification") % self._verification_failures)
+        elif status_bar:
+            status_bar.show_message(translate("Done"))
+        self._verification_failures = 0
+
     @Slot(Exception)
     def _worker_failed(self, exception: Exception) -> None:
         self._spinner.stop()
@@ -190,6 +665,14 @@ class Converter(PiePlugin, CoreAccessorsMixin, LayoutAccessorsMixins):
         if status_bar:
             status_bar.show_message(translate("Failed to load files: %s" % str(exception)))
 
+    @Slot(Path, str)
+    def _worker_file_failed(self, file: Path, message: str) -> None:
+        if file in self._current_files:
+            self._current_files.remove(file)
+        status_bar = get_plugin(Plugin.StatusBar)
+        if status_bar:
+            status_bar.show_message(translate("Failed to load file %s" % file.name))
+
     def _worker_started(self) -> None:
         self._clear_placeholder()
         self._list_grid_layout.add_widget(self._spinner, 0, 0, alignment=Qt.AlignmentFlag.AlignHCenter)
@@ -218,8 +701,27 @@ class Converter(PiePlugin, CoreAccessorsMixin, LayoutAccessorsMixins):
             widget.set_title(media_file.info.filename)
             widget.set_description(f"{media_file.info.bit_rate}kb/s")
             widget.set_icon(media_file.info.file_format)
+            if media_file.info.path:
+                # One decoding builds the waveform and finds the silence, later jobs use the cached results
+                self._analysis_service.request(
+                    media_file,
+                    lambda _, w=widget: self._show_analysis(w),
+                    names=list(ROW_ANALYZERS)
+                )
 
             # Add default buttons
+            widget.add_quick_action(
+                name="export",
+                text=translate("Export"),
+                icon=self.get_svg_icon("icons/bolt.svg"),
+                callback=self._export_tool_button_connect
+            )
+            widget.add_quick_action(
+                name="spectrogram",
+                text=translate("Spectrogram"),
+                icon=self.get_svg_icon("icons/discover-tune.svg"),
+                callback=self._spectrogram_tool_button_connect
+            )
             widget.add_quick_action(
                 name="delete",
                 text=translate("Delete"),
@@ -243,8 +745,108 @@ class Converter(PiePlugin, CoreAccessorsMixin, LayoutAccessorsMixins):
             self._converter_item_widgets.append(widget)
 
         self.get_tool_button(self.name, WorkbenchItem.Clear).set_disabled(False)
+        self.get_tool_button(self.name, WorkbenchItem.Convert).set_disabled(self._scheduler.is_running())
         self.sig_converter_table_ready.emit()
 
+        # Identical tracks under other names and tags are grouped once all the listed files are hashed
+        get_hash_service().hash_files(
+            [item.media_file for item in self._converter_item_widgets],
+            self._files_hashed
+        )
+
+    def _files_hashed(self, media_files: list[MediaFile]) -> None:
+        # Edit lists are stored by the audio hash, so they're found after renaming or retagging
+        widgets = {id(item.media_file): item for item in self._converter_item_widgets}
+        for media_file in media_files:
+            if media_file.edits:
+                # Set before the file was hashed
+                self._edit_store.put(media_file.audio_hash, media_file.edits)
+            else:
+                media_file.edits = self._edit_store.get(media_file.audio_hash)
+            if id(media_file) in widgets:
+                widgets[id(media_file)].set_edits(len(media_file.edits))
+
+        self._show_duplicates(announce=True)
+
+    def _get_duplicate_groups(self) -> list[list[MediaFile]]:
+        """
+        Get the groups of the identical files and of the copies of the same recording, the file to keep first
+        """
+        media_files = [item.media_file for item in self._converter_item_widgets]
+        return group_duplicates(media_files) + self._recording_groups
+
+    def _show_duplicates(self, announce: bool = False) -> None:
+        media_files = [item.media_file for item in self._converter_item_widgets]
+        listed = {id(media_file) for media_file in media_files}
+        self._recording_groups = [
+            group for group in (
+                [media_file for media_file in group if id(media_file) in listed]
+                for group in self._recording_groups
+            )
+            if len(group) > 1
+        ]
+
+        groups = {id(media_file): group for group in group_duplicates(media_files) for media_file in group}
+        recordings = {id(media_file): group for group in self._recording_groups for media_file in group}
+        for item in self._converter_item_widgets:
+            group = groups.get(id(item.media_file), [])
+            item.set_duplicates([media_file for media_file in group if media_file is not item.media_file])
+            item.set_similar(recordings.get(id(item.media_file), []))
+
+        duplicates = len(groups) - len({id(group) for group in groups.values()})
+        self.get_tool_button(self.name, WorkbenchItem.RemoveDuplicates).set_disabled(
+            not (duplicates or self._recording_groups)
+        )
+        status_bar = get_plugin(Plugin.StatusBar)
+        if announce and duplicates and status_bar:
+            status_bar.show_message(translate("Found %d duplicate files") % duplicates)
+
+    def _cutoffs_estimated(self, media_files: list[MediaFile]) -> None:
+        suspicious = [
+            media_file for media_file in media_files
+            if is_suspicious(media_file, media_file.analysis.get(CutoffAnalyzer.name))
+        ]
+        analyzed = {id(media_file) for media_file in media_files}
+        for item in self._converter_item_widgets:
+            if id(item.media_file) in analyzed:
+                self._show_cutoff(item)
+
+        status_bar = get_plugin(Plugin.StatusBar)
+        if status_bar:
+            status_bar.show_message(translate("%d files look transcoded from a lossy source") % len(suspicious))
+
+    def _show_cutoff(self, widget: ConverterItem) -> None:
+        cutoff = widget.media_file.analysis.get(CutoffAnalyzer.name)
+        widget.set_cutoff(cutoff["cutoff"] if is_suspicious(widget.media_file, cutoff) else None)
+
+    def _show_analysis(self, widget: ConverterItem) -> None:
+        waveform = widget.media_file.analysis.get(WaveformAnalyzer.name)
+        if waveform is not None:
+            widget.set_waveform(waveform)
+
+        # Estimated before, e.g. for the file listed again
+        self._show_cutoff(widget)
+
+        result = widget.media_file.analysis.get(SilenceAnalyzer.name)
+        if result is None:
+            return
+
+        widget.set_silence(detect_silence(
+            result,
+            threshold=self.get_config(
+                key="ffmpeg.silence_threshold",
+                default=DEFAULT_SILENCE_THRESHOLD,
+                scope=Section.Root,
+                section=Section.User
+            ),
+            min_duration=self.get_config(
+                key="ffmpeg.silence_duration",
+                default=DEFAULT_SILENCE_DURATION,
+                scope=Section.Root,
+                section=Section.User
+            )
+        ))
+
     # ConverterListWidget private methods
 
     def _content_list_item_removed(self) -> None:
@@ -253,6 +855,7 @@ class Converter(PiePlugin, CoreAccessorsMixin, LayoutAccessorsMixins):
         """
         if self._content_list.count() == 0:
             self.get_tool_button(self.name, WorkbenchItem.Clear).set_disabled(True)
+            self.get_tool_button(self.name, WorkbenchItem.Convert).set_disabled(True)
 
     # Private/protected methods
 
@@ -270,24 +873,67 @@ class Converter(PiePlugin, CoreAccessorsMixin, LayoutAccessorsMixins):
         self._list_grid_layout.remove_widget(self._text_label)
         self._list_grid_layout.remove_widget(self._pixmap_label)
 
+    def _remove_item(self, row: int) -> None:
+        """
+        Remove the file from the content list, so it can be opened again
+        """
+        self._content_list.take_item(row)
+        media_file = self._converter_item_widgets.pop(row).media_file
+        if media_file.info.path in self._current_files:
+            self._current_files.remove(media_file.info.path)
+
     def _clear_content_list(self) -> None:
         """
         Clear content list, remove it from the `list_grid_layout` and disable clear button
         """
         self._converter_item_widgets = []
         self._content_list.clear()
+        self._analysis_service.clear()
+        self._spectrogram_service.clear()
 
         self._list_grid_layout.remove_widget(self._search)
         self._list_grid_layout.remove_widget(self._content_list)
         self._set_placeholder()
 
         self._current_files = []
+        self._recording_groups = []
         self.get_tool_button(self.name, WorkbenchItem.Clear).set_disabled(True)
+        self.get_tool_button(self.name, WorkbenchItem.Convert).set_disabled(True)
+        self.get_tool_button(self.name, WorkbenchItem.RemoveDuplicates).set_disabled(True)
 
-    def _delete_tool_button_connect(self, _: MediaFile) -> None:
-        selected_index = self._content_list.selected_indexes()[0]
-        self._content_list.take_item(selected_index.row())
-        del self._converter_item_widgets[selected_index.row()]
+    def _export_tool_button_connect(self, media_file: MediaFile) -> None:
+        """
+        Convert a single file in the interactive lane, preempting the running batch
+        """
+        output_folder = QFileDialog.get_existing_directory(caption=translate("Select output folder"))
+        if not output_folder:
+            return
+
+        preset = get_preset(self.get_config(
+            key="ffmpeg.preset",
+            scope=Section.Root,
+            section=Section.User
+        ))
+        job = ConversionJob(
+            media_file=media_file,
+            preset=preset,
+            output_path=Path(output_folder) / f"{Path(media_file.info.filename).stem}{preset.extension}",
+        )
+        item = next((i for i in self._converter_item_widgets if i.media_file is media_file), None)
+        if item:
+            self._job_item_widgets[job] = item
+
+        self._update_scheduler_settings()
+        self._scheduler.submit([job], priority=JobPriority.Interactive)
+
+    def _spectrogram_tool_button_connect(self, media_file: MediaFile) -> None:
+        SpectrogramDialog(self._parent, media_file, self._spectrogram_service).show()
+
+    def _delete_tool_button_connect(self, media_file: MediaFile) -> None:
+        row = next((i for i, w in enumerate(self._converter_item_widgets) if w.media_file is media_file), None)
+        if row is not None:
+            self._remove_item(row)
+            self._show_duplicates()
 
     # ConverterSearch private methods
 
@@ -318,6 +964,11 @@ class Converter(PiePlugin, CoreAccessorsMixin, LayoutAccessorsMixins):
             main_layout.add_layout(self._list_grid_layout, 1, 0, Qt.AlignmentFlag.AlignTop)
             layout_manager.add_layout(self.name, main_layout)
 
+    @on_plugin_event(target=Plugin.StatusBar)
+    def _on_status_bar_available(self) -> None:
+        status_bar = get_plugin(Plugin.StatusBar)
+        status_bar.insert_permanent_widget(self.name, self._progress_widget, StatusBarIndex.Right)
+
     @on_plugin_event(target=Plugin.Shortcut)
     def _on_shortcut_manager_ready(self) -> None:
         shortcut = get_plugin(Plugin.Shortcut)
@@ -344,7 +995,7 @@ class Converter(PiePlugin, CoreAccessorsMixin, LayoutAccessorsMixins):
     @on_plugin_event(target=Plugin.MainMenuBar)
     def _on_menu_bar_available(self) -> None:
         """
-        Add open file element in the "File" menu
+        Add open file, mirror library, measure loudness, find similar and find lossy sources elements in the "File" menu
         """
         manager = get_plugin(Plugin.MainMenuBar)
         manager.add_menu_item(
@@ -356,6 +1007,42 @@ class Converter(PiePlugin, CoreAccessorsMixin, LayoutAccessorsMixins):
             index=INDEX_START(),
             triggered=self.open_files
         )
+        manager.add_menu_item(
+            section=Section.Shared,
+            menu=MainMenu.File,
+            name=MainMenuItem.MirrorLibrary,
+            text=translate("Mirror library"),
+            icon=self.get_svg_icon("icons/folder.svg"),
+            before=MainMenuItem.Exit,
+            triggered=self.mirror_library
+        )
+        manager.add_menu_item(
+            section=Section.Shared,
+            menu=MainMenu.File,
+            name=MainMenuItem.MeasureLoudness,
+            text=translate("Measure loudness"),
+            icon=self.get_svg_icon("icons/bolt.svg"),
+            before=MainMenuItem.Exit,
+            triggered=self.measure_loudness
+        )
+        manager.add_menu_item(
+            section=Section.Shared,
+            menu=MainMenu.File,
+            name=MainMenuItem.FindSimilar,
+            text=translate("Find similar recordings"),
+            icon=self.get_svg_icon("icons/folder-copy.svg"),
+            before=MainMenuItem.Exit,
+            triggered=self.find_similar
+        )
+        manager.add_menu_item(
+            section=Section.Shared,
+            menu=MainMenu.File,
+            name=MainMenuItem.FindLossySources,
+            text=translate("Find lossy sources"),
+            icon=self.get_svg_icon("icons/discover-tune.svg"),
+            before=MainMenuItem.Exit,
+            triggered=self.find_lossy_sources
+        )
 
     @on_plugin_event(target=Plugin.MainToolBar)
     def _on_workbench_available(self) -> None:
@@ -376,7 +1063,17 @@ class Converter(PiePlugin, CoreAccessorsMixin, LayoutAccessorsMixins):
             name=WorkbenchItem.Convert,
             text=translate("Convert"),
             tooltip=translate("Convert"),
-            icon=self.get_svg_icon("icons/bolt.svg")
+            icon=self.get_svg_icon("icons/bolt.svg"),
+            triggered=self.convert_files
+        ).set_enabled(False)
+
+        self.add_tool_button(
+            section=self.name,
+            name=WorkbenchItem.RemoveDuplicates,
+            text=translate("Remove duplicates"),
+            tooltip=translate("Remove identical files and lower quality copies of the same recording"),
+            icon=self.get_svg_icon("icons/folder-copy.svg"),
+            triggered=self.remove_duplicates
         ).set_enabled(False)
 
         clear_tool_button = self.add_tool_button(
@@ -402,11 +1099,18 @@ class Converter(PiePlugin, CoreAccessorsMixin, LayoutAccessorsMixins):
             after=WorkbenchItem.OpenFiles
         )
 
+        self.add_toolbar_item(
+            toolbar=Plugin.MainToolBar,
+            name=WorkbenchItem.RemoveDuplicates,
+            item=self.get_tool_button(self.name, WorkbenchItem.RemoveDuplicates),
+            after=WorkbenchItem.Convert
+        )
+
         self.add_toolbar_item(
             toolbar=Plugin.MainToolBar,
             name=WorkbenchItem.Clear,
             item=self.get_tool_button(self.name, WorkbenchItem.Clear),
-            after=WorkbenchItem.Convert
+            after=WorkbenchItem.RemoveDuplicates
         )
 
 
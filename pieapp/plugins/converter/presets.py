@@ -0,0 +1,46 @@
+from pieapp.api.structs.media import Preset
+
+from converter.loudness import LOUDNESS_ANALYZERS
+from converter.silence import SilenceAnalyzer
+
+
+DEFAULT_PRESET_NAME = "mp3"
+
+DEFAULT_PRESETS: dict[str, Preset] = {
+    "mp3": Preset(name="mp3", codec="libmp3lame", extension=".mp3", bit_rate="320k"),
+    "opus": Preset(name="opus", codec="libopus", extension=".opus", bit_rate="128k", sample_rate=48000),
+    "flac": Preset(name="flac", codec="flac", extension=".flac"),
+    "wav": Preset(name="wav", codec="pcm_s16le", extension=".wav"),
+    "mp3-normalized": Preset(
+        name="mp3-normalized",
+        codec="libmp3lame",
+        extension=".mp3",
+        bit_rate="320k",
+        loudness=-14.0,
+        true_peak=-1.0
+    ),
+    "mp3-trimmed": Preset(
+        name="mp3-trimmed",
+        codec="libmp3lame",
+        extension=".mp3",
+        bit_rate="320k",
+        trim_silence=-60.0
+    ),
+}
+
+
+def get_preset(name: str = None) -> Preset:
+    """
+    Get preset by its name or the default one
+    """
+    return DEFAULT_PRESETS.get(name, DEFAULT_PRESETS[DEFAULT_PRESET_NAME])
+
+
+def get_preset_analyzers(preset: Preset) -> tuple[str]:
+    """
+    Get names of the analyzers which results the preset applies in the encoding
+    """
+    return (
+        (LOUDNESS_ANALYZERS if preset.loudness is not None else ())
+        + ((SilenceAnalyzer.name,) if preset.trim_silence is not None else ())
+    )
@@ -0,0 +1,134 @@
+from __feature__ import snake_case
+
+import time
+import threading
+import dataclasses as dt
+from typing import Optional
+
+from PySide6.QtCore import Slot
+from PySide6.QtCore import Signal
+from PySide6.QtCore import QObject
+from PySide6.QtCore import QTimer
+
+from converter.jobs import ConversionJob
+
+
+# Snapshots per second published to the UI
+PROGRESS_RATE = 20
+
+
+@dt.dataclass
+class ProgressSnapshot:
+    # Percentages of the rows changed since the previous snapshot
+    rows: dict[ConversionJob, float]
+    # Overall progress in percents
+    progress: float
+    # Audio seconds processed per wall-clock second
+    throughput: float
+    # Estimated time left in seconds
+    eta: Optional[float] = None
+
+
+class ProgressAggregator(QObject):
+    """
+    Collects per-job progress from the worker threads and publishes
+    a coalesced snapshot at a fixed rate, no matter how many jobs are in flight
+    """
+    sig_progress_updated = Signal(ProgressSnapshot)
+
+    def __init__(self, rate: int = PROGRESS_RATE, parent: QObject = None) -> None:
+        super().__init__(parent)
+
+        self._lock = threading.Lock()
+        self._durations: dict[ConversionJob, float] = {}
+        self._processed: dict[ConversionJob, float] = {}
+        self._changed: dict[ConversionJob, float] = {}
+        self._total_duration: float = 0.0
+        self._total_processed: float = 0.0
+        self._started_at: float = None
+        self._estimated_time: float = None
+
+        self._timer = QTimer(self)
+        self._timer.set_interval(1000 // rate)
+        self._timer.timeout.connect(self._publish)
+
+    def add_jobs(self, jobs: list[ConversionJob]) -> None:
+        with self._lock:
+            for job in jobs:
+                duration = job.media_file.info.duration or 0.0
+                self._durations[job] = duration
+                self._total_duration += duration
+
+        if not self._timer.is_active():
+            self._started_at = time.monotonic()
+            self._timer.start()
+
+    def set_estimated_time(self, estimated_time: float) -> None:
+        """
+        Set the predicted batch time used until the throughput is measured
+        """
+        self._estimated_time = estimated_time
+
+    def update(self, job: ConversionJob, processed: float) -> None:
+        """
+        Update job progress. Safe to call from the worker threads
+
+        Args:
+            job (ConversionJob): job instance
+            processed (float): processed time in seconds
+        """
+        with self._lock:
+            duration = self._durations.get(job)
+            if duration is None:
+                return
+
+            processed = min(processed, duration)
+            self._total_processed += processed - self._processed.get(job, 0.0)
+            self._processed[job] = processed
+            self._changed[job] = processed * 100 / duration if duration else 0.0
+
+    def finish(self, job: ConversionJob) -> None:
+        self.update(job, self._durations.get(job, 0.0))
+        with self._lock:
+            if job in self._changed:
+                self._changed[job] = 100.0
+
+    def stop(self) -> None:
+        """
+        Publish the last snapshot and reset the state
+        """
+        self._publish()
+        self._timer.stop()
+        with self._lock:
+            self._durations.clear()
+            self._processed.clear()
+            self._changed.clear()
+            self._total_duration = 0.0
+            self._total_processed = 0.0
+            self._estimated_time = None
+
+    @Slot()
+    def _publish(self) -> None:
+        with self._lock:
+            if not self._changed:
+                return
+
+            rows, self._changed = self._changed, {}
+            total_processed = self._total_processed
+            total_duration = self._total_duration
+
+        elapsed = time.monotonic() - self._started_at
+        throughput = total_processed / elapsed if elapsed > 0 else 0.0
+        if throughput:
+            eta = (total_duration - total_processed) / throughput
+        elif self._estimated_time is not None:
+            eta = max(0.0, self._estimated_time - elapsed)
+        else:
+            eta = None
+
+        self.sig_progress_updated.emit(ProgressSnapshot(
+            rows=rows,
+            progress=total_processed * 100 / total_duration if total_duration else 0.0,
+            throughput=throughput,
+            eta=eta,
+        ))
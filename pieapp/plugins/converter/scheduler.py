@@ -0,0 +1,376 @@
+from __feature__ import snake_case
+
+import os
+import time
+import uuid
+import threading
+from pathlib import Path
+from typing import Optional
+from collections import deque
+
+from PySide6.QtCore import Slot
+from PySide6.QtCore import Signal
+from PySide6.QtCore import QObject
+from PySide6.QtCore import QTimer
+from PySide6.QtCore import QThreadPool
+
+from pieapp.helpers.devices import DeviceType
+from pieapp.helpers.devices import get_device
+from pieapp.helpers.devices import get_device_type
+from pieapp.helpers.devices import advise_will_need
+from pieapp.helpers.governor import ConcurrencyGovernor
+from pieapp.helpers.governor import get_calibration_profile
+
+from converter.cache import TranscodeCache
+from converter.costs import CostModel
+from converter.covers import CoverPreparer
+from converter.jobs import JobPriority
+from converter.jobs import ConversionJob
+from converter.native import NATIVE_BENCHMARK
+from converter.native import is_native_faster
+from converter.progress import ProgressAggregator
+from converter.workers import ConversionWorker
+from converter.workers import VerificationWorker
+
+
+# Interval between governor adjustments in milliseconds
+GOVERNOR_INTERVAL = 2000
+
+# Concurrent readers per source device type. `None` means no limit
+READER_LIMITS: dict[str, int] = {
+    DeviceType.Rotational: 2,
+    DeviceType.Network: 2,
+    DeviceType.NonRotational: None,
+    DeviceType.Unknown: None,
+}
+
+# Number of queued files to read ahead
+READ_AHEAD = 2
+
+
+class ConversionScheduler(QObject):
+    sig_job_started = Signal(ConversionJob)
+    sig_job_completed = Signal(ConversionJob)
+    sig_job_failed = Signal(ConversionJob, str)
+    sig_batch_completed = Signal()
+    sig_admission_paused = Signal(ConversionJob)
+    sig_job_verified = Signal(ConversionJob)
+
+    def __init__(
+        self,
+        ffmpeg_cmd: Path,
+        calibration: dict = None,
+        cost_model: CostModel = None,
+        reader_limits: dict = None,
+        cache: TranscodeCache = None,
+        verify: bool = False,
+        covers: CoverPreparer = None,
+        parent: QObject = None
+    ) -> None:
+        super().__init__(parent)
+
+        self._ffmpeg_cmd = ffmpeg_cmd
+        self._calibration: dict = calibration or {}
+        self._governor: ConcurrencyGovernor = None
+        self._cost_model: CostModel = cost_model or CostModel(calibration=self._calibration)
+        self._cache: TranscodeCache = cache
+        self._verify: bool = verify
+        self._covers: CoverPreparer = covers
+
+        # Priority lanes. Lower value is dispatched first
+        self._queues: dict[int, deque[ConversionJob]] = {
+            JobPriority.Interactive: deque(),
+            JobPriority.Background: deque(),
+        }
+        self._running: list[ConversionJob] = []
+        self._verifying: list[ConversionJob] = []
+        self._suspended: list[ConversionJob] = []
+        self._preempted: set[ConversionJob] = set()
+        self._started_at: dict[ConversionJob, float] = {}
+        # Target volume and predicted output size of the running jobs
+        self._reserved: dict[ConversionJob, tuple[int, int]] = {}
+        self._admission_paused: bool = False
+        self._reader_limits: dict[str, int] = {**READER_LIMITS, **(reader_limits or {})}
+        self._device_types: dict[int, str] = {}
+        self._staging_folder: Path = None
+        self._read_ahead: set[ConversionJob] = set()
+        self._progress = ProgressAggregator(parent=self)
+
+        # Concurrency is limited by the governor, not by the pool.
+        # Suspended jobs keep their pool threads, so there's room for the preempting ones
+        self._pool = QThreadPool(self)
+        self._pool.set_max_thread_count(2 * (os.cpu_count() or 1))
+
+        self._governor_timer = QTimer(self)
+        self._governor_timer.set_interval(GOVERNOR_INTERVAL)
+        self._governor_timer.timeout.connect(self._adjust_workers)
+
+    @property
+    def governor(self) -> ConcurrencyGovernor:
+        return self._governor
+
+    @property
+    def progress(self) -> ProgressAggregator:
+        return self._progress
+
+    @property
+    def cost_model(self) -> CostModel:
+        return self._cost_model
+
+    def set_calibration(self, calibration: dict) -> None:
+        self._calibration = calibration or {}
+        self._cost_model.set_calibration(self._calibration)
+
+    def set_staging_folder(self, staging_folder: Path = None) -> None:
+        """
+        Set local folder to copy sources from network volumes to before encoding.
+        `None` disables staging
+        """
+        self._staging_folder = staging_folder
+
+    def set_verification(self, verify: bool) -> None:
+        """
+        Enable verification of the outputs. Each output is decoded right after
+        its job is completed, while the next jobs are encoded
+        """
+        self._verify = verify
+
+    def set_covers(self, covers: CoverPreparer = None) -> None:
+        """
+        Set cover preparer to embed album covers into the outputs. `None` disables embedding
+        """
+        self._covers = covers
+
+    def is_running(self) -> bool:
+        return bool(self._running or self._verifying or any(self._queues.values()))
+
+    def submit(
+        self,
+        jobs: list[ConversionJob],
+        longest_first: bool = True,
+        priority: int = JobPriority.Background
+    ) -> None:
+        """
+        Add jobs into the queue and start processing them
+
+        Args:
+            jobs (list[ConversionJob]): jobs to process
+            longest_first (bool): order the queue longest-first to minimize the makespan
+                or shortest-first for interactive batches
+            priority (int): priority lane of the jobs (see `JobPriority`)
+        """
+        if not jobs:
+            return
+
+        # Sources are probed for the native backend by the workers, not on the GUI thread
+        prefer_native = is_native_faster(self._calibration.get(NATIVE_BENCHMARK))
+        for job in jobs:
+            job.priority = priority
+            job.device = get_device(job.source_path)
+            job.native = prefer_native and not job.media_file.edits
+            self._device_types[job.device] = get_device_type(job.device, job.source_path)
+
+        if not self.is_running():
+            preset = jobs[0].preset
+            profile = get_calibration_profile(preset.codec, resample=bool(preset.sample_rate))
+            self._governor = ConcurrencyGovernor.from_calibration(self._calibration, profile)
+            self._governor_timer.start()
+
+        queue = self._queues[priority]
+        self._queues[priority] = deque(self._cost_model.sort(list(queue) + jobs, longest_first))
+        self._progress.add_jobs(jobs)
+        self._progress.set_estimated_time(self._cost_model.estimate_batch_time(
+            [j for q in self._queues.values() for j in q] + self._running, self._governor.workers
+        ))
+        # The batch completes at once if none of its jobs can be admitted
+        self._job_finished()
+
+    def cancel(self) -> None:
+        """
+        Drop all queued jobs. Running jobs will be finished
+        """
+        for queue in self._queues.values():
+            queue.clear()
+        self._read_ahead.clear()
+
+        if not self._running:
+            self._job_finished()
+
+    def _can_read(self, device: int) -> bool:
+        """
+        Check whether one more reader fits the limit of the source device.
+        Suspended jobs don't read, so they don't count
+        """
+        limit = self._reader_limits.get(self._device_types.get(device, DeviceType.Unknown))
+        if limit is None:
+            return True
+
+        readers = sum(1 for j in self._running if j.device == device and j not in self._suspended)
+        return readers < limit
+
+    def _get_next_job(self) -> Optional[tuple[deque[ConversionJob], int]]:
+        """
+        Find the first queued job whose source device has a free reader.
+        Lanes are scanned by priority
+
+        Returns:
+            (queue, index) of the job or `None` if all queued devices are busy
+        """
+        for priority in sorted(self._queues):
+            blocked: set[int] = set()
+            for index, job in enumerate(self._queues[priority]):
+                if job.device in blocked:
+                    continue
+                if self._can_read(job.device):
+                    return self._queues[priority], index
+                blocked.add(job.device)
+
+        return None
+
+    def _has_interactive_jobs(self) -> bool:
+        return bool(self._queues[JobPriority.Interactive]) or any(
+            j.priority == JobPriority.Interactive for j in self._running
+        )
+
+    def _preempt(self) -> bool:
+        """
+        Suspend one running background job to free a worker for the interactive one
+        """
+        for job in self._running:
+            if job.priority != JobPriority.Background or job in self._suspended or job.supervisor is None:
+                continue
+
+            if job.supervisor.suspend():
+                self._suspended.append(job)
+                self._preempted.add(job)
+                return True
+
+        return False
+
+    def _resume_suspended(self) -> None:
+        for job in self._suspended:
+            job.supervisor.resume()
+
+        self._suspended.clear()
+
+    def _dispatch(self) -> None:
+        if self._suspended and not self._has_interactive_jobs():
+            self._resume_suspended()
+
+        while True:
+            next_job = self._get_next_job()
+            if next_job is None:
+                break
+
+            queue, index = next_job
+            job = queue[index]
+            if len(self._running) - len(self._suspended) >= self._governor.workers:
+                if job.priority != JobPriority.Interactive or not self._preempt():
+                    break
+
+            volume = self._cost_model.get_volume(job.output_path.parent)
+            reserved = sum(size for job_volume, size in self._reserved.values() if job_volume == volume)
+            if not self._cost_model.can_admit(job, reserved):
+                if not self._running:
+                    # No running job frees its reservation, so the job would wait forever
+                    del queue[index]
+                    self._reject(job, "Not enough free space on the target volume")
+                    continue
+
+                # Pause admission until there's enough free space on the target volume
+                if not self._admission_paused:
+                    self._admission_paused = True
+                    self.sig_admission_paused.emit(job)
+                break
+
+            self._admission_paused = False
+            del queue[index]
+            self._read_ahead.discard(job)
+            job.threads = self._governor.threads
+            if self._staging_folder and self._device_types.get(job.device) == DeviceType.Network:
+                job.staging_path = self._staging_folder / f"{uuid.uuid4().hex}{job.source_path.suffix}"
+
+            self._running.append(job)
+            self._started_at[job] = time.monotonic()
+            self._reserved[job] = (volume, self._cost_model.estimate(job).output_size)
+
+            worker = ConversionWorker(job, self._ffmpeg_cmd, self._progress.update, self._cache, self._covers)
+            worker.signals.started.connect(self.sig_job_started)
+            worker.signals.completed.connect(self._job_completed)
+            worker.signals.failed.connect(self._job_failed)
+            self._pool.start(worker)
+
+        self._advise_read_ahead()
+
+    def _reject(self, job: ConversionJob, message: str) -> None:
+        """
+        Fail the queued job that can't be started
+        """
+        self._read_ahead.discard(job)
+        self._progress.finish(job)
+        self.sig_job_failed.emit(job, message)
+
+    def _advise_read_ahead(self) -> None:
+        """
+        Start reading the next queued files ahead, so they're in the page cache by the time they're dispatched
+        """
+        upcoming = [j for p in sorted(self._queues) for j in self._queues[p]][:READ_AHEAD]
+        paths = [j.source_path for j in upcoming if j not in self._read_ahead]
+        if not paths:
+            return
+
+        self._read_ahead.update(upcoming)
+        threading.Thread(target=advise_will_need, args=(paths,), daemon=True).start()
+
+    @Slot()
+    def _adjust_workers(self) -> None:
+        self._governor.adjust()
+        self._dispatch()
+
+    @Slot(ConversionJob)
+    def _job_completed(self, job: ConversionJob) -> None:
+        self._running.remove(job)
+        # A job suspended after its last check still completes
+        if job in self._suspended:
+            self._suspended.remove(job)
+        self._reserved.pop(job, None)
+        elapsed = time.monotonic() - self._started_at.pop(job)
+        if job not in self._preempted and not job.cached:
+            self._cost_model.record(job, elapsed)
+        self._preempted.discard(job)
+        self._progress.finish(job)
+        self.sig_job_completed.emit(job)
+        if self._verify:
+            self._start_verification(job)
+        self._job_finished()
+
+    def _start_verification(self, job: ConversionJob) -> None:
+        self._verifying.append(job)
+        worker = VerificationWorker(job, self._ffmpeg_cmd)
+        worker.signals.verified.connect(self._job_verified)
+        self._pool.start(worker)
+
+    @Slot(ConversionJob)
+    def _job_verified(self, job: ConversionJob) -> None:
+        self._verifying.remove(job)
+        self.sig_job_verified.emit(job)
+        self._job_finished()
+
+    @Slot(ConversionJob, str)
+    def _job_failed(self, job: ConversionJob, message: str) -> None:
+        self._running.remove(job)
+        if job in self._suspended:
+            self._suspended.remove(job)
+        self._reserved.pop(job, None)
+        self._started_at.pop(job, None)
+        self._preempted.discard(job)
+        self._progress.finish(job)
+        self.sig_job_failed.emit(job, message)
+        self._job_finished()
+
+    def _job_finished(self) -> None:
+        self._dispatch()
+        if not self.is_running():
+            self._governor_timer.stop()
+            self._progress.stop()
+            self.sig_batch_completed.emit()
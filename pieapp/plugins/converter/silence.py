@@ -0,0 +1,149 @@
+"""
+Silence detection. The analyzer keeps the peak level of short windows, so the threshold
+and the minimum duration are applied to the cached levels without decoding again.
+The module doesn't import Qt, so the analysis worker processes import it quickly
+"""
+import base64
+import dataclasses as dt
+from typing import Optional
+
+import numpy as np
+
+from pieapp.helpers.analyzers import Analyzer
+
+# Window of the peak levels in seconds
+SILENCE_WINDOW = 0.01
+
+# Levels are stored in steps of dB below full scale, so a threshold isn't rounded to whole dB.
+# Digital silence is the floor
+SILENCE_STEP = 0.1
+SILENCE_FLOOR = 1440
+
+# Default threshold in dBFS and minimum duration in seconds of a reported gap
+DEFAULT_SILENCE_THRESHOLD = -60.0
+DEFAULT_SILENCE_DURATION = 2.0
+
+
+@dt.dataclass
+class Silence:
+    # Duration of the file in seconds
+    duration: float
+    leading: float = dt.field(default=0.0)
+    trailing: float = dt.field(default=0.0)
+    # Silent gaps inside the file: start and end in seconds
+    gaps: list[tuple[float, float]] = dt.field(default_factory=list)
+    # Whether the whole file is below the threshold
+    is_silent: bool = dt.field(default=False)
+
+
+class SilenceAnalyzer(Analyzer):
+    """
+    Peak level of every window over all channels. Levels of each block are taken
+    out of the state, so the state passed between blocks stays small
+    """
+    name = "silence"
+    version = 2
+
+    def start(self, sample_rate: int, channels: int) -> dict:
+        return {
+            "sample_rate": sample_rate,
+            "window": max(1, round(sample_rate * SILENCE_WINDOW)),
+            "pending": np.zeros((channels, 0), dtype=np.float32),
+            "levels": None,
+        }
+
+    def process(self, state: dict, block: np.ndarray) -> dict:
+        state = dict(state)
+        window = state["window"]
+        samples = np.concatenate((state["pending"], block), axis=1)
+        full = samples.shape[1] // window * window
+        state["pending"] = samples[:, full:].copy()
+        peaks = np.abs(samples[:, :full]).reshape(samples.shape[0], -1, window).max(axis=(0, 2))
+        state["levels"] = _to_levels(peaks)
+        return state
+
+    def take_output(self, state: dict) -> tuple[dict, Optional[np.ndarray]]:
+        state = dict(state)
+        return state, state.pop("levels")
+
+    def join_outputs(self, state: dict, outputs: list[np.ndarray]) -> dict:
+        state = dict(state)
+        levels = list(outputs)
+        if state["pending"].size:
+            # The last window is partial
+            levels.append(_to_levels(np.abs(state["pending"]).max(keepdims=True).ravel()))
+        state["levels"] = np.concatenate(levels) if levels else np.zeros(0, dtype="<u2")
+        return state
+
+    def finish(self, state: dict) -> dict:
+        return {
+            "window": state["window"] / state["sample_rate"],
+            "levels": base64.b64encode(state["levels"].tobytes()).decode("ascii"),
+        }
+
+
+def _to_levels(peaks: np.ndarray) -> np.ndarray:
+    with np.errstate(divide="ignore"):
+        levels = np.round(-20 * np.log10(peaks) / SILENCE_STEP)
+    return np.clip(np.nan_to_num(levels, posinf=SILENCE_FLOOR), 0, SILENCE_FLOOR).astype("<u2")
+
+
+def detect_silence(
+    result: dict,
+    threshold: float = DEFAULT_SILENCE_THRESHOLD,
+    min_duration: float = DEFAULT_SILENCE_DURATION
+) -> Silence:
+    """
+    Find silence in the analyzer result
+
+    Args:
+        result (dict): `SilenceAnalyzer` result
+        threshold (float): level in dBFS at or below which a window is silent
+        min_duration (float): minimum duration of a reported gap in seconds
+
+    Returns:
+        silence (Silence): leading and trailing silence of any duration and the long gaps
+    """
+    window = result["window"]
+    levels = np.frombuffer(base64.b64decode(result["levels"]), dtype="<u2")
+    silent = levels >= round(-threshold / SILENCE_STEP)
+    duration = len(silent) * window
+    if not len(silent) or silent.all():
+        return Silence(duration=duration, leading=duration, is_silent=bool(len(silent)))
+
+    edges = np.diff(np.concatenate(([0], silent.view(np.int8), [0])))
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+    silence = Silence(duration=duration)
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        if start == 0:
+            silence.leading = end * window
+        elif end == len(silent):
+            silence.trailing = (end - start) * window
+        elif (end - start) * window >= min_duration:
+            silence.gaps.append((start * window, end * window))
+
+    return silence
+
+
+def get_trim_range(silence: Silence) -> Optional[tuple[float, float]]:
+    """
+    Get the start and end in seconds of the audio between the leading and trailing silence,
+    or `None` if there's nothing to trim
+    """
+    if silence.is_silent or not (silence.leading or silence.trailing):
+        return None
+
+    return silence.leading, silence.duration - silence.trailing
+
+
+def get_trim_filters(silence: Silence) -> list[str]:
+    """
+    Get ffmpeg audio filters that cut the leading and trailing silence in the encoding pass
+    """
+    trim_range = get_trim_range(silence)
+    if trim_range is None:
+        return []
+
+    start, end = trim_range
+    return [f"atrim=start={start:.3f}:end={end:.3f}", "asetpts=PTS-STARTPTS"]
@@ -1,14 +1,26 @@
 from __feature__ import snake_case
 
-from PySide6.QtGui import Qt, QIcon
+from typing import Optional
+
+from PySide6.QtGui import Qt, QIcon, QPixmap
+from PySide6.QtCore import QItemSelectionModel
 from PySide6.QtWidgets import QWidget, QVBoxLayout, QLabel, QHBoxLayout, QListWidgetItem, QGridLayout, QSplitter
+from PySide6.QtWidgets import QProgressBar
 
+from pieapp.api.managers.locales.helpers import translate
 from pieapp.helpers.qt import get_main_window
+from pieapp.helpers.thumbnails import get_thumbnail_service
+from pieapp.helpers.waveform import Waveform
 from pieapp.widgets.spacer import Spacer
 from pieapp.api.structs.media import MediaFile
 
+from converter.silence import Silence
 from converter.widgets.list import ConverterListWidget
 from converter.widgets.menu import QuickActionMenu
+from converter.widgets.waveform import WaveformMiniature
+
+# Cover thumbnail size in pixels, see `THUMBNAIL_SIZES`
+ROW_THUMBNAIL_SIZE = 48
 
 
 class ConverterItem(QWidget):
@@ -31,13 +43,52 @@ class ConverterItem(QWidget):
         self._description_label = QLabel()
         self._description_label.set_object_name("ConverterItemDescription")
 
+        self._waveform_widget = WaveformMiniature()
+
+        self._duplicate_badge = QLabel(translate("Duplicate"))
+        self._duplicate_badge.set_object_name("ConverterItemBadge")
+        self._duplicate_badge.hide()
+
+        self._similar_badge = QLabel()
+        self._similar_badge.set_object_name("ConverterItemBadge")
+        self._similar_badge.hide()
+
+        self._cutoff_badge = QLabel()
+        self._cutoff_badge.set_object_name("ConverterItemBadge")
+        self._cutoff_badge.hide()
+
+        self._edits_badge = QLabel()
+        self._edits_badge.set_object_name("ConverterItemBadge")
+        self._edits_badge.hide()
+
+        self._silence_badges_layout = QHBoxLayout()
+        self._silence_badges_layout.set_contents_margins(0, 0, 0, 0)
+        self._silence_badges_layout.set_spacing(4)
+
         self._quick_action_menu = QuickActionMenu(media_file=media_file)
 
+        self._progress_bar = QProgressBar()
+        self._progress_bar.set_object_name("ConverterItemProgress")
+        self._progress_bar.set_range(0, 100)
+        self._progress_bar.set_fixed_height(4)
+        self._progress_bar.set_text_visible(False)
+        self._progress_bar.hide()
+
         main_grid_layout = QGridLayout()
 
         title_vbox = QVBoxLayout()
         title_vbox.add_widget(self._title_label, alignment=Qt.AlignmentFlag.AlignLeft)
         title_vbox.add_widget(self._description_label, alignment=Qt.AlignmentFlag.AlignLeft)
+        title_vbox.add_widget(self._waveform_widget, alignment=Qt.AlignmentFlag.AlignLeft)
+        badges_hbox = QHBoxLayout()
+        badges_hbox.set_contents_margins(0, 0, 0, 0)
+        badges_hbox.set_spacing(4)
+        badges_hbox.add_widget(self._duplicate_badge, alignment=Qt.AlignmentFlag.AlignLeft)
+        badges_hbox.add_widget(self._similar_badge, alignment=Qt.AlignmentFlag.AlignLeft)
+        badges_hbox.add_widget(self._cutoff_badge, alignment=Qt.AlignmentFlag.AlignLeft)
+        badges_hbox.add_widget(self._edits_badge, alignment=Qt.AlignmentFlag.AlignLeft)
+        badges_hbox.add_layout(self._silence_badges_layout)
+        title_vbox.add_layout(badges_hbox)
 
         quick_action_hbox = QHBoxLayout()
         quick_action_hbox.add_widget(self._quick_action_menu, alignment=Qt.AlignmentFlag.AlignRight)
@@ -45,6 +96,7 @@ class ConverterItem(QWidget):
         main_grid_layout.add_layout(title_vbox, 0, 0, Qt.AlignmentFlag.AlignLeft)
         main_grid_layout.add_layout(quick_action_hbox, 0, 1, Qt.AlignmentFlag.AlignRight)
         main_grid_layout.add_widget(QSplitter(Qt.Orientation.Horizontal), 1, 1, Qt.AlignmentFlag.AlignBottom)
+        main_grid_layout.add_widget(self._progress_bar, 2, 0, 1, 2)
 
         item_hbox_layout = QHBoxLayout()
         item_hbox_layout.set_contents_margins(12, 15, 10, 15)
@@ -87,7 +139,11 @@ class ConverterItem(QWidget):
 
     def enter_event(self, event: "QEnterEvent") -> None:
         self._quick_action_menu.show()
-        self._parent.set_current_row(self._parent.row(self._list_widget))
+        # Hovering must not drop multiple selected rows
+        if len(self._parent.selected_indexes()) > 1:
+            self._parent.set_current_row(self._parent.row(self._list_widget), QItemSelectionModel.SelectionFlag.NoUpdate)
+        else:
+            self._parent.set_current_row(self._parent.row(self._list_widget))
         for item in self._quick_action_menu.get_items():
             item.set_visible(True)
 
@@ -103,8 +159,100 @@ class ConverterItem(QWidget):
     def set_description(self, description: str) -> None:
         self._description_label.set_text(description)
 
+    def set_progress(self, progress: float) -> None:
+        self._progress_bar.set_value(int(progress))
+        self._progress_bar.set_visible(progress < 100)
+
     def set_icon(self, file_format: str) -> None:
         self._file_format_label.set_text(file_format)
+        self._file_format_label.set_tool_tip(file_format)
+
+        album_cover = self._media_file.metadata.album_cover if self._media_file.metadata else None
+        if album_cover and album_cover.image_path and album_cover.image_path.exists():
+            get_thumbnail_service().request(album_cover.image_path, ROW_THUMBNAIL_SIZE, self._set_thumbnail)
+
+    def set_waveform(self, waveform: Waveform) -> None:
+        self._waveform_widget.set_peaks(waveform.get_coarsest())
+
+    def set_silence(self, silence: Silence) -> None:
+        """
+        Show badges of the leading and trailing silence and of the silent gaps
+        """
+        while self._silence_badges_layout.count():
+            badge = self._silence_badges_layout.take_at(0).widget()
+            if badge:
+                badge.delete_later()
+
+        badges = []
+        if silence.is_silent:
+            badges.append((translate("Silent"), translate("The whole file is silent")))
+        else:
+            if silence.leading:
+                badges.append((translate("Lead %.1fs") % silence.leading, translate("Leading silence")))
+            if silence.trailing:
+                badges.append((translate("Tail %.1fs") % silence.trailing, translate("Trailing silence")))
+            if silence.gaps:
+                badges.append((
+                    translate("%d gaps") % len(silence.gaps),
+                    "\n".join(f"{start:.1f}s - {end:.1f}s" for start, end in silence.gaps)
+                ))
+
+        for text, tooltip in badges:
+            badge = QLabel(text)
+            badge.set_object_name("ConverterItemBadge")
+            badge.set_tool_tip(tooltip)
+            self._silence_badges_layout.add_widget(badge, alignment=Qt.AlignmentFlag.AlignLeft)
+        self._silence_badges_layout.add_stretch()
+
+    def set_duplicates(self, media_files: list[MediaFile]) -> None:
+        """
+        Show the badge of the other files with the same audio, or hide it if there are none
+        """
+        self._duplicate_badge.set_tool_tip("\n".join(
+            [translate("Same audio as:")] + [media_file.info.filename for media_file in media_files]
+        ))
+        self._duplicate_badge.set_visible(bool(media_files))
+
+    def set_similar(self, media_files: list[MediaFile]) -> None:
+        """
+        Show the badge of the copies of the same recording, the best source first, or hide it if there are none
+        """
+        self._similar_badge.set_visible(bool(media_files))
+        if not media_files:
+            return
+
+        best = media_files[0]
+        if best is self._media_file:
+            self._similar_badge.set_text(translate("Best copy"))
+            self._similar_badge.set_tool_tip("\n".join(
+                [translate("Best source of the same recording as:")]
+                + [media_file.info.filename for media_file in media_files[1:]]
+            ))
+        else:
+            self._similar_badge.set_text(translate("Similar"))
+            self._similar_badge.set_tool_tip(translate("Same recording as %s, which is suggested to keep") % best.info.filename)
+
+    def set_cutoff(self, cutoff: Optional[float]) -> None:
+        """
+        Show the badge of a suspicious lowpass cutoff in Hz, or hide it if the cutoff is `None`
+        """
+        self._cutoff_badge.set_visible(cutoff is not None)
+        if cutoff is None:
+            return
+
+        self._cutoff_badge.set_text(translate("Cutoff %.1f kHz") % (cutoff / 1000))
+        self._cutoff_badge.set_tool_tip(translate("Steep lowpass cutoff, the file is likely transcoded from a lossy source"))
+
+    def set_edits(self, count: int) -> None:
+        """
+        Show the badge of the number of edits applied at the export, or hide it if there are none
+        """
+        self._edits_badge.set_visible(count > 0)
+        self._edits_badge.set_text(translate("%d edits") % count)
+        self._edits_badge.set_tool_tip(translate("Edits are applied at the export, the source file isn't changed"))
+
+    def _set_thumbnail(self, pixmap: QPixmap) -> None:
+        self._file_format_label.set_pixmap(pixmap)
 
     def _get_file_format_color(self) -> None:
         color = self._color_props.get(self._media_file.info.file_format, self._color_props.get("default"))
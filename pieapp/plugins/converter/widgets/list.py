@@ -21,7 +21,7 @@ class ConverterListWidget(QListWidget):
         self.set_size_policy(QSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Expanding))
 
         self.set_selection_behavior(QAbstractItemView.SelectionBehavior.SelectRows)
-        self.set_selection_mode(QAbstractItemView.SelectionMode.SingleSelection)
+        self.set_selection_mode(QAbstractItemView.SelectionMode.ExtendedSelection)
 
         self.itemChanged.connect(change_callback)
         self.model().rowsRemoved.connect(remove_callback)
@@ -0,0 +1,44 @@
+from __feature__ import snake_case
+
+from PySide6.QtGui import Qt
+from PySide6.QtWidgets import QLabel
+from PySide6.QtWidgets import QWidget
+from PySide6.QtWidgets import QHBoxLayout
+from PySide6.QtWidgets import QProgressBar
+
+from converter.progress import ProgressSnapshot
+
+
+class ConverterProgress(QWidget):
+    """
+    Status bar widget with overall progress, throughput and ETA
+    """
+
+    def __init__(self, parent=None) -> None:
+        super().__init__(parent)
+
+        self._progress_bar = QProgressBar()
+        self._progress_bar.set_range(0, 100)
+        self._progress_bar.set_fixed_width(160)
+        self._progress_bar.set_text_visible(False)
+
+        self._label = QLabel()
+        self._label.set_object_name("ConverterProgressLabel")
+
+        layout = QHBoxLayout()
+        layout.set_contents_margins(0, 0, 0, 0)
+        layout.add_widget(self._label, alignment=Qt.AlignmentFlag.AlignRight)
+        layout.add_widget(self._progress_bar)
+        self.set_layout(layout)
+        self.hide()
+
+    def update_snapshot(self, snapshot: ProgressSnapshot) -> None:
+        self._progress_bar.set_value(int(snapshot.progress))
+        eta = "--:--" if snapshot.eta is None else "%02d:%02d" % divmod(int(snapshot.eta), 60)
+        self._label.set_text(f"{snapshot.progress:.0f}% • {snapshot.throughput:.1f}x • {eta}")
+        self.show()
+
+    def reset(self) -> None:
+        self._progress_bar.set_value(0)
+        self._label.clear()
+        self.hide()
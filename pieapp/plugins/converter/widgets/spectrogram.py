@@ -0,0 +1,189 @@
+from __feature__ import snake_case
+
+from typing import Optional
+
+from PySide6.QtCore import Qt
+from PySide6.QtCore import QRectF
+from PySide6.QtCore import QLineF
+from PySide6.QtGui import QPen
+from PySide6.QtGui import QColor
+from PySide6.QtGui import QImage
+from PySide6.QtGui import QPixmap
+from PySide6.QtGui import QPainter
+from PySide6.QtWidgets import QLabel
+from PySide6.QtWidgets import QDialog
+from PySide6.QtWidgets import QWidget
+from PySide6.QtWidgets import QComboBox
+from PySide6.QtWidgets import QHBoxLayout
+from PySide6.QtWidgets import QVBoxLayout
+from PySide6.QtWidgets import QDialogButtonBox
+
+from pieapp.api.managers.locales.helpers import translate
+from pieapp.api.structs.media import MediaFile
+from pieapp.helpers.spectrogram import Spectrogram
+from pieapp.helpers.spectrogram import SpectrogramService
+from pieapp.helpers.spectrogram import DEFAULT_FFT_SIZE
+from pieapp.helpers.spectrogram import SPECTROGRAM_FFT_SIZES
+from pieapp.helpers.spectrogram import SPECTROGRAM_TILE_FRAMES
+
+from converter.cutoff import is_suspicious
+
+# Frequency grid steps in Hz, the first one giving at most `MAX_GRID_LINES` lines is drawn
+GRID_STEPS: tuple[int] = (1000, 2000, 4000, 5000, 10000, 20000)
+MAX_GRID_LINES = 12
+
+
+class SpectrogramView(QWidget):
+    """
+    Spectrogram tiles scaled to the widget with the frequency grid and the cutoff line.
+    Tiles are composed once per size, so repaints only copy the pixmap
+    """
+
+    def __init__(self, parent=None, grid_color: str = "#9aa0a6", cutoff_color: str = "#e5534b") -> None:
+        super().__init__(parent)
+        self.set_object_name("SpectrogramView")
+        self.set_minimum_size(480, 240)
+        self.set_mouse_tracking(True)
+
+        self._grid_color = QColor(grid_color)
+        self._cutoff_color = QColor(cutoff_color)
+        self._spectrogram: Optional[Spectrogram] = None
+        self._tiles: list[QImage] = []
+        self._pixmap: Optional[QPixmap] = None
+
+    def set_spectrogram(self, spectrogram: Optional[Spectrogram]) -> None:
+        self._spectrogram = spectrogram
+        self._tiles = [spectrogram.get_tile(index) for index in range(spectrogram.tile_count)] if spectrogram else []
+        self._pixmap = None
+        self.update()
+
+    def resize_event(self, event) -> None:
+        self._pixmap = None
+        super().resize_event(event)
+
+    def mouse_move_event(self, event) -> None:
+        if not self._spectrogram or not self._spectrogram.frames:
+            return
+
+        position = event.position()
+        seconds = position.x() / max(self.width(), 1) * self._spectrogram.duration
+        frequency = (1 - position.y() / max(self.height(), 1)) * self._spectrogram.sample_rate / 2
+        self.set_tool_tip(f"{seconds:.1f} s, {frequency / 1000:.1f} kHz")
+
+    def paint_event(self, event) -> None:
+        if not self._spectrogram or not self._spectrogram.frames:
+            return
+
+        if self._pixmap is None or self._pixmap.size() != self.size():
+            self._pixmap = self._render()
+
+        painter = QPainter(self)
+        painter.draw_pixmap(0, 0, self._pixmap)
+
+        nyquist = self._spectrogram.sample_rate / 2
+        step = next((step for step in GRID_STEPS if nyquist / step <= MAX_GRID_LINES), GRID_STEPS[-1])
+        painter.set_pen(QPen(self._grid_color, 1, Qt.PenStyle.DotLine))
+        for frequency in range(step, int(nyquist), step):
+            y = self._get_y(frequency)
+            painter.draw_line(QLineF(0, y, self.width(), y))
+            painter.draw_text(4, int(y) - 2, f"{frequency // 1000} kHz")
+
+        cutoff = self._spectrogram.cutoff.get("cutoff")
+        if cutoff is not None and cutoff < nyquist:
+            y = self._get_y(cutoff)
+            painter.set_pen(QPen(self._cutoff_color, 1, Qt.PenStyle.DashLine))
+            painter.draw_line(QLineF(0, y, self.width(), y))
+            painter.draw_text(self.width() - 90, int(y) - 2, f"{cutoff / 1000:.1f} kHz")
+        painter.end()
+
+    def _get_y(self, frequency: float) -> float:
+        return self.height() * (1 - frequency / (self._spectrogram.sample_rate / 2))
+
+    def _render(self) -> QPixmap:
+        pixmap = QPixmap(self.size())
+        pixmap.fill(Qt.GlobalColor.black)
+
+        painter = QPainter(pixmap)
+        painter.set_render_hint(QPainter.RenderHint.SmoothPixmapTransform)
+        scale = self.width() / self._spectrogram.frames
+        for index, tile in enumerate(self._tiles):
+            if tile.is_null():
+                continue
+            left = index * SPECTROGRAM_TILE_FRAMES * scale
+            painter.draw_image(QRectF(left, 0, tile.width() * scale, self.height()), tile)
+        painter.end()
+
+        return pixmap
+
+
+class SpectrogramDialog(QDialog):
+    """
+    Spectrogram of a file with the lowpass cutoff estimated from the same pass
+    """
+
+    def __init__(self, parent, media_file: MediaFile, service: SpectrogramService) -> None:
+        super().__init__(parent)
+        self.set_object_name("SpectrogramDialog")
+        self.set_window_title(translate("Spectrogram of %s") % media_file.info.filename)
+        self.set_attribute(Qt.WidgetAttribute.WA_DeleteOnClose)
+        self.resize(960, 480)
+
+        self._media_file = media_file
+        self._service = service
+
+        self._fft_combo_box = QComboBox()
+        for fft_size in SPECTROGRAM_FFT_SIZES:
+            self._fft_combo_box.add_item(translate("FFT %d") % fft_size, fft_size)
+        self._fft_combo_box.set_current_index(SPECTROGRAM_FFT_SIZES.index(DEFAULT_FFT_SIZE))
+        self._fft_combo_box.currentIndexChanged.connect(self._request)
+
+        self._status_label = QLabel()
+        self._status_label.set_object_name("SpectrogramStatus")
+
+        self._view = SpectrogramView()
+
+        button_box = QDialogButtonBox(QDialogButtonBox.StandardButton.Close)
+        button_box.rejected.connect(self.reject)
+
+        top_layout = QHBoxLayout()
+        top_layout.add_widget(self._fft_combo_box)
+        top_layout.add_widget(self._status_label, 1)
+
+        layout = QVBoxLayout()
+        layout.add_layout(top_layout)
+        layout.add_widget(self._view, 1)
+        layout.add_widget(button_box)
+        self.set_layout(layout)
+
+        self._request()
+
+    def _request(self) -> None:
+        self._status_label.set_text(translate("Computing the spectrogram..."))
+        self._service.request(
+            self._media_file,
+            self._spectrogram_ready,
+            fft_size=self._fft_combo_box.current_data(),
+            error_callback=self._spectrogram_failed
+        )
+
+    def _spectrogram_ready(self, spectrogram: Spectrogram) -> None:
+        # A spectrogram of the previously selected FFT size may come late
+        if spectrogram.fft_size != self._fft_combo_box.current_data():
+            return
+
+        self._view.set_spectrogram(spectrogram)
+        cutoff = spectrogram.cutoff.get("cutoff")
+        if cutoff is None:
+            self._status_label.set_text(translate("The file is silent"))
+        elif is_suspicious(self._media_file, spectrogram.cutoff):
+            self._status_label.set_text(
+                translate("Steep cutoff at %.1f kHz: likely transcoded from a lossy source") % (cutoff / 1000)
+            )
+        elif cutoff < spectrogram.cutoff["nyquist"]:
+            self._status_label.set_text(translate("Lowpass cutoff at %.1f kHz") % (cutoff / 1000))
+        else:
+            self._status_label.set_text(translate("No lowpass cutoff"))
+
+    def _spectrogram_failed(self, message: str) -> None:
+        self._status_label.set_text(translate("The spectrogram wasn't computed"))
+        self._status_label.set_tool_tip(message)
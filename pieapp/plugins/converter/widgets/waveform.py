@@ -0,0 +1,75 @@
+from __feature__ import snake_case
+
+import numpy as np
+
+from PySide6.QtCore import QLineF
+from PySide6.QtGui import QColor
+from PySide6.QtGui import QPainter
+from PySide6.QtWidgets import QWidget
+
+from pieapp.helpers.waveform import MIN, MAX, RMS
+from pieapp.helpers.waveform import reduce_peaks
+
+# Miniature size in pixels
+MINIATURE_WIDTH = 160
+MINIATURE_HEIGHT = 20
+
+# Absolute sample value that is considered clipped
+CLIP_LEVEL = 0.999
+
+
+class WaveformMiniature(QWidget):
+    """
+    Waveform drawn from the coarsest pyramid level. Clipped bins are highlighted
+    """
+
+    def __init__(self, parent=None, color: str = "#9aa0a6", clip_color: str = "#e5534b") -> None:
+        super().__init__(parent)
+        self.set_object_name("ConverterItemWaveform")
+        self.set_fixed_size(MINIATURE_WIDTH, MINIATURE_HEIGHT)
+
+        self._color = QColor(color)
+        self._clip_color = QColor(clip_color)
+        self._peaks: np.ndarray = None
+        self.hide()
+
+    def set_peaks(self, peaks: np.ndarray) -> None:
+        """
+        Args:
+            peaks (np.ndarray): (bins, 3) array of min, max and RMS
+        """
+        self._peaks = reduce_peaks(np.asarray(peaks), MINIATURE_WIDTH)
+        self.set_visible(len(self._peaks) > 0)
+        self.update()
+
+    def is_clipped(self) -> bool:
+        if self._peaks is None or not len(self._peaks):
+            return False
+
+        return bool(np.any(np.maximum(-self._peaks[:, MIN], self._peaks[:, MAX]) >= CLIP_LEVEL))
+
+    def paint_event(self, event) -> None:
+        if self._peaks is None or not len(self._peaks):
+            return
+
+        middle = self.height() / 2
+        step = self.width() / len(self._peaks)
+        clipped = np.maximum(-self._peaks[:, MIN], self._peaks[:, MAX]) >= CLIP_LEVEL
+
+        painter = QPainter(self)
+        peak_lines, clip_lines, rms_lines = [], [], []
+        for index, (low, high, rms) in enumerate(self._peaks[:, (MIN, MAX, RMS)].tolist()):
+            x = index * step + step / 2
+            line = QLineF(x, middle - high * middle, x, middle - low * middle)
+            (clip_lines if clipped[index] else peak_lines).append(line)
+            rms_lines.append(QLineF(x, middle - rms * middle, x, middle + rms * middle))
+
+        color = QColor(self._color)
+        color.set_alpha(110)
+        painter.set_pen(color)
+        painter.draw_lines(peak_lines)
+        painter.set_pen(self._clip_color)
+        painter.draw_lines(clip_lines)
+        painter.set_pen(self._color)
+        painter.draw_lines(rms_lines)
+        painter.end()
@@ -1,6 +1,8 @@
 import os
+import shutil
 import ffmpeg
 from pathlib import Path
+from typing import Optional, Union
 from dotty_dict import Dotty
 
 from PySide6.QtCore import Slot
@@ -14,18 +16,105 @@ from pieapp.api.structs.media import Metadata
 from pieapp.api.structs.media import MediaFile
 from pieapp.api.structs.media import AlbumCover
 
+from pieapp.helpers.analyzers import analyze_file
+from pieapp.helpers.analyzers import DEFAULT_ANALYSIS_SAMPLE_RATE
+from pieapp.helpers.ffmpeg import probe
 from pieapp.helpers.ffmpeg import get_cover_album
+from pieapp.helpers.ffmpeg import get_ffmpeg_version
+from pieapp.helpers.ffmpeg import decode_to_null
+from pieapp.helpers.ffmpeg import run_with_progress
+from pieapp.helpers.files import get_partial_path
+from pieapp.helpers.hashing import get_audio_hash
+from pieapp.helpers.hashing import get_file_checksum
 from pieapp.helpers.logger import logger
+from pieapp.helpers.supervisor import Supervisor
+from pieapp.helpers.supervisor import TaskSupervisor
+from pieapp.helpers.supervisor import get_timeout
+from pieapp.helpers.supervisor import get_cpu_limit
+from pieapp.helpers.tags import COVER_EXTENSIONS
+from pieapp.helpers.tags import get_cover_output_options
+
+from converter.cache import TranscodeCache
+from converter.covers import CoverPreparer
+from converter.covers import find_cover
+from converter.edits import get_edits_hash
+from converter.edits import get_edited_stream
+from converter.edits import get_edited_duration
+from converter.edits import render_preview
+from converter.jobs import JobPriority
+from converter.jobs import ConversionJob
+from converter.jobs import VerificationResult
+from converter.presets import get_preset_analyzers
+from converter.loudness import get_loudness_analyzers
+from converter.loudness import get_normalization_gain
+from converter.native import convert_pcm
+from converter.native import can_convert_natively
+from converter.silence import SilenceAnalyzer
+from converter.silence import detect_silence
+from converter.silence import get_trim_range
+from converter.silence import get_trim_filters
+
+# Niceness increment of the background jobs' ffmpeg processes
+BACKGROUND_NICENESS = 10
+
+# Allowed difference between the decoded output and the source durations in seconds.
+# Lossy encoders add padding, so durations never match exactly
+DURATION_TOLERANCE = 0.25
 
 
 class Signals(QObject):
     started = Signal()
     completed = Signal(list)
     failed = Signal(Exception)
+    file_failed = Signal(Path, str)
     album_cover = Signal(AlbumCover)
     metadata_ready = Signal(Metadata)
 
 
+def probe_media_file(ffprobe_cmd: Path, file: Path) -> Optional[MediaFile]:
+    """
+    Run ffprobe and build `MediaFile` without the album cover
+    """
+    probe_result = Dotty(probe(ffprobe_cmd, file))
+    if not probe_result:
+        return None
+
+    probe_result["stream"] = probe_result["streams"][0]
+    probe_result.pop("streams")
+    duration = float(probe_result.get("format.duration") or 0)
+
+    metadata = Metadata(
+        title=probe_result.get("format.tags.title"),
+        genre=probe_result.get("format.tags.genre"),
+        subgenre=probe_result.get("format.tags.subgenre"),
+        track_number=probe_result.get("format.tags.track_number"),
+        featured_artist=probe_result.get("format.tags.album"),
+        primary_artist=probe_result.get("format.tags.album_artist"),
+        tags=dict(probe_result.get("format.tags") or {}),
+    )
+    codec = Codec(
+        name=probe_result.get("stream.codec_name"),
+        type=probe_result.get("stream.codec_type"),
+        long_name=probe_result.get("format.codec_long_name")
+    )
+    info = FileInfo(
+        path=file,
+        filename=os.path.basename(probe_result.get("format.filename")),
+        file_format=probe_result.get("format.format_name"),
+        bit_rate=probe_result.get("stream.bit_rate"),
+        bit_depth=probe_result.get("stream.bit_per_sample"),
+        sample_rate=probe_result.get("stream.sample_rate"),
+        duration=duration,
+        channels=probe_result.get("stream.channels"),
+        channels_layout=probe_result.get("stream.channel_layout"),
+        codec=codec,
+    )
+    return MediaFile(
+        info=info,
+        metadata=metadata
+    )
+
+
 class ConverterWorker(QRunnable):
 
     def __init__(
@@ -50,56 +139,461 @@ class ConverterWorker(QRunnable):
     @Slot()
     def run(self) -> None:
         """
-        Run ffprobe and get file information
+        Run ffprobe and get file information.
+        A failed file doesn't interrupt the rest of the chunk
+        """
+        self._signals.started.emit()
+        probe_results: list[MediaFile] = []
+        for file in self._chunk:
+            try:
+                media_file = self._probe_file(file)
+            except (ffmpeg.Error, OSError, ValueError) as e:
+                logger.critical(f"{file}: {getattr(e, 'stderr', e)!r}")
+                self._signals.file_failed.emit(file, str(e))
+                continue
+
+            if media_file:
+                probe_results.append(media_file)
+
+        self._signals.completed.emit(probe_results)
+
+    def _probe_file(self, file: Path) -> MediaFile:
+        media_file = probe_media_file(self._ffprobe_cmd, file)
+        if not media_file:
+            return None
+
+        album_cover_path = get_cover_album(self._ffmpeg_cmd, file, self._temp_folder, media_file.info.duration)
+        media_file.metadata.album_cover = AlbumCover(
+            image_path=album_cover_path,
+            image_file_format=album_cover_path.stem,
+        )
+        return media_file
+
+
+class ConversionSignals(QObject):
+    started = Signal(ConversionJob)
+    completed = Signal(ConversionJob)
+    failed = Signal(ConversionJob, str)
+
+
+class ConversionWorker(QRunnable):
+
+    def __init__(
+        self,
+        job: ConversionJob,
+        ffmpeg_cmd: Path,
+        progress_callback: callable = None,
+        cache: TranscodeCache = None,
+        covers: CoverPreparer = None
+    ) -> None:
+        super().__init__()
+
+        self._signals = ConversionSignals()
+        self._job = job
+        self._ffmpeg_cmd = ffmpeg_cmd
+        self._progress_callback = progress_callback
+        self._cache = cache
+        self._covers = covers
+
+    @property
+    def signals(self) -> ConversionSignals:
+        return self._signals
+
+    @Slot()
+    def run(self) -> None:
+        """
+        Run ffmpeg and convert file by the job preset.
+        The output is written to a temp file on the target volume and renamed when it's complete
         """
+        self._signals.started.emit(self._job)
+        partial_path = get_partial_path(self._job.output_path)
         try:
-            self._signals.started.emit()
-            probe_results: list[MediaFile] = []
-            for file in self._chunk:
-                probe_result = Dotty(ffmpeg.probe(file.as_posix(), self._ffprobe_cmd.as_posix()))
-                album_cover_path = get_cover_album(self._ffmpeg_cmd, file, self._temp_folder)
-                album_cover = AlbumCover(
-                    image_path=album_cover_path,
-                    image_file_format=album_cover_path.stem,
-                )
-
-                if probe_result:
-                    probe_result["stream"] = probe_result["streams"][0]
-                    probe_result.pop("streams")
-                    metadata = Metadata(
-                        title=probe_result.get("format.tags.title"),
-                        genre=probe_result.get("format.tags.genre"),
-                        subgenre=probe_result.get("format.tags.subgenre"),
-                        track_number=probe_result.get("format.tags.track_number"),
-                        featured_artist=probe_result.get("format.tags.album"),
-                        primary_artist=probe_result.get("format.tags.album_artist"),
-                        album_cover=album_cover
-                    )
-                    codec = Codec(
-                        name=probe_result.get("stream.codec_name"),
-                        type=probe_result.get("stream.codec_type"),
-                        long_name=probe_result.get("format.codec_long_name")
-                    )
-                    info = FileInfo(
-                        filename=os.path.basename(probe_result.get("format.filename")),
-                        file_format=probe_result.get("format.format_name"),
-                        bit_rate=probe_result.get("stream.bit_rate"),
-                        bit_depth=probe_result.get("stream.bit_per_sample"),
-                        sample_rate=probe_result.get("stream.sample_rate"),
-                        duration=probe_result.get("stream.duration_ts"),
-                        channels=probe_result.get("stream.channels"),
-                        channels_layout=probe_result.get("stream.channel_layout"),
-                        codec=codec,
-                    )
-                    media_file = MediaFile(
-                        info=info,
-                        metadata=metadata
-                    )
-                    probe_results.append(media_file)
-
-            self._signals.completed.emit(probe_results)
-
-        except ffmpeg.Error as e:
-            logger.critical(e.stderr)
-            self._signals.failed.emit(e)
-            raise e
+            cover_path = self._prepare_cover()
+            if self._cache:
+                self._convert_cached(partial_path, cover_path)
+            else:
+                self._convert(partial_path, cover_path=cover_path)
+            os.replace(partial_path, self._job.output_path)
+        except (ffmpeg.Error, OSError, ValueError) as e:
+            logger.critical(getattr(e, "stderr", e))
+            if partial_path.exists():
+                partial_path.unlink()
+            self._signals.failed.emit(self._job, str(e))
+            return
+        except Exception as e:
+            logger.critical(f"Conversion of {self._job.source_path} failed: {e!r}")
+            partial_path.unlink(missing_ok=True)
+            self._signals.failed.emit(self._job, str(e))
+            return
+        finally:
+            if self._job.staging_path and self._job.staging_path.exists():
+                self._job.staging_path.unlink()
+
+        # The library mirror matches the renamed sources by the hash, the source was just read
+        if self._job.audio_hash is None:
+            try:
+                self._job.audio_hash = self._job.media_file.audio_hash or get_audio_hash(self._job.source_path)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Audio of {self._job.source_path} wasn't hashed: {e}")
+
+        self._signals.completed.emit(self._job)
+
+    def _prepare_cover(self) -> Optional[Path]:
+        """
+        Get the cover prepared by the cover spec, if the output container can hold it
+        """
+        if self._covers is None or self._job.output_path.suffix.lower() not in COVER_EXTENSIONS:
+            return None
+
+        image_path = find_cover(self._job.media_file)
+        if image_path is None:
+            return None
+
+        try:
+            return self._covers.prepare(image_path)
+        except OSError:
+            raise
+        except Exception as e:
+            # The cover is optional, the audio is converted without it
+            logger.error(f"Cover {image_path} wasn't prepared: {e!r}")
+            return None
+
+    def _convert_cached(self, output_path: Path, cover_path: Path = None) -> None:
+        """
+        Materialize the output from the transcode cache or encode it and store in the cache.
+        Cache entries are tagless, so the source tags and the cover are applied afterwards
+        """
+        self._job.audio_hash = get_audio_hash(self._job.source_path)
+        key = TranscodeCache.get_key(
+            self._job.audio_hash,
+            self._job.preset,
+            get_ffmpeg_version(self._ffmpeg_cmd),
+            edits_hash=get_edits_hash(self._job.media_file) if self._job.media_file.edits else None
+        )
+        has_tags = bool(self._job.media_file.metadata and self._job.media_file.metadata.tags)
+        needs_remux = has_tags or cover_path is not None
+        tagless_path = get_partial_path(output_path) if needs_remux else output_path
+        try:
+            self._job.cached = self._cache.materialize(key, tagless_path)
+            if not self._job.cached:
+                self._convert(tagless_path, map_metadata=False)
+                self._cache.put(key, tagless_path)
+
+            if needs_remux:
+                self._apply_tags(tagless_path, output_path, cover_path)
+        finally:
+            if needs_remux and tagless_path.exists():
+                tagless_path.unlink()
+
+    def _apply_tags(self, tagless_path: Path, output_path: Path, cover_path: Path = None) -> None:
+        """
+        Remux the tagless file with the source tags and the cover. The audio is copied
+        """
+        args = [
+            self._ffmpeg_cmd.as_posix(), "-y", "-loglevel", "error",
+            "-i", tagless_path.as_posix(),
+            "-i", self._job.source_path.as_posix(),
+        ]
+        if cover_path:
+            args += ["-i", cover_path.as_posix()]
+
+        args += ["-map", "0:a"]
+        if cover_path:
+            args += ["-map", "2:0"]
+
+        args += [
+            "-map_metadata", "1",
+            "-map_metadata:s:a", "1:s:a",
+            "-c", "copy",
+        ]
+        if cover_path:
+            for key, value in get_cover_output_options(output_path.suffix.lower()).items():
+                args += [f"-{key}", str(value)]
+
+        args.append(output_path.as_posix())
+        duration = self._job.media_file.info.duration
+        Supervisor(args, timeout=get_timeout(duration), cpu_limit=get_cpu_limit(duration)).run()
+
+    def _convert(self, output_path: Path, map_metadata: bool = True, cover_path: Path = None) -> None:
+        source_path = self._job.source_path
+        if self._job.staging_path:
+            shutil.copyfile(source_path, self._job.staging_path)
+            source_path = self._job.staging_path
+
+        if self._job.native:
+            # The source is probed here, off the GUI thread
+            self._job.native = cover_path is None and can_convert_natively(source_path, self._job.preset)
+        if self._job.native:
+            self._convert_native(source_path, output_path, map_metadata)
+            return
+
+        if self._job.media_file.edits:
+            self._convert_edited(source_path, output_path, map_metadata, cover_path)
+            return
+
+        options = {
+            "threads": self._job.threads,
+            **({} if map_metadata else {"map_metadata": -1}),
+            **self._job.preset.get_output_options()
+        }
+        audio_filters = self._get_audio_filters(options.get("af"))
+        if audio_filters:
+            options["af"] = ",".join(audio_filters)
+
+        source = ffmpeg.input(source_path.as_posix())
+        if cover_path:
+            # The prepared cover is muxed as is: `-map 0:a -map 1:v -c:v copy`
+            cover = ffmpeg.input(cover_path.as_posix())
+            options.update(get_cover_output_options(output_path.suffix.lower()))
+            stream = ffmpeg.output(source.audio, cover.video, output_path.as_posix(), **options)
+        else:
+            stream = source.output(output_path.as_posix(), vn=None, **options)
+        run_with_progress(
+            stream,
+            self._ffmpeg_cmd,
+            progress_callback=self._report_progress,
+            duration=self._job.media_file.info.duration,
+            niceness=BACKGROUND_NICENESS if self._job.priority == JobPriority.Background else 0,
+            started_callback=self._set_supervisor,
+            threads=self._job.threads
+        )
+
+    def _convert_edited(
+        self,
+        source_path: Path,
+        output_path: Path,
+        map_metadata: bool = True,
+        cover_path: Path = None
+    ) -> None:
+        """
+        Encode the edited audio in one pass, the edits are compiled into a single filter graph.
+        The cover is muxed afterwards with the audio copied, since the graph output is mapped explicitly
+        """
+        if cover_path:
+            tagless_path = get_partial_path(output_path)
+            try:
+                self._convert_edited(source_path, tagless_path, map_metadata=False)
+                self._apply_tags(tagless_path, output_path, cover_path)
+            finally:
+                tagless_path.unlink(missing_ok=True)
+            return
+
+        options = {
+            "threads": self._job.threads,
+            **({} if map_metadata else {"map_metadata": -1}),
+            **self._job.preset.get_output_options()
+        }
+        audio_filters = self._get_audio_filters(options.pop("af", None), is_edited=True)
+        stream = get_edited_stream(
+            ffmpeg.input(source_path.as_posix()),
+            self._job.media_file,
+            output_path,
+            filters=audio_filters,
+            **options
+        )
+        run_with_progress(
+            stream,
+            self._ffmpeg_cmd,
+            progress_callback=self._report_progress,
+            duration=get_edited_duration(self._job.media_file) or self._job.media_file.info.duration,
+            niceness=BACKGROUND_NICENESS if self._job.priority == JobPriority.Background else 0,
+            started_callback=self._set_supervisor,
+            threads=self._job.threads
+        )
+
+    def _convert_native(self, source_path: Path, output_path: Path, map_metadata: bool = True) -> None:
+        """
+        Convert uncompressed audio in the worker thread, without the ffmpeg process and the pipe copies
+        """
+        preset = self._job.preset
+        self._measure(get_preset_analyzers(preset))
+
+        media_file = self._job.media_file
+        trim_range = None
+        if preset.trim_silence is not None:
+            trim_range = get_trim_range(detect_silence(media_file.analysis["silence"], preset.trim_silence))
+
+        # The conversion runs in this thread, so it's suspended and timed out between the chunks
+        supervisor = TaskSupervisor(source_path.as_posix(), timeout=get_timeout(media_file.info.duration))
+        self._set_supervisor(supervisor)
+        convert_pcm(
+            source_path,
+            output_path,
+            preset,
+            gain=get_normalization_gain(media_file, preset),
+            trim=trim_range,
+            copy_tags=map_metadata,
+            progress_callback=self._report_progress,
+            supervisor=supervisor
+        )
+
+    def _get_audio_filters(self, preset_filters: Optional[str], is_edited: bool = False) -> list[str]:
+        """
+        Get the preset filters with the trimming and the normalization of the file.
+        Both use the analysis results, so they're applied in the encoding pass:
+        unlike the two-pass `loudnorm`, the audio isn't decoded again.
+        Edited files are neither trimmed nor normalized: silence and loudness are measured
+        on the source, and the edits change both
+        """
+        preset = self._job.preset
+        media_file = self._job.media_file
+        if is_edited:
+            if preset.loudness is not None:
+                logger.warning(f"{media_file.info.path} is edited, the loudness isn't normalized")
+            return [preset_filters] if preset_filters else []
+
+        self._measure(get_preset_analyzers(preset))
+
+        audio_filters = []
+        if preset.trim_silence is not None:
+            audio_filters += get_trim_filters(detect_silence(media_file.analysis["silence"], preset.trim_silence))
+        if preset_filters:
+            audio_filters.append(preset_filters)
+
+        gain = get_normalization_gain(media_file, preset)
+        if gain is not None:
+            audio_filters.append(f"volume={gain:.2f}dB")
+
+        return audio_filters
+
+    def _measure(self, names: tuple[str]) -> None:
+        """
+        Run the analyzers that weren't run before the conversion, with a single decoding
+        """
+        media_file = self._job.media_file
+        analyzers = [
+            analyzer for analyzer in get_loudness_analyzers() + [SilenceAnalyzer()]
+            if analyzer.name in names and analyzer.name not in media_file.analysis
+        ]
+        if not analyzers:
+            return
+
+        media_file.analysis.update(analyze_file(
+            self._ffmpeg_cmd,
+            self._job.source_path,
+            analyzers,
+            sample_rate=int(float(media_file.info.sample_rate or 0)) or DEFAULT_ANALYSIS_SAMPLE_RATE,
+            channels=1 if media_file.info.channels == 1 else 2,
+            duration=media_file.info.duration
+        ))
+
+    def _set_supervisor(self, supervisor: Union[Supervisor, TaskSupervisor]) -> None:
+        self._job.supervisor = supervisor
+
+    def _report_progress(self, processed: float) -> None:
+        if self._progress_callback:
+            self._progress_callback(self._job, processed)
+
+
+class VerificationSignals(QObject):
+    verified = Signal(ConversionJob)
+
+
+class VerificationWorker(QRunnable):
+    """
+    Decode the job output to null, compare its duration with the source one
+    and compute the output checksum. The result is stored in `ConversionJob.verification`
+    """
+
+    def __init__(self, job: ConversionJob, ffmpeg_cmd: Path) -> None:
+        super().__init__()
+
+        self._signals = VerificationSignals()
+        self._job = job
+        self._ffmpeg_cmd = ffmpeg_cmd
+
+    @property
+    def signals(self) -> VerificationSignals:
+        return self._signals
+
+    @Slot()
+    def run(self) -> None:
+        try:
+            expected_duration = self._get_expected_duration()
+            duration, stderr = decode_to_null(
+                self._ffmpeg_cmd,
+                self._job.output_path,
+                duration=expected_duration,
+                niceness=BACKGROUND_NICENESS
+            )
+            checksum = get_file_checksum(self._job.output_path)
+        except (ffmpeg.Error, OSError) as e:
+            self._job.verification = VerificationResult(passed=False, message=str(getattr(e, "stderr", e)))
+            self._signals.verified.emit(self._job)
+            return
+        except Exception as e:
+            logger.error(f"Verification of {self._job.output_path} failed: {e!r}")
+            self._job.verification = VerificationResult(passed=False, message=str(e))
+            self._signals.verified.emit(self._job)
+            return
+
+        message = stderr.decode("utf-8", errors="ignore").strip() or None
+        if expected_duration and abs(duration - expected_duration) > DURATION_TOLERANCE:
+            message = f"Decoded duration {duration:.2f}s doesn't match the source duration {expected_duration:.2f}s"
+
+        self._job.verification = VerificationResult(
+            passed=message is None,
+            duration=duration,
+            checksum=checksum,
+            message=message,
+        )
+        self._signals.verified.emit(self._job)
+
+    def _get_expected_duration(self) -> float:
+        """
+        Get the source duration without the trimmed silence, or the duration of the edited output.
+        It's unknown if the trimmed file wasn't analyzed or a clip of unknown duration is inserted
+        """
+        if self._job.media_file.edits:
+            return get_edited_duration(self._job.media_file) or 0.0
+
+        duration = float(self._job.media_file.info.duration or 0)
+        threshold = self._job.preset.trim_silence
+        if threshold is None:
+            return duration
+
+        result = self._job.media_file.analysis.get(SilenceAnalyzer.name)
+        if result is None:
+            return 0.0
+
+        silence = detect_silence(result, threshold)
+        if not get_trim_filters(silence):
+            return duration
+
+        return max(0.0, duration - silence.leading - silence.trailing)
+
+
+class PreviewSignals(QObject):
+    completed = Signal(Path)
+    failed = Signal(str)
+
+
+class PreviewWorker(QRunnable):
+    """
+    Render a short region of the edited file, see `render_preview`
+    """
+
+    def __init__(self, media_file: MediaFile, start: float, duration: float, ffmpeg_cmd: Path, folder: Path) -> None:
+        super().__init__()
+
+        self._signals = PreviewSignals()
+        self._media_file = media_file
+        self._start = start
+        self._duration = duration
+        self._ffmpeg_cmd = ffmpeg_cmd
+        self._folder = folder
+
+    @property
+    def signals(self) -> PreviewSignals:
+        return self._signals
+
+    @Slot()
+    def run(self) -> None:
+        try:
+            preview_path = render_preview(self._ffmpeg_cmd, self._media_file, self._start, self._duration, self._folder)
+        except (ffmpeg.Error, OSError, ValueError) as e:
+            logger.error(getattr(e, "stderr", e))
+            self._signals.failed.emit(str(e))
+            return
+
+        self._signals.completed.emit(preview_path)
@@ -0,0 +1,247 @@
+from __feature__ import snake_case
+
+import sys
+import shutil
+import hashlib
+import dataclasses as dt
+from pathlib import Path
+from typing import Any, Optional
+
+from PySide6.QtCore import QObject
+from PySide6.QtCore import Signal
+
+from pieapp.api.structs.media import AlbumCover
+from pieapp.api.structs.media import MediaFile
+from pieapp.helpers.files import get_partial_path
+
+from metadata.models import to_text
+from metadata.models import set_metadata_fields
+
+# Maximum estimated size of the history in bytes
+DEFAULT_HISTORY_SIZE = 32 * 1024 * 1024
+
+# Maximum number of commands
+DEFAULT_HISTORY_LENGTH = 100
+
+# Estimated size of a single field change without its values
+CHANGE_OVERHEAD = 120
+
+# `Metadata` field stored as a cover reference
+COVER_FIELD = "album_cover"
+
+
+class CoverStore:
+    """
+    Keeps cover images by their content hash, so the history refers to a cover by a short key
+    and the same image is stored once
+    """
+
+    def __init__(self, folder: Path) -> None:
+        self._folder = Path(folder)
+
+    def put(self, image_path: Path) -> Optional[str]:
+        """
+        Store the image
+
+        Returns:
+            key (str|None): content hash of the image or `None` if the image can't be read
+        """
+        try:
+            data = image_path.read_bytes()
+        except OSError:
+            return None
+
+        key = f"{hashlib.blake2b(data, digest_size=16).hexdigest()}{image_path.suffix.lower()}"
+        cover_path = self._folder / key
+        if not cover_path.exists():
+            self._folder.mkdir(parents=True, exist_ok=True)
+            partial_path = get_partial_path(cover_path)
+            shutil.copyfile(image_path, partial_path)
+            partial_path.replace(cover_path)
+
+        return key
+
+    def get(self, key: str) -> Optional[Path]:
+        cover_path = self._folder / key
+        return cover_path if cover_path.exists() else None
+
+
+@dt.dataclass
+class MetadataCommand:
+    text: str
+    # Field changes: file, field name, old and new value. Covers are stored as `CoverStore` keys
+    changes: list[tuple[MediaFile, str, Any, Any]] = dt.field(default_factory=list)
+    # Estimated size in bytes
+    size: int = dt.field(default=0)
+
+
+class MetadataHistory(QObject):
+    """
+    Undo/redo stack of metadata changes. Each command holds only the changed fields,
+    so a bulk edit of many files is a single command. The oldest commands are evicted
+    when the history outgrows its limits
+    """
+    sig_history_changed = Signal()
+
+    def __init__(
+        self,
+        cover_store: CoverStore,
+        max_size: int = DEFAULT_HISTORY_SIZE,
+        max_length: int = DEFAULT_HISTORY_LENGTH,
+        parent: QObject = None
+    ) -> None:
+        super().__init__(parent)
+
+        self._cover_store = cover_store
+        self._max_size = max_size
+        self._max_length = max_length
+        self._undo_stack: list[MetadataCommand] = []
+        self._redo_stack: list[MetadataCommand] = []
+        self._size = 0
+
+    def can_undo(self) -> bool:
+        return bool(self._undo_stack)
+
+    def can_redo(self) -> bool:
+        return bool(self._redo_stack)
+
+    def clear(self) -> None:
+        self._undo_stack.clear()
+        self._redo_stack.clear()
+        self._size = 0
+        self.sig_history_changed.emit()
+
+    def apply(
+        self,
+        text: str,
+        values: list[tuple[MediaFile, dict[str, str]]],
+        covers: dict[int, Optional[Path]] = None
+    ) -> dict[Path, dict[str, Optional[str]]]:
+        """
+        Apply edited values to the files metadata and record them as one command
+
+        Args:
+            text (str): command description
+            values (list[tuple[MediaFile, dict[str, str]]]): edited text values by field name per file
+            covers (dict[int, Path|None]): new cover images by the index of the file in `values`
+
+        Returns:
+            tags (dict[Path, dict[str, str|None]]): changed tags to write by file path
+        """
+        covers = covers or {}
+        command = MetadataCommand(text)
+        tags = {}
+        for index, (media_file, file_values) in enumerate(values):
+            metadata = media_file.metadata
+            fields = {
+                field: value or None for field, value in file_values.items()
+                if value != to_text(getattr(metadata, field))
+            }
+            for field, value in fields.items():
+                command.changes.append((media_file, field, getattr(metadata, field), value))
+
+            cover_keys = self._get_cover_keys(media_file, covers[index]) if index in covers else None
+            if cover_keys is not None:
+                # The cover is set with the other fields, so it's written into the file with them
+                command.changes.append((media_file, COVER_FIELD, *cover_keys))
+                fields[COVER_FIELD] = self._get_album_cover(cover_keys[1])
+
+            file_tags = set_metadata_fields(metadata, fields)
+            if file_tags:
+                tags[media_file.info.path] = file_tags
+
+        if command.changes:
+            command.size = sum(CHANGE_OVERHEAD + sys.getsizeof(old) + sys.getsizeof(new) for *_, old, new in command.changes)
+            self._push(command)
+
+        return tags
+
+    def undo(self) -> dict[Path, dict[str, Optional[str]]]:
+        """
+        Revert the last command
+
+        Returns:
+            tags (dict[Path, dict[str, str|None]]): changed tags to write by file path
+        """
+        if not self._undo_stack:
+            return {}
+
+        command = self._undo_stack.pop()
+        self._redo_stack.append(command)
+        tags = self._set_values(command, is_undo=True)
+        self.sig_history_changed.emit()
+        return tags
+
+    def redo(self) -> dict[Path, dict[str, Optional[str]]]:
+        """
+        Apply the last reverted command again
+
+        Returns:
+            tags (dict[Path, dict[str, str|None]]): changed tags to write by file path
+        """
+        if not self._redo_stack:
+            return {}
+
+        command = self._redo_stack.pop()
+        self._undo_stack.append(command)
+        tags = self._set_values(command, is_undo=False)
+        self.sig_history_changed.emit()
+        return tags
+
+    def _get_cover_keys(
+        self,
+        media_file: MediaFile,
+        image_path: Optional[Path]
+    ) -> Optional[tuple[Optional[str], Optional[str]]]:
+        """
+        Store the old and the new cover of the file
+
+        Returns:
+            keys (tuple[str|None, str|None]|None): old and new cover keys or `None` if the cover isn't changed
+        """
+        album_cover = media_file.metadata.album_cover
+        old_path = album_cover.image_path if album_cover else None
+        old_key = self._cover_store.put(old_path) if old_path else None
+        new_key = self._cover_store.put(image_path) if image_path else None
+        if old_key == new_key:
+            return None
+
+        return old_key, new_key
+
+    def _get_album_cover(self, key: Optional[str]) -> Optional[AlbumCover]:
+        image_path = self._cover_store.get(key) if key else None
+        if image_path is None:
+            return None
+
+        return AlbumCover(image_path=image_path, image_file_format=image_path.suffix.lstrip("."))
+
+    def _set_values(self, command: MetadataCommand, is_undo: bool) -> dict[Path, dict[str, Optional[str]]]:
+        # Group the changes by file to compare the tags once per file
+        fields_by_file: dict[int, tuple[MediaFile, dict[str, Any]]] = {}
+        changes = reversed(command.changes) if is_undo else command.changes
+        for media_file, field, old, new in changes:
+            value = old if is_undo else new
+            if field == COVER_FIELD:
+                value = self._get_album_cover(value)
+            fields_by_file.setdefault(id(media_file), (media_file, {}))[1][field] = value
+
+        tags = {}
+        for media_file, fields in fields_by_file.values():
+            file_tags = set_metadata_fields(media_file.metadata, fields)
+            if file_tags:
+                tags[media_file.info.path] = file_tags
+
+        return tags
+
+    def _push(self, command: MetadataCommand) -> None:
+        self._undo_stack.append(command)
+        self._redo_stack.clear()
+        self._size = sum(c.size for c in self._undo_stack)
+
+        # The last command is kept even if it's over the limit
+        while len(self._undo_stack) > 1 and (
+            self._size > self._max_size or len(self._undo_stack) > self._max_length
+        ):
+            self._size -= self._undo_stack.pop(0).size
+
+        self.sig_history_changed.emit()
@@ -0,0 +1,347 @@
+from __feature__ import snake_case
+
+import re
+from typing import Any, Optional
+
+from PySide6.QtCore import Qt
+from PySide6.QtCore import QModelIndex
+from PySide6.QtCore import QAbstractTableModel
+from PySide6.QtGui import QFont
+
+from pieapp.api.managers.locales.helpers import translate
+from pieapp.api.structs.media import Metadata
+from pieapp.api.structs.media import MediaFile
+from pieapp.helpers.tags import COVER_TAG
+from pieapp.helpers.tags import metadata_to_tags
+
+
+# Editable `Metadata` fields and their titles, in the columns order
+BULK_FIELDS: tuple[tuple[str, str]] = (
+    ("track_number", "Track number"),
+    ("title", "Title"),
+    ("primary_artist", "Primary artist"),
+    ("featured_artist", "Featured artist"),
+    ("genre", "Genre"),
+    ("subgenre", "Subgenre"),
+    ("publisher", "Publisher"),
+    ("composition_owner", "Composition owner"),
+    ("release_language", "Release language"),
+    ("lyrics_language", "Lyrics language"),
+    ("lyrics_publisher", "Lyrics publisher"),
+    ("year_of_composition", "Year of composition"),
+)
+
+# Single file editor rows: `Metadata` field and title. Rows without a field hold widgets
+EDITOR_FIELDS: tuple[tuple[Optional[str], str]] = (
+    ("title", "Title"),
+    ("genre", "Genre"),
+    ("subgenre", "Subgenre"),
+    ("track_number", "Track number"),
+    (None, "Cover image"),
+    ("primary_artist", "Primary artist"),
+    ("publisher", "Publisher"),
+    ("explicit_content", "Explicit content"),
+    ("lyrics_language", "Lyrics language"),
+    ("lyrics_publisher", "Lyrics publisher"),
+    ("composition_owner", "Composition owner"),
+    ("release_language", "Release language"),
+    ("featured_artist", "Featured artist"),
+    (None, "Additional contributors"),
+    ("year_of_composition", "Year of composition"),
+)
+
+
+def to_text(value: Any) -> str:
+    return "" if value is None else str(value)
+
+
+def _get_cover_path(metadata: Metadata) -> Optional[str]:
+    album_cover = metadata.album_cover
+    return album_cover.image_path.as_posix() if album_cover and album_cover.image_path else None
+
+
+def set_metadata_fields(metadata: Metadata, fields: dict[str, Any]) -> dict[str, Optional[str]]:
+    """
+    Set `Metadata` fields and update its raw tags
+
+    Returns:
+        tags (dict[str, str|None]): changed generic tags to write, see `pieapp.helpers.tags`
+    """
+    old_tags = metadata_to_tags(metadata)
+    old_cover = _get_cover_path(metadata)
+    for field, value in fields.items():
+        setattr(metadata, field, value)
+
+    changes = {tag: value for tag, value in metadata_to_tags(metadata).items() if value != old_tags[tag]}
+    for tag, value in changes.items():
+        if value is None:
+            metadata.tags.pop(tag, None)
+        else:
+            metadata.tags[tag] = value
+
+    # The cover is embedded as a stream, so it isn't kept in the raw tags
+    cover = _get_cover_path(metadata)
+    if cover != old_cover:
+        changes[COVER_TAG] = cover
+
+    return changes
+
+
+class BulkMetadataModel(QAbstractTableModel):
+    """
+    Files × fields table. Edits are kept aside from the files metadata until they're applied,
+    and cells are read from the metadata only when the view asks for them
+    """
+
+    def __init__(self, fields: tuple[tuple[str, str]] = BULK_FIELDS, parent=None) -> None:
+        super().__init__(parent)
+
+        self._fields = fields
+        self._media_files: list[MediaFile] = []
+        # Edited text values by (row, column)
+        self._edits: dict[tuple[int, int], str] = {}
+
+    def set_media_files(self, media_files: list[MediaFile]) -> None:
+        self.begin_reset_model()
+        self._media_files = list(media_files)
+        self._edits = {}
+        self.end_reset_model()
+
+    def get_media_files(self) -> list[MediaFile]:
+        return self._media_files
+
+    def get_field(self, column: int) -> str:
+        return self._fields[column][0]
+
+    def get_column(self, field: str) -> int:
+        return next(i for i, (f, _) in enumerate(self._fields) if f == field)
+
+    def is_modified(self) -> bool:
+        return bool(self._edits)
+
+    # Qt model interface
+
+    def row_count(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.is_valid() else len(self._media_files)
+
+    def column_count(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.is_valid() else len(self._fields)
+
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole) -> Any:
+        if not index.is_valid():
+            return None
+
+        key = (index.row(), index.column())
+        if role in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.EditRole):
+            return self._edits[key] if key in self._edits else self._get_original(*key)
+
+        if role == Qt.ItemDataRole.FontRole and key in self._edits:
+            font = QFont()
+            font.set_bold(True)
+            return font
+
+        if role == Qt.ItemDataRole.ToolTipRole and key in self._edits:
+            return translate("Was: %s") % self._get_original(*key)
+
+        return None
+
+    def set_data(self, index: QModelIndex, value: Any, role: int = Qt.ItemDataRole.EditRole) -> bool:
+        if not index.is_valid() or role != Qt.ItemDataRole.EditRole:
+            return False
+
+        self._set_value(index.row(), index.column(), to_text(value))
+        self.dataChanged.emit(index, index)
+        return True
+
+    def header_data(self, section: int, orientation: Qt.Orientation, role: int = Qt.ItemDataRole.DisplayRole) -> Any:
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+
+        if orientation == Qt.Orientation.Horizontal:
+            return translate(self._fields[section][1])
+
+        return self._media_files[section].info.filename
+
+    def flags(self, index: QModelIndex) -> Qt.ItemFlag:
+        return super().flags(index) | Qt.ItemFlag.ItemIsEditable
+
+    # Bulk edits
+
+    def set_column(self, column: int, value: str, rows: list[int] = None) -> None:
+        """
+        Set the same value to the column cells of the rows or of all the rows
+        """
+        for row in self._get_rows(rows):
+            self._set_value(row, column, value)
+        self._emit_column_changed(column)
+
+    def number_tracks(self, rows: list[int] = None, start: int = 1, with_total: bool = False) -> None:
+        """
+        Number tracks in the rows order
+        """
+        rows = self._get_rows(rows)
+        column = self.get_column("track_number")
+        for number, row in enumerate(rows, start):
+            self._set_value(row, column, f"{number}/{len(rows)}" if with_total else str(number))
+        self._emit_column_changed(column)
+
+    def apply_filename_pattern(self, pattern: str, field: str = "title", rows: list[int] = None) -> int:
+        """
+        Set field values from the file names matched by the regular expression.
+        The group named by the field is used, or the first group, or the whole match
+
+        Returns:
+            count (int): number of matched file names
+
+        Raises:
+            re.error: the pattern is invalid
+        """
+        regex = re.compile(pattern)
+        column = self.get_column(field)
+        matched = 0
+        for row in self._get_rows(rows):
+            match = regex.search(self._media_files[row].info.filename)
+            if match is None:
+                continue
+
+            if field in regex.groupindex:
+                value = match.group(field)
+            else:
+                value = match.group(1) if regex.groups else match.group(0)
+
+            self._set_value(row, column, (value or "").strip())
+            matched += 1
+
+        self._emit_column_changed(column)
+        return matched
+
+    def get_changes(self) -> dict[int, dict[str, tuple[str, str]]]:
+        """
+        Get edited values
+
+        Returns:
+            changes (dict[int, dict[str, tuple[str, str]]]): old and new values by field name by row
+        """
+        changes: dict[int, dict[str, tuple[str, str]]] = {}
+        for (row, column), value in sorted(self._edits.items()):
+            changes.setdefault(row, {})[self.get_field(column)] = (self._get_original(row, column), value)
+
+        return changes
+
+    def get_values(self) -> list[tuple[MediaFile, dict[str, str]]]:
+        """
+        Get edited text values by field name of the edited files
+        """
+        return [
+            (self._media_files[row], {field: new for field, (_, new) in fields.items()})
+            for row, fields in self.get_changes().items()
+        ]
+
+    def clear_edits(self) -> None:
+        self._edits = {}
+        if self._media_files:
+            self.dataChanged.emit(self.index(0, 0), self.index(self.row_count() - 1, self.column_count() - 1))
+
+    # Private methods
+
+    def _get_rows(self, rows: Optional[list[int]]) -> list[int]:
+        return sorted(rows) if rows else list(range(len(self._media_files)))
+
+    def _get_original(self, row: int, column: int) -> str:
+        return to_text(getattr(self._media_files[row].metadata, self._fields[column][0]))
+
+    def _set_value(self, row: int, column: int, value: str) -> None:
+        if value == self._get_original(row, column):
+            self._edits.pop((row, column), None)
+        else:
+            self._edits[(row, column)] = value
+
+    def _emit_column_changed(self, column: int) -> None:
+        if self._media_files:
+            self.dataChanged.emit(self.index(0, column), self.index(len(self._media_files) - 1, column))
+
+
+class MetadataModel(QAbstractTableModel):
+    """
+    Fields × (title, value) table of a single file. The model is created once
+    and the file is swapped on open, so the view and its widgets are kept
+    """
+
+    def __init__(self, fields: tuple[tuple[Optional[str], str]] = EDITOR_FIELDS, parent=None) -> None:
+        super().__init__(parent)
+
+        self._fields = fields
+        self._media_file: MediaFile = None
+        # Edited text values by row
+        self._edits: dict[int, str] = {}
+
+    def set_media_file(self, media_file: MediaFile) -> None:
+        """
+        Show another file. The rows stay the same, so the model isn't reset
+        """
+        self._media_file = media_file
+        self._edits = {}
+        self.dataChanged.emit(self.index(0, 0), self.index(len(self._fields) - 1, 1))
+
+    def get_media_file(self) -> Optional[MediaFile]:
+        return self._media_file
+
+    def get_row(self, title: str) -> int:
+        return next(i for i, (_, t) in enumerate(self._fields) if t == title)
+
+    def is_modified(self) -> bool:
+        return bool(self._edits)
+
+    def get_values(self) -> dict[str, str]:
+        """
+        Get edited values by field name
+        """
+        return {self._fields[row][0]: value for row, value in self._edits.items()}
+
+    def clear_edits(self) -> None:
+        self._edits = {}
+        self.dataChanged.emit(self.index(0, 1), self.index(len(self._fields) - 1, 1))
+
+    # Qt model interface
+
+    def row_count(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.is_valid() else len(self._fields)
+
+    def column_count(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.is_valid() else 2
+
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole) -> Any:
+        if not index.is_valid() or role not in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.EditRole):
+            return None
+
+        field, title = self._fields[index.row()]
+        if index.column() == 0:
+            return translate(title)
+
+        if field is None or self._media_file is None:
+            return None
+
+        if index.row() in self._edits:
+            return self._edits[index.row()]
+
+        return to_text(getattr(self._media_file.metadata, field))
+
+    def set_data(self, index: QModelIndex, value: Any, role: int = Qt.ItemDataRole.EditRole) -> bool:
+        if not index.flags() & Qt.ItemFlag.ItemIsEditable or role != Qt.ItemDataRole.EditRole:
+            return False
+
+        value = to_text(value)
+        if value == to_text(getattr(self._media_file.metadata, self._fields[index.row()][0])):
+            self._edits.pop(index.row(), None)
+        else:
+            self._edits[index.row()] = value
+
+        self.dataChanged.emit(index, index)
+        return True
+
+    def flags(self, index: QModelIndex) -> Qt.ItemFlag:
+        flags = super().flags(index)
+        if index.column() == 1 and self._fields[index.row()][0] is not None and self._media_file is not None:
+            flags |= Qt.ItemFlag.ItemIsEditable
+
+        return flags
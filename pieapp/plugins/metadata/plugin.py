@@ -1,12 +1,13 @@
+from pathlib import Path
+from typing import Optional
+
 from PySide6.QtGui import Qt
 from PySide6.QtWidgets import QDialog
 from PySide6.QtWidgets import QGridLayout
 from PySide6.QtWidgets import QHeaderView
 from PySide6.QtWidgets import QListWidget
 from PySide6.QtWidgets import QSizePolicy
-from PySide6.QtWidgets import QStyledItemDelegate
-from PySide6.QtWidgets import QTableWidget
-from PySide6.QtWidgets import QTableWidgetItem
+from PySide6.QtWidgets import QTableView
 
 from pieapp.api.globals import Global
 from pieapp.api.managers.locales.helpers import translate
@@ -21,13 +22,11 @@ from pieapp.api.structs.media import MediaFile
 
 from pieapp.api.structs.plugins import Plugin
 
+from metadata.history import CoverStore
+from metadata.history import MetadataHistory
+from metadata.models import MetadataModel
 from metadata.widgets.albumpicker import AlbumCoverPicker
-
-
-class ReadOnlyDelegate(QStyledItemDelegate):
-
-    def create_editor(self, parent, option, index) -> None:
-        return
+from metadata.widgets.bulk import BulkEditorDialog
 
 
 class MetadataEditor(
@@ -88,25 +87,64 @@ class MetadataEditor(
         )
         self._redo_button.set_disabled(True)
 
+        self._save_button.clicked.connect(self._save_button_connect)
+        self._undo_button.clicked.connect(self._undo_button_connect)
+        self._redo_button.clicked.connect(self._redo_button_connect)
+
         self.add_toolbar_item(self._toolbar.name, "save", self._save_button)
         self.add_toolbar_item(self._toolbar.name, "undo", self._undo_button)
         self.add_toolbar_item(self._toolbar.name, "redo", self._redo_button)
 
-        self._table_widget = QTableWidget()
-        self._table_widget.set_object_name("MetadataTable")
-        self._table_widget.set_row_count(15)
-        self._table_widget.set_column_count(2)
-        self._table_widget.vertical_header().hide()
-        self._table_widget.horizontal_header().hide()
-        self._table_widget.horizontal_header().set_section_resize_mode(0, QHeaderView.ResizeMode.ResizeToContents)
-        self._table_widget.horizontal_header().set_section_resize_mode(1, QHeaderView.ResizeMode.Stretch)
-        self._table_widget.set_item_delegate_for_column(0, ReadOnlyDelegate(self._dialog))
+        # The model and its widgets are created once, and the file is swapped on open
+        self._model = MetadataModel(parent=self._dialog)
+        self._model.dataChanged.connect(self._model_data_changed)
+
+        self._table_view = QTableView()
+        self._table_view.set_object_name("MetadataTable")
+        self._table_view.set_model(self._model)
+        self._table_view.vertical_header().hide()
+        self._table_view.horizontal_header().hide()
+        self._table_view.horizontal_header().set_section_resize_mode(0, QHeaderView.ResizeMode.ResizeToContents)
+        self._table_view.horizontal_header().set_section_resize_mode(1, QHeaderView.ResizeMode.Stretch)
+
+        self._album_cover_widget = AlbumCoverPicker(
+            parent=self._dialog,
+            picker_icon=self.get_svg_icon("icons/folder-open.svg", color="#f5d97f"),
+            placeholder_text=translate("No image selected"),
+            select_album_cover_text=translate("Select album cover image")
+        )
+        self._album_cover_widget.sig_image_changed.connect(self._model_data_changed)
+        self._contributors_list_widget = QListWidget()
+
+        self._table_view.set_index_widget(
+            self._model.index(self._model.get_row("Cover image"), 1),
+            self._album_cover_widget
+        )
+        self._table_view.set_index_widget(
+            self._model.index(self._model.get_row("Additional contributors"), 1),
+            self._contributors_list_widget
+        )
 
         self._main_grid_layout.add_widget(self._toolbar, 0, 0, Qt.AlignmentFlag.AlignTop)
-        self._main_grid_layout.add_widget(self._table_widget)
+        self._main_grid_layout.add_widget(self._table_view)
 
         self._dialog.set_layout(self._main_grid_layout)
 
+        self._bulk_editor = BulkEditorDialog(self._parent)
+        self._bulk_editor.set_window_icon(self.get_plugin_icon())
+        self._bulk_editor.sig_changes_accepted.connect(self._bulk_changes_accepted)
+
+        # Covers are referenced by the history with their content hash
+        self._history = MetadataHistory(
+            CoverStore(Global.USER_ROOT / Global.DEFAULT_TEMP_FOLDER_NAME / "covers" / "originals"),
+            parent=self._dialog
+        )
+        self._history.sig_history_changed.connect(self._history_changed)
+
+        self._converter = get_plugin(Plugin.Converter)
+        self._tag_writer = self._converter.get_tag_writer()
+        self._tag_writer.sig_batch_written.connect(self._tags_written)
+
     @on_plugin_event(target=Plugin.Converter, event="converter_table_ready")
     def _on_converter_table_ready(self) -> None:
         """
@@ -123,70 +161,96 @@ class MetadataEditor(
 
     def _edit_file_button_connect(self, media_file: MediaFile) -> None:
         """
-        -map 0:0 -map 1:0
-        -c copy -id3v2_version 3
-        -metadata:s:v title="album cover"
-        -metadata:s:v comment="cover (front)" out.mp3
+        Open the editor with the file metadata, or the bulk editor if more files are selected
         """
-        self._save_button.clicked.connect(lambda: self._save_button_connect(media_file))
-        self._undo_button.clicked.connect(lambda: self._undo_button_connect(media_file))
-        self._redo_button.clicked.connect(lambda: self._redo_button_connect(media_file))
-
-        contributors_list_widget = QListWidget()
-        contributors_list_widget.add_items(media_file.metadata.additional_contributors)
+        selected_files = self._converter.get_selected_files()
+        if len(selected_files) > 1 and any(f is media_file for f in selected_files):
+            self._bulk_editor.set_media_files(selected_files)
+            self._bulk_editor.show()
+            return
 
         album_cover = media_file.metadata.album_cover
-
-        album_cover_widget = AlbumCoverPicker(
-            parent=self._dialog,
-            image_path=album_cover.image_path.as_posix() if album_cover.image_path.exists() else None,
-            picker_icon=self.get_svg_icon("icons/folder-open.svg", color="#f5d97f"),
-            placeholder_text=translate("No image selected"),
-            select_album_cover_text=translate("Select album cover image")
+        image_path = album_cover.image_path if album_cover else None
+        self._album_cover_widget.set_image_path(
+            image_path.as_posix() if image_path and image_path.exists() else None
         )
 
-        self._table_widget.set_item(0, 0, QTableWidgetItem(translate("Title")))
-        self._table_widget.set_item(1, 0, QTableWidgetItem(translate("Genre")))
-        self._table_widget.set_item(2, 0, QTableWidgetItem(translate("Subgenre")))
-        self._table_widget.set_item(3, 0, QTableWidgetItem(translate("Track number")))
-        self._table_widget.set_item(4, 0, QTableWidgetItem(translate("Cover image")))
-        self._table_widget.set_item(5, 0, QTableWidgetItem(translate("Primary artist")))
-        self._table_widget.set_item(6, 0, QTableWidgetItem(translate("Publisher")))
-        self._table_widget.set_item(7, 0, QTableWidgetItem(translate("Explicit content")))
-        self._table_widget.set_item(8, 0, QTableWidgetItem(translate("Lyrics language")))
-        self._table_widget.set_item(9, 0, QTableWidgetItem(translate("Lyrics publisher")))
-        self._table_widget.set_item(10, 0, QTableWidgetItem(translate("Release language")))
-        self._table_widget.set_item(11, 0, QTableWidgetItem(translate("Featured artist")))
-        self._table_widget.set_item(12, 0, QTableWidgetItem(translate("Additional artist")))
-        self._table_widget.set_item(13, 0, QTableWidgetItem(translate("Additional contributors")))
-        self._table_widget.set_item(14, 0, QTableWidgetItem(translate("Year of composition")))
-
-        self._table_widget.set_item(0, 1, QTableWidgetItem(media_file.metadata.title))
-        self._table_widget.set_item(1, 1, QTableWidgetItem(media_file.metadata.genre))
-        self._table_widget.set_item(2, 1, QTableWidgetItem(media_file.metadata.subgenre))
-        self._table_widget.set_item(3, 1, QTableWidgetItem(media_file.metadata.track_number))
-        self._table_widget.set_cell_widget(4, 1, album_cover_widget)
-        self._table_widget.set_item(5, 1, QTableWidgetItem(media_file.metadata.primary_artist))
-        self._table_widget.set_item(6, 1, QTableWidgetItem(media_file.metadata.publisher))
-        self._table_widget.set_item(7, 1, QTableWidgetItem(media_file.metadata.explicit_content))
-        self._table_widget.set_item(8, 1, QTableWidgetItem(media_file.metadata.lyrics_language))
-        self._table_widget.set_item(9, 1, QTableWidgetItem(media_file.metadata.lyrics_publisher))
-        self._table_widget.set_item(10, 1, QTableWidgetItem(media_file.metadata.composition_owner))
-        self._table_widget.set_item(11, 1, QTableWidgetItem(media_file.metadata.release_language))
-        self._table_widget.set_item(12, 1, QTableWidgetItem(media_file.metadata.featured_artist))
-        self._table_widget.set_cell_widget(13, 1, contributors_list_widget)
-        self._table_widget.set_item(14, 1, QTableWidgetItem(str(media_file.metadata.year_of_composition)))
+        self._contributors_list_widget.clear()
+        self._contributors_list_widget.add_items(media_file.metadata.additional_contributors)
 
+        self._model.set_media_file(media_file)
         self._dialog.show()
 
-    def _save_button_connect(self, media_file: MediaFile) -> None:
-        pass
+    def _get_cover_path(self) -> Optional[Path]:
+        album_cover = self._model.get_media_file().metadata.album_cover
+        return album_cover.image_path if album_cover else None
+
+    def _is_cover_changed(self) -> bool:
+        image_path = self._album_cover_widget.image_path
+        cover_path = self._get_cover_path()
+        if image_path is None:
+            return cover_path is not None and cover_path.exists()
+
+        return cover_path is None or Path(image_path) != cover_path
 
-    def _undo_button_connect(self, media_file: MediaFile) -> None:
-        pass
+    def _model_data_changed(self) -> None:
+        self._save_button.set_disabled(not (self._model.is_modified() or self._is_cover_changed()))
 
-    def _redo_button_connect(self, media_file: MediaFile) -> None:
-        pass
+    def _history_changed(self) -> None:
+        self._undo_button.set_disabled(not self._history.can_undo())
+        self._redo_button.set_disabled(not self._history.can_redo())
+
+    def _save_button_connect(self) -> None:
+        """
+        Apply the edited fields and write the changed tags into the file
+        """
+        media_file = self._model.get_media_file()
+        covers = {}
+        if self._is_cover_changed():
+            image_path = self._album_cover_widget.image_path
+            covers[0] = Path(image_path) if image_path else None
+
+        tags = self._history.apply(
+            translate("Edit %s") % media_file.info.filename,
+            [(media_file, self._model.get_values())],
+            covers
+        )
+        self._model.clear_edits()
+        self._tag_writer.write(tags)
+
+    def _bulk_changes_accepted(self, values: list) -> None:
+        self._tag_writer.write(self._history.apply(translate("Edit %s files") % len(values), values))
+
+    def _tags_written(self, written: list, failed: dict) -> None:
+        for file_path, message in failed.items():
+            self._logger.error(f"Tags of {file_path} weren't written: {message}")
+
+        status_bar = get_plugin(Plugin.StatusBar)
+        if not status_bar:
+            return
+
+        if failed:
+            status_bar.show_message(translate("Tags weren't written: %s") % len(failed))
+        elif written:
+            status_bar.show_message(translate("Tags saved: %s") % len(written))
+
+    def _undo_button_connect(self) -> None:
+        """
+        Revert the last saved change. The files are written again
+        """
+        self._tag_writer.write(self._history.undo())
+        self._refresh_editor()
+
+    def _redo_button_connect(self) -> None:
+        self._tag_writer.write(self._history.redo())
+        self._refresh_editor()
+
+    def _refresh_editor(self) -> None:
+        media_file = self._model.get_media_file()
+        if media_file is not None:
+            cover_path = self._get_cover_path()
+            self._album_cover_widget.set_image_path(cover_path.as_posix() if cover_path else None)
+            self._model.set_media_file(media_file)
 
 
 def main(parent: "QMainWindow", plugin_path: "Path"):
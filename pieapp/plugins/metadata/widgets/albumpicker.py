@@ -1,32 +1,62 @@
 from __feature__ import snake_case
 
-from PySide6.QtCore import QEvent, QRect
+from PySide6.QtCore import Qt
+from PySide6.QtCore import QEvent
+from PySide6.QtCore import QPoint
+from PySide6.QtCore import Signal
 from PySide6.QtGui import QAction
 from PySide6.QtGui import QCursor
 from PySide6.QtGui import QEnterEvent
 from PySide6.QtGui import QIcon
+from PySide6.QtGui import QPixmap
 from PySide6.QtWidgets import QFileDialog
+from PySide6.QtWidgets import QLabel
 from PySide6.QtWidgets import QLineEdit
 from PySide6.QtWidgets import QStyle
-from PySide6.QtWidgets import QToolTip
 
 from pieapp.api.globals import Global
 from pieapp.api.managers.locales.helpers import translate
+from pieapp.helpers.thumbnails import get_thumbnail_service
 
+# Preview thumbnail size in pixels, see `THUMBNAIL_SIZES`
+PREVIEW_SIZE = 264
 
-class ImagePreview(QToolTip):
+
+class ImagePreview(QLabel):
+    """
+    Cover miniature popup. The thumbnail is made in the background, so hovering
+    never decodes the full-size image
+    """
 
     def __init__(self, parent, image_path: str) -> None:
-        self._parent = parent
-        self._string = "<img width=264 height=264 src='%s'>" % image_path if image_path else None
-        super(ImagePreview, self).__init__()
+        super(ImagePreview, self).__init__(parent, Qt.WindowType.ToolTip)
+        self._image_path = image_path
+        self._is_hovered = False
+
+    def set_image_path(self, image_path: str = None) -> None:
+        self._image_path = image_path
 
     def show_tooltip(self) -> None:
-        if self._string:
-            self.show_text(QCursor.pos(), self._string, self._parent, QRect(), 10000)
+        if self._image_path:
+            self._is_hovered = True
+            get_thumbnail_service().request(self._image_path, PREVIEW_SIZE, self._show_thumbnail)
+
+    def hide_text(self) -> None:
+        self._is_hovered = False
+        self.hide()
+
+    def _show_thumbnail(self, pixmap: QPixmap) -> None:
+        if not self._is_hovered:
+            return
+
+        self.set_pixmap(pixmap)
+        self.adjust_size()
+        self.move(QCursor.pos() + QPoint(16, 16))
+        self.show()
 
 
 class AlbumCoverPicker(QLineEdit):
+    sig_image_changed = Signal(str)
 
     def __init__(
         self,
@@ -64,6 +94,16 @@ class AlbumCoverPicker(QLineEdit):
         """
         self._image_preview.hide_text()
 
+    @property
+    def image_path(self) -> str:
+        return self._image_path
+
+    def set_image_path(self, image_path: str = None) -> None:
+        self._image_path = image_path
+        self.clear()
+        self.insert(self._image_path if self._image_path else self._placeholder_text)
+        self._image_preview.set_image_path(self._image_path)
+
     def set_picker_icon(self, icon: QIcon) -> None:
         self._add_image_action.set_icon(icon)
 
@@ -86,4 +126,5 @@ class AlbumCoverPicker(QLineEdit):
             self.clear()
             self._image_path = file_path[0]
             self.insert(self._image_path)
-            self._image_preview = ImagePreview(self, file_path[0])
+            self._image_preview.set_image_path(file_path[0])
+            self.sig_image_changed.emit(self._image_path)
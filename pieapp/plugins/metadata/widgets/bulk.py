@@ -0,0 +1,166 @@
+from __feature__ import snake_case
+
+import re
+
+from PySide6.QtCore import Signal
+from PySide6.QtWidgets import QDialog
+from PySide6.QtWidgets import QComboBox
+from PySide6.QtWidgets import QLineEdit
+from PySide6.QtWidgets import QTableView
+from PySide6.QtWidgets import QHeaderView
+from PySide6.QtWidgets import QHBoxLayout
+from PySide6.QtWidgets import QVBoxLayout
+from PySide6.QtWidgets import QPushButton
+from PySide6.QtWidgets import QPlainTextEdit
+from PySide6.QtWidgets import QDialogButtonBox
+from PySide6.QtWidgets import QAbstractItemView
+
+from pieapp.api.managers.locales.helpers import translate
+from pieapp.api.structs.media import MediaFile
+
+from metadata.models import BULK_FIELDS
+from metadata.models import BulkMetadataModel
+
+# Default pattern of "title from file name": "01 - Title.mp3" or "Artist - Title.flac"
+FILENAME_PATTERN = r"^(?:\d+\s*[-.]?\s*)?(?:.+?\s+-\s+)?(?P<title>.+?)\.\w+$"
+
+# Row height in pixels. Fixed heights let the view skip measuring the rows
+ROW_HEIGHT = 24
+
+
+class DiffPreviewDialog(QDialog):
+
+    def __init__(self, parent, changes: dict[int, dict[str, tuple[str, str]]], media_files: list[MediaFile]) -> None:
+        super().__init__(parent)
+        self.set_window_title(translate("Review changes"))
+        self.resize(640, 420)
+
+        labels = dict(BULK_FIELDS)
+        lines = []
+        for row, fields in changes.items():
+            lines.append(media_files[row].info.filename)
+            for field, (old, new) in fields.items():
+                lines.append(f"    {translate(labels[field])}: {old or '∅'} → {new or '∅'}")
+
+        text_edit = QPlainTextEdit()
+        text_edit.set_read_only(True)
+        text_edit.set_plain_text("\n".join(lines))
+
+        button_box = QDialogButtonBox(QDialogButtonBox.StandardButton.Save | QDialogButtonBox.StandardButton.Cancel)
+        button_box.accepted.connect(self.accept)
+        button_box.rejected.connect(self.reject)
+
+        layout = QVBoxLayout()
+        layout.add_widget(text_edit)
+        layout.add_widget(button_box)
+        self.set_layout(layout)
+
+
+class BulkEditorDialog(QDialog):
+    """
+    Edit metadata of many files at once. Changes are reviewed before they're applied
+    """
+    sig_changes_accepted = Signal(object)
+
+    def __init__(self, parent=None) -> None:
+        super().__init__(parent)
+        self.set_modal(True)
+        self.set_object_name("BulkMetadataEditor")
+        self.set_window_title(translate("Edit metadata"))
+        self.resize(960, 540)
+
+        self._model = BulkMetadataModel(parent=self)
+
+        self._table_view = QTableView()
+        self._table_view.set_object_name("BulkMetadataTable")
+        self._table_view.set_model(self._model)
+        self._table_view.set_selection_behavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self._table_view.set_selection_mode(QAbstractItemView.SelectionMode.ExtendedSelection)
+        self._table_view.vertical_header().set_section_resize_mode(QHeaderView.ResizeMode.Fixed)
+        self._table_view.vertical_header().set_default_section_size(ROW_HEIGHT)
+        self._table_view.horizontal_header().set_section_resize_mode(QHeaderView.ResizeMode.Interactive)
+        self._table_view.horizontal_header().set_stretch_last_section(True)
+
+        # Column-wide edit
+        self._field_combo_box = QComboBox()
+        for field, title in BULK_FIELDS:
+            self._field_combo_box.add_item(translate(title), field)
+
+        self._value_line_edit = QLineEdit()
+        self._value_line_edit.set_placeholder_text(translate("Value"))
+
+        set_column_button = QPushButton(translate("Set"))
+        set_column_button.clicked.connect(self._set_column_button_connect)
+
+        number_tracks_button = QPushButton(translate("Number tracks"))
+        number_tracks_button.clicked.connect(self._number_tracks_button_connect)
+
+        column_layout = QHBoxLayout()
+        column_layout.add_widget(self._field_combo_box)
+        column_layout.add_widget(self._value_line_edit, 1)
+        column_layout.add_widget(set_column_button)
+        column_layout.add_widget(number_tracks_button)
+
+        # Title from file name
+        self._pattern_line_edit = QLineEdit(FILENAME_PATTERN)
+        self._pattern_line_edit.set_tool_tip(translate("Regular expression. The \"title\" group or the first group is used"))
+
+        pattern_button = QPushButton(translate("Title from file name"))
+        pattern_button.clicked.connect(self._pattern_button_connect)
+
+        pattern_layout = QHBoxLayout()
+        pattern_layout.add_widget(self._pattern_line_edit, 1)
+        pattern_layout.add_widget(pattern_button)
+
+        self._button_box = QDialogButtonBox(
+            QDialogButtonBox.StandardButton.Save | QDialogButtonBox.StandardButton.Cancel
+        )
+        self._button_box.accepted.connect(self._save_button_connect)
+        self._button_box.rejected.connect(self.reject)
+
+        layout = QVBoxLayout()
+        layout.add_layout(column_layout)
+        layout.add_layout(pattern_layout)
+        layout.add_widget(self._table_view)
+        layout.add_widget(self._button_box)
+        self.set_layout(layout)
+
+    def set_media_files(self, media_files: list[MediaFile]) -> None:
+        self._model.set_media_files(media_files)
+
+    def _get_selected_rows(self) -> list[int]:
+        """
+        Get selected rows. Empty selection means all the rows
+        """
+        return [index.row() for index in self._table_view.selection_model().selected_rows()]
+
+    def _set_column_button_connect(self) -> None:
+        column = self._model.get_column(self._field_combo_box.current_data())
+        self._model.set_column(column, self._value_line_edit.text(), self._get_selected_rows())
+
+    def _number_tracks_button_connect(self) -> None:
+        self._model.number_tracks(self._get_selected_rows())
+
+    def _pattern_button_connect(self) -> None:
+        try:
+            matched = self._model.apply_filename_pattern(self._pattern_line_edit.text(), "title", self._get_selected_rows())
+        except re.error as e:
+            self._pattern_line_edit.set_tool_tip(str(e))
+            self._pattern_line_edit.set_style_sheet("color: red")
+            return
+
+        self._pattern_line_edit.set_style_sheet("")
+        self._pattern_line_edit.set_tool_tip(translate("Matched files: %s") % matched)
+
+    def _save_button_connect(self) -> None:
+        if not self._model.is_modified():
+            self.accept()
+            return
+
+        preview_dialog = DiffPreviewDialog(self, self._model.get_changes(), self._model.get_media_files())
+        if preview_dialog.exec() != QDialog.DialogCode.Accepted:
+            return
+
+        self.sig_changes_accepted.emit(self._model.get_values())
+        self._model.clear_edits()
+        self.accept()
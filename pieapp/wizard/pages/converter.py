@@ -9,6 +9,7 @@ from PySide6.QtGui import Qt, QAction
 from PySide6.QtWidgets import QStyle, QFileDialog
 
 from pieapp.helpers.ffmpeg import DownloadWorker
+from pieapp.helpers.ffmpeg import CalibrationWorker
 from pieapp.api.globals import Global
 from pieapp.helpers.logger import logger
 from pieapp.api.managers.configs.mixins import ConfigAccessorMixin
@@ -44,6 +45,15 @@ class ConverterWizardPage(
         self._download_thread.finished.connect(self._download_worker.delete_later)
         self._download_worker.destroyed.connect(self._download_worker.destroyed)
 
+        self._calibration_results: dict[str, dict] = {}
+        self._calibration_thread = QThread()
+        self._calibration_worker = CalibrationWorker()
+        self._calibration_worker.sig_calibration_message.connect(self._download_worker_unpack)
+        self._calibration_worker.sig_calibration_done.connect(self._calibration_done)
+        self._calibration_worker.sig_calibration_failed.connect(self._calibration_failed)
+        self._calibration_worker.move_to_thread(self._calibration_thread)
+        self._calibration_thread.started.connect(self._calibration_worker.start)
+
         self.line_edit_action = QAction()
         self.line_edit_action.set_icon(self.style().standard_icon(QStyle.StandardPixmap.SP_DirIcon))
         self.line_edit_action.triggered.connect(self.select_ffmpeg_root_path)
@@ -53,6 +63,12 @@ class ConverterWizardPage(
         self._download_button.set_icon_size(QSize(27, 27))
         self._download_button.clicked.connect(self._start_downloader_thread)
 
+        self._calibrate_button = QtWidgets.QPushButton()
+        self._calibrate_button.set_tool_tip(translate("Calibrate converter"))
+        self._calibrate_button.set_icon(self.style().standard_icon(QStyle.StandardPixmap.SP_BrowserReload))
+        self._calibrate_button.set_icon_size(QSize(27, 27))
+        self._calibrate_button.clicked.connect(self._start_calibration_thread)
+
         self._line_edit = QtWidgets.QLineEdit()
         self._line_edit.set_style_sheet("QLineEdit{font-size: 15pt;}")
         self._line_edit.set_placeholder_text(translate("Select ffmpeg directory or download latest release"))
@@ -71,6 +87,7 @@ class ConverterWizardPage(
         ffmpeg_hbox = QtWidgets.QHBoxLayout()
         ffmpeg_hbox.add_widget(self._download_button)
         ffmpeg_hbox.add_widget(self._line_edit)
+        ffmpeg_hbox.add_widget(self._calibrate_button)
 
         self._layout = QtWidgets.QVBoxLayout()
         self._layout.add_widget(page_title)
@@ -108,6 +125,32 @@ class ConverterWizardPage(
     @Slot(str)
     def _unpack_ready(self, ffmpeg_path: str) -> None:
         self.wizard().button(QtWidgets.QWizard.WizardButton.NextButton).set_enabled(True)
+        self._start_calibration_thread()
+
+    def _start_calibration_thread(self) -> None:
+        """
+        Run a short calibration encode per codec profile to find optimal workers/threads settings
+        """
+        if self._calibration_thread.is_running():
+            return
+
+        ffmpeg_binary = Path(self._line_edit.text()) / self._binaries[0]
+        self._calibration_worker.set_ffmpeg_cmd(ffmpeg_binary if ffmpeg_binary.exists() else self._binaries[0])
+        self._calibrate_button.set_disabled(True)
+        self._calibration_thread.start()
+
+    @Slot(dict)
+    def _calibration_done(self, results: dict) -> None:
+        self._calibration_results = results
+        self._calibrate_button.set_disabled(False)
+        self._calibration_thread.quit()
+
+    @Slot(str)
+    def _calibration_failed(self, message: str) -> None:
+        logger.error(message)
+        self._progress_bar.set_format(translate("Calibration has failed"))
+        self._calibrate_button.set_disabled(False)
+        self._calibration_thread.quit()
 
     def is_complete(self) -> bool:
         return bool(self._ffmpeg_path.exists() if self._ffmpeg_path else False) and super().is_complete()
@@ -147,6 +190,7 @@ class ConverterWizardPage(
             self._ffmpeg_path = Path(directory_path)
             self._line_edit.set_text(str(directory_path))
             self.completeChanged.emit()
+            self._start_calibration_thread()
 
     def finish(self) -> None:
         ffmpeg_path = Path(self._line_edit.text())
@@ -173,6 +217,15 @@ class ConverterWizardPage(
                 data=str(binary)
             )
 
+        # Optimal workers/threads settings per codec profile
+        if self._calibration_results:
+            self.set_config(
+                scope=Section.Root,
+                section=Section.User,
+                key="ffmpeg.calibration",
+                data=self._calibration_results
+            )
+
         # Default converter temporary folder
         self.set_config(
             scope=Section.Root,
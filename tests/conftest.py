@@ -0,0 +1,64 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+# Qt modules enable the snake_case feature, which needs PySide6 imported first
+import PySide6
+
+from pieapp.api.structs.media import Edit
+from pieapp.api.structs.media import Codec
+from pieapp.api.structs.media import FileInfo
+from pieapp.api.structs.media import Metadata
+from pieapp.api.structs.media import MediaFile
+
+# Plugins import each other as top-level packages, as the application loads them
+sys.path.insert(0, (Path(__file__).parents[1] / "pieapp" / "plugins").as_posix())
+
+
+@pytest.fixture
+def run_analyzer():
+    """
+    Run an analyzer over a (channels, samples) signal in blocks, as `analyze_file` does
+    """
+    def run(analyzer, signal: np.ndarray, sample_rate: int, block_size: int = 65536) -> dict:
+        signal = np.atleast_2d(signal).astype(np.float32)
+        state = analyzer.start(sample_rate, signal.shape[0])
+        outputs = []
+        for start in range(0, signal.shape[1], block_size):
+            state, output = analyzer.take_output(analyzer.process(state, signal[:, start:start + block_size]))
+            if output is not None:
+                outputs.append(output)
+
+        return analyzer.finish(analyzer.join_outputs(state, outputs))
+
+    return run
+
+
+def get_sine(frequency: float, duration: float, sample_rate: int, level: float = 0.0) -> np.ndarray:
+    """
+    Get a sine with the peak level in dBFS
+    """
+    times = np.arange(round(duration * sample_rate)) / sample_rate
+    return (10 ** (level / 20) * np.sin(2 * np.pi * frequency * times)).astype(np.float32)
+
+
+def get_media_file(
+    codec: str = "flac",
+    duration: float = 30.0,
+    channels: int = 2,
+    bit_rate: int = 0,
+    edits: list[Edit] = None
+) -> MediaFile:
+    info = FileInfo(
+        filename="track",
+        file_format=codec,
+        bit_rate=bit_rate,
+        bit_depth=16,
+        sample_rate=44100,
+        duration=duration,
+        codec=Codec(name=codec, type="audio", long_name=codec),
+        channels=channels,
+        path=Path("track.flac")
+    )
+    return MediaFile(info=info, metadata=Metadata(title="track"), edits=edits or [])
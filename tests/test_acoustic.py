@@ -0,0 +1,38 @@
+import numpy as np
+
+from converter.acoustic import FingerprintIndex
+from converter.acoustic import FingerprintAnalyzer
+
+SAMPLE_RATE = 22050
+
+
+def get_music(seed: int, duration: float = 20.0) -> np.ndarray:
+    """
+    Get tones that change every quarter of a second
+    """
+    rng = np.random.default_rng(seed)
+    notes = rng.uniform(300, 2000, (int(duration * 4), 3))
+    times = np.arange(SAMPLE_RATE // 4) / SAMPLE_RATE
+    return np.concatenate([np.sin(2 * np.pi * note[:, None] * times).sum(axis=0) / 4 for note in notes])
+
+
+def test_clusters(run_analyzer):
+    music = get_music(1)
+    rng = np.random.default_rng(2)
+    # A copy with the encoder delay and some noise, and an unrelated recording
+    copy = np.concatenate((np.zeros(SAMPLE_RATE // 10), music))
+    copy += rng.normal(0, 0.01, len(copy))
+    signals = [music, get_music(3), copy]
+
+    index = FingerprintIndex()
+    for key, signal in enumerate(signals):
+        index.add(key, run_analyzer(FingerprintAnalyzer(), signal, SAMPLE_RATE))
+
+    assert len(index) == 3
+    assert index.get_clusters() == [[0, 2]]
+
+
+def test_silence_skipped(run_analyzer):
+    index = FingerprintIndex()
+    index.add("silence", run_analyzer(FingerprintAnalyzer(), np.zeros(SAMPLE_RATE * 5), SAMPLE_RATE))
+    assert len(index) == 0
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from conftest import get_media_file
+from converter.cutoff import CutoffAnalyzer
+from converter.cutoff import is_suspicious
+
+SAMPLE_RATE = 44100
+
+
+def get_noise(cutoff: float = None, duration: float = 5.0) -> np.ndarray:
+    rng = np.random.default_rng(1)
+    spectrum = np.fft.rfft(rng.normal(0, 0.1, int(duration * SAMPLE_RATE)))
+    if cutoff is not None:
+        # Brick-wall lowpass of a lossy encoder
+        spectrum[np.fft.rfftfreq(int(duration * SAMPLE_RATE), 1 / SAMPLE_RATE) > cutoff] = 0
+    return np.fft.irfft(spectrum, int(duration * SAMPLE_RATE))
+
+
+def test_lowpass_edge(run_analyzer):
+    result = run_analyzer(CutoffAnalyzer(), get_noise(16000.0), SAMPLE_RATE)
+    assert result["cutoff"] == pytest.approx(16000.0, abs=200.0)
+    assert is_suspicious(get_media_file("flac"), result)
+    # A low cutoff is normal for the low bit rates
+    assert not is_suspicious(get_media_file("mp3", bit_rate=128000), result)
+
+
+def test_full_band(run_analyzer):
+    result = run_analyzer(CutoffAnalyzer(), get_noise(), SAMPLE_RATE)
+    assert result["cutoff"] == result["nyquist"] == SAMPLE_RATE / 2
+    assert not is_suspicious(get_media_file("flac"), result)
+
+
+def test_silence(run_analyzer):
+    result = run_analyzer(CutoffAnalyzer(), np.zeros(SAMPLE_RATE), SAMPLE_RATE)
+    assert result["cutoff"] is None
+    assert not is_suspicious(get_media_file("flac"), result)
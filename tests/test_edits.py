@@ -0,0 +1,121 @@
+import pytest
+
+from conftest import get_media_file
+from pieapp.api.structs.media import Edit
+from pieapp.api.structs.media import EditType
+from pieapp.api.structs.media import ChannelOperation
+from converter.edits import get_seek
+from converter.edits import get_pieces
+from converter.edits import compile_edits
+from converter.edits import get_region_pieces
+from converter.edits import get_edited_duration
+
+
+def test_reversed_region():
+    with pytest.raises(ValueError):
+        Edit(EditType.Cut, 20.0, 10.0)
+
+
+def test_unknown_type():
+    with pytest.raises(ValueError):
+        Edit("reverse")
+
+
+def test_pieces():
+    edits = [Edit(EditType.Cut, 20.0, 25.0), Edit(EditType.Cut, 5.0, 10.0), Edit(EditType.Cut, 8.0, 12.0)]
+    assert get_pieces(edits, 30.0) == [("source", 0.0, 5.0), ("source", 12.0, 20.0), ("source", 25.0, None)]
+
+
+def test_cut_to_end():
+    assert get_pieces([Edit(EditType.Cut, 20.0)], 30.0) == [("source", 0.0, 20.0)]
+
+
+def test_clip_at_cut():
+    clip = Edit(EditType.Insert, 10.0, clip_path="clip.wav", clip_end=2.0)
+    pieces = get_pieces([Edit(EditType.Cut, 5.0, 15.0), clip], 30.0)
+    assert pieces == [("source", 0.0, 5.0), ("clip", clip), ("source", 15.0, None)]
+
+
+@pytest.mark.parametrize("duration", [None, 0.0])
+def test_unknown_duration(duration):
+    # The source is open-ended, the cut isn't clamped to the unknown end
+    media_file = get_media_file(duration=duration, edits=[Edit(EditType.Cut, 10.0, 20.0)])
+    assert get_pieces(media_file.edits, duration or None) == [("source", 0.0, 10.0), ("source", 20.0, None)]
+    assert "atrim=start=20,asetpts" in compile_edits(media_file)
+    assert get_edited_duration(media_file) is None
+
+
+def test_gain_unknown_duration():
+    media_file = get_media_file(duration=0.0, edits=[Edit(EditType.Gain, gain=-3.0)])
+    assert compile_edits(media_file) == "[0:a]volume=volume=-3.00dB[out]"
+
+
+def test_fade_to_unknown_end():
+    media_file = get_media_file(duration=None, edits=[Edit(EditType.FadeOut, 20.0)])
+    with pytest.raises(ValueError):
+        compile_edits(media_file)
+
+
+def test_whole_file_cut():
+    with pytest.raises(ValueError):
+        compile_edits(get_media_file(edits=[Edit(EditType.Cut, 0.0)]))
+
+
+def test_mono_source_channels():
+    # The downmix doesn't apply to a mono source, and the duplicated stereo isn't downmixed again
+    edits = [Edit(EditType.Channels, channels=ChannelOperation.Mono)]
+    assert compile_edits(get_media_file(channels=1, edits=edits)) == "[0:a]anull[out]"
+
+    edits.insert(0, Edit(EditType.Channels, channels=ChannelOperation.Stereo))
+    graph = compile_edits(get_media_file(channels=1, edits=edits))
+    assert graph == "[0:a]pan=stereo|c0=c0|c1=c0,pan=mono|c0=0.5*c0+0.5*c1[out]"
+
+
+def test_edited_duration():
+    clip = Edit(EditType.Insert, 10.0, clip_path="clip.wav", clip_start=1.0, clip_end=3.0)
+    media_file = get_media_file(edits=[Edit(EditType.Cut, 10.0, 20.0), clip])
+    assert get_edited_duration(media_file) == pytest.approx(22.0)
+
+
+def test_region_pieces():
+    clip = Edit(EditType.Insert, 10.0, clip_path="clip.wav", clip_start=1.0, clip_end=3.0)
+    pieces = get_pieces([Edit(EditType.Cut, 10.0, 20.0), clip], 30.0)
+    region = get_region_pieces(pieces, 30.0, 9.0, 5.0)
+    assert region == [
+        ("source", 9.0, 10.0),
+        ("clip", Edit(EditType.Insert, 10.0, clip_path="clip.wav", clip_start=1.0, clip_end=3.0)),
+        ("source", 20.0, 22.0),
+    ]
+
+
+def test_region_after_open_clip():
+    # The region position is unknown after a clip without an end
+    clip = Edit(EditType.Insert, 10.0, clip_path="clip.wav")
+    pieces = get_pieces([clip], 30.0)
+    assert get_region_pieces(pieces, 30.0, 0.0, 5.0) == [("source", 0.0, 5.0)]
+    assert get_region_pieces(pieces, 30.0, 15.0, 5.0) is None
+
+
+def test_region_seek():
+    edits = [
+        Edit(EditType.Cut, 10.0, 20.0),
+        Edit(EditType.FadeOut, 25.0, 28.0),
+        Edit(EditType.Gain, 22.0, 30.0, gain=-3.0),
+    ]
+    media_file = get_media_file(edits=edits)
+    region = get_region_pieces(get_pieces(edits, 30.0), 30.0, 12.0, 5.0)
+    assert region == [("source", 22.0, 27.0)]
+    assert get_seek(edits, region) == 22.0
+    assert compile_edits(media_file, pieces=region, offset=22.0) == (
+        "[0:a]afade=t=out:st=3:d=3:curve=tri,volume=volume=-3.00dB:enable='between(t,0,8)',"
+        "atrim=start=0:end=5,asetpts=PTS-STARTPTS[out]"
+    )
+
+
+def test_seek_before_fades():
+    # The audio after a fade-out stays silent, so the input is seeked to its start,
+    # and then to the start of the fade-in that is still going on there
+    edits = [Edit(EditType.FadeIn, 0.0, 21.0), Edit(EditType.FadeOut, 20.0, 22.0)]
+    assert get_seek(edits, [("source", 25.0, 28.0)]) == 0.0
+    assert get_seek(edits[1:], [("source", 25.0, 28.0)]) == 20.0
+    assert get_seek(edits[:1], [("source", 25.0, 28.0)]) == 25.0
@@ -0,0 +1,19 @@
+import pytest
+
+from pieapp.helpers.governor import calibrate
+
+
+@pytest.mark.parametrize("best_workers", [16, 4, 1])
+def test_calibrate_fewer_workers(monkeypatch, best_workers):
+    passes = []
+
+    def run_calibration_pass(ffmpeg_cmd, profile, workers, threads, duration):
+        passes.append((workers, threads))
+        return 100 / (1 + abs(workers * threads - best_workers)) / threads
+
+    monkeypatch.setattr("pieapp.helpers.governor._run_calibration_pass", run_calibration_pass)
+    best = calibrate("ffmpeg", "flac", cpu_count=16)
+
+    assert (best["workers"], best["threads"]) == (best_workers, 1)
+    # Halving stops once the throughput drops
+    assert len([p for p in passes if p[1] == 1]) == {16: 2, 4: 4, 1: 5}[best_workers]
@@ -0,0 +1,53 @@
+import struct
+
+from pieapp.helpers.hashing import HashCache
+from pieapp.helpers.hashing import get_audio_hash
+from pieapp.helpers.hashing import get_audio_ranges
+
+PAYLOAD = bytes(range(256)) * 16
+
+
+def get_id3v2(size: int) -> bytes:
+    synchsafe = bytes((size >> shift) & 0x7F for shift in (21, 14, 7, 0))
+    return b"ID3\x04\x00\x00" + synchsafe + b"\x00" * size
+
+
+def get_ape(items: bytes) -> bytes:
+    footer = b"APETAGEX" + struct.pack("<IIII", 2000, len(items) + 32, 1, 0x80000000) + b"\x00" * 8
+    return footer + items + footer
+
+
+def test_plain_payload():
+    assert get_audio_ranges(PAYLOAD) == [(0, len(PAYLOAD))]
+
+
+def test_tags_skipped():
+    id3v2 = get_id3v2(100)
+    data = id3v2 + PAYLOAD + get_ape(b"item" * 10) + b"TAG" + b"\x00" * 125
+    assert get_audio_ranges(data) == [(len(id3v2), len(id3v2) + len(PAYLOAD))]
+
+
+def test_flac_metadata_skipped():
+    streaminfo = b"\x00" + (34).to_bytes(3, "big") + b"\x00" * 34
+    comment = b"\x84" + (10).to_bytes(3, "big") + b"\x00" * 10
+    header = b"fLaC" + streaminfo + comment
+    assert get_audio_ranges(header + PAYLOAD) == [(len(header), len(header) + len(PAYLOAD))]
+
+
+def test_mp4_media_ranges():
+    ftyp = struct.pack(">I4s", 16, b"ftyp") + b"M4A \x00\x00\x00\x00"
+    moov = struct.pack(">I4s", 24, b"moov") + b"\x00" * 16
+    mdat = struct.pack(">I4s", 8 + len(PAYLOAD), b"mdat") + PAYLOAD
+    start = len(ftyp) + len(moov) + 8
+    assert get_audio_ranges(ftyp + moov + mdat) == [(start, start + len(PAYLOAD))]
+
+
+def test_retagged_copies(tmp_path):
+    first, second = tmp_path / "first.mp3", tmp_path / "second.mp3"
+    first.write_bytes(get_id3v2(100) + PAYLOAD)
+    second.write_bytes(get_id3v2(300) + PAYLOAD + b"TAG" + b"\x00" * 125)
+    cache = HashCache()
+    assert get_audio_hash(first, cache) == get_audio_hash(second, cache)
+
+    second.write_bytes(get_id3v2(300) + PAYLOAD[::-1])
+    assert get_audio_hash(first, HashCache()) != get_audio_hash(second, HashCache())
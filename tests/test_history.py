@@ -0,0 +1,34 @@
+from conftest import get_media_file
+from pieapp.helpers.tags import COVER_TAG
+from metadata.history import CoverStore
+from metadata.history import MetadataHistory
+
+
+def test_cover_tags(tmp_path):
+    image_path = tmp_path / "front.jpg"
+    image_path.write_bytes(b"\xff\xd8\xff\xe0cover")
+    media_file = get_media_file()
+    history = MetadataHistory(CoverStore(tmp_path / "covers"))
+
+    tags = history.apply("Edit", [(media_file, {"title": "new"})], {0: image_path})
+    cover_path = media_file.metadata.album_cover.image_path
+    assert cover_path.parent == tmp_path / "covers"
+    assert tags == {media_file.info.path: {"title": "new", COVER_TAG: cover_path.as_posix()}}
+    assert COVER_TAG not in media_file.metadata.tags
+
+    assert history.undo() == {media_file.info.path: {"title": "track", COVER_TAG: None}}
+    assert media_file.metadata.album_cover is None
+    assert history.redo() == {media_file.info.path: {"title": "new", COVER_TAG: cover_path.as_posix()}}
+
+
+def test_same_cover(tmp_path):
+    image_path = tmp_path / "front.jpg"
+    image_path.write_bytes(b"\xff\xd8\xff\xe0cover")
+    media_file = get_media_file()
+    history = MetadataHistory(CoverStore(tmp_path / "covers"))
+    history.apply("Edit", [(media_file, {})], {0: image_path})
+
+    copy_path = tmp_path / "copy.jpg"
+    copy_path.write_bytes(image_path.read_bytes())
+    assert history.apply("Edit", [(media_file, {})], {0: copy_path}) == {}
+    assert not history.can_redo() and len(history._undo_stack) == 1
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from conftest import get_sine
+from pieapp.helpers.analyzers import MIN_DB
+from converter.loudness import HISTOGRAM_BINS
+from converter.loudness import LoudnessAnalyzer
+from converter.loudness import get_gated_loudness
+
+SAMPLE_RATE = 48000
+
+
+def test_sine_loudness(run_analyzer):
+    # BS.1770: a 997 Hz sine at 0 dBFS in one channel is -3.01 LKFS
+    result = run_analyzer(LoudnessAnalyzer(), get_sine(997, 10, SAMPLE_RATE, -20.0), SAMPLE_RATE)
+    assert result["integrated"] == pytest.approx(-23.01, abs=0.1)
+
+
+def test_relative_gate(run_analyzer):
+    # The quiet part is more than 10 LU below the ungated loudness and is gated out
+    signal = np.concatenate((get_sine(997, 10, SAMPLE_RATE, -20.0), get_sine(997, 10, SAMPLE_RATE, -50.0)))
+    result = run_analyzer(LoudnessAnalyzer(), signal, SAMPLE_RATE)
+    assert result["integrated"] == pytest.approx(-23.01, abs=0.1)
+    assert result["threshold"] == pytest.approx(-36.0, abs=0.2)
+
+
+def test_absolute_gate(run_analyzer):
+    signal = np.concatenate((get_sine(997, 10, SAMPLE_RATE, -20.0), np.zeros(10 * SAMPLE_RATE, dtype=np.float32)))
+    result = run_analyzer(LoudnessAnalyzer(), signal, SAMPLE_RATE)
+    assert result["integrated"] == pytest.approx(-23.01, abs=0.1)
+
+
+def test_block_size_independence(run_analyzer):
+    signal = get_sine(997, 5, SAMPLE_RATE, -20.0) * np.linspace(0.1, 1, 5 * SAMPLE_RATE, dtype=np.float32)
+    whole = run_analyzer(LoudnessAnalyzer(), signal, SAMPLE_RATE, block_size=len(signal))
+    blocks = run_analyzer(LoudnessAnalyzer(), signal, SAMPLE_RATE, block_size=1000)
+    assert blocks["integrated"] == pytest.approx(whole["integrated"], abs=1e-3)
+    assert blocks["range"] == pytest.approx(whole["range"], abs=0.1)
+
+
+def test_silence():
+    counts, energies = np.zeros(HISTOGRAM_BINS, dtype=np.int64), np.zeros(HISTOGRAM_BINS)
+    assert get_gated_loudness(counts, energies) == (MIN_DB, MIN_DB)
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from conftest import get_sine
+from converter.native import PolyphaseResampler
+
+
+def resample(signal: np.ndarray, source_rate: int, target_rate: int, block_size: int = 10000) -> np.ndarray:
+    resampler = PolyphaseResampler(source_rate, target_rate, channels=1, dtype=np.float64)
+    blocks = [resampler.process(signal[start:start + block_size, None]) for start in range(0, len(signal), block_size)]
+    return np.concatenate(blocks + [resampler.flush()])[:, 0]
+
+
+def get_level(signal: np.ndarray) -> float:
+    return 20 * np.log10(np.sqrt(np.mean(signal ** 2)) * np.sqrt(2))
+
+
+@pytest.mark.parametrize("source_rate, target_rate", [(96000, 48000), (48000, 44100), (44100, 48000)])
+def test_output_length(source_rate, target_rate):
+    signal = np.zeros(12345)
+    assert len(resample(signal, source_rate, target_rate)) == -(-len(signal) * target_rate // source_rate)
+
+
+@pytest.mark.parametrize("source_rate, target_rate", [(96000, 48000), (48000, 44100), (44100, 48000)])
+def test_passband(source_rate, target_rate):
+    output = resample(get_sine(1000, 1, source_rate).astype(np.float64), source_rate, target_rate)
+    # Filter edges are skipped
+    assert get_level(output[1000:-1000]) == pytest.approx(0.0, abs=0.01)
+
+
+@pytest.mark.parametrize("source_rate, target_rate, frequency", [(96000, 48000, 24500), (48000, 44100, 22500)])
+def test_stopband(source_rate, target_rate, frequency):
+    # Tones above the output Nyquist frequency would alias back into the audible band
+    output = resample(get_sine(frequency, 1, source_rate).astype(np.float64), source_rate, target_rate)
+    assert get_level(output[1000:-1000]) < -85.0
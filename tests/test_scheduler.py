@@ -0,0 +1,83 @@
+from types import SimpleNamespace
+
+import pytest
+from PySide6.QtCore import QCoreApplication
+
+from conftest import get_media_file
+from pieapp.api.structs.media import Preset
+from converter.jobs import JobPriority
+from converter.jobs import ConversionJob
+from converter.costs import FREE_SPACE_MARGIN
+from converter.scheduler import ConversionScheduler
+
+
+class FakeSupervisor:
+
+    def __init__(self) -> None:
+        self.is_suspended = False
+
+    def suspend(self) -> bool:
+        self.is_suspended = True
+        return True
+
+    def resume(self) -> None:
+        self.is_suspended = False
+
+
+@pytest.fixture
+def scheduler(tmp_path):
+    _ = QCoreApplication.instance() or QCoreApplication([])
+    scheduler = ConversionScheduler(tmp_path / "ffmpeg", calibration={"flac": {"workers": 1, "threads": 1}})
+    # Workers aren't run, the tests complete the jobs
+    scheduler.started = []
+    scheduler._pool = SimpleNamespace(start=lambda worker: scheduler.started.append(worker))
+    yield scheduler
+    scheduler.cancel()
+
+
+def get_job(tmp_path, name: str, folder: str = "output") -> ConversionJob:
+    source_path = tmp_path / f"{name}.flac"
+    source_path.write_bytes(b"\x00" * 1024)
+    media_file = get_media_file(duration=1.0)
+    media_file.info.path = source_path
+    output_path = tmp_path / folder / f"{name}.flac"
+    output_path.parent.mkdir(exist_ok=True)
+    return ConversionJob(media_file, Preset(name="flac", codec="flac", extension=".flac"), output_path)
+
+
+def test_preempted_job_completes(scheduler, tmp_path):
+    background, queued = get_job(tmp_path, "background"), get_job(tmp_path, "queued")
+    scheduler.submit([background, queued])
+    assert scheduler._running == [background]
+    background.supervisor = FakeSupervisor()
+
+    interactive = get_job(tmp_path, "interactive")
+    scheduler.submit([interactive], priority=JobPriority.Interactive)
+    assert background.supervisor.is_suspended
+    assert scheduler._running == [background, interactive]
+
+    # The suspended job completes anyway, the interactive one still takes the only worker
+    scheduler._job_completed(background)
+    assert scheduler._running == [interactive]
+    assert len(scheduler.started) == 2
+
+    scheduler._job_completed(interactive)
+    assert scheduler._running == [queued]
+    assert len(scheduler.started) == 3
+
+
+def test_reservations_per_volume(scheduler, tmp_path, monkeypatch):
+    jobs = [
+        get_job(tmp_path, "first", "first"),
+        get_job(tmp_path, "second", "second"),
+        get_job(tmp_path, "third", "first"),
+    ]
+    size = scheduler.cost_model.estimate(jobs[0]).output_size
+    # Each volume has room for a single output
+    monkeypatch.setattr(scheduler.cost_model, "get_free_space", lambda path: size * 3 // 2 + FREE_SPACE_MARGIN)
+    monkeypatch.setattr(scheduler.cost_model, "get_volume", lambda path: path.name)
+    monkeypatch.setattr("pieapp.helpers.governor.os.cpu_count", lambda: 4)
+    scheduler._calibration = {"flac": {"workers": 3, "threads": 1}}
+
+    scheduler.submit(jobs)
+    assert scheduler._running == jobs[:2]
@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+
+from conftest import get_sine
+from converter.silence import SilenceAnalyzer
+from converter.silence import detect_silence
+from converter.silence import get_trim_filters
+
+SAMPLE_RATE = 48000
+
+
+@pytest.mark.parametrize("level, is_silent", [(-60.2, True), (-59.8, False)])
+def test_threshold_precision(run_analyzer, level, is_silent):
+    # Levels are kept in tenths of dB, so the threshold isn't rounded to whole dB
+    result = run_analyzer(SilenceAnalyzer(), get_sine(1000, 1, SAMPLE_RATE, level), SAMPLE_RATE)
+    assert detect_silence(result, -60.0).is_silent == is_silent
+
+
+def test_gaps(run_analyzer):
+    tone, gap = get_sine(1000, 1, SAMPLE_RATE, -6.0), np.zeros(3 * SAMPLE_RATE, dtype=np.float32)
+    signal = np.concatenate((gap[:SAMPLE_RATE], tone, gap, tone, gap[:SAMPLE_RATE // 2]))
+    silence = detect_silence(run_analyzer(SilenceAnalyzer(), signal, SAMPLE_RATE, block_size=10000))
+    assert silence.leading == pytest.approx(1.0, abs=0.02)
+    assert silence.trailing == pytest.approx(0.5, abs=0.02)
+    assert silence.gaps == [pytest.approx((2.0, 5.0), abs=0.02)]
+    assert get_trim_filters(silence) == ["atrim=start=1.000:end=6.000", "asetpts=PTS-STARTPTS"]
@@ -0,0 +1,198 @@
+import struct
+from pathlib import Path
+
+import pytest
+
+from pieapp.helpers.tags import COVER_TAG
+from pieapp.helpers.tags import FLAC_PADDING
+from pieapp.helpers.tags import TagWriteMethod
+from pieapp.helpers.tags import FLAC_VORBIS_COMMENT
+from pieapp.helpers.tags import _read_synchsafe
+from pieapp.helpers.tags import _write_synchsafe
+from pieapp.helpers.tags import _build_id3_frame
+from pieapp.helpers.tags import _write_id3_in_place
+from pieapp.helpers.tags import _write_flac_in_place
+from pieapp.helpers.tags import _build_vorbis_comment
+from pieapp.helpers.tags import write_tags
+
+AUDIO = b"\xff\xfb" + bytes(range(256)) * 4
+
+
+def get_id3_file(tmp_path, version: int, frames: list[bytes], padding: int):
+    data = b"".join(frames) + b"\x00" * padding
+    file_path = tmp_path / "track.mp3"
+    file_path.write_bytes(b"ID3" + bytes((version, 0, 0)) + _write_synchsafe(len(data)) + data + AUDIO)
+    return file_path
+
+
+def read_id3_frames(data: bytes) -> tuple[dict[str, bytes], int]:
+    """
+    Get the frame bodies by the frame id, and the tag size
+    """
+    version, tag_size = data[3], _read_synchsafe(data[6:10])
+    frames, position = {}, 10
+    while position + 10 <= 10 + tag_size and data[position] != 0:
+        size_bytes = data[position + 4:position + 8]
+        size = _read_synchsafe(size_bytes) if version == 4 else struct.unpack(">I", size_bytes)[0]
+        frames[data[position:position + 4].decode("ascii")] = data[position + 10:position + 10 + size]
+        position += 10 + size
+
+    return frames, tag_size
+
+
+@pytest.mark.parametrize("version, encoding, codec", [(3, b"\x01", "utf-16"), (4, b"\x03", "utf-8")])
+def test_id3_in_place(tmp_path, version, encoding, codec):
+    frames = [_build_id3_frame("title", "Old title", version), _build_id3_frame("album", "Album", version)]
+    file_path = get_id3_file(tmp_path, version, frames, padding=256)
+    _, tag_size = read_id3_frames(file_path.read_bytes())
+
+    assert _write_id3_in_place(file_path, {"title": "Новое", "mood": "Calm", "album": None})
+    data = file_path.read_bytes()
+    frames, new_tag_size = read_id3_frames(data)
+    assert new_tag_size == tag_size
+    assert data.endswith(AUDIO) and len(data) == 10 + tag_size + len(AUDIO)
+    assert set(frames) == {"TIT2", "TXXX"}
+    assert frames["TIT2"] == encoding + "Новое".encode(codec)
+    assert frames["TXXX"].endswith("Calm".encode(codec))
+
+
+def test_id3_keeps_other_frames(tmp_path):
+    frames = [_build_id3_frame("artist", "Artist", 4), _build_id3_frame("mood", "Sad", 4)]
+    file_path = get_id3_file(tmp_path, 4, frames, padding=64)
+
+    assert _write_id3_in_place(file_path, {"mood": "Calm"})
+    frames, _ = read_id3_frames(file_path.read_bytes())
+    assert frames["TPE1"] == b"\x03Artist"
+    assert frames["TXXX"] == b"\x03MOOD\x00Calm"
+
+
+@pytest.mark.parametrize("version", [3, 4])
+def test_id3_without_padding(tmp_path, version):
+    file_path = get_id3_file(tmp_path, version, [_build_id3_frame("title", "Title", version)], padding=0)
+    data = file_path.read_bytes()
+
+    assert not _write_id3_in_place(file_path, {"title": "A longer title"})
+    assert file_path.read_bytes() == data
+
+
+def get_vorbis_comment(vendor: bytes, fields: list[bytes]) -> bytes:
+    return b"".join((
+        struct.pack("<I", len(vendor)), vendor,
+        struct.pack("<I", len(fields)),
+        *(struct.pack("<I", len(field)) + field for field in fields),
+    ))
+
+
+def read_vorbis_fields(comment: bytes) -> list[bytes]:
+    position = 4 + struct.unpack("<I", comment[:4])[0]
+    count = struct.unpack("<I", comment[position:position + 4])[0]
+    fields, position = [], position + 4
+    for _ in range(count):
+        size = struct.unpack("<I", comment[position:position + 4])[0]
+        fields.append(comment[position + 4:position + 4 + size])
+        position += 4 + size
+
+    return fields
+
+
+def test_vorbis_comment():
+    comment = get_vorbis_comment(b"vendor", [b"title=Old", b"ARTIST=Artist", b"Genre=Rock"])
+    fields = read_vorbis_fields(_build_vorbis_comment(comment, {"title": "New", "genre": None, "track": "2"}))
+    assert fields == [b"ARTIST=Artist", b"TITLE=New", b"TRACKNUMBER=2"]
+
+
+def test_malformed_vorbis_comment():
+    assert _build_vorbis_comment(b"\xff\x00\x00\x00vendor", {"title": "New"}) is None
+
+
+def get_flac_file(tmp_path, comment: bytes, padding: int):
+    blocks = [(0, b"\x00" * 34), (FLAC_VORBIS_COMMENT, comment)]
+    if padding:
+        blocks.append((FLAC_PADDING, b"\x00" * padding))
+    data = b"fLaC" + b"".join(
+        bytes(((0x80 if index == len(blocks) - 1 else 0) | block_type,)) + len(block).to_bytes(3, "big") + block
+        for index, (block_type, block) in enumerate(blocks)
+    )
+    file_path = tmp_path / "track.flac"
+    file_path.write_bytes(data + AUDIO)
+    return file_path
+
+
+def read_flac_blocks(data: bytes) -> tuple[list[tuple[int, bytes]], int]:
+    """
+    Get the metadata blocks and the offset of the first frame
+    """
+    blocks, position, is_last = [], 4, False
+    while not is_last:
+        is_last = bool(data[position] & 0x80)
+        size = int.from_bytes(data[position + 1:position + 4], "big")
+        blocks.append((data[position] & 0x7F, data[position + 4:position + 4 + size]))
+        position += 4 + size
+
+    return blocks, position
+
+
+def test_flac_in_place(tmp_path):
+    file_path = get_flac_file(tmp_path, get_vorbis_comment(b"vendor", [b"TITLE=Old"]), padding=128)
+    _, frames_start = read_flac_blocks(file_path.read_bytes())
+
+    assert _write_flac_in_place(file_path, {"title": "Новое", "artist": "Artist"})
+    data = file_path.read_bytes()
+    blocks, new_frames_start = read_flac_blocks(data)
+    assert new_frames_start == frames_start
+    assert data[frames_start:] == AUDIO
+    assert [block_type for block_type, _ in blocks] == [0, FLAC_VORBIS_COMMENT, FLAC_PADDING]
+    assert read_vorbis_fields(blocks[1][1]) == ["TITLE=Новое".encode("utf-8"), b"ARTIST=Artist"]
+
+
+def test_flac_fills_region(tmp_path):
+    # The longer title takes the whole padding block with its header
+    file_path = get_flac_file(tmp_path, get_vorbis_comment(b"vendor", [b"TITLE=Old"]), padding=8)
+    assert _write_flac_in_place(file_path, {"title": "Old" + "!" * (4 + 8)})
+    blocks, _ = read_flac_blocks(file_path.read_bytes())
+    assert [block_type for block_type, _ in blocks] == [0, FLAC_VORBIS_COMMENT]
+
+
+def test_flac_without_padding(tmp_path):
+    file_path = get_flac_file(tmp_path, get_vorbis_comment(b"vendor", [b"TITLE=Old"]), padding=0)
+    data = file_path.read_bytes()
+
+    assert not _write_flac_in_place(file_path, {"title": "A longer title"})
+    assert file_path.read_bytes() == data
+
+
+class FakeSupervisor:
+    args: list = []
+
+    def __init__(self, args, **kwargs):
+        FakeSupervisor.args = args
+
+    def run(self):
+        Path(self.args[-1]).write_bytes(b"remuxed")
+
+
+@pytest.mark.parametrize("cover, maps", [
+    ("front.jpg", ["-map", "0", "-map", "-0:v", "-map", "1:0"]),
+    (None, ["-map", "0", "-map", "-0:v"]),
+])
+def test_cover_remux(tmp_path, monkeypatch, cover, maps):
+    monkeypatch.setattr("pieapp.helpers.tags.Supervisor", FakeSupervisor)
+    file_path = get_id3_file(tmp_path, 3, [_build_id3_frame("title", "Old", 3)], padding=1024)
+    cover_path = (tmp_path / cover).as_posix() if cover else None
+
+    assert write_tags(Path("ffmpeg"), file_path, {"title": "New", COVER_TAG: cover_path}) == TagWriteMethod.Remux
+    assert file_path.read_bytes() == b"remuxed"
+
+    args = FakeSupervisor.args
+    assert [a for i, a in enumerate(args) if a == "-map" or args[i - 1] == "-map"] == maps
+    assert ("-disposition:v" in args) == bool(cover)
+    assert [args[i + 1] for i, a in enumerate(args) if a == "-metadata"] == ["title=New"]
+
+
+def test_cover_unsupported(tmp_path, monkeypatch):
+    monkeypatch.setattr("pieapp.helpers.tags.Supervisor", FakeSupervisor)
+    file_path = tmp_path / "track.ogg"
+    file_path.write_bytes(b"OggS")
+
+    assert write_tags(Path("ffmpeg"), file_path, {COVER_TAG: "front.jpg"}) == TagWriteMethod.InPlace
+    assert file_path.read_bytes() == b"OggS"